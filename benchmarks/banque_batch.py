@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# benchmarks/banque_batch.py
+"""
+Coût par chèque des opérations unitaires et groupées de ms_banque.
+
+Appels SOAP en processus (application WSGI Spyne, validation lxml comprise,
+sans réseau), médiane (µs/chèque) :
+* upload : N appels UploadCheque face à un UploadCheques de N chèques ;
+* status : N appels GetChequeStatus face à un GetChequeStatuses de N identifiants.
+
+Les callbacks sont neutralisés (mesure du seul traitement SOAP et du store).
+
+Usage :
+    python benchmarks/banque_batch.py [--items 1000] [--repeat 3] [--min-speedup 1.0]
+    BANQUE_STORE_PATH=/tmp/cheques.db python benchmarks/banque_batch.py   # store SQLite
+
+Code de sortie 1 si l'opération groupée n'est pas au moins `--min-speedup`
+fois moins coûteuse par chèque que l'opération unitaire.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.append(os.path.join(ROOT, 'src', 'ms_banque'))
+
+from spyne.server.wsgi import WsgiApplication   # noqa: E402
+from werkzeug.test import Client                # noqa: E402
+from werkzeug.wrappers import Response          # noqa: E402
+from ms_banque import server                     # noqa: E402
+
+HEAD = (b'<?xml version="1.0"?><soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">'
+        b'<soapenv:Body>')
+TAIL = b'</soapenv:Body></soapenv:Envelope>'
+
+
+def upload_one(request_id):
+    return (HEAD + b'<UploadCheque xmlns="ms.banque.async"><request_id>%s</request_id>'
+            b'<cheque>valid</cheque></UploadCheque>' % request_id.encode() + TAIL)
+
+
+def upload_many(request_ids):
+    items = b''.join(b'<ChequeUpload><request_id>%s</request_id><cheque>valid</cheque></ChequeUpload>'
+                     % i.encode() for i in request_ids)
+    return HEAD + b'<UploadCheques xmlns="ms.banque.async"><uploads>' + items + b'</uploads></UploadCheques>' + TAIL
+
+
+def status_one(request_id):
+    return (HEAD + b'<GetChequeStatus xmlns="ms.banque.async"><request_id>%s</request_id>'
+            b'</GetChequeStatus>' % request_id.encode() + TAIL)
+
+
+def status_many(request_ids):
+    items = b''.join(b'<string>%s</string>' % i.encode() for i in request_ids)
+    return (HEAD + b'<GetChequeStatuses xmlns="ms.banque.async"><request_ids>' + items
+            + b'</request_ids></GetChequeStatuses>' + TAIL)
+
+
+def post_all(client, envelopes):
+    start = time.perf_counter()
+    for envelope in envelopes:
+        resp = client.post('/', data=envelope, headers={'Content-Type': 'text/xml'})
+        assert resp.status_code == 200, resp.data[:500]
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--items', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--min-speedup', type=float, default=1.0)
+    args = parser.parse_args()
+
+    server.batcher.add = lambda url, item, traceparent=None: None
+    client = Client(WsgiApplication(server.application), Response)
+    ids = [server._new_request('http://app:5000/loan/callback', f'urn:uuid:{n}')
+           for n in range(args.items)]
+
+    cases = [('upload', [upload_one(i) for i in ids], [upload_many(ids)]),
+             ('status', [status_one(i) for i in ids], [status_many(ids)])]
+    failed = False
+    print(f"{'opération':<10} {'unitaire (µs)':>14} {'groupée (µs)':>13} {'gain':>7}   ({args.items} chèques)")
+    for name, single, batch in cases:
+        before = statistics.median(post_all(client, single) for _ in range(args.repeat))
+        after  = statistics.median(post_all(client, batch) for _ in range(args.repeat))
+        before, after = before / args.items * 1e6, after / args.items * 1e6
+        speedup = before / after
+        print(f"{name:<10} {before:>14.1f} {after:>13.1f} {speedup:>6.1f}x")
+        if speedup < args.min_speedup:
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# benchmarks/banque_load.py
+"""
+Test de charge de ms_banque : débit et latence du cycle SubmitChequeRequest
+→ UploadCheque selon le mode de service.
+
+Configurations (processus neufs, callbacks reçus par un puits HTTP local) :
+* wsgiref        : serveur mono-thread précédent, tout par Spyne (BANQUE_FAST_PATH=0) ;
+* gunicorn       : common.serving (threaded), tout par Spyne ;
+* gunicorn+fast  : common.serving et chemin rapide (BANQUE_FAST_PATH=1).
+
+`--clients` threads enchaînent les cycles pendant `--duration` s (connexions
+keep-alive) ; sont affichés cycles/s, p50 et p99 (ms) d'un cycle.
+
+Usage :
+    python benchmarks/banque_load.py [--clients 16] [--duration 5] [--workers 0]
+                                     [--min-speedup 1.0]
+
+`--workers 0` : nombre de workers gunicorn par défaut (cœurs disponibles) ;
+au-delà d'un worker, les demandes sont partagées par BANQUE_STORE_PATH.
+Code de sortie 1 si gunicorn+fast n'atteint pas `--min-speedup` fois le
+débit de wsgiref.
+"""
+import argparse
+import http.client
+import http.server
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from common import soap, serving     # noqa: E402
+
+WSGIREF = ("from wsgiref.simple_server import make_server, WSGIRequestHandler\n"
+           "import server\n"
+           "class Quiet(WSGIRequestHandler):\n"
+           "    def log_message(self, *args): pass\n"
+           "make_server('127.0.0.1', {port}, server.wsgi_app(), handler_class=Quiet).serve_forever()\n")
+
+
+class Sink(http.server.BaseHTTPRequestHandler):
+    """Destinataire des callbacks : acquitte sans traiter."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start(kind, port, env):
+    cwd = os.path.join(ROOT, 'src', 'ms_banque')
+    env = dict(os.environ, PYTHONPATH=os.path.join(ROOT, 'src'), **env)
+    if kind == 'wsgiref':
+        cmd = [sys.executable, '-c', WSGIREF.format(port=port)]
+    else:
+        cmd = [sys.executable, '-m', 'common.serving', 'server:wsgi_app()',
+               '--port', str(port), '--host', '127.0.0.1']
+    proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{kind} : serveur non démarré")
+
+
+def client(port, template, stop, latencies):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    headers = {'Content-Type': 'text/xml; charset=utf-8'}
+    while not stop.is_set():
+        begin = time.perf_counter()
+        conn.request('POST', '/', template.render(), headers)
+        resp = conn.getresponse()
+        request_id = soap.submit_result(soap.parse(resp.read()))
+        upload = (b'<?xml version="1.0"?><soapenv:Envelope xmlns:soapenv="' + soap.NS_SOAP.encode()
+                  + b'"><soapenv:Body><UploadCheque xmlns="ms.banque.async"><request_id>'
+                  + request_id.encode() + b'</request_id><cheque>valid</cheque></UploadCheque>'
+                  b'</soapenv:Body></soapenv:Envelope>')
+        conn.request('POST', '/', upload, headers)
+        resp = conn.getresponse()
+        resp.read()
+        if resp.status != 200:
+            raise RuntimeError(f"UploadCheque : HTTP {resp.status}")
+        latencies.append(time.perf_counter() - begin)
+    conn.close()
+
+
+def run(kind, env, args, sink_url):
+    port = free_port()
+    proc = start(kind, port, env)
+    try:
+        template = soap.SubmitTemplate(sink_url)
+        stop, latencies = threading.Event(), []
+        threads = [threading.Thread(target=client, args=(port, template, stop, latencies))
+                   for _ in range(args.clients)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        proc.terminate()
+        proc.wait(10)
+    latencies.sort()
+    return (len(latencies) / args.duration, statistics.median(latencies) * 1000,
+            latencies[int(len(latencies) * 0.99)] * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--workers', type=int, default=0)
+    parser.add_argument('--min-speedup', type=float, default=1.0)
+    args = parser.parse_args()
+
+    sink = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Sink)
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    sink_url = f'http://127.0.0.1:{sink.server_address[1]}/loan/callback'
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workers = args.workers or serving.available_cores()
+        served  = {'SERVE_MODE': 'threaded', 'SERVE_WORKERS': str(workers)}
+        if workers > 1:
+            served['BANQUE_STORE_PATH'] = os.path.join(tmp, 'cheques.db')
+        configs = [('wsgiref', 'wsgiref', {'BANQUE_FAST_PATH': '0'}),
+                   ('gunicorn', 'gunicorn', dict(served, BANQUE_FAST_PATH='0')),
+                   ('gunicorn+fast', 'gunicorn', dict(served, BANQUE_FAST_PATH='1'))]
+        results = {}
+        print(f"{'mode':<14} {'cycles/s':>9} {'p50 (ms)':>9} {'p99 (ms)':>9}   "
+              f"({args.clients} clients, {args.duration:g} s, {workers} worker(s) gunicorn)")
+        for name, kind, env in configs:
+            rate, p50, p99 = results[name] = run(kind, env, args, sink_url)
+            print(f"{name:<14} {rate:>9.0f} {p50:>9.1f} {p99:>9.1f}")
+    sink.shutdown()
+    speedup = results['gunicorn+fast'][0] / results['wsgiref'][0]
+    print(f"gain gunicorn+fast / wsgiref : {speedup:.1f}x")
+    return 0 if speedup >= args.min_speedup else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# benchmarks/soap_codec.py
+"""
+Microbenchmark du codec SOAP (src/common/soap.py) face aux chemins qu'il remplace.
+
+Pour chaque opération du trajet app ↔ ms_banque, médiane (µs/opération)
+de l'implémentation précédente (copiée ci-dessous telle quelle) et du codec :
+* submit_build    : enveloppe SubmitChequeRequest (str.format + WS-Addressing) ;
+* submit_parse    : réponse SubmitChequeRequest (ElementTree, findtext './/') ;
+* callback_build  : callback ChequeStatusResponse (lxml SubElement + tostring) ;
+* callback_parse  : callback côté app (ElementTree, trois recherches './/').
+
+Usage :
+    python benchmarks/soap_codec.py [--number 20000] [--repeat 5] [--min-speedup 1.0]
+
+Code de sortie 1 si le codec n'est pas au moins `--min-speedup` fois plus
+rapide sur l'une des opérations.
+"""
+import argparse
+import os
+import statistics
+import sys
+import timeit
+import uuid
+from html import escape
+from xml.etree import ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from lxml import etree          # noqa: E402
+from common import soap         # noqa: E402
+
+CALLBACK_URL = 'http://app:5000/loan/callback'
+TRACEPARENT  = '00-' + 'a' * 32 + '-' + 'b' * 16 + '-01'
+REQUEST_ID   = str(uuid.uuid4())
+
+# ------------------------------------------------------------------------------
+# Implémentations précédentes (app.py, ms_banque/server.py)
+# ------------------------------------------------------------------------------
+
+WSA_HEADER = ('<wsa:MessageID>urn:uuid:{message_id}</wsa:MessageID>'
+              '<wsa:ReplyTo><wsa:Address>{reply_to}</wsa:Address>'
+              '<wsa:ReferenceParameters>{reference}</wsa:ReferenceParameters></wsa:ReplyTo>')
+
+SUBMIT_CHEQUE_SOAP = '''<?xml version="1.0"?>
+<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"
+                  xmlns:wsa="http://www.w3.org/2005/08/addressing">
+  <soapenv:Header>{addressing}</soapenv:Header>
+  <soapenv:Body>
+    <SubmitChequeRequest xmlns="ms.banque.async"/>
+  </soapenv:Body>
+</soapenv:Envelope>'''
+
+
+def legacy_submit_build():
+    reference = (f'<tr:traceparent xmlns:tr="{soap.NS_TRACE}">'
+                 f'{TRACEPARENT}</tr:traceparent>')
+    addressing = WSA_HEADER.format(message_id=uuid.uuid4(), reply_to=escape(CALLBACK_URL),
+                                   reference=reference)
+    # requests encode le corps str avant l'envoi
+    return SUBMIT_CHEQUE_SOAP.format(addressing=addressing).encode('utf-8')
+
+
+def legacy_submit_parse(content):
+    tree = ET.fromstring(content)
+    ns   = {'tns': 'ms.banque.async'}
+    return tree.findtext('.//tns:SubmitChequeRequestResult', namespaces=ns)
+
+
+def legacy_callback_build(request_id, reply_to, relates_to, verdict):
+    NS_WSA = 'http://www.w3.org/2005/08/addressing'
+    root = etree.Element(
+        "{http://schemas.xmlsoap.org/soap/envelope/}Envelope",
+        nsmap={None: "http://schemas.xmlsoap.org/soap/envelope/", 'wsa': NS_WSA}
+    )
+    hdr = etree.SubElement(root, "{http://schemas.xmlsoap.org/soap/envelope/}Header")
+    etree.SubElement(hdr, f"{{{NS_WSA}}}MessageID").text = str(uuid.uuid4())
+    etree.SubElement(hdr, f"{{{NS_WSA}}}RelatesTo").text = relates_to
+    etree.SubElement(hdr, f"{{{NS_WSA}}}To").text        = reply_to
+    tp = etree.SubElement(hdr, f"{{{soap.NS_TRACE}}}traceparent", nsmap={'tr': soap.NS_TRACE})
+    tp.set(f"{{{NS_WSA}}}IsReferenceParameter", "true")
+    tp.text = TRACEPARENT
+    body = etree.SubElement(root, "{http://schemas.xmlsoap.org/soap/envelope/}Body")
+    resp = etree.SubElement(body, "ChequeStatusResponse")
+    etree.SubElement(resp, "request_id").text = request_id
+    etree.SubElement(resp, "status").text     = "done"
+    etree.SubElement(resp, "verdict").text    = verdict
+    return etree.tostring(root, xml_declaration=True, encoding='utf-8')
+
+
+def legacy_callback_parse(content):
+    tree = ET.fromstring(content)
+    parent  = tree.findtext(f'.//{{{soap.NS_TRACE}}}traceparent')
+    req_id  = tree.findtext('.//request_id')
+    verdict = tree.findtext('.//verdict')
+    return parent, req_id, verdict
+
+
+# ------------------------------------------------------------------------------
+# Codec
+# ------------------------------------------------------------------------------
+
+SUBMIT = soap.SubmitTemplate(CALLBACK_URL)
+
+
+def codec_submit_parse(content):
+    return soap.submit_result(soap.parse(content))
+
+
+def codec_callback_parse(content):
+    root = soap.parse(content)
+    fields = soap.cheque_status(root)
+    return soap.traceparent(root), fields.get('request_id'), fields.get('verdict')
+
+
+# réponse Spyne réelle et callback au format attendu par l'app
+SUBMIT_RESPONSE = f'''<?xml version='1.0' encoding='UTF-8'?>
+<soap11env:Envelope xmlns:soap11env="http://schemas.xmlsoap.org/soap/envelope/" xmlns:tns="ms.banque.async">\
+<soap11env:Body><tns:SubmitChequeRequestResponse><tns:SubmitChequeRequestResult>{REQUEST_ID}\
+</tns:SubmitChequeRequestResult></tns:SubmitChequeRequestResponse></soap11env:Body></soap11env:Envelope>'''.encode()
+CALLBACK = soap.cheque_status_response(REQUEST_ID, CALLBACK_URL, 'urn:uuid:1', 'Chèque validé',
+                                       traceparent=TRACEPARENT)
+
+CASES = [
+    ('submit_build',
+     legacy_submit_build,
+     lambda: SUBMIT.render(TRACEPARENT)),
+    ('submit_parse',
+     lambda: legacy_submit_parse(SUBMIT_RESPONSE),
+     lambda: codec_submit_parse(SUBMIT_RESPONSE)),
+    ('callback_build',
+     lambda: legacy_callback_build(REQUEST_ID, CALLBACK_URL, 'urn:uuid:1', 'Chèque validé'),
+     lambda: soap.cheque_status_response(REQUEST_ID, CALLBACK_URL, 'urn:uuid:1', 'Chèque validé',
+                                         traceparent=TRACEPARENT)),
+    ('callback_parse',
+     lambda: legacy_callback_parse(CALLBACK),
+     lambda: codec_callback_parse(CALLBACK)),
+]
+
+
+def check_equivalence():
+    """Les deux implémentations lisent les mêmes valeurs."""
+    assert legacy_submit_parse(SUBMIT_RESPONSE) == codec_submit_parse(SUBMIT_RESPONSE) == REQUEST_ID
+    assert codec_callback_parse(CALLBACK) == (TRACEPARENT, REQUEST_ID, 'Chèque validé')
+    built = soap.parse(legacy_submit_build())
+    assert soap.addressing(built)[0] == CALLBACK_URL and soap.traceparent(built) == TRACEPARENT
+
+
+def measure(fn, number, repeat):
+    return statistics.median(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--number', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-speedup', type=float, default=1.0)
+    args = parser.parse_args()
+
+    check_equivalence()
+    failed = False
+    print(f"{'opération':<16} {'avant (µs)':>11} {'codec (µs)':>11} {'gain':>7}")
+    for name, legacy, codec in CASES:
+        before = measure(legacy, args.number, args.repeat)
+        after  = measure(codec, args.number, args.repeat)
+        speedup = before / after
+        print(f"{name:<16} {before:>11.2f} {after:>11.2f} {speedup:>6.1f}x")
+        if speedup < args.min_speedup:
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
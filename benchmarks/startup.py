@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# benchmarks/startup.py
+"""
+Temps de démarrage de l'orchestrateur (src/app/app.py).
+
+Pour chaque mode Swagger, lance N processus neufs et mesure :
+* import   : durée de `import app` ;
+* health   : délai entre le lancement du processus et la première réponse
+             200 de GET /health (serveur de développement Flask) ;
+* modules  : modules lourds chargés dès l'import (doivent l'être au premier usage).
+
+Usage :
+    python benchmarks/startup.py [--runs 5] [--modes dynamic,static]
+                                 [--max-import-ms 400] [--max-health-ms 1500]
+
+Le mode static utilise une spec générée pour l'occasion par openapi.py.
+Code de sortie 1 si une médiane dépasse un seuil ou si un module lourd est
+chargé à l'import : utilisable en CI pour détecter une régression.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT    = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(ROOT, 'src', 'app')
+HEAVY   = ('grpc', 'google.protobuf', 'requests', 'urllib3', 'asyncio', 'httpx')
+
+IMPORT_PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+print(json.dumps({"import_ms": elapsed * 1000,
+                  "heavy": [m for m in %r if m in sys.modules]}))
+''' % (HEAVY,)
+
+SERVE = '''
+import app
+app.app.run(host="127.0.0.1", port=%d)
+'''
+
+
+def _env(mode, spec_path):
+    env = dict(os.environ)
+    paths = [os.path.join(ROOT, 'src'), os.path.join(ROOT, 'src', 'ms_montantmax')]
+    env['PYTHONPATH'] = os.pathsep.join(paths + [env.get('PYTHONPATH', '')])
+    env['SWAGGER_MODE'] = mode
+    env['OPENAPI_SPEC_PATH'] = spec_path
+    env.setdefault('LOAN_STORE', 'memory')
+    return env
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def measure_import(env):
+    out = subprocess.run([sys.executable, '-c', IMPORT_PROBE], cwd=APP_DIR, env=env,
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def measure_health(env, timeout=30.0):
+    port = _free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-c', SERVE % port], cwd=APP_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=1) as resp:
+                    if resp.status == 200:
+                        return (time.perf_counter() - start) * 1000
+            except OSError:
+                time.sleep(0.005)
+        raise RuntimeError(f"/health sans réponse après {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def build_spec(path):
+    subprocess.run([sys.executable, 'openapi.py', path], cwd=APP_DIR, env=_env('dynamic', path),
+                   check=True, capture_output=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--modes', default='dynamic,static')
+    parser.add_argument('--max-import-ms', type=float)
+    parser.add_argument('--max-health-ms', type=float)
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        spec_path = os.path.join(tmp, 'openapi.json')
+        build_spec(spec_path)
+        print(f"{'mode':<8} {'import (ms)':>12} {'/health (ms)':>13}  modules lourds à l'import")
+        for mode in args.modes.split(','):
+            env = _env(mode, spec_path)
+            imports, healths, heavy = [], [], set()
+            for _ in range(args.runs):
+                probe = measure_import(env)
+                imports.append(probe['import_ms'])
+                heavy.update(probe['heavy'])
+                healths.append(measure_health(env))
+            imp, health = statistics.median(imports), statistics.median(healths)
+            print(f"{mode:<8} {imp:>12.1f} {health:>13.1f}  {', '.join(sorted(heavy)) or '-'}")
+            if heavy:
+                failed = True
+            if args.max_import_ms is not None and imp > args.max_import_ms:
+                failed = True
+            if args.max_health_ms is not None and health > args.max_health_ms:
+                failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
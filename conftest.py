@@ -10,3 +10,10 @@ sys.path.insert(0, os.path.abspath(os.path.join(ROOT, 'src')))
 # 2) ajouter src/ms_montantmax/ au PYTHONPATH pour que
 #    `import montantmax_pb2` dans montantmax_pb2_grpc.py fonctionne
 sys.path.insert(0, os.path.abspath(os.path.join(ROOT, 'src', 'ms_montantmax')))
+
+# 3) ajouter src/app/ en fin de PYTHONPATH pour les modules compagnons de app.py
+#    (importés en top-level comme dans le conteneur, sans masquer le paquet `app`)
+sys.path.append(os.path.abspath(os.path.join(ROOT, 'src', 'app')))
+
+# 4) idem pour les modules compagnons de ms_banque/server.py
+sys.path.append(os.path.abspath(os.path.join(ROOT, 'src', 'ms_banque')))
@@ -0,0 +1,145 @@
+# src/app/admission.py
+"""
+Contrôle d'admission de l'orchestrateur.
+
+* limite globale de concurrence : au-delà de `max_concurrent` requêtes en
+  cours, les nouvelles sont rejetées immédiatement (503 + Retry-After)
+  plutôt que d'attendre des appels aval déjà saturés ;
+* priorité : les `reserved` dernières places sont réservées au trafic
+  prioritaire (statut, callback de la banque) ; les nouvelles demandes de
+  prêt sont donc délestées en premier ;
+* seau à jetons par client : `client_rate` demandes/s en régime permanent,
+  rafales de `client_burst` (429 + Retry-After au-delà).
+
+Toutes les limites se modifient à chaud (configure()) ; 0 désactive la
+limite correspondante.
+"""
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+LIMITS = ('max_concurrent', 'reserved', 'client_rate', 'client_burst', 'retry_after')
+
+
+class AdmissionRejected(Exception):
+    """Requête délestée ; `reason` vaut 'overload' ou 'rate_limit'."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Requête rejetée ({reason})")
+        self.reason      = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens, now):
+        self.tokens  = tokens
+        self.updated = now
+
+    def take(self, rate, burst, now):
+        """Consomme un jeton ; sinon renvoie le délai (s) avant le prochain."""
+        self.tokens  = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / rate
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent=64, reserved=8, client_rate=20.0, client_burst=40.0,
+                 retry_after=1.0, max_clients=100000):
+        self._lock       = threading.Lock()
+        self._in_flight  = 0
+        self._buckets    = OrderedDict()   # client -> TokenBucket, ordre LRU
+        self.max_clients = max_clients
+        self.admitted    = 0
+        self.configure(max_concurrent=max_concurrent, reserved=reserved, client_rate=client_rate,
+                       client_burst=client_burst, retry_after=retry_after)
+
+    def configure(self, **limits):
+        """Met à jour tout ou partie des limites ; ValueError si une valeur est invalide."""
+        unknown = set(limits) - set(LIMITS)
+        if unknown:
+            raise ValueError(f"Limites inconnues : {', '.join(sorted(unknown))}")
+        values = {name: float(value) for name, value in limits.items()}
+        if any(not value >= 0 for value in values.values()):
+            raise ValueError("Les limites doivent être positives")
+        values = {name: int(value) if name in ('max_concurrent', 'reserved') else value
+                  for name, value in values.items()}
+        with self._lock:
+            # cohérence vérifiée sur les limites résultantes, pas seulement celles modifiées
+            max_concurrent = values.get('max_concurrent', getattr(self, 'max_concurrent', 0))
+            reserved       = values.get('reserved', getattr(self, 'reserved', 0))
+            if max_concurrent and reserved > max_concurrent:
+                raise ValueError(f"reserved ({reserved}) dépasse max_concurrent ({max_concurrent})")
+            for name, value in values.items():
+                setattr(self, name, value)
+            if 'client_rate' in values or 'client_burst' in values:
+                self._buckets.clear()
+
+    def limits(self):
+        return {name: getattr(self, name) for name in LIMITS}
+
+    def _check_rate(self, client, now):
+        # sous self._lock
+        if not self.client_rate or client is None:
+            return
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(max(1.0, self.client_burst), now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        wait = bucket.take(self.client_rate, max(1.0, self.client_burst), now)
+        if wait:
+            raise AdmissionRejected('rate_limit', wait)
+
+    def acquire(self, client=None, priority=False):
+        """
+        Admet une requête (une place de concurrence) ou lève AdmissionRejected.
+        La saturation est vérifiée avant le débit : une requête délestée pour
+        surcharge ne consomme pas de jeton du client.
+        """
+        with self._lock:
+            if self.max_concurrent:
+                limit = self.max_concurrent if priority else self.max_concurrent - self.reserved
+                if self._in_flight >= limit:
+                    raise AdmissionRejected('overload', self.retry_after)
+            if not priority:
+                self._check_rate(client, time.monotonic())
+            self._in_flight += 1
+            self.admitted   += 1
+
+    def charge(self, client):
+        """Consomme un jeton du seau de `client` sans place de concurrence (prêt d'un lot)."""
+        with self._lock:
+            self._check_rate(client, time.monotonic())
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    @contextmanager
+    def admit(self, client=None, priority=False):
+        self.acquire(client, priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def in_flight(self):
+        return self._in_flight
+
+    def reset(self):
+        """Oublie les seaux des clients (les requêtes en cours restent comptées)."""
+        with self._lock:
+            self._buckets.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.limits(), in_flight=self._in_flight, admitted=self.admitted,
+                        clients=len(self._buckets))
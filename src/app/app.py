@@ -4,17 +4,38 @@
 Application compagnon pour la gestion des demandes de prêt.
 Orchestre les appels aux microservices et supporte le workflow asynchrone pour le chèque.
 Ajout : documentation Swagger via Flasgger.
+
+Démarrage rapide : grpc, protobuf, requests et asyncio ne sont importés
+qu'au premier appel qui en a besoin, et la spec OpenAPI peut être
+pré-générée au build (SWAGGER_MODE=static, cf. openapi.py).
 """
 import os
 import uuid
-import datetime
-from xml.etree import ElementTree as ET
+import json
+import zlib
+import hashlib
+import math
+import time
+import atexit
+import contextlib
+from collections import namedtuple
+from datetime import datetime, timezone
 
-from flask import Flask, request, jsonify
-from flasgger import Swagger
-import requests
-import grpc
-from ms_montantmax import montantmax_pb2, montantmax_pb2_grpc
+from flask import Flask, Response, request, jsonify, stream_with_context
+import openapi
+from grpc_pool import GrpcChannelPool
+from http_clients import ServiceClient
+import loan_store
+from loan_store import LoanStore, encode_cursor, decode_cursor
+from history import HistoryStep
+from cache import TTLCache, SharedTTLCache, SingleFlight, AsyncSingleFlight
+from rules import LocalDecisions, RuleTable
+from resilience import CircuitBreaker, CircuitOpenError, Downstream, check_status
+from transfers import TransferQueue, TransferWorkers, TransferRejected
+from waiters import WaiterRegistry
+from admission import AdmissionController, AdmissionRejected
+import metrics
+from common import tracing, serving, shared_store, soap
 
 # ------------------------------------------------------------------------------
 # Configuration de l’application et de Swagger
@@ -31,7 +52,10 @@ swagger_template = {
     },
     "basePath": "/",
 }
-swagger = Swagger(app, template=swagger_template)
+# SWAGGER_MODE=dynamic (Flasgger) | static (spec pré-générée OPENAPI_SPEC_PATH) | off
+swagger = openapi.init_app(app, swagger_template,
+                           mode=os.getenv('SWAGGER_MODE', 'dynamic'),
+                           spec_path=os.getenv('OPENAPI_SPEC_PATH', 'openapi.json'))
 
 # ------------------------------------------------------------------------------
 # Variables d’environnement / adresses des micro‑services
@@ -40,9 +64,150 @@ MS_MONTANTMAX_ADDRESS = os.getenv('MS_MONTANTMAX_ADDRESS', 'ms_montantmax:50051'
 MS_PROFILRISQUE_URL   = os.getenv('MS_PROFILRISQUE_URL',  'http://ms_profilrisque:5001/graphql')
 MS_BANQUE_URL         = os.getenv('MS_BANQUE_URL',        'http://ms_banque:5002/')
 MS_FOURNISSEUR_URL    = os.getenv('MS_FOURNISSEUR_URL',   'http://ms_fournisseur:5003/fundTransfers')
+# adresse ReplyTo (WS-Addressing) du callback de ms_banque
+APP_CALLBACK_URL      = os.getenv('APP_CALLBACK_URL',     'http://app:5000/loan/callback')
+
+# Pool de canaux gRPC longue durée vers MontantMax (réutilisés entre requêtes)
+MS_MONTANTMAX_POOL_SIZE = int(os.getenv('MS_MONTANTMAX_POOL_SIZE', '2'))
+montantmax_pool = GrpcChannelPool(MS_MONTANTMAX_ADDRESS, size=MS_MONTANTMAX_POOL_SIZE)
+atexit.register(montantmax_pool.close)
+
+# Sessions HTTP keep-alive par micro‑service (pool, retries, timeout réglables
+# via MS_<SERVICE>_POOL_SIZE / _RETRIES / _TIMEOUT)
+profilrisque_client = ServiceClient.from_env('MS_PROFILRISQUE', MS_PROFILRISQUE_URL)
+banque_client       = ServiceClient.from_env('MS_BANQUE', MS_BANQUE_URL)
+fournisseur_client  = ServiceClient.from_env('MS_FOURNISSEUR', MS_FOURNISSEUR_URL)
+for _client in (profilrisque_client, banque_client, fournisseur_client):
+    atexit.register(_client.close)
+
+# Résilience par service aval : disjoncteur (BREAKER_FAILURES échecs consécutifs,
+# réessai après BREAKER_RESET s) et timeout adaptatif dérivé du p99 observé,
+# borné par le timeout configuré du service. Les lectures idempotentes (profil
+# de risque) sont couvertes par une seconde requête au-delà du p95 (HEDGE_READS).
+MS_MONTANTMAX_TIMEOUT = float(os.getenv('MS_MONTANTMAX_TIMEOUT', '5'))
+HEDGE_READS = os.getenv('HEDGE_READS', '1') == '1'
+
+
+def _downstream(name, max_timeout, hedge=False):
+    return Downstream(name,
+                      CircuitBreaker(failure_threshold=int(os.getenv('BREAKER_FAILURES', '5')),
+                                     reset_timeout=float(os.getenv('BREAKER_RESET', '10'))),
+                      default_timeout=max_timeout, max_timeout=max_timeout,
+                      min_timeout=float(os.getenv('ADAPTIVE_TIMEOUT_MIN', '0.2')),
+                      hedge=hedge)
+
+
+breakers = {
+    'ms_montantmax':   _downstream('ms_montantmax', MS_MONTANTMAX_TIMEOUT),
+    'ms_profilrisque': _downstream('ms_profilrisque', profilrisque_client.timeout, hedge=HEDGE_READS),
+    'ms_banque':       _downstream('ms_banque', banque_client.timeout),
+    'ms_fournisseur':  _downstream('ms_fournisseur', fournisseur_client.timeout),
+}
+
+# Cache des profils de risque, clé (montant, clientInfo) normalisée ;
+# RISK_CACHE_TTL=0 désactive le cache (la fusion des appels concurrents reste active)
+risk_cache  = TTLCache(maxsize=int(os.getenv('RISK_CACHE_SIZE', '10000')),
+                       ttl=float(os.getenv('RISK_CACHE_TTL', '30')))
+risk_flight = SingleFlight()
+risk_aflight = AsyncSingleFlight()   # mode ORCHESTRATION_MODE=async
+
+# Idempotency-Key sur POST /loan : réponses définitives (hors 5xx) rejouées
+# pendant IDEMPOTENCY_TTL s, requêtes concurrentes de même clé fusionnées ;
+# IDEMPOTENCY_PATH : réponses dans un fichier SQLite commun à tous les workers
+if os.getenv('IDEMPOTENCY_PATH'):
+    idempotency_cache = SharedTTLCache(shared_store.SharedDict(
+        os.getenv('IDEMPOTENCY_PATH'), table='idempotency',
+        maxsize=int(os.getenv('IDEMPOTENCY_CACHE_SIZE', '10000')),
+        ttl=float(os.getenv('IDEMPOTENCY_TTL', '3600'))))
+else:
+    idempotency_cache = TTLCache(maxsize=int(os.getenv('IDEMPOTENCY_CACHE_SIZE', '10000')),
+                                 ttl=float(os.getenv('IDEMPOTENCY_TTL', '3600')))
+idempotency_flight = SingleFlight()
+idempotency_aflight = AsyncSingleFlight()   # mode ORCHESTRATION_MODE=async
+serving.require_shared('IDEMPOTENCY_PATH', isinstance(idempotency_cache, SharedTTLCache),
+                       "définir IDEMPOTENCY_PATH")
+IDEMPOTENCY_KEY_MAX = 255
+
+# Contrôle d'admission devant les demandes de prêt (cf. admission.py) : limite
+# globale de concurrence dont ADMISSION_RESERVED places réservées au trafic
+# prioritaire (statut, callback), seau à jetons par client ; réglable à chaud
+# via PUT /admin/admission, 0 désactivant une limite
+admission = AdmissionController(
+    max_concurrent=int(os.getenv('ADMISSION_MAX_CONCURRENT', '64')),
+    reserved=int(os.getenv('ADMISSION_RESERVED', '8')),
+    client_rate=float(os.getenv('CLIENT_RATE', '20')),
+    client_burst=float(os.getenv('CLIENT_BURST', '40')),
+    retry_after=float(os.getenv('ADMISSION_RETRY_AFTER', '1')))
+metrics.admission_in_flight.set_function(admission.in_flight)
+
+# Décisions locales à partir des tables de règles publiées par ms_montantmax et
+# ms_profilrisque (RULES_MODE=off|local|shadow, cf. rules.py)
+decisions = LocalDecisions(
+    {'ms_montantmax':   lambda version: _fetch_montantmax_rules(version),
+     'ms_profilrisque': lambda version: _fetch_risk_rules(version)},
+    mode=os.getenv('RULES_MODE', 'off'),
+    sync_interval=float(os.getenv('RULES_SYNC_INTERVAL', '30')))
+
+# Soumission groupée : prêts acceptés par requête, et prêts par appel aval
+LOAN_BATCH_MAX  = int(os.getenv('LOAN_BATCH_MAX', '1000'))
+LOAN_BATCH_SIZE = int(os.getenv('LOAN_BATCH_SIZE', '100'))
+
+# Recherche de prêts (GET /loans) : taille de page par défaut et maximale
+LOANS_PAGE_SIZE = int(os.getenv('LOANS_PAGE_SIZE', '100'))
+LOANS_PAGE_MAX  = int(os.getenv('LOANS_PAGE_MAX', '1000'))
 
-# Stockage en mémoire des demandes (pour démo/tests)
-_loans: dict[str, dict] = {}
+# Stockage des demandes : en mémoire par défaut (démo/tests), SQLite WAL
+# partagé et persistant avec LOAN_STORE=sqlite (cf. loan_store.py)
+_loans: LoanStore = loan_store.from_env()
+atexit.register(_loans.close)
+serving.require_shared('LOAN_STORE', _loans.shared, "utiliser LOAN_STORE=sqlite")
+metrics.store_entries.set_function(_loans.count)
+
+# Traces distribuées (traceparent W3C propagé vers chaque micro‑service) ;
+# exportateur choisi par TRACE_EXPORTER (cf. common/tracing.py)
+tracer = tracing.tracer_from_env('app')
+atexit.register(tracer.exporter.close)
+
+# Transferts de fonds en arrière-plan : file persistante (TRANSFER_QUEUE_PATH,
+# en mémoire par défaut, donc perdue au redémarrage : avertissement au
+# démarrage) vidée par TRANSFER_WORKERS workers, reprises en backoff
+# exponentiel jusqu'à TRANSFER_MAX_ATTEMPTS tentatives (cf. transfers.py)
+transfer_queue = TransferQueue(os.getenv('TRANSFER_QUEUE_PATH', ':memory:'))
+transfer_queue.warn_if_volatile()
+serving.require_shared('TRANSFER_QUEUE_PATH', transfer_queue.path != ':memory:',
+                       "désigner un fichier SQLite commun")
+transfers = TransferWorkers(
+    transfer_queue,
+    handler=lambda job: _transfer_funds(job),
+    on_failed=lambda job, exc: _transfer_failed(job, exc),
+    on_attempt=lambda outcome: metrics.TRANSFERS[outcome].inc(),
+    workers=int(os.getenv('TRANSFER_WORKERS', '4')),
+    max_attempts=int(os.getenv('TRANSFER_MAX_ATTEMPTS', '8')),
+    backoff_base=float(os.getenv('TRANSFER_BACKOFF_BASE', '0.5')),
+    backoff_max=float(os.getenv('TRANSFER_BACKOFF_MAX', '60')))
+atexit.register(transfer_queue.close)
+atexit.register(transfers.stop)
+metrics.transfer_depth.set_function(transfer_queue.depth)
+metrics.transfer_age.set_function(transfer_queue.oldest_age)
+if transfer_queue.depth():
+    transfers.start()   # reprise des transferts persistés avant un arrêt
+
+# Attentes de statut (GET /loan/status/<id>?wait=, flux SSE /events), réveillées
+# directement par le callback et les workers de transfert (cf. waiters.py) ;
+# les notifications ne franchissant pas les processus, une attente relit aussi
+# l'état toutes les STATUS_RECHECK s sous un serveur multi-workers
+waiters = WaiterRegistry()
+metrics.status_waiters.set_function(waiters.waiting)
+STATUS_WAIT_MAX = float(os.getenv('STATUS_WAIT_MAX', '30'))
+SSE_KEEPALIVE   = float(os.getenv('SSE_KEEPALIVE', '15'))
+STATUS_RECHECK  = float(os.getenv('STATUS_RECHECK', '0.5' if serving.processes() > 1 else '0'))
+
+
+@contextlib.contextmanager
+def _stage(name, kind='client', parent=None):
+    """Étape du workflow : span de trace et histogramme de latence."""
+    with tracer.span(name, parent=parent, kind=kind), metrics.stage(name):
+        yield
 
 # ------------------------------------------------------------------------------
 # Endpoints
@@ -97,6 +262,13 @@ def loan_request():
               type: number
               format: float
               example: 8000
+      - in: header
+        name: Idempotency-Key
+        type: string
+        required: false
+        description: Clé choisie par le client (255 caractères au plus) ; une nouvelle
+                     tentative avec la même clé et le même contenu rejoue la réponse initiale
+                     (en-tête Idempotent-Replayed) sans rappeler les micro‑services
     responses:
       200:
         description: Demande acceptée et en attente du chèque
@@ -106,6 +278,19 @@ def loan_request():
         description: Refus ou erreur de validation
         schema:
           $ref: '#/definitions/ErrorResponse'
+      422:
+        description: Idempotency-Key déjà utilisée pour une demande différente
+        schema:
+          $ref: '#/definitions/ErrorResponse'
+      429:
+        description: Débit du client dépassé (en-tête Retry-After)
+        schema:
+          $ref: '#/definitions/ErrorResponse'
+      503:
+        description: Orchestrateur saturé ou disjoncteur ouvert sur un micro‑service
+                     (en-tête Retry-After)
+        schema:
+          $ref: '#/definitions/ErrorResponse'
     definitions:
       PendingLoanResponse:
         type: object
@@ -129,128 +314,741 @@ def loan_request():
             type: string
             example: Paramètres requis manquants
     """
+    key = request.headers.get('Idempotency-Key')
+    if not _valid_idempotency_key(key):
+        return jsonify({"status": "error", "reason": "Idempotency-Key invalide"}), 400
+
     data = request.get_json(silent=True)
+    try:
+        admission.acquire(_client_key(data, request.remote_addr))
+    except AdmissionRejected as exc:
+        return _shed(exc, 'submit')
+    try:
+        with metrics.IN_FLIGHT['loan'].track_inprogress(), \
+                _stage('loan', kind='server', parent=tracing.extract(request.headers)):
+            if key is None:
+                (body, code), replayed = _process_loan(data), False
+            else:
+                body, code, replayed = _idempotent_loan(key, data)
+    finally:
+        admission.release()
+    return jsonify(body), code, _loan_headers(body, code, replayed)
+
+
+def _valid_idempotency_key(key):
+    return key is None or 0 < len(key) <= IDEMPOTENCY_KEY_MAX
+
+
+def _loan_headers(body, code, replayed):
+    """En-têtes de la réponse de POST /loan (réponse rejouée, disjoncteur ouvert)."""
+    headers = {}
+    if replayed:
+        headers['Idempotent-Replayed'] = 'true'
+    if code == 503:
+        headers['Retry-After'] = str(math.ceil(body['retry_after']))
+    return headers
+
+
+def _client_key(data, remote_addr):
+    """Client d'une demande de prêt pour le débit : son `id`, à défaut l'adresse de l'appelant."""
+    client = data.get('id') if isinstance(data, dict) else None
+    return str(client) if client is not None else remote_addr
+
+
+def _shed(exc, traffic):
+    """Réponse d'une requête délestée par le contrôle d'admission."""
+    body, code = _shed_body(exc, traffic)
+    return jsonify(body), code, _shed_headers(exc)
+
+
+def _shed_body(exc, traffic):
+    metrics.SHED[(exc.reason, traffic)].inc()
+    if exc.reason == 'rate_limit':
+        body, code = {"status": "error", "reason": "Trop de demandes pour ce client"}, 429
+    else:
+        body, code = {"status": "error", "reason": "Service saturé, réessayez plus tard"}, 503
+    body["retry_after"] = round(exc.retry_after, 3)
+    return body, code
+
+
+def _shed_headers(exc):
+    return {'Retry-After': str(max(1, math.ceil(exc.retry_after)))}
+
+
+def _idempotent_loan(key, data):
+    """
+    Traite une demande portant une Idempotency-Key : réponse rejouée depuis
+    le cache, partagée avec le calcul en vol de la même clé, ou calculée puis
+    conservée si elle est définitive. Renvoie (corps, code, rejouée).
+    """
+    fingerprint = _fingerprint(data)
+    found, stored = idempotency_cache.get(key)
+    if not found:
+        def compute():
+            return _remember(key, fingerprint, *_process_loan(data))
+
+        stored, shared = idempotency_flight.do(key, compute)
+        if not shared:
+            return stored[1], stored[2], False
+    return _replay(stored, fingerprint)
+
+
+async def _idempotent_loan_async(key, data, downstreams):
+    """Variante asyncio de _idempotent_loan (même cache, fusion par AsyncSingleFlight)."""
+    fingerprint = _fingerprint(data)
+    found, stored = idempotency_cache.get(key)
+    if not found:
+        async def compute():
+            return _remember(key, fingerprint, *await _process_loan_async(data, downstreams))
+
+        stored, shared = await idempotency_aflight.do(key, compute)
+        if not shared:
+            return stored[1], stored[2], False
+    return _replay(stored, fingerprint)
+
+
+def _fingerprint(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _remember(key, fingerprint, body, code):
+    if code < 500:   # une erreur transitoire ne doit pas être rejouée
+        idempotency_cache.set(key, (fingerprint, body, code))
+    return fingerprint, body, code
+
+
+def _replay(stored, fingerprint):
+    """Réponse conservée (rejouée), ou 422 si la clé a servi à une autre demande."""
+    if stored[0] != fingerprint:
+        return {"status": "error",
+                "reason": "Idempotency-Key déjà utilisée pour une autre demande"}, 422, False
+    return stored[1], stored[2], True
+
+
+def _process_loan(data):
+    """Workflow synchrone de POST /loan ; renvoie (corps JSON, code HTTP)."""
+    parsed, error = _parse_loan_payload(data)
+    if error:
+        return error
+    client_id, personal_info, loan_amount = parsed
+    history = [_client_step(client_id, personal_info, loan_amount)]
+
+    # 1. Vérification MontantMax (table de règles locale, sinon gRPC)
+    try:
+        resp = _check_amount(loan_amount)
+        history.append(_montantmax_step(loan_amount, resp))
+    except Exception as exc:
+        history.append(_error_step("ms_montantmax", "Erreur vérification montant"))
+        return _loan_error("Erreur vérification montant", exc)
+
+    if not resp.allowed:
+        return _loan_refused(client_id, loan_amount, history, resp.message)
+
+    # 2. Vérification profil de risque (règles locales, cache, sinon GraphQL)
+    try:
+        risk, origin = _risk_profile(loan_amount, personal_info)
+        history.append(_risk_step(loan_amount, personal_info, risk, origin))
+    except Exception as exc:
+        history.append(_error_step("ms_profilrisque", "Erreur profil risque"))
+        return _loan_error("Erreur profil risque", exc)
+
+    if _risk_refused(risk, loan_amount):
+        return _loan_refused(client_id, loan_amount, history, "Risque trop élevé")
+
+    # 3. SubmitChequeRequest (SOAP async)
+    try:
+        with _stage('submit'):
+            envelope = _submit_cheque_soap()
+            r = breakers['ms_banque'].call(lambda timeout: _checked(banque_client.post(
+                data=envelope, headers=SOAP_HEADERS, timeout=timeout)))
+        req_id = _parse_submit_response(r.content)
+        history.append(_submit_step(req_id))
+    except Exception as exc:
+        history.append(_error_step("ms_banque (SubmitChequeRequest)", "Erreur dépôt chèque"))
+        return _loan_error("Erreur dépôt chèque", exc)
+
+    return _loan_pending(req_id, client_id, loan_amount, history)
+
+
+async def _process_loan_async(data, downstreams):
+    """
+    Workflow de POST /loan en mode asynchrone : MontantMax et profil de risque
+    sont interrogés en parallèle et le premier refus (ou erreur) annule l'appel
+    restant. Règles locales (RULES_MODE), cache et fusion des appels de profil
+    de risque s'appliquent comme en mode synchrone. `downstreams` expose les
+    coroutines check_loan, risk_profile et submit_cheque
+    (cf. async_downstreams.AsyncDownstreams).
+    """
+    import asyncio
+    parsed, error = _parse_loan_payload(data)
+    if error:
+        return error
+    client_id, personal_info, loan_amount = parsed
+    history = [_client_step(client_id, personal_info, loan_amount)]
+
+    # 1+2. MontantMax (gRPC) et profil de risque (GraphQL) en parallèle
+    montantmax = asyncio.ensure_future(_check_amount_async(loan_amount, downstreams))
+    risk_check = asyncio.ensure_future(_risk_profile_async(loan_amount, personal_info, downstreams))
+    pending = {montantmax, risk_check}
+    outcome = None
+    try:
+        while pending and outcome is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # MontantMax d'abord si les deux sont prêts (règles locales) : même issue qu'en synchrone
+            for task in sorted(done, key=lambda t: t is not montantmax):
+                if outcome is not None:
+                    task.exception()  # résultat ignoré, on évite l'avertissement asyncio
+                elif task is montantmax:
+                    outcome = _montantmax_outcome(task, client_id, loan_amount, history)
+                else:
+                    outcome = _risk_outcome(task, client_id, personal_info, loan_amount, history)
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    if outcome is not None:
+        return outcome
+
+    # 3. SubmitChequeRequest (SOAP async)
+    try:
+        content = await breakers['ms_banque'].acall(
+            lambda: _timed('submit', downstreams.submit_cheque(_submit_cheque_soap(), SOAP_HEADERS)))
+        req_id  = _parse_submit_response(content)
+        history.append(_submit_step(req_id))
+    except Exception as exc:
+        history.append(_error_step("ms_banque (SubmitChequeRequest)", "Erreur dépôt chèque"))
+        return _loan_error("Erreur dépôt chèque", exc)
+
+    return _loan_pending(req_id, client_id, loan_amount, history)
+
+
+async def _timed(stage, coro):
+    with _stage(stage):
+        return await coro
+
+
+def _montantmax_outcome(task, client_id, loan_amount, history):
+    """Réponse finale si MontantMax refuse ou échoue, sinon None."""
+    try:
+        resp = task.result()
+    except Exception as exc:
+        history.append(_error_step("ms_montantmax", "Erreur vérification montant"))
+        return _loan_error("Erreur vérification montant", exc)
+    history.append(_montantmax_step(loan_amount, resp))
+    if not resp.allowed:
+        return _loan_refused(client_id, loan_amount, history, resp.message)
+    return None
+
+
+def _risk_outcome(task, client_id, personal_info, loan_amount, history):
+    """Réponse finale si le profil de risque refuse ou échoue, sinon None."""
+    try:
+        risk, origin = task.result()
+    except Exception as exc:
+        history.append(_error_step("ms_profilrisque", "Erreur profil risque"))
+        return _loan_error("Erreur profil risque", exc)
+    history.append(_risk_step(loan_amount, personal_info, risk, origin))
+    if _risk_refused(risk, loan_amount):
+        return _loan_refused(client_id, loan_amount, history, "Risque trop élevé")
+    return None
+
+
+def create_asgi_app():
+    """
+    Application ASGI (ORCHESTRATION_MODE=async) : même contrat HTTP que le
+    mode Flask, POST /loan étant servi par des coroutines (grpc.aio + httpx).
+    """
+    from asgi import LoanAsgiApp, send_json, send_events, query_params, header
+    from async_downstreams import AsyncDownstreams
+
+    downstreams = AsyncDownstreams(MS_MONTANTMAX_ADDRESS, MS_PROFILRISQUE_URL, MS_BANQUE_URL,
+                                   timeout=float(os.getenv('ASYNC_TIMEOUT', '5')))
+
+    async def loan_handler(scope, data):
+        key = header(scope, 'Idempotency-Key')
+        if not _valid_idempotency_key(key):
+            return {"status": "error", "reason": "Idempotency-Key invalide"}, 400
+        try:
+            admission.acquire(_client_key(data, (scope.get('client') or (None,))[0]))
+        except AdmissionRejected as exc:
+            body, code = _shed_body(exc, 'submit')
+            return body, code, _shed_headers(exc)
+        try:
+            with metrics.IN_FLIGHT['loan'].track_inprogress(), _stage('loan', kind='server'):
+                if key is None:
+                    (body, code), replayed = await _process_loan_async(data, downstreams), False
+                else:
+                    body, code, replayed = await _idempotent_loan_async(key, data, downstreams)
+        finally:
+            admission.release()
+        return body, code, _loan_headers(body, code, replayed)
+
+    # attentes de statut servies par des coroutines : une attente ne mobilise pas de thread
+    async def status_handler(scope, receive, send, request_id):
+        entry = _loans.get(request_id)
+        if entry is None:
+            return await send_json(send, 404, {"status": "error", "reason": "ID inconnu"})
+        try:
+            wait = _wait_seconds(query_params(scope).get('wait'))
+        except ValueError:
+            return await send_json(send, 400, {"status": "error", "reason": "Paramètre wait invalide"})
+        if entry['status'] == 'pending' and wait > 0:
+            entry = await _wait_for_async(request_id, _decided, wait) or entry
+        body, code = _status_response(entry)
+        await send_json(send, code, body)
+
+    async def events_handler(scope, receive, send, request_id):
+        if _loans.get(request_id) is None:
+            return await send_json(send, 404, {"status": "error", "reason": "ID inconnu"})
+        await send_events(receive, send, _status_events_async(request_id), SSE_HEADERS)
+
+    return LoanAsgiApp(app, {('POST', '/loan'): loan_handler}, on_shutdown=downstreams.aclose,
+                       patterns=[('GET', r'/loan/status/(?P<request_id>[^/]+)', status_handler),
+                                 ('GET', r'/loan/status/(?P<request_id>[^/]+)/events', events_handler)])
+
+
+# ------------------------------------------------------------------------------
+# Étapes du workflow, partagées par les modes synchrone et asynchrone
+# ------------------------------------------------------------------------------
+RISK_QUERY = '''
+      query($loanAmount: Float!, $clientInfo: String!) {
+        riskProfile(loanAmount: $loanAmount, clientInfo: $clientInfo)
+      }
+    '''
+
+# SubmitChequeRequest(s) pré-assemblées (cf. common/soap.py) : l'en-tête
+# WS-Addressing adresse le callback de ms_banque à ReplyTo et lui fait renvoyer
+# les ReferenceParameters, dont le traceparent de l'étape de dépôt
+SUBMIT_CHEQUE  = soap.SubmitTemplate(APP_CALLBACK_URL)
+SUBMIT_CHEQUES = soap.SubmitTemplate(APP_CALLBACK_URL, batch=True)
+
+RISK_BATCH_QUERY = '''
+      query($items: [RiskInput!]!) {
+        riskProfiles(items: $items)
+      }
+    '''
+
+RISK_RULES_QUERY = '{ riskRules { version expressible rules { op threshold profile } } }'
+
+SOAP_HEADERS = {'Content-Type': 'application/soap+xml; charset=utf-8'}
+
+
+def _traceparent():
+    context = tracing.current()
+    return context.traceparent() if context else None
+
+
+def _submit_cheque_soap():
+    return SUBMIT_CHEQUE.render(_traceparent())
+
+
+def _parse_loan_payload(data):
+    """Valide le corps de POST /loan : ((client_id, personal_info, montant), None) ou (None, erreur)."""
     if not data:
-        return jsonify({"status": "error", "reason": "Données de requête manquantes"}), 400
+        return None, ({"status": "error", "reason": "Données de requête manquantes"}, 400)
 
     client_id     = data.get("id")
     personal_info = data.get("personal_info")
     loan_amount   = data.get("loan_amount")
     if client_id is None or personal_info is None or loan_amount is None:
-        return jsonify({"status": "error", "reason": "Paramètres requis manquants"}), 400
+        return None, ({"status": "error", "reason": "Paramètres requis manquants"}, 400)
 
     # Validation du montant
     try:
         loan_amount = float(loan_amount)
     except (ValueError, TypeError):
-        return jsonify({"status": "error", "reason": "Le montant doit être un nombre"}), 400
+        return None, ({"status": "error", "reason": "Le montant doit être un nombre"}, 400)
+    return (client_id, personal_info, loan_amount), None
 
-    # Initialiser l'historique
-    history = [{
-        "timestamp": datetime.datetime.utcnow().isoformat(),
-        "service": "client",
-        "request": {"id": client_id, "personal_info": personal_info, "loan_amount": loan_amount}
-    }]
 
-    # 1. Vérification gRPC MontantMax
-    try:
-        channel = grpc.insecure_channel(MS_MONTANTMAX_ADDRESS)
-        stub    = montantmax_pb2_grpc.MontantMaxServiceStub(channel)
-        resp    = stub.CheckLoan(montantmax_pb2.LoanRequest(loan_amount=loan_amount))
-        history.append({
-            "timestamp": datetime.datetime.utcnow().isoformat(),
-            "service": "ms_montantmax",
-            "request": {"loan_amount": loan_amount},
-            "response": {"allowed": resp.allowed, "message": resp.message}
-        })
-    except Exception:
-        history.append({
-            "timestamp": datetime.datetime.utcnow().isoformat(),
-            "service": "ms_montantmax",
-            "error": "Erreur vérification montant"
-        })
-        return jsonify({"status": "error", "reason": "Erreur vérification montant"}), 500
+def _step(service, **fields):
+    return HistoryStep(service, **fields)
 
-    if not resp.allowed:
-        req_id = str(uuid.uuid4())
-        _loans[req_id] = {"client_id": client_id, "loan_amount": loan_amount,
-                          "status": "refused", "history": history}
-        return jsonify({"status": "refused", "reason": resp.message,
-                        "request_id": req_id}), 400
-
-    # 2. Vérification profil de risque (GraphQL)
-    query = '''
-      query($loanAmount: Float!, $clientInfo: String!) {
-        riskProfile(loanAmount: $loanAmount, clientInfo: $clientInfo)
-      }
-    '''
-    try:
-        gql = requests.post(
-            MS_PROFILRISQUE_URL,
-            json={'query': query, 'variables': {'loanAmount': loan_amount, 'clientInfo': personal_info}},
-            timeout=5
-        )
+
+def _error_step(service, error):
+    return _step(service, error=error)
+
+
+def _client_step(client_id, personal_info, loan_amount):
+    return _step("client", request={"id": client_id, "personal_info": personal_info,
+                                    "loan_amount": loan_amount})
+
+
+def _montantmax_modules():
+    """Modules protobuf/gRPC de MontantMax, importés au premier appel."""
+    from ms_montantmax import montantmax_pb2, montantmax_pb2_grpc
+    return montantmax_pb2, montantmax_pb2_grpc
+
+
+# Décision MontantMax évaluée localement, même interface que LoanResponse
+LocalLoanResponse = namedtuple('LocalLoanResponse', 'allowed message')
+
+
+def _check_amount(loan_amount):
+    """Décision MontantMax : table de règles locale si possible, sinon CheckLoan gRPC."""
+    local = decisions.decide('ms_montantmax', loan_amount)
+    if local is not None:
+        return local
+    montantmax_pb2, montantmax_pb2_grpc = _montantmax_modules()
+    with _stage('montantmax'):
+        resp = breakers['ms_montantmax'].call(lambda timeout: montantmax_pool.call(
+            montantmax_pb2_grpc.MontantMaxServiceStub, 'CheckLoan',
+            montantmax_pb2.LoanRequest(loan_amount=loan_amount), timeout=timeout))
+    decisions.shadow('ms_montantmax', loan_amount, resp, same=_same_decision)
+    return resp
+
+
+async def _check_amount_async(loan_amount, downstreams):
+    """_check_amount() du mode asynchrone (CheckLoan via grpc.aio)."""
+    local = decisions.decide('ms_montantmax', loan_amount)
+    if local is not None:
+        return local
+    resp = await breakers['ms_montantmax'].acall(
+        lambda: _timed('montantmax', downstreams.check_loan(loan_amount)))
+    decisions.shadow('ms_montantmax', loan_amount, resp, same=_same_decision)
+    return resp
+
+
+def _same_decision(local, remote):
+    return (local.allowed, local.message) == (remote.allowed, remote.message)
+
+
+def _fetch_montantmax_rules(known_version):
+    montantmax_pb2, montantmax_pb2_grpc = _montantmax_modules()
+    table = montantmax_pool.call(montantmax_pb2_grpc.MontantMaxServiceStub, 'GetRules',
+                                 montantmax_pb2.RulesRequest(known_version=known_version or 0),
+                                 timeout=2)
+    if table.version == known_version and not table.rules:
+        return None  # table inchangée
+    return RuleTable(table.version,
+                     [(r.op, r.threshold, LocalLoanResponse(r.allowed, r.message)) for r in table.rules],
+                     table.expressible)
+
+
+def _montantmax_step(loan_amount, resp):
+    response = {"allowed": resp.allowed, "message": resp.message}
+    if isinstance(resp, LocalLoanResponse):
+        response["local"] = True
+    return _step("ms_montantmax",
+                 request={"loan_amount": loan_amount},
+                 response=response)
+
+
+def _risk_payload(loan_amount, personal_info):
+    return {'query': RISK_QUERY,
+            'variables': {'loanAmount': loan_amount, 'clientInfo': personal_info}}
+
+
+def _risk_step(loan_amount, personal_info, risk, origin='remote'):
+    response = {"riskProfile": risk}
+    if origin == 'cache':
+        response["cached"] = True
+    elif origin == 'local':
+        response["local"] = True
+    return _step("ms_profilrisque",
+                 request={"loanAmount": loan_amount, "clientInfo": personal_info},
+                 response=response)
+
+
+def _risk_key(loan_amount, personal_info):
+    return round(float(loan_amount), 2), " ".join(str(personal_info).split())
+
+
+def _risk_profile(loan_amount, personal_info):
+    """
+    Profil de risque : table de règles locale, puis cache TTL ; en cas
+    d'absence, les requêtes identiques concurrentes partagent un seul appel
+    GraphQL. Renvoie (profil, origine) avec origine parmi local, cache, remote.
+    """
+    local = decisions.decide('ms_profilrisque', loan_amount)
+    if local is not None:
+        return local, 'local'
+
+    key = _risk_key(loan_amount, personal_info)
+    found, risk = risk_cache.get(key)
+    if found:
+        return risk, 'cache'
+
+    def fetch():
+        with _stage('risk'):
+            gql = breakers['ms_profilrisque'].call(lambda timeout: _checked(profilrisque_client.post(
+                json=_risk_payload(loan_amount, personal_info), timeout=timeout)))
         risk = gql.json().get('riskProfile')
-        history.append({
-            "timestamp": datetime.datetime.utcnow().isoformat(),
-            "service": "ms_profilrisque",
-            "request": {"loanAmount": loan_amount, "clientInfo": personal_info},
-            "response": {"riskProfile": risk}
-        })
-    except Exception:
-        history.append({
-            "timestamp": datetime.datetime.utcnow().isoformat(),
-            "service": "ms_profilrisque",
-            "error": "Erreur profil risque"
-        })
-        return jsonify({"status": "error", "reason": "Erreur profil risque"}), 500
-
-    if risk == 'elevé' and loan_amount >= 20000:
-        req_id = str(uuid.uuid4())
-        _loans[req_id] = {"client_id": client_id, "loan_amount": loan_amount,
-                          "status": "refused", "history": history}
-        return jsonify({"status": "refused", "reason": "Risque trop élevé",
-                        "request_id": req_id}), 400
+        if risk is not None:
+            risk_cache.set(key, risk)
+        decisions.shadow('ms_profilrisque', loan_amount, risk)
+        return risk
 
-    # 3. SubmitChequeRequest (SOAP async)
-    soap = '''<?xml version="1.0"?>
-<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">
-  <soapenv:Body>
-    <SubmitChequeRequest xmlns="ms.banque.async"/>
-  </soapenv:Body>
-</soapenv:Envelope>'''
-    try:
-        r = requests.post(MS_BANQUE_URL,
-                          data=soap,
-                          headers={'Content-Type': 'application/soap+xml; charset=utf-8'},
-                          timeout=5)
-        tree = ET.fromstring(r.content)
-        ns   = {'tns': 'ms.banque.async'}
-        req_id = tree.findtext('.//tns:SubmitChequeRequestResult', namespaces=ns)
-        history.append({
-            "timestamp": datetime.datetime.utcnow().isoformat(),
-            "service": "ms_banque (SubmitChequeRequest)",
-            "response": {"request_id": req_id}
-        })
-    except Exception:
-        history.append({
-            "timestamp": datetime.datetime.utcnow().isoformat(),
-            "service": "ms_banque (SubmitChequeRequest)",
-            "error": "Erreur dépôt chèque"
-        })
-        return jsonify({"status": "error", "reason": "Erreur dépôt chèque"}), 500
-
-    _loans[req_id] = {
+    risk, shared = risk_flight.do(key, fetch)
+    return risk, 'cache' if shared else 'remote'
+
+
+async def _risk_profile_async(loan_amount, personal_info, downstreams):
+    """_risk_profile() du mode asynchrone : mêmes règles, cache et fusion des appels."""
+    local = decisions.decide('ms_profilrisque', loan_amount)
+    if local is not None:
+        return local, 'local'
+
+    key = _risk_key(loan_amount, personal_info)
+    found, risk = risk_cache.get(key)
+    if found:
+        return risk, 'cache'
+
+    async def fetch():
+        risk = await breakers['ms_profilrisque'].acall(lambda: _timed(
+            'risk', downstreams.risk_profile(_risk_payload(loan_amount, personal_info))))
+        if risk is not None:
+            risk_cache.set(key, risk)
+        decisions.shadow('ms_profilrisque', loan_amount, risk)
+        return risk
+
+    risk, shared = await risk_aflight.do(key, fetch)
+    return risk, 'cache' if shared else 'remote'
+
+
+def _fetch_risk_rules(known_version):
+    data = profilrisque_client.post(json={'query': RISK_RULES_QUERY}, timeout=2).json()
+    table = data['riskRules']
+    if table['version'] == known_version:
+        return None  # table inchangée
+    return RuleTable(table['version'],
+                     [(r['op'], r['threshold'], r['profile']) for r in table['rules']],
+                     table['expressible'])
+
+
+def _risk_refused(risk, loan_amount):
+    return risk == 'elevé' and loan_amount >= 20000
+
+
+def _checked(resp):
+    """Une réponse HTTP 5xx compte comme un échec pour le disjoncteur."""
+    return check_status(resp)
+
+
+def _parse_submit_response(content):
+    return soap.submit_result(soap.parse(content))
+
+
+def _parse_submit_batch_response(content):
+    return soap.submit_results(soap.parse(content))
+
+
+def _submit_step(req_id):
+    return _step("ms_banque (SubmitChequeRequest)", response={"request_id": req_id})
+
+
+def _loan_error(reason, exc=None):
+    """Erreur aval : 500, ou 503 immédiat si le disjoncteur du service est ouvert."""
+    metrics.error(reason)
+    metrics.OUTCOMES['error'].inc()
+    if isinstance(exc, CircuitOpenError):
+        return {"status": "error", "reason": f"{reason} : {exc.service} indisponible",
+                "retry_after": round(exc.retry_after, 3)}, 503
+    return {"status": "error", "reason": reason}, 500
+
+
+def _loan_refused(client_id, loan_amount, history, reason):
+    metrics.OUTCOMES['refused'].inc()
+    req_id = str(uuid.uuid4())
+    _loans.put(req_id, {"client_id": client_id, "loan_amount": loan_amount,
+                        "status": "refused", "history": history,
+                        "trace_id": tracing.current_trace_id()})
+    return {"status": "refused", "reason": reason, "request_id": req_id}, 400
+
+
+def _loan_pending(req_id, client_id, loan_amount, history):
+    metrics.OUTCOMES['pending'].inc()
+    _loans.put(req_id, {
         "client_id": client_id,
         "loan_amount": loan_amount,
         "status": "pending",
-        "history": history
-    }
-    return jsonify({
+        "history": history,
+        "trace_id": tracing.current_trace_id()
+    })
+    return {
         "status": "pending",
         "request_id": req_id,
         "message": "Veuillez déposer votre chèque en utilisant cet ID"
-    }), 200
+    }, 200
+
+
+@app.route('/loan/batch', methods=['POST'])
+def loan_batch():
+    """
+    Soumettre un lot de demandes de prêt.
+
+    Les appels aval sont groupés par paquets de LOAN_BATCH_SIZE prêts : un appel
+    gRPC CheckLoans, une requête GraphQL riskProfiles et un SubmitChequeRequests
+    SOAP par paquet.
+    ---
+    tags:
+      - loan
+    consumes:
+      - application/json
+    parameters:
+      - in: body
+        name: payload
+        required: true
+        schema:
+          type: object
+          required: [loans]
+          properties:
+            loans:
+              type: array
+              items:
+                type: object
+                properties:
+                  id:
+                    type: string
+                  personal_info:
+                    type: string
+                  loan_amount:
+                    type: number
+    responses:
+      200:
+        description: Un résultat par prêt, au format de POST /loan, dans l’ordre soumis ; un prêt dont le client a dépassé son débit reçoit le corps 429 de POST /loan
+      400:
+        description: Lot absent, vide ou trop grand
+        schema:
+          $ref: '#/definitions/ErrorResponse'
+      503:
+        description: Orchestrateur saturé (en-tête Retry-After)
+    """
+    data  = request.get_json(silent=True) or {}
+    loans = data.get("loans")
+    if not isinstance(loans, list) or not loans:
+        return jsonify({"status": "error", "reason": "Lot de prêts manquant"}), 400
+    if len(loans) > LOAN_BATCH_MAX:
+        return jsonify({"status": "error",
+                        "reason": f"Lot limité à {LOAN_BATCH_MAX} prêts"}), 400
+    # une place de concurrence pour le lot ; le débit est décompté prêt par prêt
+    try:
+        admission.acquire()
+    except AdmissionRejected as exc:
+        return _shed(exc, 'submit')
+    try:
+        with metrics.IN_FLIGHT['loan_batch'].track_inprogress(), \
+                _stage('loan_batch', kind='server', parent=tracing.extract(request.headers)):
+            results = _process_loan_batch(loans, request.remote_addr)
+    finally:
+        admission.release()
+    return jsonify({"results": results}), 200
+
+
+def _process_loan_batch(loans, remote_addr=None):
+    """
+    Workflow groupé : renvoie la liste des corps de réponse, alignée sur `loans`.
+    Chaque prêt consomme un jeton du seau de son client ; un prêt dont le client
+    a dépassé son débit reçoit la réponse 429 de POST /loan, sans appel aval.
+    """
+    results = [None] * len(loans)
+    valid   = []   # (index, client_id, personal_info, montant, historique)
+    for i, data in enumerate(loans):
+        try:
+            admission.charge(_client_key(data, remote_addr))
+        except AdmissionRejected as exc:
+            results[i] = _shed_body(exc, 'submit')[0]
+            continue
+        parsed, error = _parse_loan_payload(data if isinstance(data, dict) else None)
+        if error:
+            results[i] = error[0]
+            continue
+        client_id, personal_info, loan_amount = parsed
+        valid.append((i, client_id, personal_info, loan_amount,
+                      [_client_step(client_id, personal_info, loan_amount)]))
+
+    for start in range(0, len(valid), LOAN_BATCH_SIZE):
+        # les prêts du paquet sont enregistrés en une seule écriture
+        with _loans.batch():
+            for i, body in _process_loan_chunk(valid[start:start + LOAN_BATCH_SIZE]):
+                results[i] = body
+    return results
+
+
+def _process_loan_chunk(chunk):
+    """Traite un paquet de prêts validés avec un seul appel par micro‑service."""
+    # 1. Vérification gRPC MontantMax groupée
+    # (appels groupés : timeout configuré du service plutôt que le p99 des appels unitaires)
+    montantmax_pb2, montantmax_pb2_grpc = _montantmax_modules()
+    try:
+        batch = montantmax_pb2.LoanBatchRequest(loans=[
+            montantmax_pb2.LoanRequest(loan_amount=amount) for _, _, _, amount, _ in chunk])
+        with _stage('montantmax_batch'):
+            resp = breakers['ms_montantmax'].call(
+                lambda timeout: montantmax_pool.call(montantmax_pb2_grpc.MontantMaxServiceStub,
+                                                     'CheckLoans', batch, timeout=timeout),
+                timeout=MS_MONTANTMAX_TIMEOUT)
+        checks = list(resp.results)
+        if len(checks) != len(chunk):
+            raise ValueError("Réponse CheckLoans incomplète")
+    except Exception as exc:
+        yield from _chunk_error(chunk, "ms_montantmax", "Erreur vérification montant", exc)
+        return
+
+    accepted = []
+    for item, check in zip(chunk, checks):
+        i, client_id, _, amount, history = item
+        history.append(_montantmax_step(amount, check))
+        if check.allowed:
+            accepted.append(item)
+        else:
+            yield i, _loan_refused(client_id, amount, history, check.message)[0]
+    chunk = accepted
+    if not chunk:
+        return
+
+    # 2. Profils de risque en une requête GraphQL
+    try:
+        query = {'query': RISK_BATCH_QUERY,
+                 'variables': {'items': [{'loanAmount': amount, 'clientInfo': info}
+                                         for _, _, info, amount, _ in chunk]}}
+        with _stage('risk_batch'):
+            gql = breakers['ms_profilrisque'].call(
+                lambda timeout: _checked(profilrisque_client.post(json=query, timeout=timeout)),
+                timeout=profilrisque_client.timeout)
+        risks = gql.json().get('riskProfiles') or []
+        if len(risks) != len(chunk):
+            raise ValueError("Réponse riskProfiles incomplète")
+    except Exception as exc:
+        yield from _chunk_error(chunk, "ms_profilrisque", "Erreur profil risque", exc)
+        return
+
+    accepted = []
+    for item, risk in zip(chunk, risks):
+        i, client_id, info, amount, history = item
+        history.append(_risk_step(amount, info, risk))
+        if _risk_refused(risk, amount):
+            yield i, _loan_refused(client_id, amount, history, "Risque trop élevé")[0]
+        else:
+            accepted.append(item)
+    chunk = accepted
+    if not chunk:
+        return
+
+    # 3. SubmitChequeRequests groupé (SOAP async)
+    try:
+        with _stage('submit_batch'):
+            envelope = SUBMIT_CHEQUES.render(_traceparent(), count=len(chunk))
+            r = breakers['ms_banque'].call(
+                lambda timeout: _checked(banque_client.post(data=envelope, headers=SOAP_HEADERS,
+                                                            timeout=timeout)),
+                timeout=banque_client.timeout)
+        req_ids = _parse_submit_batch_response(r.content)
+        if len(req_ids) != len(chunk):
+            raise ValueError("Réponse SubmitChequeRequests incomplète")
+    except Exception as exc:
+        yield from _chunk_error(chunk, "ms_banque (SubmitChequeRequest)", "Erreur dépôt chèque", exc)
+        return
+
+    for (i, client_id, _, amount, history), req_id in zip(chunk, req_ids):
+        history.append(_submit_step(req_id))
+        yield i, _loan_pending(req_id, client_id, amount, history)[0]
+
+
+def _chunk_error(chunk, service, reason, exc=None):
+    for i, _, _, _, history in chunk:
+        history.append(_error_step(service, reason))
+        yield i, _loan_error(reason, exc)[0]
 
 
 @app.route('/loan/status/<request_id>', methods=['GET'])
@@ -266,27 +1064,182 @@ def loan_status(request_id):
         type: string
         required: true
         description: Identifiant de la demande de prêt
+      - in: query
+        name: wait
+        type: number
+        description: Long-poll — si la demande est en attente, attendre au plus `wait`
+                     secondes (plafonné à STATUS_WAIT_MAX) le verdict de la banque
     responses:
       200:
-        description: Statut actuel de la demande
+        description: Statut actuel de la demande (pending si le délai expire)
       400:
-        description: Demande refusée
+        description: Demande refusée, ou paramètre wait invalide
       404:
         description: ID inconnu
     """
-    entry = _loans.get(request_id)
+    try:
+        wait = _wait_seconds(request.args.get('wait'))
+    except ValueError:
+        return jsonify({"status": "error", "reason": "Paramètre wait invalide"}), 400
+    # trafic prioritaire ; l'attente d'un long-poll n'occupe pas de place
+    try:
+        with admission.admit(priority=True):
+            entry = _loans.get(request_id)
+    except AdmissionRejected as exc:
+        return _shed(exc, 'priority')
     if not entry:
         return jsonify({"status": "error", "reason": "ID inconnu"}), 404
 
+    if entry['status'] == 'pending' and wait > 0:
+        entry = _wait_for(request_id, _decided, wait) or entry
+    body, code = _status_response(entry)
+    return jsonify(body), code
+
+
+@app.route('/loan/status/<request_id>/events', methods=['GET'])
+def loan_status_events(request_id):
+    """
+    Flux Server-Sent Events du statut d’une demande de prêt.
+
+    Un événement `status` (même corps que GET /loan/status) est émis à la
+    connexion puis à chaque changement (verdict, transfert des fonds) ; le
+    flux se ferme sur un statut définitif.
+    ---
+    tags:
+      - loan
+    produces:
+      - text/event-stream
+    parameters:
+      - in: path
+        name: request_id
+        type: string
+        required: true
+    responses:
+      200:
+        description: Flux text/event-stream
+      404:
+        description: ID inconnu
+    """
+    if _loans.get(request_id) is None:
+        return jsonify({"status": "error", "reason": "ID inconnu"}), 404
+    return Response(_status_events(request_id), status=200, mimetype='text/event-stream',
+                    headers=SSE_HEADERS)
+
+
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+SSE_KEEPALIVE_EVENT = ': keep-alive\n\n'
+
+
+def _wait_seconds(raw):
+    """Durée de long-poll demandée, plafonnée à STATUS_WAIT_MAX ; ValueError si invalide."""
+    if raw is None:
+        return 0.0
+    wait = float(raw)
+    if not wait >= 0:  # rejette aussi NaN
+        raise ValueError(raw)
+    return min(wait, STATUS_WAIT_MAX)
+
+
+def _status_response(entry):
+    """(corps, code HTTP) du statut d'une demande."""
     if entry['status'] == 'pending':
-        return jsonify({"status": "pending"}), 200
+        return {"status": "pending"}, 200
 
     verdict = entry.get('verdict', '')
     if verdict == 'Chèque validé':
-        return jsonify({"status": "approved",
-                        "message": "Prêt approuvé et fonds transférés"}), 200
-    return jsonify({"status": "refused",
-                    "reason": "Chèque invalide"}), 400
+        transfer = entry.get('transfer', 'queued')
+        return {"status": "approved", "message": TRANSFER_MESSAGES[transfer],
+                "transfer": transfer}, 200
+    return {"status": "refused", "reason": "Chèque invalide"}, 400
+
+
+def _decided(entry):
+    return entry['status'] != 'pending'
+
+
+def _final(entry):
+    """Plus aucun changement à attendre : verdict rendu et, s'il y a lieu, transfert terminé."""
+    return _decided(entry) and (entry.get('verdict') != 'Chèque validé'
+                                or entry.get('transfer') in ('done', 'failed'))
+
+
+def _recheck(timeout):
+    """Délai d'attente d'une notification, borné par STATUS_RECHECK s'il est actif."""
+    return min(timeout, STATUS_RECHECK) if STATUS_RECHECK > 0 else timeout
+
+
+def _wait_for(request_id, done, timeout):
+    """Attend (sans scrutation) que done(entrée) soit vrai ou `timeout` s ; renvoie l'entrée."""
+    deadline = time.monotonic() + timeout
+    while True:
+        with waiters.watch(request_id) as event:
+            entry = _loans.get(request_id)
+            remaining = deadline - time.monotonic()
+            if entry is None or done(entry) or remaining <= 0:
+                return entry
+            event.wait(_recheck(remaining))
+
+
+def _sse(entry):
+    body, _ = _status_response(entry)
+    return 'event: status\ndata: %s\n\n' % json.dumps(body, ensure_ascii=False)
+
+
+def _status_events(request_id):
+    """Événements SSE d'une demande ; un commentaire keep-alive toutes les SSE_KEEPALIVE s."""
+    last, sent = None, time.monotonic()
+    while True:
+        with waiters.watch(request_id) as event:
+            entry = _loans.get(request_id)
+            if entry is None:
+                return
+            chunk = _sse(entry)
+            if chunk != last:
+                last, sent = chunk, time.monotonic()
+                yield chunk
+            if _final(entry):
+                return
+            event.wait(_recheck(sent + SSE_KEEPALIVE - time.monotonic()))
+            if time.monotonic() - sent >= SSE_KEEPALIVE:
+                sent = time.monotonic()
+                yield SSE_KEEPALIVE_EVENT
+
+
+async def _wait_for_async(request_id, done, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        with waiters.watch_async(request_id) as waiter:
+            entry = _loans.get(request_id)
+            remaining = deadline - time.monotonic()
+            if entry is None or done(entry) or remaining <= 0:
+                return entry
+            await waiter.wait(_recheck(remaining))
+
+
+async def _status_events_async(request_id):
+    last, sent = None, time.monotonic()
+    while True:
+        with waiters.watch_async(request_id) as waiter:
+            entry = _loans.get(request_id)
+            if entry is None:
+                return
+            chunk = _sse(entry)
+            if chunk != last:
+                last, sent = chunk, time.monotonic()
+                yield chunk
+            if _final(entry):
+                return
+            await waiter.wait(_recheck(sent + SSE_KEEPALIVE - time.monotonic()))
+            if time.monotonic() - sent >= SSE_KEEPALIVE:
+                sent = time.monotonic()
+                yield SSE_KEEPALIVE_EVENT
+
+
+TRANSFER_MESSAGES = {
+    'queued': "Prêt approuvé, transfert des fonds en cours",
+    'done':   "Prêt approuvé et fonds transférés",
+    'failed': "Prêt approuvé, échec du transfert des fonds",
+}
 
 
 @app.route('/loan/callback', methods=['POST'])
@@ -302,53 +1255,190 @@ def loan_callback():
       - in: body
         name: callback
         required: true
-        description: Enveloppe SOAP ChequeStatusResponse
+        description: >
+          Enveloppe SOAP ChequeStatusResponse, ou ChequeStatusResponses (verdicts
+          regroupés par ms_banque, chacun avec son relates_to et son traceparent)
         schema:
           type: string
     responses:
       200:
-        description: Callback traité
+        description: >
+          Callback enregistré (le transfert des fonds est mis en file) ; pour un lot,
+          `results` donne le code de chaque verdict (200, ou 404 si request_id inconnu)
+      400:
+        description: Enveloppe SOAP invalide
       404:
         description: request_id inconnu
     """
-    tree = ET.fromstring(request.data)
-    req_id  = tree.findtext('.//request_id')
-    verdict = tree.findtext('.//verdict')
+    try:
+        tree = soap.parse(request.data)
+    except soap.SoapError as exc:
+        metrics.error('invalid_callback')
+        return jsonify({"status": "error", "reason": str(exc)}), 400
+    batch = soap.cheque_statuses(tree)
+    if batch:
+        return _callback_batch(batch)
+    # contexte de trace renvoyé par ms_banque dans l'en-tête SOAP, sinon HTTP
+    parent = (tracing.parse_traceparent(soap.traceparent(tree))
+              or tracing.extract(request.headers))
+    try:
+        with admission.admit(priority=True), metrics.IN_FLIGHT['loan_callback'].track_inprogress(), \
+                _stage('callback', kind='server', parent=parent):
+            return '', _process_callback(soap.cheque_status(tree))
+    except AdmissionRejected as exc:
+        return _shed(exc, 'priority')
+
+
+def _callback_batch(verdicts):
+    """Callback groupé : chaque verdict est appliqué dans un span rattaché à son dépôt."""
+    results = []
+    try:
+        with admission.admit(priority=True), metrics.IN_FLIGHT['loan_callback'].track_inprogress():
+            for fields in verdicts:
+                parent = tracing.parse_traceparent(fields.get('traceparent'))
+                with _stage('callback', kind='server', parent=parent):
+                    results.append({"request_id": fields.get('request_id'),
+                                    "status": _process_callback(fields)})
+    except AdmissionRejected as exc:
+        return _shed(exc, 'priority')
+    return jsonify({"results": results}), 200
+
+
+def _process_callback(fields):
+    """Enregistre le verdict de la banque et met le transfert en file ; renvoie le code HTTP."""
+    req_id  = fields.get('request_id')
+    verdict = fields.get('verdict')
 
     entry = _loans.get(req_id)
     if not entry:
-        return '', 404
-
-    entry['status']  = 'done'
-    entry['verdict'] = verdict or ''
-    entry['history'].append({
-        "timestamp": datetime.datetime.utcnow().isoformat(),
-        "service": "ms_banque callback",
-        "response": {"request_id": req_id, "verdict": verdict}
-    })
+        return 404
+
+    if entry['status'] == 'done':
+        # callback rejoué : le premier verdict fait foi
+        verdict = entry.get('verdict')
+    else:
+        _loans.update(req_id, status='done', verdict=verdict or '')
+        _loans.append_history(req_id, _step("ms_banque callback",
+                                            response={"request_id": req_id, "verdict": verdict}))
 
-    # Appel REST ms_fournisseur si le chèque est validé
+    # Transfert ms_fournisseur en arrière-plan si le chèque est validé ; un
+    # seul transfert par request_id, même si le callback est rejoué
     if verdict == 'Chèque validé':
-        try:
-            resp = requests.post(
-                MS_FOURNISSEUR_URL,
-                json={'loan_amount': entry['loan_amount'], 'client_id': entry['client_id']},
-                timeout=5
-            )
-            entry['history'].append({
-                "timestamp": datetime.datetime.utcnow().isoformat(),
-                "service": "ms_fournisseur",
-                "request": {"loan_amount": entry['loan_amount'],
-                            "client_id": entry['client_id']},
-                "response": {"status_code": resp.status_code, "json": resp.json()}
-            })
-        except Exception:
-            entry['history'].append({
-                "timestamp": datetime.datetime.utcnow().isoformat(),
-                "service": "ms_fournisseur",
-                "error": "Erreur transfert fonds"
-            })
-    return '', 200
+        context = tracing.current()
+        transfers.submit(req_id, {
+            "transfer":    {'loan_amount': entry['loan_amount'], 'client_id': entry['client_id']},
+            "traceparent": context.traceparent() if context else None})
+    waiters.notify(req_id)
+    return 200
+
+
+def _transfer_funds(job):
+    """Worker de transfert : appel REST ms_fournisseur, rattaché à la trace du callback."""
+    req_id, transfer = job['request_id'], job['payload']['transfer']
+    headers = {'Idempotency-Key': req_id}
+    with _stage('fund_transfer', parent=tracing.parse_traceparent(job['payload']['traceparent'])):
+        resp = breakers['ms_fournisseur'].call(lambda timeout: _checked(
+            fournisseur_client.post(json=transfer, headers=headers, timeout=timeout)))
+    if not 200 <= resp.status_code < 300:
+        # refus du fournisseur (4xx) : définitif, et sans effet sur le disjoncteur
+        raise TransferRejected(f"HTTP {resp.status_code}")
+    body = resp.json()
+    _loans.update(req_id, transfer='done')
+    _loans.append_history(req_id, _step("ms_fournisseur", request=transfer,
+                                        response={"status_code": resp.status_code, "json": body}))
+    waiters.notify(req_id)
+    return body
+
+
+def _transfer_failed(job, exc):
+    """Refus ou tentatives épuisées : le prêt reste approuvé, l'échec est tracé dans l'historique."""
+    metrics.error("Erreur transfert fonds")
+    error = f"Transfert refusé ({exc})" if isinstance(exc, TransferRejected) else "Erreur transfert fonds"
+    _loans.update(job['request_id'], transfer='failed')
+    _loans.append_history(job['request_id'], _error_step("ms_fournisseur", error))
+    waiters.notify(job['request_id'])
+
+
+@app.route('/loans', methods=['GET'])
+def list_loans():
+    """
+    Rechercher des demandes de prêt, de la plus récente à la plus ancienne.
+    ---
+    tags:
+      - loan
+    parameters:
+      - in: query
+        name: client_id
+        type: string
+      - in: query
+        name: status
+        type: string
+        enum: [pending, refused, done]
+      - in: query
+        name: since
+        type: string
+        description: Date de création minimale (incluse), epoch en secondes ou ISO 8601
+      - in: query
+        name: until
+        type: string
+        description: Date de création maximale (exclue), epoch en secondes ou ISO 8601
+      - in: query
+        name: limit
+        type: integer
+        description: Taille de page (LOANS_PAGE_SIZE par défaut, au plus LOANS_PAGE_MAX)
+      - in: query
+        name: cursor
+        type: string
+        description: Curseur opaque, champ `next` de la page précédente
+    responses:
+      200:
+        description: Page de demandes (sans historique) et curseur `next` (null en fin de liste)
+      400:
+        description: Paramètre invalide
+    """
+    args = request.args
+    try:
+        limit = int(args.get('limit', LOANS_PAGE_SIZE))
+        if not 1 <= limit <= LOANS_PAGE_MAX:
+            raise ValueError(limit)
+        since  = _parse_time(args.get('since'))
+        until  = _parse_time(args.get('until'))
+        cursor = decode_cursor(args['cursor']) if 'cursor' in args else None
+    except ValueError:
+        return jsonify({"status": "error", "reason": "Paramètres de recherche invalides"}), 400
+
+    loans, next_cursor = _loans.query(client_id=args.get('client_id'), status=args.get('status'),
+                                      since=since, until=until, limit=limit, cursor=cursor)
+    return jsonify({"loans": loans,
+                    "next": None if next_cursor is None else encode_cursor(next_cursor)}), 200
+
+
+@app.route('/loans/counts', methods=['GET'])
+def loan_counts():
+    """
+    Nombre de demandes de prêt par statut (compteurs tenus à jour à chaque écriture).
+    ---
+    tags:
+      - loan
+    responses:
+      200:
+        description: Nombre de demandes par statut et total
+    """
+    counts = _loans.status_counts()
+    return jsonify({"counts": counts, "total": sum(counts.values())}), 200
+
+
+def _parse_time(raw):
+    """Epoch (s) d'un paramètre de date : nombre ou ISO 8601 (UTC si sans fuseau)."""
+    if raw is None:
+        return None
+    try:
+        return float(raw)
+    except ValueError:
+        moment = datetime.fromisoformat(raw)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
 
 
 @app.route('/loan/history/<request_id>', methods=['GET'])
@@ -363,17 +1453,351 @@ def loan_history(request_id):
         name: request_id
         required: true
         type: string
+      - in: query
+        name: after
+        type: integer
+        description: Curseur (indice de la première étape renvoyée), champ `next` de la page précédente
+      - in: query
+        name: limit
+        type: integer
+        description: Nombre maximal d’étapes renvoyées
     responses:
       200:
-        description: Historique renvoyé
+        description: Historique renvoyé en flux (gzip si Accept-Encoding le permet)
+      400:
+        description: Pagination invalide
       404:
         description: ID inconnu
     """
+    try:
+        after = int(request.args.get('after', 0))
+        limit = request.args.get('limit')
+        limit = None if limit is None else int(limit)
+        if after < 0 or (limit is not None and limit < 1):
+            raise ValueError
+    except ValueError:
+        return jsonify({"status": "error", "reason": "Pagination invalide"}), 400
+
+    # une étape de plus que demandé pour savoir s'il reste une page
+    steps = _loans.history(request_id, after, None if limit is None else limit + 1)
+    if steps is None:
+        return jsonify({"status": "error", "reason": "ID inconnu"}), 404
+    next_cursor = None
+    if limit is not None and len(steps) > limit:
+        steps = steps[:limit]
+        next_cursor = after + limit
+
+    chunks = _stream_history(request_id, steps, next_cursor)
+    headers = {}
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        chunks = _gzip_stream(chunks)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    return Response(stream_with_context(chunks), status=200,
+                    mimetype='application/json', headers=headers)
+
+
+def _stream_history(request_id, steps, next_cursor):
+    """Sérialise l'historique étape par étape, sans construire le document complet."""
+    yield '{"request_id": %s, "history": [' % json.dumps(request_id)
+    for i, step in enumerate(steps):
+        yield (',' if i else '') + json.dumps(step.to_dict())
+    yield '], "next": %s}' % json.dumps(next_cursor)
+
+
+def _gzip_stream(chunks):
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 : en-tête gzip
+    for chunk in chunks:
+        data = gz.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield gz.flush()
+
+
+@app.route('/debug/trace/<request_id>', methods=['GET'])
+def debug_trace(request_id):
+    """
+    Cascade des spans de la trace d’un prêt, tous services confondus lorsque
+    l’exportateur est partagé (TRACE_EXPORTER=file sur un volume commun).
+    ---
+    tags:
+      - admin
+    parameters:
+      - in: path
+        name: request_id
+        required: true
+        type: string
+      - in: query
+        name: format
+        type: string
+        enum: [json, text]
+        description: json (défaut) ou cascade en texte
+    responses:
+      200:
+        description: Spans ordonnés (profondeur, décalage et durée en ms)
+      404:
+        description: ID inconnu ou trace absente
+    """
     entry = _loans.get(request_id)
-    if not entry:
+    trace_id = entry.get('trace_id') if entry else None
+    if not trace_id:
         return jsonify({"status": "error", "reason": "ID inconnu"}), 404
-    return jsonify({"request_id": request_id,
-                    "history": entry.get("history", [])}), 200
+    rows = tracing.waterfall(tracer.exporter.find(trace_id))
+    if not rows:
+        return jsonify({"status": "error", "reason": "Trace non disponible"}), 404
+    if request.args.get('format') == 'text':
+        return Response(tracing.render_waterfall(rows), status=200, mimetype='text/plain')
+    return jsonify({"request_id": request_id, "trace_id": trace_id, "spans": rows}), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Métriques Prometheus (format texte) : latences par étape, requêtes en cours,
+    erreurs par motif, issues des prêts et taille du stockage.
+    ---
+    tags:
+      - admin
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: Exposition Prometheus
+    """
+    body, content_type = metrics.render()
+    return Response(body, status=200, content_type=content_type)
+
+
+@app.route('/admin/pools', methods=['GET'])
+def admin_pools():
+    """
+    Statistiques des pools de connexions vers les micro‑services.
+    ---
+    tags:
+      - admin
+    responses:
+      200:
+        description: Compteurs de création et de réutilisation des connexions
+    """
+    return jsonify({
+        "ms_montantmax":   montantmax_pool.stats(),
+        "ms_profilrisque": profilrisque_client.stats(),
+        "ms_banque":       banque_client.stats(),
+        "ms_fournisseur":  fournisseur_client.stats(),
+    }), 200
+
+
+@app.route('/admin/breakers', methods=['GET'])
+def admin_breakers():
+    """
+    État des disjoncteurs et des timeouts adaptatifs par micro‑service.
+    ---
+    tags:
+      - admin
+    responses:
+      200:
+        description: État (closed, open, half_open), échecs consécutifs, appels rejetés,
+                     timeout courant, latences p50/p99 et requêtes couvertes
+    """
+    return jsonify({name: d.stats() for name, d in breakers.items()}), 200
+
+
+@app.route('/admin/transfers', methods=['GET'])
+def admin_transfers():
+    """
+    État de la file des transferts de fonds.
+    ---
+    tags:
+      - admin
+    responses:
+      200:
+        description: Transferts par statut (queued, running, done, failed), profondeur
+                     de la file, âge du plus ancien transfert en attente et workers actifs
+    """
+    return jsonify(transfers.stats()), 200
+
+
+@app.route('/admin/waiters', methods=['GET'])
+def admin_waiters():
+    """
+    Attentes de statut en cours (long-poll et flux SSE).
+    ---
+    tags:
+      - admin
+    responses:
+      200:
+        description: Attentes en cours, demandes attendues et réveils effectués
+    """
+    return jsonify(waiters.stats()), 200
+
+
+@app.route('/admin/admission', methods=['GET'])
+def admin_admission():
+    """
+    Limites et état du contrôle d'admission.
+    ---
+    tags:
+      - admin
+    responses:
+      200:
+        description: Limites courantes, requêtes admises en cours et au total, clients suivis
+    """
+    return jsonify(admission.stats()), 200
+
+
+@app.route('/admin/admission', methods=['PUT'])
+def admin_admission_configure():
+    """
+    Modifier à chaud les limites du contrôle d'admission (0 désactive une limite).
+    ---
+    tags:
+      - admin
+    consumes:
+      - application/json
+    parameters:
+      - in: body
+        name: limits
+        required: true
+        schema:
+          type: object
+          properties:
+            max_concurrent:
+              type: integer
+            reserved:
+              type: integer
+              description: Places réservées au trafic prioritaire (statut, callback)
+            client_rate:
+              type: number
+              description: Demandes par seconde et par client
+            client_burst:
+              type: number
+            retry_after:
+              type: number
+              description: Retry-After (s) des requêtes délestées pour saturation
+    responses:
+      200:
+        description: Limites appliquées
+      400:
+        description: Limite inconnue ou invalide
+    """
+    limits = request.get_json(silent=True)
+    if not isinstance(limits, dict):
+        return jsonify({"status": "error", "reason": "Limites manquantes"}), 400
+    try:
+        admission.configure(**limits)
+    except (TypeError, ValueError) as exc:
+        return jsonify({"status": "error", "reason": str(exc)}), 400
+    return jsonify(admission.stats()), 200
+
+
+@app.route('/admin/cache/risk', methods=['GET'])
+def admin_risk_cache():
+    """
+    Métriques du cache des profils de risque.
+    ---
+    tags:
+      - admin
+    responses:
+      200:
+        description: Taille, hits, misses, évictions et appels fusionnés
+    """
+    return jsonify(dict(risk_cache.stats(), coalesced=risk_flight.coalesced)), 200
+
+
+@app.route('/admin/cache/idempotency', methods=['GET'])
+def admin_idempotency_cache():
+    """
+    Métriques du cache des réponses idempotentes de POST /loan.
+    ---
+    tags:
+      - admin
+    responses:
+      200:
+        description: Taille, réponses rejouées (hits), évictions et requêtes concurrentes fusionnées
+    """
+    coalesced = idempotency_flight.coalesced + idempotency_aflight.coalesced
+    return jsonify(dict(idempotency_cache.stats(), coalesced=coalesced)), 200
+
+
+@app.route('/admin/cache/risk', methods=['DELETE'])
+def admin_risk_cache_invalidate():
+    """
+    Invalider le cache des profils de risque.
+
+    Sans paramètre, tout le cache est vidé ; `client_info` seul invalide toutes
+    les entrées du client, avec `loan_amount` une seule entrée.
+    ---
+    tags:
+      - admin
+    parameters:
+      - in: query
+        name: client_info
+        type: string
+      - in: query
+        name: loan_amount
+        type: number
+    responses:
+      200:
+        description: Nombre d’entrées invalidées
+      400:
+        description: Montant invalide
+    """
+    client_info = request.args.get('client_info')
+    loan_amount = request.args.get('loan_amount')
+    try:
+        if client_info is not None and loan_amount is not None:
+            removed = risk_cache.invalidate(key=_risk_key(loan_amount, client_info))
+        elif client_info is not None:
+            info    = _risk_key(0, client_info)[1]
+            removed = risk_cache.invalidate(predicate=lambda k: k[1] == info)
+        else:
+            removed = risk_cache.invalidate()
+    except ValueError:
+        return jsonify({"status": "error", "reason": "Le montant doit être un nombre"}), 400
+    return jsonify({"invalidated": removed}), 200
+
+
+@app.route('/admin/rules', methods=['GET'])
+def admin_rules():
+    """
+    État des tables de règles locales (mode, versions, décisions locales, divergences shadow).
+    ---
+    tags:
+      - admin
+    responses:
+      200:
+        description: Statistiques des règles par service
+    """
+    return jsonify(decisions.stats()), 200
+
+
+@app.route('/admin/rules/sync', methods=['POST'])
+def admin_rules_sync():
+    """
+    Forcer la resynchronisation des tables de règles.
+    ---
+    tags:
+      - admin
+    responses:
+      200:
+        description: Tables rechargées
+    """
+    decisions.sync()
+    return jsonify(decisions.stats()), 200
+
+
+@app.route('/admin/store', methods=['GET'])
+def admin_store():
+    """
+    Compteurs du stockage des prêts (entrées, évictions, mémoire).
+    ---
+    tags:
+      - admin
+    responses:
+      200:
+        description: Statistiques du backend LOAN_STORE
+    """
+    return jsonify(_loans.stats()), 200
 
 
 # ------------------------------------------------------------------------------
@@ -381,4 +1805,8 @@ def loan_history(request_id):
 # ------------------------------------------------------------------------------
 if __name__ == '__main__':
     # /apidocs → UI Swagger
-    app.run(host='0.0.0.0', port=5000)
+    if os.getenv('ORCHESTRATION_MODE', 'sync') == 'async':
+        import uvicorn
+        uvicorn.run(create_asgi_app(), host='0.0.0.0', port=5000)
+    else:
+        app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,132 @@
+# src/app/asgi.py
+"""
+Application ASGI de l'orchestrateur.
+
+POST /loan est servi nativement par une coroutine, de même que les routes
+à motif (`patterns`) comme les attentes de statut (long-poll, SSE) ; toutes
+les autres routes sont déléguées à l'application Flask via `WsgiToAsgi`, si
+bien que le contrat HTTP reste identique au mode synchrone.
+"""
+import re
+import json
+from urllib.parse import parse_qsl
+
+from asgiref.wsgi import WsgiToAsgi
+
+
+class LoanAsgiApp:
+    """Routeur ASGI minimal : routes asynchrones natives, repli WSGI pour le reste."""
+
+    def __init__(self, wsgi_app, routes, on_shutdown=None, patterns=()):
+        # routes   : {(méthode, chemin): coroutine(scope, data) -> (corps, code[, en-têtes])}
+        # patterns : [(méthode, regex du chemin, coroutine(scope, receive, send, **groupes))],
+        #            le handler envoie lui-même sa réponse
+        self._wsgi        = WsgiToAsgi(wsgi_app)
+        self._routes      = routes
+        self._patterns    = [(method, re.compile(regex + '$'), handler)
+                             for method, regex, handler in patterns]
+        self._on_shutdown = on_shutdown
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+
+        handler = None
+        if scope['type'] == 'http':
+            handler = self._routes.get((scope['method'], scope['path']))
+            if handler is None:
+                for method, regex, raw in self._patterns:
+                    match = regex.match(scope['path']) if method == scope['method'] else None
+                    if match:
+                        await raw(scope, receive, send, **match.groupdict())
+                        return
+        if handler is None:
+            await self._wsgi(scope, receive, send)
+            return
+
+        body, status, *headers = await handler(scope, _json_or_none(scope, await _read_body(receive)))
+        await send_json(send, status, body, *headers)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._on_shutdown is not None:
+                    await self._on_shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+def _json_or_none(scope, raw):
+    """Équivalent de `request.get_json(silent=True)` côté Flask."""
+    headers = dict(scope.get('headers') or [])
+    if b'json' not in headers.get(b'content-type', b''):
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+
+def header(scope, name):
+    """Valeur (str) de l'en-tête `name` de la requête, ou None."""
+    name = name.lower().encode('latin-1')
+    for key, value in scope.get('headers') or []:
+        if key.lower() == name:
+            return value.decode('latin-1')
+    return None
+
+
+def query_params(scope):
+    """Paramètres de la query string (dernière valeur de chaque nom)."""
+    return dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+
+
+async def send_json(send, status, body, headers=None):
+    payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+    extra = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'),
+                            (b'content-length', str(len(payload)).encode())] + extra})
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+async def send_events(receive, send, events, headers=None):
+    """
+    Réponse text/event-stream alimentée par l'itérateur asynchrone `events`
+    (chaînes) ; le flux est abandonné dès que le client se déconnecte.
+    """
+    import asyncio
+
+    extra = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    await send({'type': 'http.response.start', 'status': 200,
+                'headers': [(b'content-type', b'text/event-stream; charset=utf-8')] + extra})
+
+    async def pump():
+        async for chunk in events:
+            await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'),
+                        'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def disconnected():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    tasks = [asyncio.ensure_future(pump()), asyncio.ensure_future(disconnected())]
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    if tasks[0] in done:
+        tasks[0].result()
@@ -0,0 +1,68 @@
+# src/app/async_downstreams.py
+"""
+Clients asynchrones des micro‑services pour le mode d'orchestration ASGI.
+
+gRPC passe par `grpc.aio`, GraphQL et SOAP par un `httpx.AsyncClient`
+keep-alive. Les canaux et clients sont créés paresseusement dans la boucle
+asyncio qui les utilise et fermés par aclose(). Comme en mode synchrone, une
+réponse HTTP 5xx lève IOError : le disjoncteur la compte comme un échec.
+"""
+import grpc
+import httpx
+
+from ms_montantmax import montantmax_pb2, montantmax_pb2_grpc
+from grpc_pool import DEFAULT_OPTIONS
+from resilience import check_status
+from common import tracing
+
+
+class AsyncDownstreams:
+    """Appels asynchrones vers ms_montantmax, ms_profilrisque et ms_banque."""
+
+    def __init__(self, montantmax_address, profilrisque_url, banque_url,
+                 timeout=5.0, max_connections=100):
+        self.montantmax_address = montantmax_address
+        self.profilrisque_url   = profilrisque_url
+        self.banque_url         = banque_url
+        self.timeout            = timeout
+        self.max_connections    = max_connections
+        self._channel = None
+        self._stub    = None
+        self._http    = None
+
+    def _montantmax(self):
+        if self._stub is None:
+            self._channel = grpc.aio.insecure_channel(self.montantmax_address,
+                                                      options=list(DEFAULT_OPTIONS))
+            self._stub = montantmax_pb2_grpc.MontantMaxServiceStub(self._channel)
+        return self._stub
+
+    def _client(self):
+        if self._http is None:
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_connections)
+            self._http = httpx.AsyncClient(timeout=self.timeout, limits=limits)
+        return self._http
+
+    async def check_loan(self, loan_amount):
+        return await self._montantmax().CheckLoan(
+            montantmax_pb2.LoanRequest(loan_amount=loan_amount), timeout=self.timeout,
+            metadata=tracing.grpc_metadata())
+
+    async def risk_profile(self, payload):
+        resp = check_status(await self._client().post(self.profilrisque_url, json=payload,
+                                                      headers=tracing.inject()))
+        return resp.json().get('riskProfile')
+
+    async def submit_cheque(self, soap, headers):
+        resp = check_status(await self._client().post(self.banque_url, content=soap,
+                                                      headers=tracing.inject(dict(headers))))
+        return resp.content
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        if self._channel is not None:
+            await self._channel.close()
+            self._channel = self._stub = None
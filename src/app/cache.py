@@ -0,0 +1,194 @@
+# src/app/cache.py
+"""
+Briques de cache de l'orchestrateur.
+
+* TTLCache : cache borné, expiration par TTL et éviction LRU ;
+* SharedTTLCache : même interface, entrées dans un SharedDict (SQLite)
+  partagé par les processus d'un serveur multi-workers ;
+* SingleFlight : fusionne les calculs concurrents d'une même clé, seul le
+  premier appelant exécute la fonction, les autres attendent son résultat ;
+* AsyncSingleFlight : idem pour des coroutines d'une même boucle asyncio.
+"""
+import time
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Cache clé → valeur borné à `maxsize` entrées, chacune valable `ttl` secondes."""
+
+    def __init__(self, maxsize=10000, ttl=30.0):
+        self.maxsize = maxsize
+        self.ttl     = ttl
+        self._lock   = threading.Lock()
+        self._data   = OrderedDict()   # clé -> (expiration, valeur)
+        self._hits = self._misses = self._evictions = self._expired = 0
+
+    def get(self, key):
+        """Renvoie (trouvé, valeur)."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                if item[0] > now:
+                    self._data.move_to_end(key)
+                    self._hits += 1
+                    return True, item[1]
+                del self._data[key]
+                self._expired += 1
+            self._misses += 1
+            return False, None
+
+    def set(self, key, value):
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, key=None, predicate=None):
+        """Supprime une clé, les clés vérifiant `predicate`, ou tout le cache ; renvoie le nombre retiré."""
+        with self._lock:
+            if key is not None:
+                return 1 if self._data.pop(key, None) is not None else 0
+            if predicate is not None:
+                keys = [k for k in self._data if predicate(k)]
+                for k in keys:
+                    del self._data[k]
+                return len(keys)
+            removed = len(self._data)
+            self._data.clear()
+            return removed
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "ttl": self.ttl,
+                    "hits": self._hits, "misses": self._misses,
+                    "evictions": self._evictions, "expired": self._expired}
+
+    def reset(self):
+        """Vide le cache et remet les compteurs à zéro."""
+        with self._lock:
+            self._data.clear()
+            self._hits = self._misses = self._evictions = self._expired = 0
+
+
+class SharedTTLCache:
+    """
+    TTLCache adossé à un common.shared_store.SharedDict (maxsize et ttl sont
+    ceux du SharedDict) : une entrée écrite par un processus est vue de tous.
+    Les valeurs doivent être sérialisables en JSON (un tuple est relu en liste).
+    """
+
+    def __init__(self, store):
+        self._store  = store
+        self._lock   = threading.Lock()
+        self._hits = self._misses = 0
+
+    def get(self, key):
+        """Renvoie (trouvé, valeur)."""
+        value = self._store.get(key, _MISSING)
+        with self._lock:
+            if value is _MISSING:
+                self._misses += 1
+                return False, None
+            self._hits += 1
+        return True, value
+
+    def set(self, key, value):
+        self._store[key] = value
+
+    def invalidate(self, key=None):
+        if key is not None:
+            return 0 if self._store.pop(key, _MISSING) is _MISSING else 1
+        removed = len(self._store)
+        self._store.clear()
+        return removed
+
+    def stats(self):
+        return {"size": len(self._store), "maxsize": self._store.maxsize, "ttl": self._store.ttl,
+                "hits": self._hits, "misses": self._misses, "shared": self._store.path}
+
+    def reset(self):
+        self._store.clear()
+        with self._lock:
+            self._hits = self._misses = 0
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event  = threading.Event()
+        self.result = None
+        self.error  = None
+
+
+class SingleFlight:
+    """Dé-duplication des appels concurrents identiques."""
+
+    def __init__(self):
+        self._lock  = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """Exécute fn() une seule fois par clé en vol ; renvoie (résultat, partagé)."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result, False
+
+
+class AsyncSingleFlight:
+    """Dé-duplication des coroutines concurrentes identiques (une boucle d'événements)."""
+
+    def __init__(self):
+        self._calls = {}
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        """Attend fn() une seule fois par clé en vol ; renvoie (résultat, partagé)."""
+        import asyncio
+        call = self._calls.get(key)
+        if call is not None:
+            self.coalesced += 1
+            return await asyncio.shield(call), True
+        call = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+        except BaseException as exc:
+            if isinstance(exc, asyncio.CancelledError):
+                call.cancel()
+            else:
+                call.set_exception(exc)
+                call.exception()     # évite l'avertissement si personne n'attendait
+            raise
+        else:
+            call.set_result(result)
+        finally:
+            del self._calls[key]
+        return result, False
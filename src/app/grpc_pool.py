@@ -0,0 +1,145 @@
+# src/app/grpc_pool.py
+"""
+Pool de canaux gRPC persistants.
+
+Chaque canal gRPC porte une connexion HTTP/2 : le créer à chaque requête
+coûte une poignée de main complète et, faute de fermeture, fuit des sockets.
+Le pool garde quelques canaux longue durée (keepalive), les distribue en
+round-robin, recrée un canal lorsque le serveur devient injoignable et
+les ferme proprement à l'arrêt.
+
+Le module grpc n'est importé qu'à la création du premier canal, pour ne
+pas alourdir le démarrage de l'application.
+"""
+import threading
+
+from common import tracing
+
+# Options keepalive : pings HTTP/2 réguliers pour détecter une connexion morte
+# sans attendre l'échec d'un appel, et reconnexion rapide après coupure.
+DEFAULT_OPTIONS = (
+    ('grpc.keepalive_time_ms', 30000),
+    ('grpc.keepalive_timeout_ms', 10000),
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.max_pings_without_data', 0),
+    ('grpc.initial_reconnect_backoff_ms', 200),
+    ('grpc.max_reconnect_backoff_ms', 5000),
+)
+
+# Codes d'erreur (noms de grpc.StatusCode) indiquant que le canal lui-même est à reconstruire
+RECONNECT_CODES = frozenset({'UNAVAILABLE'})
+
+
+class GrpcChannelPool:
+    """Pool round-robin de canaux gRPC vers une même adresse."""
+
+    def __init__(self, address, size=2, options=DEFAULT_OPTIONS):
+        if size < 1:
+            raise ValueError("La taille du pool doit être >= 1")
+        self.address = address
+        self.size    = size
+        self.options = list(options)
+
+        self._lock     = threading.Lock()
+        self._channels = [None] * size
+        self._stubs    = [{} for _ in range(size)]
+        self._next     = 0
+        self._closed   = False
+
+        # Compteurs exposés par stats()
+        self._created    = 0
+        self._reconnects = 0
+        self._calls      = 0
+        self._reused     = 0
+
+    def _acquire(self):
+        """
+        Choisit le prochain slot et renvoie (slot, canal, cache des stubs du
+        canal), lus sous le même verrou : un stub n'est jamais mis en cache
+        pour un canal déjà écarté par _reconnect().
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Pool gRPC fermé")
+            slot = self._next
+            self._next = (slot + 1) % self.size
+            channel = self._channels[slot]
+            self._calls += 1
+            if channel is None:
+                import grpc
+                channel = grpc.insecure_channel(self.address, options=self.options)
+                self._channels[slot] = channel
+                self._created += 1
+            else:
+                self._reused += 1
+            return slot, channel, self._stubs[slot]
+
+    def _reconnect(self, slot, channel):
+        """Écarte un canal défaillant ; le prochain appel sur ce slot en recrée un."""
+        with self._lock:
+            if self._channels[slot] is not channel:
+                return  # déjà remplacé par un autre thread
+            self._channels[slot] = None
+            self._stubs[slot]    = {}
+            self._reconnects    += 1
+        _close_quietly(channel)
+
+    def call(self, stub_factory, method, request, **kwargs):
+        """
+        Invoque `method` sur un stub construit par `stub_factory` (ex. la
+        classe *Stub générée) au-dessus du prochain canal du pool.
+        Les stubs sont mis en cache par canal.
+        """
+        if 'metadata' not in kwargs:
+            metadata = tracing.grpc_metadata()
+            if metadata is not None:
+                kwargs['metadata'] = metadata
+        slot, channel, stubs = self._acquire()
+        stub = stubs.get(stub_factory)
+        if stub is None:
+            stub = stubs[stub_factory] = stub_factory(channel)
+        try:
+            return getattr(stub, method)(request, **kwargs)
+        except Exception as exc:
+            import grpc  # déjà chargé par _acquire()
+            if isinstance(exc, grpc.RpcError) and exc.code().name in RECONNECT_CODES:
+                self._reconnect(slot, channel)
+            raise
+
+    def stats(self):
+        """Statistiques de réutilisation des connexions."""
+        with self._lock:
+            return {
+                "address":          self.address,
+                "size":             self.size,
+                "open_channels":    sum(c is not None for c in self._channels),
+                "channels_created": self._created,
+                "reconnects":       self._reconnects,
+                "calls":            self._calls,
+                "reused_calls":     self._reused,
+            }
+
+    def close(self):
+        """Ferme tous les canaux ; le pool peut être rouvert par reset()."""
+        with self._lock:
+            channels = [c for c in self._channels if c is not None]
+            self._channels = [None] * self.size
+            self._stubs    = [{} for _ in range(self.size)]
+            self._closed   = True
+        for channel in channels:
+            _close_quietly(channel)
+
+    def reset(self):
+        """Ferme les canaux existants et remet le pool en service, compteurs à zéro."""
+        self.close()
+        with self._lock:
+            self._closed = False
+            self._next   = 0
+            self._created = self._reconnects = self._calls = self._reused = 0
+
+
+def _close_quietly(channel):
+    try:
+        channel.close()
+    except Exception:
+        pass
@@ -0,0 +1,55 @@
+# src/app/history.py
+"""
+Représentation compacte de l'historique des appels d'un prêt.
+
+Une étape est un objet à `__slots__` (pas de dict par instance) horodaté
+en nanosecondes epoch entières ; le nom du service est interné, et la date
+ISO n'est formatée qu'à la sérialisation. Pour le stockage (SQLite,
+segment froid), une étape s'écrit sous forme de liste compacte
+[ts_ns, service, request, response, error].
+"""
+import sys
+import time
+import datetime
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+class HistoryStep:
+    """Une étape de l'historique d'un prêt."""
+
+    __slots__ = ('ts_ns', 'service', 'request', 'response', 'error')
+
+    def __init__(self, service, request=None, response=None, error=None, ts_ns=None):
+        self.ts_ns    = time.time_ns() if ts_ns is None else ts_ns
+        self.service  = sys.intern(service)
+        self.request  = request
+        self.response = response
+        self.error    = error
+
+    @property
+    def timestamp(self):
+        """Horodatage ISO 8601 (UTC, sans fuseau) comme l'ancien format."""
+        return (_EPOCH + datetime.timedelta(microseconds=self.ts_ns // 1000)).isoformat()
+
+    def to_dict(self):
+        """Forme JSON exposée par /loan/history."""
+        out = {"timestamp": self.timestamp, "service": self.service}
+        if self.request is not None:
+            out["request"] = self.request
+        if self.response is not None:
+            out["response"] = self.response
+        if self.error is not None:
+            out["error"] = self.error
+        return out
+
+    def to_record(self):
+        return [self.ts_ns, self.service, self.request, self.response, self.error]
+
+    @classmethod
+    def from_record(cls, record):
+        ts_ns, service, request, response, error = record
+        return cls(service, request, response, error, ts_ns=ts_ns)
+
+    def __repr__(self):
+        return f"HistoryStep({self.service!r}, ts_ns={self.ts_ns})"
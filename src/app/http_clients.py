@@ -0,0 +1,92 @@
+# src/app/http_clients.py
+"""
+Clients HTTP poolés vers les micro‑services aval (GraphQL, SOAP, REST).
+
+`requests.post(...)` ouvre une nouvelle connexion TCP à chaque appel.
+Chaque ServiceClient garde une `requests.Session` dont l'adaptateur
+conserve des connexions keep-alive, avec taille de pool, nouvelles
+tentatives et timeout réglables par service via l'environnement :
+
+    <PREFIXE>_POOL_SIZE   connexions keep-alive conservées   (défaut 10)
+    <PREFIXE>_RETRIES     tentatives sur erreur de connexion (défaut 2)
+    <PREFIXE>_TIMEOUT     timeout par appel en secondes      (défaut 5)
+
+où PREFIXE est celui de la variable d'URL (ex. MS_PROFILRISQUE).
+
+requests (et urllib3) ne sont importés qu'au premier appel : construire
+les clients au chargement de l'application reste quasi gratuit.
+"""
+import os
+import threading
+
+from common import tracing
+
+
+class ServiceClient:
+    """Session HTTP keep-alive dédiée à un micro‑service."""
+
+    def __init__(self, url, pool_size=10, retries=2, timeout=5.0):
+        self.url       = url
+        self.pool_size = pool_size
+        self.retries   = retries
+        self.timeout   = timeout
+        self._lock     = threading.Lock()
+        self._adapter  = None
+        self._session  = None
+
+    @property
+    def session(self):
+        """requests.Session du service, créée au premier usage."""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    from urllib3.util.retry import Retry
+
+                    # Seules les erreurs de connexion sont rejouées : la requête n'a alors
+                    # pas quitté la machine, ce qui reste sûr pour des POST non idempotents.
+                    retry = Retry(total=self.retries, connect=self.retries, read=0, status=0,
+                                  redirect=0, other=0, backoff_factor=0.1)
+                    self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size,
+                                                max_retries=retry)
+                    session = requests.Session()
+                    session.mount('http://', self._adapter)
+                    session.mount('https://', self._adapter)
+                    self._session = session
+        return self._session
+
+    @classmethod
+    def from_env(cls, prefix, url):
+        return cls(url,
+                   pool_size=int(os.getenv(f'{prefix}_POOL_SIZE', '10')),
+                   retries=int(os.getenv(f'{prefix}_RETRIES', '2')),
+                   timeout=float(os.getenv(f'{prefix}_TIMEOUT', '5')))
+
+    def post(self, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        # propagation du contexte de trace courant (en-tête traceparent)
+        kwargs['headers'] = tracing.inject(dict(kwargs.get('headers') or {}))
+        return self.session.post(self.url, **kwargs)
+
+    def stats(self):
+        """Connexions TCP ouvertes vs requêtes servies par une connexion réutilisée."""
+        opened = sent = 0
+        pools = self._adapter.poolmanager.pools if self._adapter is not None else {}
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+                sent   += pool.num_requests
+        return {
+            "url":                self.url,
+            "pool_size":          self.pool_size,
+            "timeout":            self.timeout,
+            "requests":           sent,
+            "connections_opened": opened,
+            "connections_reused": max(sent - opened, 0),
+        }
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
@@ -0,0 +1,857 @@
+# src/app/loan_store.py
+"""
+Stockage des demandes de prêt de l'orchestrateur.
+
+Interface commune `LoanStore` et trois backends :
+
+* MemoryLoanStore : dictionnaire protégé par un verrou (démo, tests) ;
+* SqliteLoanStore : SQLite embarqué en mode WAL, partageable entre processus
+  et persistant, avec index sur client_id, status et date de création ;
+* TieredLoanStore : mémoire bornée, les prêts terminés étant évincés (TTL
+  d'inactivité et LRU) vers un segment froid compressé sur disque, indexé
+  par SQLite et compacté au fil de l'eau.
+
+Une entrée est un dict {client_id, loan_amount, status, [verdict], history},
+où history est une liste de `history.HistoryStep`.
+Les écritures groupées passent par `with store.batch(): ...` : les put() du
+bloc sont écrits en une seule transaction à sa sortie.
+
+Recherche (GET /loans) : query() filtre par client, statut et fenêtre
+[since, until) de created_at, du plus récent au plus ancien, avec un curseur
+stable (created_at, request_id). Chaque backend s'appuie sur des index
+secondaires tenus à jour à chaque écriture (index SQLite, `LoanIndex` en
+mémoire) et sur des compteurs par statut précalculés (status_counts()).
+"""
+import os
+import json
+import time
+import zlib
+import base64
+import sqlite3
+import threading
+import heapq
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from itertools import islice
+
+from history import HistoryStep
+
+# Statuts définitifs : seules ces entrées peuvent quitter la mémoire
+FINAL_STATUSES = frozenset({'refused', 'done'})
+
+
+class LoanStore:
+    """Interface des backends de stockage des prêts."""
+
+    # True si plusieurs processus peuvent servir le même stockage
+    shared = False
+
+    def get(self, request_id):
+        """Entrée complète (historique inclus) ou None."""
+        raise NotImplementedError
+
+    def put(self, request_id, entry):
+        """Crée ou remplace une entrée (mise en tampon dans un batch())."""
+        if self._buffered(request_id, entry):
+            return
+        self.put_many([(request_id, entry)])
+
+    def put_many(self, items):
+        """Écrit plusieurs couples (request_id, entry) d'un coup."""
+        raise NotImplementedError
+
+    def update(self, request_id, **fields):
+        """Met à jour des champs ; renvoie False si l'ID est inconnu."""
+        raise NotImplementedError
+
+    def append_history(self, request_id, *steps):
+        """Ajoute des étapes à l'historique ; renvoie False si l'ID est inconnu."""
+        raise NotImplementedError
+
+    def history(self, request_id, after=0, limit=None):
+        """
+        Étapes d'indice >= `after` (au plus `limit`), None si l'ID est inconnu.
+        L'historique n'étant qu'ajouté, un indice est un curseur stable.
+        """
+        entry = self.get(request_id)
+        if entry is None:
+            return None
+        return _page(entry['history'], after, limit)
+
+    def count(self):
+        raise NotImplementedError
+
+    def query(self, client_id=None, status=None, since=None, until=None, limit=100, cursor=None):
+        """
+        Entrées (sans historique, avec leur request_id) filtrées par client,
+        statut et created_at dans [since, until), de la plus récente à la plus
+        ancienne ; au plus `limit`, après `cursor`. Renvoie (entrées, curseur
+        suivant ou None).
+        """
+        raise NotImplementedError
+
+    def status_counts(self):
+        """Nombre d'entrées par statut, sans parcours des entrées."""
+        raise NotImplementedError
+
+    def stats(self):
+        """Compteurs et jauges du backend."""
+        return {"backend": type(self).__name__, "entries": self.count()}
+
+    def close(self):
+        pass
+
+    @contextmanager
+    def batch(self):
+        """Regroupe les put() du bloc en une seule écriture (thread courant)."""
+        local = self._batch_local()
+        if getattr(local, 'items', None) is not None:
+            yield self  # bloc imbriqué : le bloc englobant écrira
+            return
+        local.items = []
+        try:
+            yield self
+            items, local.items = local.items, None
+            if items:
+                self.put_many(items)
+        finally:
+            local.items = None
+
+    def _batch_local(self):
+        if not hasattr(self, '_local'):
+            self._local = threading.local()
+        return self._local
+
+    def _buffered(self, request_id, entry):
+        """Met le put() en tampon si un batch() est ouvert sur ce thread."""
+        items = getattr(self._batch_local(), 'items', None)
+        if items is None:
+            return False
+        items.append((request_id, entry))
+        return True
+
+
+class LoanIndex:
+    """
+    Index secondaires en mémoire des backends memory et tiered : pour chaque
+    clé (toutes les entrées, client, statut, client et statut), une liste
+    triée de (created_at, request_id). Une requête n'utilise qu'une liste,
+    bornée par dichotomie : O(log n + limit). Non thread-safe (verrou du backend).
+    Le client est indexé en texte, comme la colonne client_id de SQLite : un
+    client_id entier est retrouvé par le paramètre ?client_id= de l'API.
+    """
+
+    def __init__(self):
+        self._lists  = {}
+        self._meta   = {}        # request_id -> (created_at, client_id, status)
+        self.counts  = Counter()
+
+    @staticmethod
+    def _keys(client_id, status):
+        client_id = _client_key(client_id)
+        return ((), ('client', client_id), ('status', status), ('client', client_id, status))
+
+    def add(self, request_id, created_at, client_id, status):
+        self.remove(request_id)
+        self._meta[request_id] = (created_at, client_id, status)
+        for key in self._keys(client_id, status):
+            insort(self._lists.setdefault(key, []), (created_at, request_id))
+        self.counts[status] += 1
+
+    def remove(self, request_id):
+        meta = self._meta.pop(request_id, None)
+        if meta is None:
+            return
+        created_at, client_id, status = meta
+        for key in self._keys(client_id, status):
+            entries = self._lists[key]
+            del entries[bisect_left(entries, (created_at, request_id))]
+            if not entries:
+                del self._lists[key]
+        self.counts[status] -= 1
+        if not self.counts[status]:
+            del self.counts[status]
+
+    def changed(self, request_id, fields):
+        """Réindexe après update() si le client ou le statut change."""
+        meta = self._meta.get(request_id)
+        if meta is None or ('status' not in fields and 'client_id' not in fields):
+            return
+        created_at, client_id, status = meta
+        client_id = fields.get('client_id', client_id)
+        status    = fields.get('status', status)
+        if (client_id, status) != meta[1:]:
+            self.add(request_id, created_at, client_id, status)
+
+    def query(self, client_id=None, status=None, since=None, until=None, limit=100, cursor=None):
+        """(request_ids du plus récent au plus ancien, curseur suivant ou None)."""
+        page = self.latest(client_id, status, since, until, limit + 1, cursor)
+        next_cursor = page[limit - 1] if len(page) > limit else None
+        return [request_id for _, request_id in page[:limit]], next_cursor
+
+    def latest(self, client_id=None, status=None, since=None, until=None, limit=100, cursor=None):
+        """Au plus `limit` (created_at, request_id), du plus récent au plus ancien."""
+        client_id = _client_key(client_id)
+        if client_id is not None and status is not None:
+            key = ('client', client_id, status)
+        elif client_id is not None:
+            key = ('client', client_id)
+        elif status is not None:
+            key = ('status', status)
+        else:
+            key = ()
+        entries = self._lists.get(key, [])
+        lo = 0 if since is None else bisect_left(entries, (since,))
+        hi = len(entries) if until is None else bisect_left(entries, (until,))
+        if cursor is not None:
+            hi = min(hi, bisect_left(entries, tuple(cursor)))
+        return entries[max(lo, hi - limit):hi][::-1]
+
+    def clear(self):
+        self._lists.clear()
+        self._meta.clear()
+        self.counts.clear()
+
+
+def _client_key(client_id):
+    """client_id tel qu'indexé et filtré par tous les backends (texte, None conservé)."""
+    return None if client_id is None else str(client_id)
+
+
+def _where(client_id, status, since, until, cursor):
+    """Clause WHERE (et paramètres) des requêtes SQL sur client, statut, dates et curseur."""
+    clauses, params = [], []
+    for column, value in (('client_id', _client_key(client_id)), ('status', status)):
+        if value is not None:
+            clauses.append(f'{column} = ?')
+            params.append(value)
+    if since is not None:
+        clauses.append('created_at >= ?')
+        params.append(since)
+    if until is not None:
+        clauses.append('created_at < ?')
+        params.append(until)
+    if cursor is not None:
+        clauses.append('(created_at, request_id) < (?, ?)')
+        params.extend(cursor)
+    return ('WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+
+def _summary(request_id, entry):
+    """Entrée renvoyée par query() : sans historique, avec son request_id."""
+    return dict({k: v for k, v in entry.items() if k != 'history'}, request_id=request_id)
+
+
+def encode_cursor(cursor):
+    """Curseur (created_at, request_id) → jeton opaque pour l'API."""
+    raw = json.dumps(list(cursor), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Jeton opaque → curseur ; ValueError si le jeton est invalide."""
+    try:
+        created_at, request_id = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return float(created_at), str(request_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as exc:
+        raise ValueError(f"Curseur invalide : {token}") from exc
+
+
+class MemoryLoanStore(LoanStore):
+    """Backend en mémoire, limité au processus courant."""
+
+    def __init__(self):
+        self._lock  = threading.Lock()
+        self._loans = {}
+        self._index = LoanIndex()
+
+    def get(self, request_id):
+        with self._lock:
+            entry = self._loans.get(request_id)
+            return dict(entry, history=list(entry['history'])) if entry else None
+
+    def put_many(self, items):
+        now = time.time()
+        with self._lock:
+            for request_id, entry in items:
+                stored = dict(entry, history=list(entry.get('history', [])))
+                stored.setdefault('created_at', now)
+                self._loans[request_id] = stored
+                self._index.add(request_id, stored['created_at'], stored.get('client_id'),
+                                stored['status'])
+
+    def update(self, request_id, **fields):
+        with self._lock:
+            entry = self._loans.get(request_id)
+            if entry is None:
+                return False
+            entry.update(fields)
+            self._index.changed(request_id, fields)
+            return True
+
+    def append_history(self, request_id, *steps):
+        with self._lock:
+            entry = self._loans.get(request_id)
+            if entry is None:
+                return False
+            entry['history'].extend(steps)
+            return True
+
+    def history(self, request_id, after=0, limit=None):
+        with self._lock:
+            entry = self._loans.get(request_id)
+            return None if entry is None else _page(entry['history'], after, limit)
+
+    def count(self):
+        with self._lock:
+            return len(self._loans)
+
+    def query(self, client_id=None, status=None, since=None, until=None, limit=100, cursor=None):
+        with self._lock:
+            ids, next_cursor = self._index.query(client_id, status, since, until, limit, cursor)
+            return [_summary(i, self._loans[i]) for i in ids], next_cursor
+
+    def status_counts(self):
+        with self._lock:
+            return dict(self._index.counts)
+
+    def clear(self):
+        with self._lock:
+            self._loans.clear()
+            self._index.clear()
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS loans (
+    request_id TEXT PRIMARY KEY,
+    client_id  TEXT,
+    status     TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    data       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS loans_client_idx  ON loans (client_id, created_at);
+CREATE INDEX IF NOT EXISTS loans_status_idx  ON loans (status, created_at);
+CREATE INDEX IF NOT EXISTS loans_created_idx ON loans (created_at);
+CREATE INDEX IF NOT EXISTS loans_client_status_idx ON loans (client_id, status, created_at);
+CREATE TABLE IF NOT EXISTS loan_history (
+    request_id TEXT NOT NULL,
+    seq        INTEGER NOT NULL,
+    step       TEXT NOT NULL,
+    PRIMARY KEY (request_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS loan_counts (
+    status TEXT PRIMARY KEY,
+    n      INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS loans_count_insert AFTER INSERT ON loans BEGIN
+    INSERT INTO loan_counts VALUES (NEW.status, 1)
+        ON CONFLICT (status) DO UPDATE SET n = n + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS loans_count_delete AFTER DELETE ON loans BEGIN
+    UPDATE loan_counts SET n = n - 1 WHERE status = OLD.status;
+END;
+CREATE TRIGGER IF NOT EXISTS loans_count_update AFTER UPDATE OF status ON loans
+WHEN OLD.status IS NOT NEW.status BEGIN
+    UPDATE loan_counts SET n = n - 1 WHERE status = OLD.status;
+    INSERT INTO loan_counts VALUES (NEW.status, 1)
+        ON CONFLICT (status) DO UPDATE SET n = n + 1;
+END;
+"""
+
+
+class SqliteLoanStore(LoanStore):
+    """
+    Backend SQLite (WAL) : les lectures ne bloquent pas les écritures et
+    plusieurs processus peuvent partager le même fichier. L'historique est
+    une table à part, de sorte qu'ajouter une étape ne réécrit pas l'entrée.
+    Les compteurs par statut (loan_counts) sont tenus par des triggers.
+    """
+
+    shared = True
+
+    def __init__(self, path):
+        self.path   = path
+        self._conns = threading.local()
+        self._all   = []
+        self._lock  = threading.Lock()
+        conn = self._conn()
+        counted = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'loan_counts'").fetchone()
+        conn.executescript(_SCHEMA)
+        if counted is None:
+            # base antérieure aux compteurs : initialisation par un parcours unique
+            with self._write() as conn:
+                conn.execute('DELETE FROM loan_counts')
+                conn.execute('INSERT INTO loan_counts SELECT status, COUNT(*) FROM loans GROUP BY status')
+
+    def _conn(self):
+        conn = getattr(self._conns, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            # INSERT OR REPLACE déclenche alors le trigger de suppression (compteurs)
+            conn.execute('PRAGMA recursive_triggers=ON')
+            self._conns.conn = conn
+            with self._lock:
+                self._all.append(conn)
+        return conn
+
+    @contextmanager
+    def _write(self):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def get(self, request_id):
+        conn = self._conn()
+        row = conn.execute('SELECT data FROM loans WHERE request_id = ?',
+                           (request_id,)).fetchone()
+        if row is None:
+            return None
+        entry = json.loads(row[0])
+        entry['history'] = [_decode_step(step) for (step,) in conn.execute(
+            'SELECT step FROM loan_history WHERE request_id = ? ORDER BY seq',
+            (request_id,))]
+        return entry
+
+    def history(self, request_id, after=0, limit=None):
+        conn = self._conn()
+        if conn.execute('SELECT 1 FROM loans WHERE request_id = ?',
+                        (request_id,)).fetchone() is None:
+            return None
+        return [_decode_step(step) for (step,) in conn.execute(
+            'SELECT step FROM loan_history WHERE request_id = ? AND seq >= ? '
+            'ORDER BY seq LIMIT ?',
+            (request_id, after, -1 if limit is None else limit))]
+
+    def put_many(self, items):
+        now = time.time()
+        rows, steps, ids = [], [], []
+        for request_id, entry in items:
+            data = {k: v for k, v in entry.items() if k != 'history'}
+            data.setdefault('created_at', now)
+            rows.append((request_id, data.get('client_id'), data['status'],
+                         data['created_at'], json.dumps(data)))
+            steps.extend((request_id, seq, _encode_step(step))
+                         for seq, step in enumerate(entry.get('history', [])))
+            ids.append((request_id,))
+        with self._write() as conn:
+            conn.executemany('DELETE FROM loan_history WHERE request_id = ?', ids)
+            conn.executemany('INSERT OR REPLACE INTO loans VALUES (?, ?, ?, ?, ?)', rows)
+            conn.executemany('INSERT INTO loan_history VALUES (?, ?, ?)', steps)
+
+    def update(self, request_id, **fields):
+        with self._write() as conn:
+            row = conn.execute('SELECT data FROM loans WHERE request_id = ?',
+                               (request_id,)).fetchone()
+            if row is None:
+                return False
+            data = json.loads(row[0])
+            data.update(fields)
+            conn.execute('UPDATE loans SET client_id = ?, status = ?, data = ? '
+                         'WHERE request_id = ?',
+                         (data.get('client_id'), data['status'], json.dumps(data), request_id))
+            return True
+
+    def append_history(self, request_id, *steps):
+        with self._write() as conn:
+            if conn.execute('SELECT 1 FROM loans WHERE request_id = ?',
+                            (request_id,)).fetchone() is None:
+                return False
+            (last,) = conn.execute('SELECT COALESCE(MAX(seq), -1) FROM loan_history '
+                                   'WHERE request_id = ?', (request_id,)).fetchone()
+            conn.executemany('INSERT INTO loan_history VALUES (?, ?, ?)',
+                             [(request_id, last + 1 + i, _encode_step(step))
+                              for i, step in enumerate(steps)])
+            return True
+
+    def count(self):
+        return self._conn().execute('SELECT COALESCE(SUM(n), 0) FROM loan_counts').fetchone()[0]
+
+    def query(self, client_id=None, status=None, since=None, until=None, limit=100, cursor=None):
+        where, params = _where(client_id, status, since, until, cursor)
+        # une ligne de plus que demandé pour savoir s'il reste une page
+        rows = self._conn().execute(
+            f'SELECT request_id, created_at, data FROM loans {where} '
+            f'ORDER BY created_at DESC, request_id DESC LIMIT ?', params + [limit + 1]).fetchall()
+        next_cursor = (rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+        return [_summary(request_id, json.loads(data))
+                for request_id, _, data in rows[:limit]], next_cursor
+
+    def status_counts(self):
+        return dict(self._conn().execute('SELECT status, n FROM loan_counts WHERE n > 0'))
+
+    def close(self):
+        with self._lock:
+            conns, self._all = self._all, []
+        for conn in conns:
+            conn.close()
+        self._conns = threading.local()
+
+
+_COLD_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cold (
+    request_id TEXT PRIMARY KEY,
+    offset     INTEGER NOT NULL,
+    length     INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    client_id  TEXT,
+    status     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cold_client_idx  ON cold (client_id, created_at);
+CREATE INDEX IF NOT EXISTS cold_status_idx  ON cold (status, created_at);
+CREATE INDEX IF NOT EXISTS cold_created_idx ON cold (created_at);
+CREATE INDEX IF NOT EXISTS cold_client_status_idx ON cold (client_id, status, created_at);
+CREATE TABLE IF NOT EXISTS cold_generation (n INTEGER NOT NULL);
+"""
+
+
+class ColdSegment:
+    """
+    Segment froid append-only : un enregistrement JSON compressé (zlib) par
+    prêt évincé. L'index (emplacement, created_at, client, statut) est une
+    base SQLite `<chemin>.idx` : rien n'est gardé en mémoire par entrée, et
+    les requêtes sur les prêts froids passent par ses index secondaires.
+
+    Un enregistrement remplacé ou ramené en mémoire reste dans le fichier ;
+    quand celui-ci dépasse `compact_ratio` fois le volume vivant (et au moins
+    `compact_min` octets), compact() recopie les seuls enregistrements vivants
+    dans le fichier de la génération suivante. Les nouveaux emplacements et
+    le numéro de génération sont validés dans une même transaction : un arrêt
+    en cours de compaction laisse le segment précédent intact.
+    """
+
+    def __init__(self, path, compact_ratio=2.0, compact_min=1 << 20):
+        self.path          = path
+        self.compact_ratio = compact_ratio
+        self.compact_min   = compact_min
+        self.compactions   = 0
+        self._conn = sqlite3.connect(path + '.idx', isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_COLD_SCHEMA)
+        row = self._conn.execute('SELECT n FROM cold_generation').fetchone()
+        if row is None:
+            self._conn.execute('INSERT INTO cold_generation VALUES (0)')
+        self._generation = row[0] if row else 0
+        if self._generation:
+            # fichier de la génération précédente, si l'arrêt a suivi la validation
+            self._remove(self._data_path(self._generation - 1))
+        self._data = open(self._data_path(self._generation), 'ab+')
+        self._count, self._live_bytes = self._conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(length), 0) FROM cold').fetchone()
+        self.counts = Counter(dict(self._conn.execute(
+            'SELECT status, COUNT(*) FROM cold GROUP BY status')))
+
+    def _data_path(self, generation):
+        return self.path if generation == 0 else f'{self.path}.{generation}'
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def __contains__(self, request_id):
+        return self._conn.execute('SELECT 1 FROM cold WHERE request_id = ?',
+                                  (request_id,)).fetchone() is not None
+
+    def __len__(self):
+        return self._count
+
+    def write(self, request_id, entry):
+        record = dict(entry, history=[step.to_record() for step in entry['history']])
+        blob = zlib.compress(json.dumps(record).encode('utf-8'))
+        self.discard(request_id)
+        self._data.seek(0, os.SEEK_END)
+        offset = self._data.tell()
+        self._data.write(blob)
+        self._data.flush()
+        self._conn.execute('INSERT INTO cold VALUES (?, ?, ?, ?, ?, ?)',
+                           (request_id, offset, len(blob), entry['created_at'],
+                            _client_key(entry.get('client_id')), entry['status']))
+        self._count += 1
+        self._live_bytes += len(blob)
+        self.counts[entry['status']] += 1
+        self._maybe_compact()
+
+    def read(self, request_id):
+        loc = self._conn.execute('SELECT offset, length FROM cold WHERE request_id = ?',
+                                 (request_id,)).fetchone()
+        if loc is None:
+            return None
+        offset, length = loc
+        blob  = os.pread(self._data.fileno(), length, offset)
+        entry = json.loads(zlib.decompress(blob))
+        entry['history'] = [HistoryStep.from_record(r) for r in entry['history']]
+        return entry
+
+    def latest(self, client_id=None, status=None, since=None, until=None, limit=100, cursor=None):
+        """Au plus `limit` (created_at, request_id), du plus récent au plus ancien."""
+        where, params = _where(client_id, status, since, until, cursor)
+        return self._conn.execute(
+            f'SELECT created_at, request_id FROM cold {where} '
+            f'ORDER BY created_at DESC, request_id DESC LIMIT ?', params + [limit]).fetchall()
+
+    def discard(self, request_id):
+        row = self._conn.execute('SELECT length, status FROM cold WHERE request_id = ?',
+                                 (request_id,)).fetchone()
+        if row is None:
+            return
+        self._conn.execute('DELETE FROM cold WHERE request_id = ?', (request_id,))
+        length, status = row
+        self._count -= 1
+        self._live_bytes -= length
+        self.counts[status] -= 1
+        if not self.counts[status]:
+            del self.counts[status]
+
+    def _maybe_compact(self):
+        size = self.size_bytes()
+        if size >= self.compact_min and size > self.compact_ratio * self._live_bytes:
+            self.compact()
+
+    def compact(self):
+        """Recopie les enregistrements vivants dans un nouveau fichier ; renvoie sa taille."""
+        generation = self._generation + 1
+        path = self._data_path(generation)
+        src, offset, last = self._data.fileno(), 0, ''
+        with open(path, 'wb') as out:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                while True:
+                    # par tranches, dans l'ordre de la clé : mémoire bornée
+                    rows = self._conn.execute(
+                        'SELECT request_id, offset, length FROM cold WHERE request_id > ? '
+                        'ORDER BY request_id LIMIT 1000', (last,)).fetchall()
+                    if not rows:
+                        break
+                    moved = []
+                    for request_id, old, length in rows:
+                        out.write(os.pread(src, length, old))
+                        moved.append((offset, request_id))
+                        offset += length
+                    self._conn.executemany('UPDATE cold SET offset = ? WHERE request_id = ?', moved)
+                    last = rows[-1][0]
+                out.flush()
+                os.fsync(out.fileno())
+                self._conn.execute('UPDATE cold_generation SET n = ?', (generation,))
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                self._remove(path)
+                raise
+            self._conn.execute('COMMIT')
+        self._data.close()
+        self._remove(self._data_path(self._generation))
+        self._generation = generation
+        self._data = open(path, 'ab+')
+        self.compactions += 1
+        return offset
+
+    def size_bytes(self):
+        return os.fstat(self._data.fileno()).st_size
+
+    def close(self):
+        self._data.close()
+        self._conn.close()
+
+
+class TieredLoanStore(LoanStore):
+    """
+    Mémoire bornée à deux niveaux. Les prêts en cours restent en mémoire ;
+    les prêts terminés (refused, done) sont évincés vers le segment froid
+    lorsqu'ils sont inactifs depuis `ttl` secondes ou, au-delà de `max_hot`
+    entrées en mémoire, dans l'ordre LRU. get() relit le segment froid de
+    façon transparente ; update()/append_history() y ramènent l'entrée.
+    Le `LoanIndex` ne couvre que les entrées en mémoire : query() fusionne
+    ses résultats avec ceux de l'index SQLite du segment froid.
+    """
+
+    def __init__(self, cold_path, max_hot=10000, ttl=300.0, sweep_interval=1.0,
+                 compact_ratio=2.0, compact_min=1 << 20):
+        self.max_hot        = max_hot
+        self.ttl            = ttl
+        self.sweep_interval = sweep_interval
+        self._lock      = threading.Lock()
+        self._hot       = {}
+        self._finished  = OrderedDict()   # request_id -> dernier accès, ordre LRU
+        self._cold      = ColdSegment(cold_path, compact_ratio, compact_min)
+        self._index     = LoanIndex()
+        self._last_sweep = 0.0
+        self._counters  = {"evictions_ttl": 0, "evictions_lru": 0,
+                           "cold_reads": 0, "promotions": 0}
+
+    def _touch(self, request_id, entry, now):
+        if entry['status'] in FINAL_STATUSES:
+            self._finished[request_id] = now
+            self._finished.move_to_end(request_id)
+        else:
+            self._finished.pop(request_id, None)
+
+    def _evict(self, request_id, reason):
+        del self._finished[request_id]
+        self._index.remove(request_id)
+        self._cold.write(request_id, self._hot.pop(request_id))
+        self._counters[reason] += 1
+
+    def _maybe_evict(self, now):
+        """Évictions TTL (au plus toutes les sweep_interval s) puis LRU."""
+        if now - self._last_sweep >= self.sweep_interval:
+            self._last_sweep = now
+            deadline = now - self.ttl
+            while self._finished:
+                request_id, last_access = next(iter(self._finished.items()))
+                if last_access > deadline:
+                    break
+                self._evict(request_id, "evictions_ttl")
+        while len(self._hot) > self.max_hot and self._finished:
+            self._evict(next(iter(self._finished)), "evictions_lru")
+
+    def _promote(self, request_id):
+        """Ramène une entrée froide en mémoire avant de la modifier."""
+        entry = self._cold.read(request_id)
+        if entry is not None:
+            self._cold.discard(request_id)
+            self._hot[request_id] = entry
+            self._index.add(request_id, entry['created_at'], entry.get('client_id'), entry['status'])
+            self._counters["promotions"] += 1
+        return entry
+
+    def get(self, request_id):
+        now = time.time()
+        with self._lock:
+            entry = self._hot.get(request_id)
+            if entry is not None:
+                self._touch(request_id, entry, now)
+                return dict(entry, history=list(entry['history']))
+            if request_id not in self._cold:
+                return None
+            self._counters["cold_reads"] += 1
+            return self._cold.read(request_id)
+
+    def put_many(self, items):
+        now = time.time()
+        with self._lock:
+            for request_id, entry in items:
+                stored = dict(entry, history=list(entry.get('history', [])))
+                stored.setdefault('created_at', now)
+                self._cold.discard(request_id)
+                self._hot[request_id] = stored
+                self._touch(request_id, stored, now)
+                self._index.add(request_id, stored['created_at'], stored.get('client_id'),
+                                stored['status'])
+            self._maybe_evict(now)
+
+    def update(self, request_id, **fields):
+        now = time.time()
+        with self._lock:
+            entry = self._hot.get(request_id) or self._promote(request_id)
+            if entry is None:
+                return False
+            entry.update(fields)
+            self._index.changed(request_id, fields)
+            self._touch(request_id, entry, now)
+            self._maybe_evict(now)
+            return True
+
+    def append_history(self, request_id, *steps):
+        now = time.time()
+        with self._lock:
+            entry = self._hot.get(request_id) or self._promote(request_id)
+            if entry is None:
+                return False
+            entry['history'].extend(steps)
+            self._touch(request_id, entry, now)
+            self._maybe_evict(now)
+            return True
+
+    def history(self, request_id, after=0, limit=None):
+        with self._lock:
+            entry = self._hot.get(request_id)
+            if entry is not None:
+                return _page(entry['history'], after, limit)
+        return super().history(request_id, after, limit)
+
+    def count(self):
+        with self._lock:
+            return len(self._hot) + len(self._cold)
+
+    def query(self, client_id=None, status=None, since=None, until=None, limit=100, cursor=None):
+        with self._lock:
+            page = list(islice(heapq.merge(
+                self._index.latest(client_id, status, since, until, limit + 1, cursor),
+                self._cold.latest(client_id, status, since, until, limit + 1, cursor),
+                reverse=True), limit + 1))
+            next_cursor = page[limit - 1] if len(page) > limit else None
+            items = []
+            for _, request_id in page[:limit]:
+                entry = self._hot.get(request_id)
+                if entry is None:
+                    self._counters["cold_reads"] += 1
+                    entry = self._cold.read(request_id)
+                items.append(_summary(request_id, entry))
+            return items, next_cursor
+
+    def status_counts(self):
+        with self._lock:
+            return dict(self._index.counts + self._cold.counts)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters,
+                        compactions=self._cold.compactions,
+                        backend=type(self).__name__,
+                        entries=len(self._hot) + len(self._cold),
+                        hot_entries=len(self._hot),
+                        hot_finished=len(self._finished),
+                        hot_history_steps=sum(len(e['history']) for e in self._hot.values()),
+                        cold_entries=len(self._cold),
+                        cold_bytes=self._cold.size_bytes(),
+                        rss_bytes=_rss_bytes())
+
+    def close(self):
+        with self._lock:
+            self._cold.close()
+
+
+def _page(steps, after, limit):
+    return steps[after:] if limit is None else steps[after:after + limit]
+
+
+def _encode_step(step):
+    return json.dumps(step.to_record())
+
+
+def _decode_step(raw):
+    return HistoryStep.from_record(json.loads(raw))
+
+
+def _rss_bytes():
+    """Mémoire résidente du processus (Linux), None si indisponible."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def from_env():
+    """Backend choisi par LOAN_STORE (memory | sqlite | tiered) et ses variables."""
+    kind = os.getenv('LOAN_STORE', 'memory')
+    if kind == 'memory':
+        return MemoryLoanStore()
+    if kind == 'sqlite':
+        return SqliteLoanStore(os.getenv('LOAN_STORE_PATH', 'loans.db'))
+    if kind == 'tiered':
+        return TieredLoanStore(os.getenv('LOAN_COLD_PATH', 'loans.cold'),
+                               max_hot=int(os.getenv('LOAN_HOT_MAX', '10000')),
+                               ttl=float(os.getenv('LOAN_HOT_TTL', '300')))
+    raise ValueError(f"LOAN_STORE inconnu : {kind}")
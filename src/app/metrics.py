@@ -0,0 +1,84 @@
+# src/app/metrics.py
+"""
+Métriques Prometheus de l'orchestrateur, exposées sur /metrics.
+
+* loan_stage_duration_seconds{stage} : latence de chaque étape du workflow
+  (montantmax, risk, submit, callback, fund_transfer, variantes *_batch) et
+  de la requête complète (loan) ;
+* loan_requests_in_flight{endpoint} : requêtes en cours ;
+* loan_errors_total{reason} / loan_outcomes_total{status} ;
+* loan_store_entries : taille de `_loans`, lue au moment du scrape ;
+* transfer_queue_depth / transfer_queue_oldest_age_seconds : transferts de
+  fonds en attente et âge du plus ancien, lus au moment du scrape ;
+* transfer_attempts_total{outcome} : tentatives de transfert (success, retry, failed) ;
+* loan_status_waiters : attentes de statut en cours (long-poll, SSE) ;
+* loan_shed_total{reason,traffic} : requêtes délestées par le contrôle
+  d'admission (overload, rate_limit ; submit, priority) et
+  admission_in_flight : requêtes admises en cours.
+
+En multi-processus (cf. common/serving.py), compteurs, histogrammes et
+requêtes en cours sont agrégés sur tous les workers ; les jauges lues au
+moment du scrape viennent du worker qui répond : exactes pour les bases
+partagées (stockage, file de transferts), propres à ce worker pour
+loan_status_waiters et admission_in_flight.
+
+Les séries étiquetées sont résolues une fois pour toutes (STAGES, IN_FLIGHT) :
+sur le chemin critique, un enregistrement se réduit à une mesure d'horloge et
+à une addition sous verrou.
+"""
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+from common.metrics import CallbackGauge, exposition
+
+REGISTRY = CollectorRegistry()
+
+# de 1 ms à 10 s : appels locaux rapides comme timeouts aval
+BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+STAGE_NAMES = ('loan', 'montantmax', 'risk', 'submit', 'callback', 'fund_transfer',
+               'loan_batch', 'montantmax_batch', 'risk_batch', 'submit_batch')
+ENDPOINTS   = ('loan', 'loan_batch', 'loan_callback')
+
+_stage_latency = Histogram('loan_stage_duration_seconds',
+                           "Durée des étapes du workflow de prêt", ['stage'],
+                           buckets=BUCKETS, registry=REGISTRY)
+_in_flight = Gauge('loan_requests_in_flight', "Requêtes en cours de traitement",
+                   ['endpoint'], multiprocess_mode='livesum', registry=REGISTRY)
+_errors   = Counter('loan_errors', "Erreurs du workflow par motif", ['reason'],
+                    registry=REGISTRY)
+_outcomes = Counter('loan_outcomes', "Issues des demandes de prêt", ['status'],
+                    registry=REGISTRY)
+store_entries = CallbackGauge('loan_store_entries', "Demandes de prêt conservées dans _loans",
+                              registry=REGISTRY)
+transfer_depth = CallbackGauge('transfer_queue_depth', "Transferts de fonds en attente",
+                               registry=REGISTRY)
+transfer_age   = CallbackGauge('transfer_queue_oldest_age_seconds',
+                               "Âge du plus ancien transfert de fonds en attente", registry=REGISTRY)
+status_waiters = CallbackGauge('loan_status_waiters', "Attentes de statut en cours (long-poll, SSE)",
+                               registry=REGISTRY)
+admission_in_flight = CallbackGauge('admission_in_flight', "Requêtes admises en cours de traitement",
+                                    registry=REGISTRY)
+_shed = Counter('loan_shed', "Requêtes délestées par le contrôle d'admission",
+                ['reason', 'traffic'], registry=REGISTRY)
+_transfer_attempts = Counter('transfer_attempts', "Tentatives de transfert de fonds par issue",
+                             ['outcome'], registry=REGISTRY)
+
+STAGES    = {name: _stage_latency.labels(name) for name in STAGE_NAMES}
+IN_FLIGHT = {name: _in_flight.labels(name) for name in ENDPOINTS}
+OUTCOMES  = {name: _outcomes.labels(name) for name in ('pending', 'refused', 'error')}
+SHED      = {(reason, traffic): _shed.labels(reason, traffic)
+             for reason in ('overload', 'rate_limit') for traffic in ('submit', 'priority')}
+TRANSFERS = {name: _transfer_attempts.labels(name) for name in ('success', 'retry', 'failed')}
+
+
+def stage(name):
+    """Context manager (ou décorateur) chronométrant l'étape `name`."""
+    return STAGES[name].time()
+
+
+def error(reason):
+    _errors.labels(reason).inc()
+
+
+def render():
+    """(corps, content-type) au format texte Prometheus."""
+    return exposition(REGISTRY)
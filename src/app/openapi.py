@@ -0,0 +1,88 @@
+# src/app/openapi.py
+"""
+Documentation OpenAPI de l'orchestrateur.
+
+SWAGGER_MODE :
+* dynamic : Flasgger analyse les docstrings YAML des endpoints (comportement
+            historique, pratique en développement) ;
+* static  : la spec pré-générée OPENAPI_SPEC_PATH est servie telle quelle
+            depuis la mémoire (ETag, Cache-Control) ; Flasgger n'est pas importé ;
+* off     : pas de documentation.
+
+Génération au build (cf. Dockerfile) :
+
+    SWAGGER_MODE=dynamic python openapi.py openapi.json
+"""
+import hashlib
+import json
+import os
+import sys
+
+# mêmes URL que Flasgger, pour que les deux modes soient interchangeables
+SPEC_ROUTE = '/apispec_1.json'
+UI_ROUTE   = '/apidocs/'
+
+MODES = ('dynamic', 'static', 'off')
+
+_UI_PAGE = '''<!DOCTYPE html>
+<html>
+<head>
+  <meta charset="utf-8">
+  <title>{title}</title>
+  <link rel="stylesheet" href="https://unpkg.com/swagger-ui-dist@5/swagger-ui.css">
+</head>
+<body>
+  <div id="swagger-ui"></div>
+  <script src="https://unpkg.com/swagger-ui-dist@5/swagger-ui-bundle.js"></script>
+  <script>SwaggerUIBundle({{url: "{spec}", dom_id: "#swagger-ui"}});</script>
+</body>
+</html>
+'''
+
+
+def init_app(app, template, mode='dynamic', spec_path='openapi.json'):
+    """Installe la documentation selon `mode` ; renvoie l'objet Swagger en mode dynamic."""
+    if mode not in MODES:
+        raise ValueError(f"SWAGGER_MODE inconnu : {mode}")
+    if mode == 'dynamic':
+        from flasgger import Swagger
+        return Swagger(app, template=template)
+    if mode == 'static':
+        _register_static(app, spec_path, template["info"]["title"])
+    return None
+
+
+def _register_static(app, spec_path, title):
+    from flask import Response, request
+
+    with open(spec_path, 'rb') as fh:
+        body = fh.read()
+    etag = hashlib.sha1(body).hexdigest()
+    page = _UI_PAGE.format(title=title, spec=SPEC_ROUTE)
+
+    def apispec():
+        if etag in request.if_none_match:
+            return Response(status=304, headers={'ETag': f'"{etag}"'})
+        return Response(body, status=200, mimetype='application/json',
+                        headers={'ETag': f'"{etag}"', 'Cache-Control': 'public, max-age=3600'})
+
+    def apidocs():
+        return Response(page, status=200, mimetype='text/html')
+
+    app.add_url_rule(SPEC_ROUTE, 'apispec_1', apispec, methods=['GET'])
+    app.add_url_rule(UI_ROUTE, 'apidocs', apidocs, methods=['GET'])
+
+
+def build_spec(swagger):
+    """Spec complète telle que Flasgger la sert sur SPEC_ROUTE."""
+    with swagger.app.test_request_context():
+        return swagger.get_apispecs('apispec_1')
+
+
+if __name__ == '__main__':
+    os.environ['SWAGGER_MODE'] = 'dynamic'
+    import app as application
+    output = sys.argv[1] if len(sys.argv) > 1 else 'openapi.json'
+    with open(output, 'w', encoding='utf-8') as fh:
+        json.dump(build_spec(application.swagger), fh, ensure_ascii=False, indent=1, sort_keys=True)
+    print(f"Spec OpenAPI écrite dans {output}")
@@ -0,0 +1,267 @@
+# src/app/resilience.py
+"""
+Couche de résilience autour des appels aux micro‑services.
+
+Pour chaque service aval, un `Downstream` combine :
+
+* un disjoncteur (closed → open après N échecs consécutifs → half_open
+  après `reset_timeout` s, un appel d'essai décidant de la suite) ; tant
+  qu'il est ouvert, les appels échouent immédiatement (CircuitOpenError) ;
+* un timeout adaptatif, dérivé du p99 des latences observées ; un appel qui
+  dépasse son délai est échantillonné à sa durée, les latences sont oubliées
+  à l'ouverture du disjoncteur et l'appel d'essai dispose de `max_timeout` :
+  un service devenu plus lent que le délai appris peut refermer le disjoncteur ;
+* en option, des requêtes couvertes (hedging) pour les lectures
+  idempotentes : si la réponse tarde au-delà du p95, une seconde requête
+  identique est lancée et la première réponse reçue l'emporte.
+"""
+import time
+import threading
+import contextvars
+from concurrent import futures
+
+
+def check_status(resp):
+    """Une réponse HTTP 5xx compte comme un échec pour le disjoncteur (IOError)."""
+    if resp.status_code >= 500:
+        raise IOError(f"Réponse HTTP {resp.status_code}")
+    return resp
+
+
+class CircuitOpenError(Exception):
+    """Appel refusé sans tentative : le disjoncteur du service est ouvert."""
+
+    def __init__(self, service, retry_after):
+        super().__init__(f"Disjoncteur ouvert pour {service}")
+        self.service     = service
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout     = reset_timeout
+        self._lock      = threading.Lock()
+        self._state     = 'closed'
+        self._failures  = 0
+        self._opened_at = 0.0
+        self._trial     = False
+        self.rejected   = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now):
+        if self._state == 'open' and now - self._opened_at >= self.reset_timeout:
+            self._state = 'half_open'
+            self._trial = False
+        return self._state
+
+    def allow(self):
+        """True si un appel peut partir ; en half_open, un seul appel d'essai à la fois."""
+        return self.admit() is not None
+
+    def admit(self):
+        """Comme allow() : 'closed', 'half_open' (appel d'essai) ou None si l'appel est refusé."""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == 'closed':
+                return state
+            if state == 'half_open' and not self._trial:
+                self._trial = True
+                return state
+            self.rejected += 1
+            return None
+
+    def retry_after(self):
+        with self._lock:
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self._state    = 'closed'
+            self._failures = 0
+            self._trial    = False
+
+    def release_trial(self):
+        """Libère l'appel d'essai sans verdict (appel annulé) : un autre essai pourra partir."""
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == 'half_open' or self._failures >= self.failure_threshold:
+                self._state     = 'open'
+                self._opened_at = time.monotonic()
+                self._trial     = False
+
+    def stats(self):
+        with self._lock:
+            return {"state": self._current_state(time.monotonic()),
+                    "consecutive_failures": self._failures,
+                    "rejected": self.rejected}
+
+
+class LatencyTracker:
+    """Fenêtre glissante des dernières latences (s) et quantiles associés."""
+
+    def __init__(self, window=256):
+        self._lock    = threading.Lock()
+        self._samples = [0.0] * window
+        self._count   = 0
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples[self._count % len(self._samples)] = seconds
+            self._count += 1
+
+    def quantile(self, q):
+        with self._lock:
+            n = min(self._count, len(self._samples))
+            if n == 0:
+                return None
+            ordered = sorted(self._samples[:n])
+        return ordered[min(n - 1, int(q * n))]
+
+    @property
+    def samples(self):
+        return min(self._count, len(self._samples))
+
+    def clear(self):
+        with self._lock:
+            self._count = 0
+
+
+class Downstream:
+    """Disjoncteur + timeout adaptatif (+ hedging optionnel) pour un service."""
+
+    # Exécuteur partagé des requêtes couvertes
+    _executor = futures.ThreadPoolExecutor(max_workers=16, thread_name_prefix='hedge')
+
+    def __init__(self, name, breaker=None, default_timeout=5.0, min_timeout=0.2,
+                 max_timeout=5.0, timeout_factor=2.0, min_samples=20, hedge=False):
+        self.name            = name
+        self.breaker         = breaker or CircuitBreaker()
+        self.latency         = LatencyTracker()
+        self.default_timeout = default_timeout
+        self.min_timeout     = min_timeout
+        self.max_timeout     = max_timeout
+        self.timeout_factor  = timeout_factor
+        self.min_samples     = min_samples
+        self.hedge           = hedge
+        self.hedges     = 0
+        self.hedge_wins = 0
+
+    def timeout(self):
+        """p99 observé × facteur, borné ; timeout par défaut tant que l'échantillon est trop petit."""
+        if self.latency.samples < self.min_samples:
+            return self.default_timeout
+        p99 = self.latency.quantile(0.99)
+        return max(self.min_timeout, min(self.max_timeout, p99 * self.timeout_factor))
+
+    def call(self, fn, timeout=None):
+        """
+        Appelle fn(timeout) sous la protection du disjoncteur. Un `timeout`
+        explicite (appels groupés, plus lents) remplace le timeout adaptatif :
+        la latence n'est alors pas échantillonnée et l'appel n'est pas couvert.
+        """
+        trial    = self._admit()
+        adaptive = timeout is None
+        if adaptive:
+            timeout = self.max_timeout if trial else self.timeout()
+        start = time.monotonic()
+        try:
+            if adaptive and not trial and self.hedge and self.latency.samples >= self.min_samples:
+                result = self._hedged(fn, timeout)
+            else:
+                result = fn(timeout)
+        except Exception:
+            self._failed(start if adaptive else None, timeout)
+            raise
+        self._succeeded(start if adaptive else None)
+        return result
+
+    async def acall(self, coro_fn):
+        """Variante asyncio : attend coro_fn() au plus le timeout adaptatif (sans hedging)."""
+        import asyncio
+        timeout = self.max_timeout if self._admit() else self.timeout()
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(coro_fn(), timeout)
+        except asyncio.CancelledError:
+            # une annulation n'est pas un échec du service, mais libère l'essai half_open
+            self.breaker.release_trial()
+            raise
+        except Exception:
+            self._failed(start, timeout)
+            raise
+        self._succeeded(start)
+        return result
+
+    def _admit(self):
+        """True pour l'appel d'essai d'un disjoncteur half_open ; CircuitOpenError si refusé."""
+        state = self.breaker.admit()
+        if state is None:
+            raise CircuitOpenError(self.name, self.breaker.retry_after())
+        return state == 'half_open'
+
+    def _failed(self, start, timeout):
+        elapsed = None if start is None else time.monotonic() - start
+        if elapsed is not None and elapsed >= timeout:
+            # délai dépassé : échantillonné à sa durée, le p99 (donc le timeout) remonte
+            self.latency.record(elapsed)
+        self.breaker.record_failure()
+        if self.breaker.state == 'open':
+            # latences d'avant la panne : le délai repart de default_timeout
+            self.latency.clear()
+
+    def _succeeded(self, start):
+        if start is not None:
+            self.latency.record(time.monotonic() - start)
+        self.breaker.record_success()
+
+    def _hedged(self, fn, timeout):
+        """Lance une seconde requête si la première dépasse le p95 ; la première réponse l'emporte."""
+        # chaque requête s'exécute dans une copie du contexte (span courant) ;
+        # l'ensemble reste dans le budget `timeout` de l'appel
+        deadline = time.monotonic() + timeout
+        first = self._executor.submit(contextvars.copy_context().run, fn, timeout)
+        try:
+            return first.result(timeout=min(timeout, self.latency.quantile(0.95)))
+        except futures.TimeoutError:
+            pass
+        self.hedges += 1
+        second  = self._executor.submit(contextvars.copy_context().run, fn,
+                                        max(0.0, deadline - time.monotonic()))
+        pending = {first, second}
+        error   = None
+        while pending:
+            done, pending = futures.wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                         return_when=futures.FIRST_COMPLETED)
+            if not done:
+                break
+            for f in done:
+                if f.exception() is None:
+                    if f is second:
+                        self.hedge_wins += 1
+                    return f.result()
+                error = f.exception()
+        raise error or TimeoutError(f"{self.name} : délai de {timeout:.2f}s dépassé")
+
+    def reset(self):
+        """Referme le disjoncteur et oublie les latences observées."""
+        self.breaker = CircuitBreaker(self.breaker.failure_threshold, self.breaker.reset_timeout)
+        self.latency = LatencyTracker()
+        self.hedges = self.hedge_wins = 0
+
+    def stats(self):
+        p50, p99 = self.latency.quantile(0.5), self.latency.quantile(0.99)
+        return dict(self.breaker.stats(),
+                    timeout=round(self.timeout(), 4),
+                    samples=self.latency.samples,
+                    p50=None if p50 is None else round(p50, 4),
+                    p99=None if p99 is None else round(p99, 4),
+                    hedging=self.hedge, hedges=self.hedges, hedge_wins=self.hedge_wins)
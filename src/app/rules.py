@@ -0,0 +1,143 @@
+# src/app/rules.py
+"""
+Décisions locales à partir des tables de règles publiées par les micro‑services.
+
+ms_montantmax (gRPC GetRules) et ms_profilrisque (GraphQL riskRules) exposent
+leurs règles sous forme de tables versionnées, fonctions du seul montant.
+L'orchestrateur les charge, les évalue en mémoire sur le chemin critique et
+les resynchronise en arrière-plan lorsque leur version change.
+
+Modes (RULES_MODE) :
+* off    : décisions toujours distantes (comportement historique) ;
+* local  : table évaluée localement si elle est chargée et exprimable,
+           sinon repli sur l'appel distant ;
+* shadow : l'appel distant fait foi, la décision locale lui est comparée
+           et les divergences sont comptées.
+"""
+import time
+import logging
+import operator
+import threading
+
+logger = logging.getLogger(__name__)
+
+MODES = ('off', 'local', 'shadow')
+
+_OPS = {"<=": operator.le, "<": operator.lt, ">=": operator.ge, ">": operator.gt,
+        "*": lambda amount, threshold: True}
+
+
+class RuleTable:
+    """Table ordonnée de règles (op, seuil, issue) sur le montant."""
+
+    def __init__(self, version, rules, expressible=True):
+        self.version     = version
+        self.expressible = expressible and all(op in _OPS for op, _, _ in rules)
+        self.rules       = [(_OPS.get(op), threshold, outcome) for op, threshold, outcome in rules]
+
+    def evaluate(self, amount):
+        """Issue de la première règle vérifiée, None si aucune ne l'est."""
+        for op, threshold, outcome in self.rules:
+            if op(amount, threshold):
+                return outcome
+        return None
+
+
+class LocalDecisions:
+    """
+    Tables de règles d'un ensemble de services. `fetchers` associe à chaque
+    service une fonction fetch(version_connue) -> RuleTable, ou None si la
+    table détenue est toujours à jour.
+    """
+
+    def __init__(self, fetchers, mode='off', sync_interval=30.0):
+        if mode not in MODES:
+            raise ValueError(f"RULES_MODE inconnu : {mode}")
+        self.mode          = mode
+        self.sync_interval = sync_interval
+        self._fetchers     = fetchers
+        self._tables       = {}
+        self._lock         = threading.Lock()
+        self._syncing      = False
+        self._last_sync    = float('-inf')
+        self._counters     = {name: {"local": 0, "fallback": 0, "shadow_checks": 0,
+                                     "shadow_mismatches": 0, "sync_errors": 0}
+                              for name in fetchers}
+
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+
+    def sync(self):
+        """Recharge les tables dont la version a changé (appel bloquant)."""
+        for name, fetch in self._fetchers.items():
+            current = self._tables.get(name)
+            try:
+                table = fetch(current.version if current else None)
+            except Exception:
+                logger.warning("Synchronisation des règles %s impossible", name, exc_info=True)
+                self._counters[name]["sync_errors"] += 1
+                continue
+            if table is not None:
+                self._tables[name] = table
+        self._last_sync = time.monotonic()
+
+    def maybe_sync(self):
+        """Lance une resynchronisation en arrière-plan si l'intervalle est écoulé."""
+        if not self.enabled or time.monotonic() - self._last_sync < self.sync_interval:
+            return
+        with self._lock:
+            if self._syncing:
+                return
+            self._syncing = True
+
+        def run():
+            try:
+                self.sync()
+            finally:
+                self._syncing = False
+
+        threading.Thread(target=run, name='rules-sync', daemon=True).start()
+
+    def table(self, name):
+        return self._tables.get(name)
+
+    def decide(self, name, amount):
+        """
+        Issue locale en mode `local` ; None s'il faut appeler le service
+        (mode off/shadow, table absente, non exprimable ou sans règle applicable).
+        """
+        if self.mode != 'local':
+            return None
+        self.maybe_sync()
+        table = self._tables.get(name)
+        outcome = table.evaluate(amount) if table is not None and table.expressible else None
+        self._counters[name]["local" if outcome is not None else "fallback"] += 1
+        return outcome
+
+    def shadow(self, name, amount, remote, same=operator.eq):
+        """En mode `shadow`, compare l'issue distante `remote` à l'évaluation locale."""
+        if self.mode != 'shadow':
+            return
+        self.maybe_sync()
+        table = self._tables.get(name)
+        if table is None or not table.expressible:
+            return
+        local = table.evaluate(amount)
+        counters = self._counters[name]
+        counters["shadow_checks"] += 1
+        if local is None or not same(local, remote):
+            counters["shadow_mismatches"] += 1
+            logger.warning("Règles %s v%s : décision locale %r != distante %r (montant %s)",
+                           name, table.version, local, remote, amount)
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "services": {
+                name: dict(counters,
+                           version=self._tables[name].version if name in self._tables else None,
+                           expressible=self._tables[name].expressible if name in self._tables else None)
+                for name, counters in self._counters.items()
+            },
+        }
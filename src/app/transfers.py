@@ -0,0 +1,291 @@
+# src/app/transfers.py
+"""
+File persistante des transferts de fonds vers ms_fournisseur.
+
+Le callback de la banque se contente d'enregistrer le verdict et de mettre
+le transfert en file : il est acquitté immédiatement. Un pool borné de
+workers vide ensuite la file :
+
+* persistance : table SQLite ; un transfert est « loué » le temps de son
+  envoi (`lease` s), de sorte qu'un transfert interrompu par un arrêt ou un
+  plantage redevient éligible, y compris pour un autre processus ;
+* idempotence : un seul transfert par request_id (un callback rejoué ne le
+  remet pas en file, un transfert terminé n'est jamais renvoyé), et l'appel
+  porte l'en-tête Idempotency-Key pour les renvois après une interruption ;
+* reprises : backoff exponentiel avec gigue (base × 2^n, plafonné), puis
+  statut 'failed' après `max_attempts` tentatives ; un transfert refusé
+  (TransferRejected) passe directement en 'failed'.
+
+Avec ':memory:' (défaut), la file ne survit pas au processus : les
+transferts en attente sont perdus au redémarrage (cf. warn_if_volatile()).
+"""
+import json
+import time
+import random
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transfers (
+    request_id  TEXT PRIMARY KEY,
+    payload     TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    next_at     REAL NOT NULL,
+    last_error  TEXT,
+    result      TEXT
+);
+CREATE INDEX IF NOT EXISTS transfers_due_idx ON transfers (next_at)
+    WHERE status IN ('queued', 'running');
+"""
+
+# transferts à traiter : en file, ou en cours mais dont le bail a expiré
+_PENDING = "status IN ('queued', 'running')"
+
+
+class TransferQueue:
+    """
+    Table des transferts (SQLite, ':memory:' par défaut). Toutes les
+    opérations sont courtes et passent par une connexion unique sous verrou ;
+    la prise d'un transfert est une transaction IMMEDIATE, sûre entre processus.
+    """
+
+    def __init__(self, path=':memory:', lease=60.0):
+        self.path  = path
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None,
+                                     check_same_thread=False)
+        if path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+
+    def warn_if_volatile(self, setting='TRANSFER_QUEUE_PATH'):
+        """Avertit (log) si la file est en mémoire, donc perdue au redémarrage."""
+        if self.path == ':memory:':
+            logger.warning("File des transferts en mémoire : les transferts en attente sont "
+                           "perdus au redémarrage (définir %s)", setting)
+
+    def enqueue(self, request_id, payload):
+        """Met un transfert en file ; False s'il existe déjà pour ce request_id."""
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                'INSERT OR IGNORE INTO transfers (request_id, payload, status, enqueued_at, next_at) '
+                'VALUES (?, ?, ?, ?, ?)', (request_id, json.dumps(payload), QUEUED, now, now))
+            return cur.rowcount == 1
+
+    def claim(self):
+        """Prend le prochain transfert échu (bail de `lease` s) ; None si aucun."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    f'SELECT request_id, payload, attempts, enqueued_at FROM transfers '
+                    f'WHERE {_PENDING} AND next_at <= ? ORDER BY next_at LIMIT 1', (now,)).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        'UPDATE transfers SET status = ?, attempts = attempts + 1, next_at = ? '
+                        'WHERE request_id = ?', (RUNNING, now + self.lease, row[0]))
+            except BaseException:
+                self._conn.execute('ROLLBACK')       # pas de bail pris à moitié
+                raise
+            self._conn.execute('COMMIT')
+        if row is None:
+            return None
+        return {"request_id": row[0], "payload": json.loads(row[1]),
+                "attempt": row[2] + 1, "enqueued_at": row[3]}
+
+    def complete(self, request_id, result=None):
+        self._finish(request_id, DONE, result=json.dumps(result))
+
+    def fail(self, request_id, error):
+        self._finish(request_id, FAILED, last_error=error)
+
+    def retry(self, request_id, error, delay):
+        """Remet le transfert en file, éligible dans `delay` s."""
+        with self._lock:
+            self._conn.execute(
+                'UPDATE transfers SET status = ?, next_at = ?, last_error = ? WHERE request_id = ?',
+                (QUEUED, time.time() + delay, error, request_id))
+
+    def _finish(self, request_id, status, result=None, last_error=None):
+        with self._lock:
+            self._conn.execute(
+                'UPDATE transfers SET status = ?, result = COALESCE(?, result), '
+                'last_error = COALESCE(?, last_error) WHERE request_id = ?',
+                (status, result, last_error, request_id))
+
+    def get(self, request_id):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT status, attempts, last_error FROM transfers WHERE request_id = ?',
+                (request_id,)).fetchone()
+        if row is None:
+            return None
+        return {"status": row[0], "attempts": row[1], "last_error": row[2]}
+
+    def next_due(self):
+        """Échéance (epoch) du prochain transfert à traiter, None si la file est vide."""
+        with self._lock:
+            return self._conn.execute(
+                f'SELECT MIN(next_at) FROM transfers WHERE {_PENDING}').fetchone()[0]
+
+    def depth(self):
+        with self._lock:
+            return self._conn.execute(
+                f'SELECT COUNT(*) FROM transfers WHERE {_PENDING}').fetchone()[0]
+
+    def oldest_age(self):
+        """Âge (s) du plus ancien transfert non terminé, 0 si la file est vide."""
+        with self._lock:
+            oldest = self._conn.execute(
+                f'SELECT MIN(enqueued_at) FROM transfers WHERE {_PENDING}').fetchone()[0]
+        return 0.0 if oldest is None else max(0.0, time.time() - oldest)
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._conn.execute(
+                'SELECT status, COUNT(*) FROM transfers GROUP BY status').fetchall())
+        return {status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, FAILED)}
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM transfers')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class TransferRejected(Exception):
+    """Transfert refusé par le destinataire : échec définitif, sans reprise."""
+
+
+class TransferWorkers:
+    """
+    Pool borné de workers vidant une TransferQueue. `handler(job)` effectue
+    le transfert (exception = échec, TransferRejected = échec définitif) ;
+    `on_failed(job, exc)` est appelé quand les tentatives sont épuisées. Les threads démarrent au premier
+    submit() (ou par start(), pour reprendre une file persistante).
+    """
+
+    def __init__(self, queue, handler, on_failed=None, workers=4, max_attempts=8,
+                 backoff_base=0.5, backoff_max=60.0, poll_interval=1.0, on_attempt=None):
+        self.queue         = queue
+        self.handler       = handler
+        self.on_failed     = on_failed
+        self.on_attempt    = on_attempt
+        self.workers       = workers
+        self.max_attempts  = max_attempts
+        self.backoff_base  = backoff_base
+        self.backoff_max   = backoff_max
+        self.poll_interval = poll_interval
+        self._cond     = threading.Condition()
+        self._signal   = 0
+        self._active   = 0
+        self._threads  = []
+        self._stopping = False
+
+    def submit(self, request_id, payload):
+        """Met le transfert en file et réveille un worker ; False si déjà connu."""
+        added = self.queue.enqueue(request_id, payload)
+        if added:
+            self.start()
+            with self._cond:
+                self._signal += 1
+                self._cond.notify()
+        return added
+
+    def start(self):
+        with self._cond:
+            if self._threads or self._stopping:
+                return
+            self._threads = [threading.Thread(target=self._run, name=f'transfer-{n}', daemon=True)
+                             for n in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def backoff(self, attempt):
+        """Délai avant la tentative suivante : base × 2^(n-1) plafonné, tiré entre 50 et 100 % (gigue)."""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                signal = self._signal
+            job = self.queue.claim()
+            if job is None:
+                due  = self.queue.next_due()
+                wait = self.poll_interval if due is None else due - time.time()
+                with self._cond:
+                    if self._signal == signal and not self._stopping:
+                        self._cond.wait(min(self.poll_interval, max(0.001, wait)))
+                continue
+            with self._cond:
+                self._active += 1
+            try:
+                self._process(job)
+            finally:
+                with self._cond:
+                    self._active -= 1
+                    self._cond.notify_all()
+
+    def _process(self, job):
+        try:
+            result = self.handler(job)
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+            if isinstance(exc, TransferRejected) or job['attempt'] >= self.max_attempts:
+                self.queue.fail(job['request_id'], error)
+                self._attempted('failed')
+                if self.on_failed is not None:
+                    self.on_failed(job, exc)
+            else:
+                # disjoncteur ouvert : inutile de réessayer avant sa réouverture
+                delay = max(self.backoff(job['attempt']), getattr(exc, 'retry_after', 0))
+                self.queue.retry(job['request_id'], error, delay)
+                self._attempted('retry')
+            return
+        self.queue.complete(job['request_id'], result)
+        self._attempted('success')
+
+    def _attempted(self, outcome):
+        if self.on_attempt is not None:
+            self.on_attempt(outcome)
+
+    def join(self, timeout=None):
+        """Attend que la file soit vide ; False si `timeout` expire avant."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._active or self.queue.depth():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(0.05 if remaining is None else min(0.05, remaining))
+        return True
+
+    def stop(self, timeout=5.0):
+        """Arrête les workers après leur transfert en cours ; la file reste persistée."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    def stats(self):
+        return dict(self.queue.stats(), depth=self.queue.depth(),
+                    oldest_age=round(self.queue.oldest_age(), 3),
+                    workers=len(self._threads), active=self._active)
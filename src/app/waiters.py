@@ -0,0 +1,128 @@
+# src/app/waiters.py
+"""
+Registre des attentes de statut (long-poll, Server-Sent Events).
+
+Une requête qui attend l'issue d'une demande s'abonne à son request_id ;
+loan_callback et les workers de transfert appellent notify(), qui réveille
+d'un coup tous les abonnés, sans scrutation.
+
+Rien n'est conservé en dehors des attentes en cours : un emplacement par
+request_id attendu, partagé par tous ses abonnés — un seul Event pour les
+threads (mode Flask), une future par coroutine (mode ASGI, où des dizaines
+de milliers d'attentes ne coûtent que quelques centaines d'octets chacune).
+Les notifications sont locales au processus.
+
+Usage (thread) :
+
+    with waiters.watch(request_id) as event:
+        ... relire l'état ...
+        event.wait(timeout)
+
+L'abonnement précède la relecture de l'état : une notification émise entre
+les deux n'est pas perdue.
+"""
+import threading
+from contextlib import contextmanager
+
+
+class _Slot:
+    __slots__ = ('event', 'threads', 'futures')
+
+    def __init__(self):
+        self.event   = None   # threading.Event, créé au premier abonné thread
+        self.threads = 0
+        self.futures = {}     # future -> boucle asyncio
+
+
+class _AsyncWaiter:
+    __slots__ = ('_future',)
+
+    def __init__(self, future):
+        self._future = future
+
+    async def wait(self, timeout):
+        """True si notifié avant `timeout` s."""
+        import asyncio
+        done, _ = await asyncio.wait((self._future,), timeout=timeout)
+        return bool(done)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+
+class WaiterRegistry:
+    def __init__(self):
+        self._lock    = threading.Lock()
+        self._slots   = {}
+        self._waiting = 0
+        self.notified = 0
+
+    def _slot(self, key):
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = _Slot()
+        return slot
+
+    @contextmanager
+    def watch(self, key):
+        """Abonnement d'un thread ; fournit un Event levé par notify(key)."""
+        with self._lock:
+            slot = self._slot(key)
+            if slot.event is None:
+                slot.event = threading.Event()
+            slot.threads += 1
+            self._waiting += 1
+        try:
+            yield slot.event
+        finally:
+            with self._lock:
+                slot.threads -= 1
+                self._release(key, slot)
+
+    @contextmanager
+    def watch_async(self, key):
+        """Abonnement d'une coroutine ; fournit un objet dont `await wait(timeout)` rend True si notifié."""
+        import asyncio
+        loop   = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            slot = self._slot(key)
+            slot.futures[future] = loop
+            self._waiting += 1
+        try:
+            yield _AsyncWaiter(future)
+        finally:
+            with self._lock:
+                del slot.futures[future]
+                self._release(key, slot)
+
+    def _release(self, key, slot):
+        # sous self._lock
+        self._waiting -= 1
+        if not slot.threads and not slot.futures and self._slots.get(key) is slot:
+            del self._slots[key]
+
+    def notify(self, key):
+        """Réveille tous les abonnés de `key` ; renvoie leur nombre."""
+        with self._lock:
+            slot = self._slots.pop(key, None)
+            if slot is None:
+                return 0
+            futures = list(slot.futures.items())
+            woken   = slot.threads + len(futures)
+            self.notified += woken
+        if slot.event is not None:
+            slot.event.set()
+        for future, loop in futures:
+            loop.call_soon_threadsafe(_resolve, future)
+        return woken
+
+    def waiting(self):
+        """Nombre d'attentes en cours."""
+        return self._waiting
+
+    def stats(self):
+        with self._lock:
+            return {"waiting": self._waiting, "keys": len(self._slots), "notified": self.notified}
@@ -0,0 +1,428 @@
+# src/common/callbacks.py
+"""
+Envoi borné de callbacks HTTP (ms_banque → ReplyTo de l'orchestrateur).
+
+* pool fixe de `workers` threads, quel que soit le nombre de callbacks ;
+* file bornée (`queue_size` callbacks, reprises en attente et places
+  réservées comprises) : submit() attend une place au plus
+  `enqueue_timeout` s puis lève QueueFull, l'appelant répercute la
+  saturation au lieu d'empiler des threads ;
+* une requests.Session par hôte de destination (connexions keep-alive
+  réutilisées, au plus `workers` par hôte) ;
+* reprises en backoff exponentiel avec gigue (base × 2^n, plafonné, au moins
+  le Retry-After renvoyé) sur erreur réseau, 408, 429 et 5xx ; une reprise
+  attend son échéance dans la file, sans occuper de worker ;
+* lettres mortes : un callback refusé (autre 4xx, URL invalide) ou en échec après
+  `max_attempts` tentatives est conservé (les `dead_letter_max` derniers)
+  avec sa dernière erreur, et peut être renvoyé par redeliver().
+
+CallbackBatcher regroupe, en amont du dispatcher, les éléments destinés à
+une même URL pendant une courte fenêtre (au plus `max_batch` par envoi) :
+un seul POST, et une seule enveloppe à analyser côté destinataire, pour
+plusieurs verdicts. Chaque élément en attente de regroupement occupe une
+place de la file (reserve()) jusqu'à l'envoi de son lot.
+
+La file est en mémoire : les callbacks en attente sont perdus à l'arrêt du
+processus (le verdict reste consultable par GetChequeStatus).
+"""
+import time
+import heapq
+import random
+import itertools
+import threading
+from collections import deque
+from urllib.parse import urlsplit
+
+from common import tracing
+
+RETRYABLE = frozenset({408, 429})
+
+
+class QueueFull(Exception):
+    """File des callbacks saturée au-delà du délai d'attente."""
+
+
+class DeliveryError(Exception):
+    def __init__(self, message, retry_after=0.0, permanent=False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.permanent   = permanent
+
+
+class Callback:
+    __slots__ = ('url', 'body', 'headers', 'traceparent', 'attempt', 'enqueued_at', 'error')
+
+    def __init__(self, url, body, headers, traceparent):
+        self.url         = url
+        self.body        = body
+        self.headers     = headers
+        self.traceparent = traceparent
+        self.attempt     = 0
+        self.enqueued_at = time.monotonic()
+        self.error       = None
+
+    def to_dict(self):
+        return {"url": self.url, "attempts": self.attempt, "error": self.error,
+                "age": round(time.monotonic() - self.enqueued_at, 3)}
+
+
+def _retry_after(resp):
+    try:
+        return float(resp.headers.get('Retry-After', 0))
+    except ValueError:
+        return 0.0
+
+
+class CallbackDispatcher:
+    """
+    `body` d'un callback : octets, ou fonction(traceparent) → octets appelée à
+    chaque tentative dans le span d'envoi (contexte de trace dans le corps).
+    `on_attempt(outcome, duration)` (success, retry, dead) et
+    `on_delivered(latency)` (soumission → livraison) alimentent les métriques.
+    """
+
+    def __init__(self, workers=8, queue_size=10000, max_attempts=6, backoff_base=0.5,
+                 backoff_max=30.0, timeout=5.0, enqueue_timeout=5.0, dead_letter_max=1000,
+                 tracer=None, on_attempt=None, on_delivered=None):
+        self.workers         = workers
+        self.queue_size      = queue_size
+        self.max_attempts    = max_attempts
+        self.backoff_base    = backoff_base
+        self.backoff_max     = backoff_max
+        self.timeout         = timeout
+        self.enqueue_timeout = enqueue_timeout
+        self.tracer          = tracer
+        self.on_attempt      = on_attempt
+        self.on_delivered    = on_delivered
+        self._cond     = threading.Condition()
+        self._ready    = deque()
+        self._delayed  = []                 # tas (échéance, n°, callback)
+        self._seq      = itertools.count()
+        self._active   = 0
+        self._reserved = 0                  # places prises par reserve(), pas encore en file
+        self._threads  = []
+        self._stopping = False
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+        self.dead      = deque(maxlen=dead_letter_max)
+        self.delivered = self.retried = self.rejected = 0
+
+    # --- soumission ---
+
+    def pending(self):
+        """Callbacks en file ou en attente de reprise (hors envois en cours)."""
+        return len(self._ready) + len(self._delayed)
+
+    def _wait_for_space(self):
+        # sous self._cond
+        deadline = time.monotonic() + self.enqueue_timeout
+        while self.pending() + self._active + self._reserved >= self.queue_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stopping:
+                self.rejected += 1
+                raise QueueFull(f"{self.queue_size} callbacks en attente")
+            self._cond.wait(remaining)
+
+    def reserve(self):
+        """
+        Prend une place dans la file (attente au plus `enqueue_timeout` s,
+        sinon QueueFull) ; elle est rendue par submit(reserved=…) ou release().
+        """
+        with self._cond:
+            self._wait_for_space()
+            self._reserved += 1
+
+    def release(self, count=1):
+        """Rend `count` places prises par reserve() sans rien mettre en file."""
+        with self._cond:
+            self._reserved -= count
+            self._cond.notify_all()
+
+    def submit(self, url, body, headers=None, traceparent=None, reserved=0):
+        """
+        Met un callback en file ; QueueFull si aucune place ne se libère à temps.
+        `reserved` : nombre de places prises par reserve() pour ce callback ;
+        il les rend et est mis en file sans attendre (il occupe alors une place).
+        """
+        self.start()
+        callback = Callback(url, body, dict(headers or {}), traceparent)
+        with self._cond:
+            if reserved:
+                self._reserved -= reserved
+            else:
+                self._wait_for_space()
+            self._ready.append(callback)
+            self._cond.notify_all()
+
+    def redeliver(self):
+        """Remet en file toutes les lettres mortes ; renvoie leur nombre."""
+        with self._cond:
+            callbacks = list(self.dead)
+            self.dead.clear()
+            for callback in callbacks:
+                callback.attempt = 0
+                self._ready.append(callback)
+            self._cond.notify_all()
+        if callbacks:
+            self.start()
+        return len(callbacks)
+
+    # --- workers ---
+
+    def start(self):
+        with self._cond:
+            if self._threads or self._stopping:
+                return
+            self._threads = [threading.Thread(target=self._run, name=f'callback-{n}', daemon=True)
+                             for n in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _next(self):
+        # sous self._cond : prochain callback échu, sinon attente
+        while not self._stopping:
+            now = time.monotonic()
+            while self._delayed and self._delayed[0][0] <= now:
+                self._ready.append(heapq.heappop(self._delayed)[2])
+            if self._ready:
+                self._active += 1
+                return self._ready.popleft()
+            self._cond.wait(self._delayed[0][0] - now if self._delayed else None)
+        return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                callback = self._next()
+            if callback is None:
+                return
+            try:
+                self._attempt(callback)
+            finally:
+                with self._cond:
+                    self._active -= 1
+                    self._cond.notify_all()
+
+    def backoff(self, attempt):
+        """Délai avant la tentative suivante : base × 2^(n-1) plafonné, tiré entre 50 et 100 % (gigue)."""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def session(self, url):
+        """Session HTTP (connexions keep-alive) de l'hôte de `url`."""
+        host = urlsplit(url).netloc
+        session = self._sessions.get(host)
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            with self._sessions_lock:
+                session = self._sessions.get(host)
+                if session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers,
+                                          max_retries=0)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._sessions[host] = session
+        return session
+
+    def _send(self, callback):
+        context = tracing.current()
+        body = callback.body
+        if callable(body):
+            body = body(context.traceparent() if context else None)
+        try:
+            resp = self.session(callback.url).post(callback.url, data=body,
+                                                   headers=tracing.inject(dict(callback.headers)),
+                                                   timeout=self.timeout)
+        except Exception as exc:
+            # URL invalide (MissingSchema, InvalidURL… sont des ValueError) : inutile de réessayer
+            raise DeliveryError(f"{type(exc).__name__}: {exc}",
+                                permanent=isinstance(exc, ValueError)) from exc
+        if resp.status_code >= 500 or resp.status_code in RETRYABLE:
+            raise DeliveryError(f"HTTP {resp.status_code}", retry_after=_retry_after(resp))
+        if resp.status_code >= 400:
+            raise DeliveryError(f"HTTP {resp.status_code}", permanent=True)
+
+    def _attempt(self, callback):
+        callback.attempt += 1
+        start = time.perf_counter()
+        try:
+            if self.tracer is not None:
+                with self.tracer.span('send_callback', kind='client',
+                                      parent=tracing.parse_traceparent(callback.traceparent)):
+                    self._send(callback)
+            else:
+                self._send(callback)
+        except DeliveryError as exc:
+            callback.error = str(exc)
+            duration = time.perf_counter() - start
+            if exc.permanent or callback.attempt >= self.max_attempts:
+                with self._cond:
+                    self.dead.append(callback)
+                self._notify('dead', duration)
+            else:
+                delay = max(self.backoff(callback.attempt), exc.retry_after)
+                with self._cond:
+                    heapq.heappush(self._delayed,
+                                   (time.monotonic() + delay, next(self._seq), callback))
+                    self.retried += 1
+                    self._cond.notify_all()
+                self._notify('retry', duration)
+            return
+        with self._cond:
+            self.delivered += 1
+        self._notify('success', time.perf_counter() - start)
+        if self.on_delivered is not None:
+            self.on_delivered(time.monotonic() - callback.enqueued_at)
+
+    def _notify(self, outcome, duration):
+        if self.on_attempt is not None:
+            self.on_attempt(outcome, duration)
+
+    # --- arrêt, observation ---
+
+    def join(self, timeout=None):
+        """Attend que la file soit vide (reprises comprises) ; False si `timeout` expire avant."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._active or self.pending():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(0.05 if remaining is None else min(0.05, remaining))
+        return True
+
+    def stop(self, timeout=5.0):
+        """Arrête les workers après leur envoi en cours ; les callbacks en file sont abandonnés."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+        with self._sessions_lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+    def dead_letters(self):
+        with self._cond:
+            return [callback.to_dict() for callback in self.dead]
+
+    def stats(self):
+        with self._cond:
+            return {"queued": len(self._ready), "delayed": len(self._delayed),
+                    "in_flight": self._active, "reserved": self._reserved, "delivered": self.delivered,
+                    "retried": self.retried, "rejected": self.rejected, "dead": len(self.dead),
+                    "workers": len(self._threads), "queue_size": self.queue_size,
+                    "hosts": len(self._sessions)}
+
+
+class CallbackBatcher:
+    """
+    Regroupe les éléments soumis pour une même URL : envoi groupé à
+    l'expiration de la fenêtre (`window` s après le premier élément) ou dès
+    `max_batch` éléments. `build(url, items)` construit le corps (octets ou
+    fonction(traceparent), cf. CallbackDispatcher). Un envoi d'un seul élément
+    garde son traceparent (span d'envoi rattaché) ; un lot ouvre sa propre trace.
+
+    add() réserve une place du dispatcher (contre-pression : QueueFull) avant
+    de mettre l'élément en attente ; les places d'un lot sont rendues à son
+    envoi, qui n'en occupe qu'une. `window` nulle ou `max_batch` ≤ 1 : envoi
+    immédiat, sans regroupement. `on_flush(size)` reçoit la taille des envois.
+    """
+
+    def __init__(self, dispatcher, build, window=0.02, max_batch=100, headers=None,
+                 on_flush=None):
+        self.dispatcher = dispatcher
+        self.build      = build
+        self.window     = window
+        self.max_batch  = max_batch
+        self.headers    = dict(headers or {})
+        self.on_flush   = on_flush
+        self._cond     = threading.Condition()
+        self._buffers  = {}                 # url → (échéance, [(élément, traceparent)])
+        self._thread   = None
+        self._stopping = False
+
+    @property
+    def enabled(self):
+        return self.window > 0 and self.max_batch > 1
+
+    def add(self, url, item, traceparent=None):
+        """Ajoute un élément pour `url` ; QueueFull si le dispatcher reste saturé."""
+        if not self.enabled:
+            self._send(url, [(item, traceparent)], reserved=0)
+            return
+        self.dispatcher.reserve()
+        with self._cond:
+            deadline, items = self._buffers.setdefault(url, (time.monotonic() + self.window, []))
+            items.append((item, traceparent))
+            full = len(items) >= self.max_batch
+            if full:
+                del self._buffers[url]
+            elif len(items) == 1:
+                self._start()
+                self._cond.notify()
+        if full:
+            self._send(url, items)
+
+    def pending(self):
+        with self._cond:
+            return sum(len(items) for _, items in self._buffers.values())
+
+    def _start(self):
+        # sous self._cond
+        if self._thread is None and not self._stopping:
+            self._thread = threading.Thread(target=self._run, name='callback-batcher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    due = [url for url, (deadline, _) in self._buffers.items() if deadline <= now]
+                    if due or self._stopping:
+                        break
+                    deadline = min((d for d, _ in self._buffers.values()), default=None)
+                    self._cond.wait(None if deadline is None else deadline - now)
+                if self._stopping:
+                    due = list(self._buffers)
+                batches = [(url, self._buffers.pop(url)[1]) for url in due]
+                stopping = self._stopping
+            for url, items in batches:
+                self._send(url, items)
+            if stopping:
+                return
+
+    def _send(self, url, items, reserved=None):
+        # par défaut, une place réservée par add() pour chaque élément du lot
+        reserved = len(items) if reserved is None else reserved
+        traceparent = items[0][1] if len(items) == 1 else None
+        try:
+            body = self.build(url, [item for item, _ in items])
+        except BaseException:
+            self.dispatcher.release(reserved)
+            raise
+        self.dispatcher.submit(url, body, self.headers, traceparent=traceparent, reserved=reserved)
+        if self.on_flush is not None:
+            self.on_flush(len(items))
+
+    def flush(self):
+        """Envoie immédiatement tous les lots en attente."""
+        with self._cond:
+            batches, self._buffers = list(self._buffers.items()), {}
+        for url, (_, items) in batches:
+            self._send(url, items)
+
+    def stop(self, timeout=5.0):
+        """Envoie les lots en attente puis arrête le thread de regroupement."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+        self.flush()
@@ -0,0 +1,72 @@
+# src/common/metrics.py
+"""
+Exposition Prometheus commune aux services, en un ou plusieurs processus.
+
+Sous un serveur multi-processus (cf. serving.py), PROMETHEUS_MULTIPROC_DIR
+est défini avant le démarrage des workers : compteurs, histogrammes et
+jauges y écrivent leurs valeurs (fichiers mmap, un par processus) et
+exposition() les agrège, quel que soit le worker qui répond au scrape.
+
+* les jauges incrémentées autour d'une requête (en cours) se déclarent avec
+  multiprocess_mode='livesum' : somme sur les processus vivants ;
+* les jauges évaluées au moment du scrape sont des CallbackGauge (API
+  set_function() de Gauge) : lues dans le processus qui répond, elles
+  conviennent à un état partagé (taille d'une base SQLite) ; un état local
+  au processus n'y reflète que ce worker.
+"""
+import os
+from prometheus_client import CollectorRegistry, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import GaugeMetricFamily
+
+
+def multiprocess_enabled():
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+_callbacks = []
+
+
+class CallbackGauge:
+    """Jauge sans étiquette dont la valeur est lue par une fonction au moment du scrape."""
+
+    def __init__(self, name, documentation, registry=None):
+        self.name          = name
+        self.documentation = documentation
+        self.registry      = registry
+        self._function     = None
+        if registry is not None:
+            registry.register(self)
+            _callbacks.append(self)
+
+    def set_function(self, function):
+        self._function = function
+
+    def collect(self):
+        if self._function is not None:
+            yield GaugeMetricFamily(self.name, self.documentation, value=float(self._function()))
+
+    def describe(self):
+        return [GaugeMetricFamily(self.name, self.documentation)]
+
+
+def exposition(registry):
+    """(corps, content-type) au format texte Prometheus pour `registry`."""
+    if not multiprocess_enabled():
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    from prometheus_client import multiprocess
+    merged = CollectorRegistry()
+    multiprocess.MultiProcessCollector(merged)
+    for gauge in _callbacks:
+        if gauge.registry is registry:
+            merged.register(gauge)
+    return generate_latest(merged), CONTENT_TYPE_LATEST
+
+
+def wsgi_app(registry):
+    """Application WSGI servant exposition(registry) (pour un service sans Flask)."""
+    def metrics_app(environ, start_response):
+        body, content_type = exposition(registry)
+        start_response('200 OK', [('Content-Type', content_type),
+                                  ('Content-Length', str(len(body)))])
+        return [body]
+    return metrics_app
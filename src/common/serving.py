@@ -0,0 +1,141 @@
+# src/common/serving.py
+"""
+Serveur de production des services HTTP (gunicorn), à la place du serveur
+de développement Flask ou de wsgiref, qui ne servent qu'un processus :
+
+    python -m common.serving app:app --port 5000
+    python -m common.serving 'server:wsgi_app()' --port 5002
+
+Variables :
+* SERVE_MODE : threaded (défaut, worker gthread : SERVE_THREADS threads par
+  processus, adapté aux appels aval bloquants) ou prefork (worker sync : une
+  requête à la fois par processus) ;
+* SERVE_WORKERS : nombre de processus ; par défaut selon les cœurs
+  disponibles (affinité CPU et quota cgroup du conteneur) : un par cœur en
+  threaded, 2 × cœurs + 1 en prefork ;
+* SERVE_KEEPALIVE (5 s) : durée de vie d'une connexion inactive, à régler
+  au-dessus du délai d'inactivité du proxy amont ;
+* SERVE_TIMEOUT (60 s) : worker bloqué au-delà redémarré ;
+  SERVE_GRACEFUL_TIMEOUT (30 s) : délai laissé aux requêtes en cours ;
+* SERVE_MAX_REQUESTS (0) : recyclage d'un worker après N requêtes (gigue de 10 %).
+
+Rechargement gracieux : SIGHUP au processus maître démarre des workers sur
+le code et la configuration relus, puis arrête les anciens après leurs
+requêtes en cours ; SIGTERM arrête le serveur de la même façon.
+
+Plusieurs processus : SERVE_PROCESSES est transmis aux workers, et un
+service dont l'état est local au processus refuse de démarrer
+(require_shared()). Les métriques Prometheus passent en mode multiprocess
+(PROMETHEUS_MULTIPROC_DIR, répertoire temporaire par défaut, vidé au
+démarrage ; cf. common/metrics.py). Les workers importent l'application
+après le fork : ni connexion ni thread n'est hérité du maître.
+"""
+import os
+import sys
+import math
+import glob
+import argparse
+import tempfile
+
+MODES = {'threaded': 'gthread', 'prefork': 'sync'}
+
+
+def available_cores():
+    """Cœurs utilisables par le processus : affinité CPU, bornée par le quota cgroup v2."""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as fh:
+            quota, period = fh.read().split()[:2]
+        if quota != 'max':
+            cores = min(cores, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cores)
+
+
+def options(bind, env=os.environ):
+    """Réglages gunicorn déduits des variables SERVE_* ; ValueError si SERVE_MODE est inconnu."""
+    mode = env.get('SERVE_MODE', 'threaded')
+    if mode not in MODES:
+        raise ValueError(f"SERVE_MODE inconnu : {mode}")
+    cores   = available_cores()
+    default = cores if mode == 'threaded' else 2 * cores + 1
+    max_requests = int(env.get('SERVE_MAX_REQUESTS', '0'))
+    return {
+        'bind':              bind,
+        'worker_class':      MODES[mode],
+        'workers':           max(1, int(env.get('SERVE_WORKERS', default))),
+        'threads':           int(env.get('SERVE_THREADS', '8')) if mode == 'threaded' else 1,
+        'keepalive':         int(env.get('SERVE_KEEPALIVE', '5')),
+        'timeout':           int(env.get('SERVE_TIMEOUT', '60')),
+        'graceful_timeout':  int(env.get('SERVE_GRACEFUL_TIMEOUT', '30')),
+        'max_requests':      max_requests,
+        'max_requests_jitter': max_requests // 10,
+        'preload_app':       False,
+    }
+
+
+def processes():
+    """Nombre de processus servant l'application (1 hors de run())."""
+    return int(os.environ.get('SERVE_PROCESSES', '1'))
+
+
+def require_shared(name, shared, hint):
+    """RuntimeError si l'état `name` est local au processus alors que plusieurs workers servent."""
+    if not shared and processes() > 1:
+        raise RuntimeError(f"{name} est local au processus, incompatible avec "
+                           f"{processes()} workers : {hint}")
+
+
+# --- hooks gunicorn (processus maître) ---
+
+def _clear_multiprocess_dir(server):
+    # valeurs laissées par une exécution précédente
+    for path in glob.glob(os.path.join(os.environ['PROMETHEUS_MULTIPROC_DIR'], '*.db')):
+        os.remove(path)
+
+
+def _child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def run(target, port, host='0.0.0.0', env=os.environ):
+    """Sert l'application WSGI `target` ('module:objet' ou 'module:fabrique()') avec gunicorn."""
+    settings = options(f'{host}:{port}', env)
+    os.environ['SERVE_PROCESSES'] = str(settings['workers'])
+    if settings['workers'] > 1:
+        # à définir avant tout import de prometheus_client par les workers
+        os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', tempfile.mkdtemp(prefix='prometheus-'))
+        settings['on_starting'] = _clear_multiprocess_dir
+        settings['child_exit']  = _child_exit
+
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in settings.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from gunicorn.util import import_app
+            return import_app(target)
+
+    Server().run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n\n')[0])
+    parser.add_argument('target', help="application WSGI, 'module:objet' ou 'module:fabrique()'")
+    parser.add_argument('--port', type=int, required=True)
+    parser.add_argument('--host', default='0.0.0.0')
+    args = parser.parse_args(argv)
+    sys.path.insert(0, os.getcwd())
+    run(args.target, args.port, args.host)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+# src/common/shared_store.py
+"""
+État partagé entre les processus d'un même service.
+
+Sous un serveur multi-processus (cf. serving.py), un dict du module n'est
+visible que du worker qui l'a rempli : une demande de chèque enregistrée par
+un worker serait inconnue des autres. SharedDict offre le sous-ensemble
+de l'API dict dont les services ont besoin, adossé à une table SQLite (WAL)
+que tous les processus ouvrent :
+
+* valeurs sérialisées en JSON ; une valeur lue est une copie, toute
+  modification doit être réécrite (`store[key] = value`) ;
+* `maxsize` : au-delà, les entrées les plus anciennement écrites sont évincées ;
+* `ttl` : une entrée expire `ttl` s après sa dernière écriture (ou
+  `ttl(valeur)` s, 0 : jamais, si `ttl` est une fonction) ; les entrées
+  expirées sont supprimées à l'écriture, au plus toutes les `purge_interval` s ;
+* setdefault() est atomique entre processus (le premier écrivain gagne) ;
+* get_many() et update() lisent et écrivent un lot d'entrées en une requête
+  et une transaction (opérations groupées des services).
+
+from_env() renvoie un SharedDict si la variable de chemin est définie, sinon
+un dict local (borné par `maxsize`), pour le développement et les tests.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+_MISSING = object()
+
+# clés par requête IN (limite de paramètres SQLite)
+_CHUNK = 500
+
+
+class SharedDict:
+    def __init__(self, path, table='entries', maxsize=0, ttl=0.0, purge_interval=60.0):
+        self.path    = path
+        self.table   = table
+        self.maxsize = maxsize
+        self.ttl     = ttl
+        self.purge_interval = purge_interval
+        self._next_purge    = time.time() + purge_interval
+        self._lock   = threading.Lock()
+        self._conn   = sqlite3.connect(path, timeout=30, isolation_level=None,
+                                       check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(f'CREATE TABLE IF NOT EXISTS {table} '
+                           f'(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)')
+
+    def _expires(self, value):
+        ttl = self.ttl(value) if callable(self.ttl) else self.ttl
+        return time.time() + ttl if ttl else None
+
+    @contextmanager
+    def _transaction(self):
+        # sous self._lock : validée si le bloc aboutit, annulée sinon (rien d'appliqué à moitié)
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._conn.execute('COMMIT')
+
+    def _evict(self):
+        # sous self._lock ; les rowid croissent à chaque écriture (REPLACE compris)
+        now = time.time()
+        if self.ttl and now >= self._next_purge:
+            self._next_purge = now + self.purge_interval
+            self._conn.execute(f'DELETE FROM {self.table} WHERE expires <= ?', (now,))
+        if self.maxsize:
+            self._conn.execute(f'DELETE FROM {self.table} WHERE rowid <= '
+                               f'(SELECT MAX(rowid) FROM {self.table}) - ?', (self.maxsize,))
+
+    def get(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute(f'SELECT value, expires FROM {self.table} WHERE key = ?',
+                                     (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return default
+        return json.loads(row[0])
+
+    def get_many(self, keys):
+        """{clé: valeur} des clés présentes (et non expirées) parmi `keys`."""
+        keys, found, now = list(keys), {}, time.time()
+        with self._lock:
+            for start in range(0, len(keys), _CHUNK):
+                chunk = keys[start:start + _CHUNK]
+                rows = self._conn.execute(
+                    f'SELECT key, value, expires FROM {self.table} '
+                    f'WHERE key IN ({",".join("?" * len(chunk))})', chunk).fetchall()
+                found.update((key, value) for key, value, expires in rows
+                             if expires is None or expires > now)
+        return {key: json.loads(value) for key, value in found.items()}
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._conn.execute(f'INSERT OR REPLACE INTO {self.table} (key, value, expires) '
+                               f'VALUES (?, ?, ?)', (key, json.dumps(value), self._expires(value)))
+            self._evict()
+
+    def update(self, entries):
+        """Écrit toutes les entrées de `entries` (dict) en une transaction."""
+        rows = [(key, json.dumps(value), self._expires(value)) for key, value in entries.items()]
+        with self._lock, self._transaction():
+            self._conn.executemany(f'INSERT OR REPLACE INTO {self.table} (key, value, expires) '
+                                   f'VALUES (?, ?, ?)', rows)
+            self._evict()
+
+    def setdefault(self, key, value):
+        """Écrit `value` si `key` est absente (ou expirée) ; renvoie la valeur conservée."""
+        with self._lock, self._transaction():
+            self._conn.execute(f'DELETE FROM {self.table} WHERE key = ? AND expires <= ?',
+                               (key, time.time()))
+            cur = self._conn.execute(f'INSERT OR IGNORE INTO {self.table} (key, value, expires) '
+                                     f'VALUES (?, ?, ?)', (key, json.dumps(value), self._expires(value)))
+            if cur.rowcount == 1:
+                self._evict()
+                return value
+            row = self._conn.execute(f'SELECT value FROM {self.table} WHERE key = ?',
+                                     (key,)).fetchone()
+        return json.loads(row[0])
+
+    def pop(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute(f'DELETE FROM {self.table} WHERE key = ? RETURNING value, expires',
+                                     (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return default
+        return json.loads(row[0])
+
+    def __delitem__(self, key):
+        if self.pop(key, _MISSING) is _MISSING:
+            raise KeyError(key)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f'SELECT COUNT(*) FROM {self.table} '
+                                      f'WHERE expires IS NULL OR expires > ?',
+                                      (time.time(),)).fetchone()[0]
+
+    def purge(self):
+        """Supprime les entrées expirées ; renvoie leur nombre."""
+        with self._lock:
+            return self._conn.execute(f'DELETE FROM {self.table} WHERE expires <= ?',
+                                      (time.time(),)).rowcount
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f'DELETE FROM {self.table}')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class BoundedDict(OrderedDict):
+    """dict local borné à `maxsize` entrées (les plus anciennement écrites sont évincées)."""
+
+    def __init__(self, maxsize):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
+def from_env(var, table='entries', maxsize=0):
+    """SharedDict sur le fichier désigné par la variable `var`, sinon dict local."""
+    path = os.getenv(var)
+    if path:
+        return SharedDict(path, table=table, maxsize=maxsize)
+    return BoundedDict(maxsize) if maxsize else {}
+
+
+def is_shared(store):
+    return isinstance(store, SharedDict)
@@ -0,0 +1,263 @@
+# src/common/soap.py
+"""
+Codec SOAP partagé par l'orchestrateur et ms_banque (chemin critique
+dépôt de chèque → callback).
+
+* envoi : enveloppes pré-assemblées en octets ; seules les parties
+  variables (MessageID, traceparent, identifiants) sont insérées, échappées,
+  à chaque appel : ni formatage de chaîne ni construction d'arbre ;
+* réception : expressions XPath lxml compilées une fois, chemins absolus
+  depuis l'enveloppe (pas de recherche `.//` dans tout le document) ;
+* parser durci : ni DTD ni entité (XXE, « billion laughs »), pas d'accès
+  réseau, taille bornée ; toute enveloppe invalide lève SoapError.
+
+Le corps du callback ChequeStatusResponse et ses champs sont non qualifiés
+(préfixe soapenv: pour l'enveloppe) ; à la lecture, un corps dans l'espace
+de noms SOAP est aussi accepté. Un callback groupé (ChequeStatusResponses)
+porte plusieurs verdicts pour un même ReplyTo : chaque ChequeStatusResponse
+y ajoute son relates_to et son traceparent, propres à chaque dépôt.
+
+Les réponses du chemin rapide de ms_banque (submit_response, UPLOAD_RESPONSE,
+fault) reproduisent octet pour octet celles de Spyne : le contrat WSDL ne
+change pas.
+"""
+import uuid
+import threading
+from xml.sax.saxutils import escape as _escape
+
+from lxml import etree
+
+from common.tracing import NS_TRACE
+
+NS_SOAP   = 'http://schemas.xmlsoap.org/soap/envelope/'
+NS_WSA    = 'http://www.w3.org/2005/08/addressing'
+NS_BANQUE = 'ms.banque.async'
+
+NAMESPACES = {'s': NS_SOAP, 'wsa': NS_WSA, 'tr': NS_TRACE, 'tns': NS_BANQUE}
+
+# taille maximale d'une enveloppe reçue (un lot de 1000 identifiants ≈ 60 Ko)
+MAX_SIZE = 4 * 1024 * 1024
+
+
+class SoapError(ValueError):
+    """Enveloppe SOAP invalide, trop volumineuse ou interdite (DTD)."""
+
+
+def escape(text):
+    return _escape(text).encode('utf-8')
+
+
+# ------------------------------------------------------------------------------
+# Réception
+# ------------------------------------------------------------------------------
+
+_parsers = threading.local()
+
+
+def _parser():
+    # un parser par thread : un XMLParser lxml ne se partage pas entre threads
+    parser = getattr(_parsers, 'parser', None)
+    if parser is None:
+        parser = _parsers.parser = etree.XMLParser(
+            resolve_entities=False, no_network=True, load_dtd=False, dtd_validation=False,
+            huge_tree=False, remove_comments=True, remove_pis=True, collect_ids=False)
+    return parser
+
+
+def parse(data):
+    """Élément racine d'une enveloppe (octets ou str) ; SoapError si invalide."""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    if len(data) > MAX_SIZE:
+        raise SoapError(f"Enveloppe de {len(data)} octets (max {MAX_SIZE})")
+    try:
+        root = etree.fromstring(data, _parser())
+    except etree.XMLSyntaxError as exc:
+        raise SoapError(f"XML invalide : {exc}") from None
+    if root.getroottree().docinfo.doctype:
+        raise SoapError("DTD interdite dans une enveloppe SOAP")
+    return root
+
+
+def _xpath(path):
+    return etree.XPath(path, namespaces=NAMESPACES, smart_strings=False)
+
+
+_SUBMIT_RESULT = _xpath('/s:Envelope/s:Body/tns:SubmitChequeRequestResponse'
+                        '/tns:SubmitChequeRequestResult/text()')
+_SUBMIT_RESULTS = _xpath('/s:Envelope/s:Body/tns:SubmitChequeRequestsResponse'
+                         '/tns:SubmitChequeRequestsResult/tns:string/text()')
+_STATUS = _xpath('/s:Envelope/s:Body/*[local-name() = "ChequeStatusResponse"]')
+_STATUSES = _xpath('/s:Envelope/s:Body/*[local-name() = "ChequeStatusResponses"]'
+                   '/*[local-name() = "ChequeStatusResponse"]')
+_HEADER_TRACE = _xpath('/s:Envelope/s:Header//tr:traceparent/text()')
+_REPLY_TO   = _xpath('/s:Envelope/s:Header/wsa:ReplyTo/wsa:Address/text()')
+_MESSAGE_ID = _xpath('/s:Envelope/s:Header/wsa:MessageID/text()')
+_PAYLOAD = _xpath('/s:Envelope/s:Body/*[1]')
+_UPLOAD_ID = _xpath('tns:request_id/text()')
+_UPLOAD_CHEQUE = _xpath('tns:cheque/text()')
+
+
+def _first(results):
+    return results[0] if results else None
+
+
+def submit_result(root):
+    """request_id d'une réponse SubmitChequeRequest, None si absent."""
+    return _first(_SUBMIT_RESULT(root))
+
+
+def submit_results(root):
+    """request_id d'une réponse SubmitChequeRequests, dans l'ordre."""
+    return _SUBMIT_RESULTS(root)
+
+
+def cheque_status(root):
+    """Champs (request_id, status, verdict) d'un callback ChequeStatusResponse ; {} si absent."""
+    body = _first(_STATUS(root))
+    if body is None:
+        return {}
+    return _fields(body)
+
+
+def _fields(element):
+    return {child.tag.rpartition('}')[2]: child.text or '' for child in element}
+
+
+def cheque_statuses(root):
+    """
+    Verdicts d'un callback groupé ChequeStatusResponses : champs (request_id,
+    status, verdict, relates_to, traceparent) de chacun ; [] hors lot.
+    """
+    return [_fields(item) for item in _STATUSES(root)]
+
+
+def traceparent(root):
+    """traceparent porté dans l'en-tête SOAP (paramètre de référence WS-Addressing)."""
+    return _first(_HEADER_TRACE(root))
+
+
+def payload(root):
+    """Premier élément du corps SOAP (requête de l'opération), None si absent."""
+    return _first(_PAYLOAD(root))
+
+
+def upload_fields(payload):
+    """(request_id, cheque) d'une requête UploadCheque ; None si absent."""
+    return _first(_UPLOAD_ID(payload)), _first(_UPLOAD_CHEQUE(payload))
+
+
+def addressing(root):
+    """(ReplyTo, MessageID) d'une requête WS-Addressing ; chaînes vides si absents."""
+    return _first(_REPLY_TO(root)) or '', _first(_MESSAGE_ID(root)) or ''
+
+
+# ------------------------------------------------------------------------------
+# Envoi
+# ------------------------------------------------------------------------------
+
+XML_DECL = b'<?xml version="1.0" encoding="utf-8"?>\n'
+_ENVELOPE_OPEN = (f'<soapenv:Envelope xmlns:soapenv="{NS_SOAP}" xmlns:wsa="{NS_WSA}">'
+                  f'<soapenv:Header>').encode()
+_ENVELOPE_CLOSE = b'</soapenv:Body></soapenv:Envelope>'
+
+
+def _message_id():
+    return str(uuid.uuid4()).encode()
+
+
+class SubmitTemplate:
+    """
+    Requête SubmitChequeRequest (ou SubmitChequeRequests si `batch`) adressée
+    à `reply_to`, pré-assemblée : render() n'insère que le MessageID, le
+    traceparent et, en lot, le nombre de demandes.
+    """
+
+    def __init__(self, reply_to, batch=False):
+        self._head = XML_DECL + _ENVELOPE_OPEN + b'<wsa:MessageID>urn:uuid:'
+        self._reply = (b'</wsa:MessageID><wsa:ReplyTo><wsa:Address>' + escape(reply_to)
+                       + b'</wsa:Address><wsa:ReferenceParameters>')
+        self._trace = (b'<tr:traceparent xmlns:tr="' + NS_TRACE.encode() + b'">',
+                       b'</tr:traceparent>')
+        body = b'</wsa:ReferenceParameters></wsa:ReplyTo></soapenv:Header><soapenv:Body>'
+        if batch:
+            self._body  = body + b'<SubmitChequeRequests xmlns="ms.banque.async"><count>'
+            self._close = b'</count></SubmitChequeRequests>' + _ENVELOPE_CLOSE
+        else:
+            self._body  = body + b'<SubmitChequeRequest xmlns="ms.banque.async"/>'
+            self._close = _ENVELOPE_CLOSE
+
+    def render(self, traceparent=None, count=None):
+        parts = [self._head, _message_id(), self._reply]
+        if traceparent:
+            parts += (self._trace[0], traceparent.encode('ascii'), self._trace[1])
+        parts.append(self._body)
+        if count is not None:
+            parts.append(b'%d' % count)
+        parts.append(self._close)
+        return b''.join(parts)
+
+
+_CALLBACK_HEAD = XML_DECL + _ENVELOPE_OPEN + b'<wsa:MessageID>urn:uuid:'
+_CALLBACK_TRACE = (b'<tr:traceparent xmlns:tr="' + NS_TRACE.encode()
+                   + b'" wsa:IsReferenceParameter="true">', b'</tr:traceparent>')
+_CALLBACK_BODY = b'</soapenv:Header><soapenv:Body><ChequeStatusResponse><request_id>'
+_BATCH_BODY = b'</wsa:To></soapenv:Header><soapenv:Body><ChequeStatusResponses>'
+_BATCH_CLOSE = b'</ChequeStatusResponses>' + _ENVELOPE_CLOSE
+
+
+def cheque_status_response(request_id, reply_to, relates_to, verdict, traceparent=None,
+                           status='done'):
+    """Enveloppe du callback ChequeStatusResponse envoyé par ms_banque à `reply_to`."""
+    parts = [_CALLBACK_HEAD, _message_id(),
+             b'</wsa:MessageID><wsa:RelatesTo>', escape(relates_to),
+             b'</wsa:RelatesTo><wsa:To>', escape(reply_to), b'</wsa:To>']
+    if traceparent:
+        parts += (_CALLBACK_TRACE[0], traceparent.encode('ascii'), _CALLBACK_TRACE[1])
+    parts += (_CALLBACK_BODY, escape(request_id), b'</request_id><status>', escape(status),
+              b'</status><verdict>', escape(verdict),
+              b'</verdict></ChequeStatusResponse>', _ENVELOPE_CLOSE)
+    return b''.join(parts)
+
+
+def cheque_status_batch(reply_to, verdicts, status='done'):
+    """
+    Callback groupé : un ChequeStatusResponse par élément de `verdicts`,
+    tuples (request_id, relates_to, verdict, traceparent) pour `reply_to`.
+    """
+    parts = [_CALLBACK_HEAD, _message_id(), b'</wsa:MessageID><wsa:To>', escape(reply_to),
+             _BATCH_BODY]
+    status = escape(status)
+    for request_id, relates_to, verdict, context in verdicts:
+        parts += (b'<ChequeStatusResponse><request_id>', escape(request_id),
+                  b'</request_id><status>', status, b'</status><verdict>', escape(verdict),
+                  b'</verdict><relates_to>', escape(relates_to or ''), b'</relates_to>')
+        if context:
+            parts += (b'<traceparent>', context.encode('ascii'), b'</traceparent>')
+        parts.append(b'</ChequeStatusResponse>')
+    parts.append(_BATCH_CLOSE)
+    return b''.join(parts)
+
+
+# --- réponses de ms_banque, au format de Spyne (Soap11) ---
+
+_SPYNE_HEAD = (b"<?xml version='1.0' encoding='UTF-8'?>\n<soap11env:Envelope xmlns:soap11env=\""
+               + NS_SOAP.encode() + b'"')
+_SPYNE_BODY = _SPYNE_HEAD + b' xmlns:tns="' + NS_BANQUE.encode() + b'"><soap11env:Body>'
+_SPYNE_CLOSE = b'</soap11env:Body></soap11env:Envelope>'
+
+UPLOAD_RESPONSE = _SPYNE_BODY + b'<tns:UploadChequeResponse/>' + _SPYNE_CLOSE
+
+
+def submit_response(request_id):
+    """Réponse SubmitChequeRequest portant `request_id`."""
+    return (_SPYNE_BODY + b'<tns:SubmitChequeRequestResponse><tns:SubmitChequeRequestResult>'
+            + escape(request_id) + b'</tns:SubmitChequeRequestResult></tns:SubmitChequeRequestResponse>'
+            + _SPYNE_CLOSE)
+
+
+def fault(code, message):
+    """Faute SOAP 1.1 (code sans préfixe, ex. Server.Busy)."""
+    return (_SPYNE_HEAD + b'><soap11env:Body><soap11env:Fault><faultcode>soap11env:' + escape(code)
+            + b'</faultcode><faultstring>' + escape(message)
+            + b'</faultstring><faultactor></faultactor></soap11env:Fault>' + _SPYNE_CLOSE)
@@ -0,0 +1,342 @@
+# src/common/tracing.py
+"""
+Traces distribuées partagées par l'orchestrateur et les micro‑services.
+
+Le contexte suit le format W3C Trace Context :
+
+    traceparent: 00-<trace_id 32 hex>-<span_id 16 hex>-<flags 2 hex>
+
+Il circule dans les en-têtes HTTP (GraphQL, SOAP, REST), dans les
+métadonnées gRPC et, pour le callback SOAP asynchrone, dans un en-tête
+SOAP `tr:traceparent` posé à côté des en-têtes WS-Addressing.
+
+Le span courant est porté par une ContextVar : il suit le thread de la
+requête et les tâches asyncio. Les spans terminés sont confiés à un
+exportateur interchangeable (TRACE_EXPORTER) :
+
+* memory : tampon circulaire en mémoire (défaut) ;
+* file   : une ligne JSON par span dans TRACE_FILE, partageable entre
+           services (volume commun) pour reconstituer la trace complète ;
+* none   : aucun export ;
+* module:Classe : exportateur personnalisé, construit sans argument.
+"""
+import os
+import re
+import json
+import time
+import random
+import secrets
+import threading
+import importlib
+import contextvars
+from collections import deque, namedtuple
+
+TRACEPARENT = 'traceparent'
+
+# espace de noms de l'en-tête SOAP portant le traceparent
+NS_TRACE = 'urn:webservice:trace'
+
+_TRACEPARENT_RE = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+_current = contextvars.ContextVar('current_span', default=None)
+
+
+class SpanContext(namedtuple('SpanContext', 'trace_id span_id sampled')):
+    """Identité d'un span, telle que propagée entre services."""
+
+    __slots__ = ()
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+def parse_traceparent(value):
+    """SpanContext décrit par un en-tête traceparent, None s'il est absent ou invalide."""
+    if not value:
+        return None
+    match = _TRACEPARENT_RE.match(value.strip().lower())
+    if match is None or match.group(1) == '0' * 32 or match.group(2) == '0' * 16:
+        return None
+    return SpanContext(match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1)
+
+
+# ------------------------------------------------------------------------------
+# Span courant et propagation
+# ------------------------------------------------------------------------------
+def current():
+    """SpanContext du span courant, None hors de toute trace."""
+    span = _current.get()
+    return span.context if span is not None else None
+
+
+def current_trace_id():
+    context = current()
+    return context.trace_id if context is not None else None
+
+
+def inject(headers=None, context=None):
+    """Ajoute l'en-tête traceparent du span courant (ou de `context`) à `headers`."""
+    headers = {} if headers is None else headers
+    context = context or current()
+    if context is not None:
+        headers[TRACEPARENT] = context.traceparent()
+    return headers
+
+
+def grpc_metadata(context=None):
+    """Métadonnées gRPC portant le traceparent, None hors de toute trace."""
+    context = context or current()
+    if context is None:
+        return None
+    return ((TRACEPARENT, context.traceparent()),)
+
+
+def extract(headers):
+    """SpanContext parent lu dans des en-têtes HTTP (dict ou objet Headers)."""
+    if headers is None:
+        return None
+    return parse_traceparent(headers.get(TRACEPARENT) or headers.get('Traceparent'))
+
+
+def extract_grpc(servicer_context):
+    """SpanContext parent lu dans les métadonnées d'un appel gRPC entrant."""
+    if servicer_context is None:
+        return None
+    for key, value in servicer_context.invocation_metadata() or ():
+        if key == TRACEPARENT:
+            return parse_traceparent(value)
+    return None
+
+
+# ------------------------------------------------------------------------------
+# Spans
+# ------------------------------------------------------------------------------
+class Span:
+    """Un span ; s'utilise comme context manager, qui le rend courant."""
+
+    __slots__ = ('tracer', 'name', 'context', 'parent_id', 'kind', 'attributes',
+                 'start_ns', 'end_ns', 'status', '_token')
+
+    def __init__(self, tracer, name, context, parent_id, kind, attributes):
+        self.tracer     = tracer
+        self.name       = name
+        self.context    = context
+        self.parent_id  = parent_id
+        self.kind       = kind
+        self.attributes = attributes
+        self.start_ns   = time.time_ns()
+        self.end_ns     = None
+        self.status     = 'ok'
+        self._token     = None
+
+    @property
+    def trace_id(self):
+        return self.context.trace_id
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_error(self, exc):
+        self.status = 'error'
+        self.attributes['error'] = f"{type(exc).__name__}: {exc}"
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            if self.context.sampled:
+                self.tracer.exporter.export(self.to_dict())
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.record_error(exc)
+        _current.reset(self._token)
+        self.end()
+        return False
+
+    def to_dict(self):
+        return {
+            "trace_id":   self.context.trace_id,
+            "span_id":    self.context.span_id,
+            "parent_id":  self.parent_id,
+            "name":       self.name,
+            "service":    self.tracer.service,
+            "kind":       self.kind,
+            "start_ns":   self.start_ns,
+            "end_ns":     self.end_ns,
+            "status":     self.status,
+            "attributes": self.attributes,
+        }
+
+
+class Tracer:
+    """Fabrique de spans d'un service."""
+
+    def __init__(self, service, exporter=None, sample_rate=1.0):
+        self.service     = service
+        self.exporter    = exporter if exporter is not None else InMemoryExporter()
+        self.sample_rate = sample_rate
+
+    def span(self, name, parent=None, kind='internal', **attributes):
+        """
+        Nouveau span, enfant de `parent` (SpanContext reçu d'un autre service)
+        ou à défaut du span courant ; sans l'un ni l'autre, une trace démarre.
+        """
+        parent = parent or current()
+        if parent is not None:
+            trace_id, sampled, parent_id = parent.trace_id, parent.sampled, parent.span_id
+        else:
+            trace_id, parent_id = secrets.token_hex(16), None
+            sampled = self.sample_rate >= 1 or random.random() < self.sample_rate
+        context = SpanContext(trace_id, secrets.token_hex(8), sampled)
+        return Span(self, name, context, parent_id, kind, attributes)
+
+
+# ------------------------------------------------------------------------------
+# Exportateurs
+# ------------------------------------------------------------------------------
+class SpanExporter:
+    """Interface d'un exportateur : export() à la fin de chaque span, find() pour /debug/trace."""
+
+    def export(self, span):
+        raise NotImplementedError
+
+    def find(self, trace_id):
+        return []
+
+    def close(self):
+        pass
+
+
+class NullExporter(SpanExporter):
+    def export(self, span):
+        pass
+
+
+class InMemoryExporter(SpanExporter):
+    """Derniers `maxspans` spans en mémoire."""
+
+    def __init__(self, maxspans=10000):
+        self._lock  = threading.Lock()
+        self._spans = deque(maxlen=maxspans)
+
+    def export(self, span):
+        with self._lock:
+            self._spans.append(span)
+
+    def find(self, trace_id):
+        with self._lock:
+            return [s for s in self._spans if s['trace_id'] == trace_id]
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+
+class FileExporter(SpanExporter):
+    """
+    Spans en JSON lines, ajoutés en fin de fichier (O_APPEND) : plusieurs
+    processus peuvent écrire dans le même fichier, une ligne par write().
+    """
+
+    def __init__(self, path):
+        self.path  = path
+        self._lock = threading.Lock()
+        self._fd   = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def export(self, span):
+        line = (json.dumps(span, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+        with self._lock:
+            os.write(self._fd, line)
+
+    def find(self, trace_id):
+        needle = f'"trace_id":"{trace_id}"'
+        spans = []
+        with open(self.path, encoding='utf-8') as fh:
+            for line in fh:
+                if needle in line:
+                    spans.append(json.loads(line))
+        return spans
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+
+def exporter_from_env():
+    kind = os.getenv('TRACE_EXPORTER', 'memory')
+    if kind == 'memory':
+        return InMemoryExporter(int(os.getenv('TRACE_MEMORY_SPANS', '10000')))
+    if kind == 'file':
+        return FileExporter(os.getenv('TRACE_FILE', 'spans.jsonl'))
+    if kind == 'none':
+        return NullExporter()
+    if ':' in kind:
+        module, _, cls = kind.partition(':')
+        return getattr(importlib.import_module(module), cls)()
+    raise ValueError(f"TRACE_EXPORTER inconnu : {kind}")
+
+
+def tracer_from_env(service):
+    return Tracer(service, exporter_from_env(),
+                  sample_rate=float(os.getenv('TRACE_SAMPLE_RATE', '1')))
+
+
+# ------------------------------------------------------------------------------
+# Vue en cascade
+# ------------------------------------------------------------------------------
+def waterfall(spans):
+    """
+    Ordonne les spans d'une trace en cascade : chaque enfant suit son parent,
+    avec sa profondeur, son décalage depuis le début de la trace et sa durée (ms).
+    """
+    if not spans:
+        return []
+    ids = {s['span_id'] for s in spans}
+    children = {}
+    for s in sorted(spans, key=lambda s: s['start_ns']):
+        parent = s['parent_id'] if s['parent_id'] in ids else None
+        children.setdefault(parent, []).append(s)
+    origin = min(s['start_ns'] for s in spans)
+
+    rows = []
+
+    def walk(parent, depth):
+        for s in children.get(parent, ()):
+            rows.append({
+                "depth":       depth,
+                "service":     s['service'],
+                "name":        s['name'],
+                "kind":        s['kind'],
+                "span_id":     s['span_id'],
+                "parent_id":   s['parent_id'],
+                "offset_ms":   round((s['start_ns'] - origin) / 1e6, 3),
+                "duration_ms": round(((s['end_ns'] or s['start_ns']) - s['start_ns']) / 1e6, 3),
+                "status":      s['status'],
+                "attributes":  s['attributes'],
+            })
+            walk(s['span_id'], depth + 1)
+
+    walk(None, 0)
+    return rows
+
+
+def render_waterfall(rows, width=60):
+    """Représentation texte de la cascade, une barre par span."""
+    if not rows:
+        return ''
+    total = max(r['offset_ms'] + r['duration_ms'] for r in rows) or 1.0
+    lines = []
+    for r in rows:
+        start = int(r['offset_ms'] / total * width)
+        size  = max(1, int(r['duration_ms'] / total * width))
+        label = f"{'  ' * r['depth']}{r['service']} {r['name']}"
+        bar   = ' ' * start + '█' * size
+        lines.append(f"{label:<48.48} |{bar:<{width}}| {r['duration_ms']:9.3f} ms"
+                     + (' !' if r['status'] != 'ok' else ''))
+    return '\n'.join(lines) + '\n'
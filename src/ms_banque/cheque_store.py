@@ -0,0 +1,323 @@
+# src/ms_banque/cheque_store.py
+"""
+Stockage des demandes de chèque de ms_banque.
+
+ChequeStore offre l'API dict utilisée par le service (get, [], in, get_many,
+update, pop, len, clear) :
+
+* verrous répartis : `stripes` segments, chacun son dict et son verrou,
+  choisis par hash(request_id) ; les handlers SOAP concurrents (gthread)
+  ne se bloquent que sur un même segment ;
+* expiration : une demande terminée (status done) expire `done_ttl` s après
+  sa dernière écriture, une demande en attente `pending_ttl` s après (dépôt
+  jamais reçu) ; chaque segment tient un tas des échéances, purgé à
+  l'écriture : la mémoire reste bornée par le débit, pas par la durée de
+  fonctionnement ;
+* journal optionnel (`path`) : chaque écriture est ajoutée (JSON, une ligne)
+  à un fichier append-only rejoué au démarrage, de sorte que les demandes en
+  attente survivent à un redémarrage ; quand le journal dépasse
+  `compact_ratio` fois le nombre d'entrées vivantes, il est réécrit (entrées
+  vivantes seulement, fichier temporaire puis os.replace) ; `fsync` : écriture
+  synchronisée sur disque (sinon perdue seulement en cas de panne système).
+
+Une valeur lue est une copie ; toute modification doit être réécrite.
+Le journal est propre au processus : plusieurs workers partagent les
+demandes par BANQUE_STORE_PATH (SQLite, cf. common/shared_store.py).
+"""
+import os
+import json
+import time
+import heapq
+import threading
+
+from common import shared_store
+
+_MISSING = object()
+
+
+def ttl_for(value, done_ttl, pending_ttl):
+    """TTL (s) d'une demande selon son statut ; 0 : sans expiration."""
+    return done_ttl if value.get('status') == 'done' else pending_ttl
+
+
+def _is_record(record):
+    """Ligne du journal : [clé] (suppression) ou [clé, valeur JSON, échéance ou null]."""
+    if not isinstance(record, list) or len(record) not in (1, 3) or not isinstance(record[0], str):
+        return False
+    return len(record) == 1 or (isinstance(record[1], str) and
+                                (record[2] is None or isinstance(record[2], (int, float))))
+
+
+class _Stripe:
+    __slots__ = ('lock', 'entries', 'deadlines')
+
+    def __init__(self):
+        self.lock      = threading.Lock()
+        self.entries   = {}      # request_id → (valeur JSON, échéance ou None)
+        self.deadlines = []      # tas (échéance, request_id), suppression paresseuse
+
+
+class ChequeStore:
+    def __init__(self, path=None, stripes=16, done_ttl=3600.0, pending_ttl=7 * 86400.0,
+                 compact_ratio=4.0, compact_min=10000, fsync=False):
+        self.path          = path
+        self.done_ttl      = done_ttl
+        self.pending_ttl   = pending_ttl
+        self.compact_ratio = compact_ratio
+        self.compact_min   = compact_min
+        self.fsync         = fsync
+        self._stripes      = [_Stripe() for _ in range(stripes)]
+        self._log_lock     = threading.Lock()
+        self._log          = None
+        self._records      = 0           # lignes du journal
+        self._compact_at   = compact_min
+        self.compactions   = 0
+        if path:
+            self._replay()
+            self._log = open(path, 'a', encoding='utf-8')
+
+    # --- segments et échéances ---
+
+    def _stripe(self, key):
+        return self._stripes[hash(key) % len(self._stripes)]
+
+    def _expires(self, value, now):
+        ttl = ttl_for(value, self.done_ttl, self.pending_ttl)
+        return now + ttl if ttl else None
+
+    @staticmethod
+    def _live(item, now):
+        return item is not None and (item[1] is None or item[1] > now)
+
+    def _store(self, stripe, key, raw, expires):
+        # sous stripe.lock
+        stripe.entries[key] = (raw, expires)
+        if expires is not None:
+            heapq.heappush(stripe.deadlines, (expires, key))
+
+    @staticmethod
+    def _purge(stripe, now):
+        # sous stripe.lock : échéances dépassées ; une entrée réécrite depuis
+        # garde sa nouvelle échéance (entrée du tas périmée, ignorée)
+        deadlines, entries = stripe.deadlines, stripe.entries
+        while deadlines and deadlines[0][0] <= now:
+            expires, key = heapq.heappop(deadlines)
+            item = entries.get(key)
+            if item is not None and item[1] == expires:
+                del entries[key]
+        if len(deadlines) > 2 * len(entries) + 64:
+            # échéances périmées (entrées réécrites ou supprimées) : tas reconstruit
+            deadlines[:] = [(item[1], key) for key, item in entries.items() if item[1] is not None]
+            heapq.heapify(deadlines)
+
+    # --- lecture ---
+
+    def get(self, key, default=None):
+        stripe = self._stripe(key)
+        with stripe.lock:
+            item = stripe.entries.get(key)
+        if not self._live(item, time.time()):
+            return default
+        return json.loads(item[0])
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        stripe = self._stripe(key)
+        with stripe.lock:
+            return self._live(stripe.entries.get(key), time.time())
+
+    def get_many(self, keys):
+        """{clé: valeur} des clés présentes (et non expirées) parmi `keys`."""
+        found, now = {}, time.time()
+        for key in keys:
+            stripe = self._stripe(key)
+            with stripe.lock:
+                item = stripe.entries.get(key)
+            if self._live(item, now):
+                found[key] = json.loads(item[0])
+        return found
+
+    def __len__(self):
+        total, now = 0, time.time()
+        for stripe in self._stripes:
+            with stripe.lock:
+                self._purge(stripe, now)
+                total += len(stripe.entries)
+        return total
+
+    # --- écriture ---
+
+    def __setitem__(self, key, value):
+        self.update({key: value})
+
+    def update(self, entries):
+        """Écrit les entrées de `entries` (dict) ; une seule écriture du journal."""
+        now = time.time()
+        items = [(key, json.dumps(value), self._expires(value, now))
+                 for key, value in entries.items()]
+        stripes = {}
+        for item in items:
+            stripes.setdefault(id(self._stripe(item[0])), []).append(item)
+        # verrous des segments concernés, dans l'ordre de la liste (cf. compact())
+        locked = [s for s in self._stripes if id(s) in stripes]
+        for stripe in locked:
+            stripe.lock.acquire()
+        try:
+            self._append(''.join(json.dumps([key, raw, expires]) + '\n'
+                                 for key, raw, expires in items), len(items))
+            for stripe in locked:
+                for key, raw, expires in stripes[id(stripe)]:
+                    self._store(stripe, key, raw, expires)
+                self._purge(stripe, now)
+        finally:
+            for stripe in reversed(locked):
+                stripe.lock.release()
+        self._maybe_compact()
+
+    def pop(self, key, default=None):
+        stripe = self._stripe(key)
+        with stripe.lock:
+            item = stripe.entries.pop(key, None)
+            if item is not None:
+                self._append(json.dumps([key]) + '\n', 1)
+        if not self._live(item, time.time()):
+            return default
+        return json.loads(item[0])
+
+    def __delitem__(self, key):
+        if self.pop(key, _MISSING) is _MISSING:
+            raise KeyError(key)
+
+    def clear(self):
+        for stripe in self._stripes:
+            stripe.lock.acquire()
+        try:
+            for stripe in self._stripes:
+                stripe.entries.clear()
+                stripe.deadlines.clear()
+            if self._log is not None:
+                with self._log_lock:
+                    self._log.truncate(0)
+                    self._log.seek(0)
+                    self._records = 0
+        finally:
+            for stripe in reversed(self._stripes):
+                stripe.lock.release()
+
+    # --- journal ---
+
+    def _append(self, lines, count):
+        if self._log is None:
+            return
+        with self._log_lock:
+            self._log.write(lines)
+            self._log.flush()
+            if self.fsync:
+                os.fsync(self._log.fileno())
+            self._records += count
+
+    def _replay(self):
+        now, valid, newline = time.time(), 0, True
+        try:
+            fh = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+        with fh:
+            for line in fh:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break        # dernière ligne tronquée (arrêt pendant l'écriture)
+                if not _is_record(record):
+                    break        # ligne corrompue : traitée comme une fin tronquée
+                valid += len(line)
+                newline = line.endswith(b'\n')
+                self._records += 1
+                stripe = self._stripe(record[0])
+                if len(record) == 1:
+                    stripe.entries.pop(record[0], None)
+                elif record[2] is None or record[2] > now:
+                    self._store(stripe, *record)
+                else:
+                    stripe.entries.pop(record[0], None)
+        for stripe in self._stripes:
+            self._purge(stripe, now)
+        if valid and not newline or os.path.getsize(self.path) > valid:
+            # fin tronquée retirée (ou fin de ligne manquante ajoutée) : les
+            # écritures suivantes commencent sur une ligne neuve
+            with open(self.path, 'r+b') as fh:
+                fh.truncate(valid)
+                if valid and not newline:
+                    fh.seek(valid)
+                    fh.write(b'\n')
+
+    def _maybe_compact(self):
+        # seuil recalculé à chaque vérification : len() n'est pas évalué à chaque écriture
+        if self._log is None or self._records < self._compact_at:
+            return
+        live = len(self)
+        if self._records > self.compact_ratio * max(1, live):
+            live = self.compact()
+        self._compact_at = max(self.compact_min, int(self.compact_ratio * live))
+
+    def compact(self):
+        """Réécrit le journal avec les seules entrées vivantes ; renvoie leur nombre."""
+        if self._log is None:
+            return 0
+        for stripe in self._stripes:
+            stripe.lock.acquire()
+        try:
+            now, live = time.time(), 0
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as out:
+                for stripe in self._stripes:
+                    self._purge(stripe, now)
+                    for key, (raw, expires) in stripe.entries.items():
+                        out.write(json.dumps([key, raw, expires]) + '\n')
+                    live += len(stripe.entries)
+                out.flush()
+                os.fsync(out.fileno())
+            with self._log_lock:
+                self._log.close()
+                os.replace(tmp, self.path)
+                self._log = open(self.path, 'a', encoding='utf-8')
+                self._records = live
+                self.compactions += 1
+            return live
+        finally:
+            for stripe in reversed(self._stripes):
+                stripe.lock.release()
+
+    def log_bytes(self):
+        if self._log is None:
+            return 0
+        with self._log_lock:
+            return os.fstat(self._log.fileno()).st_size
+
+    def close(self):
+        if self._log is not None:
+            with self._log_lock:
+                self._log.close()
+                self._log = None
+
+
+def from_env():
+    """
+    BANQUE_STORE_PATH : SQLite commun aux workers ; sinon ChequeStore, journalisé
+    si BANQUE_STORE_LOG est défini. TTL : BANQUE_DONE_TTL, BANQUE_PENDING_TTL.
+    """
+    done_ttl    = float(os.getenv('BANQUE_DONE_TTL', '3600'))
+    pending_ttl = float(os.getenv('BANQUE_PENDING_TTL', str(7 * 86400)))
+    path = os.getenv('BANQUE_STORE_PATH')
+    if path:
+        return shared_store.SharedDict(path, table='cheques',
+                                       ttl=lambda value: ttl_for(value, done_ttl, pending_ttl))
+    return ChequeStore(os.getenv('BANQUE_STORE_LOG') or None,
+                       stripes=int(os.getenv('BANQUE_STORE_STRIPES', '16')),
+                       done_ttl=done_ttl, pending_ttl=pending_ttl,
+                       fsync=os.getenv('BANQUE_STORE_FSYNC', '0') == '1')
@@ -1,78 +1,192 @@
-from spyne import Application, rpc, ServiceBase, Unicode, ComplexModel
+from spyne import Application, rpc, ServiceBase, Unicode, Integer, Array, ComplexModel
 from spyne.protocol.soap import Soap11
 from spyne.server.wsgi import WsgiApplication
+from spyne.model.fault import Fault
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
 from lxml import etree
-import uuid, threading, requests
+import io, os, json, time, uuid, atexit, logging, threading
+from common import tracing, serving, shared_store, soap
+from common import metrics as prometheus
+from common.callbacks import CallbackDispatcher, CallbackBatcher, QueueFull
+import cheque_store
 
-# --- store in-memory instead of Redis ---
-_STORE = {}
+logger = logging.getLogger(__name__)
+
+# --- demandes de chèque (cf. cheque_store.py) : verrous répartis, expiration
+# des demandes terminées, journal append-only (BANQUE_STORE_LOG) ou SQLite
+# commun aux workers (BANQUE_STORE_PATH) ; une demande lue est une copie, à réécrire
+_STORE = cheque_store.from_env()
+serving.require_shared('BANQUE_STORE_PATH', shared_store.is_shared(_STORE),
+                       "définir BANQUE_STORE_PATH")
+
+# taille maximale d'un lot SubmitChequeRequests
+MAX_BATCH = 1000
+# taille maximale d'un lot UploadCheques / GetChequeStatuses
+MAX_ITEMS = int(os.getenv('BANQUE_MAX_ITEMS', '10000'))
+
+# --- métriques Prometheus (servies sur /metrics à côté de l'endpoint SOAP) ---
+REGISTRY  = CollectorRegistry()
+_BUCKETS  = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5)
+LATENCY   = Histogram('soap_operation_duration_seconds', "Durée des opérations SOAP",
+                      ['operation'], buckets=_BUCKETS, registry=REGISTRY)
+IN_FLIGHT = Gauge('soap_operations_in_flight', "Opérations SOAP en cours",
+                  multiprocess_mode='livesum', registry=REGISTRY)
+ERRORS    = Counter('soap_errors', "Erreurs par opération et motif", ['operation', 'reason'],
+                    registry=REGISTRY)
+CALLBACK_LATENCY = Histogram('callback_duration_seconds', "Durée d'une tentative de callback vers le client",
+                             buckets=_BUCKETS, registry=REGISTRY)
+CALLBACK_DELIVERY = Histogram('callback_delivery_seconds',
+                              "Délai entre le dépôt du chèque et la livraison du callback",
+                              buckets=_BUCKETS + (10, 30, 60, 120, 300), registry=REGISTRY)
+CALLBACK_BATCH = Histogram('callback_batch_size', "Verdicts par enveloppe de callback",
+                           buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500), registry=REGISTRY)
+_callback_attempts = Counter('callback_attempts', "Tentatives de callback par issue",
+                             ['outcome'], registry=REGISTRY)
+CALLBACK_ATTEMPTS = {outcome: _callback_attempts.labels(outcome)
+                     for outcome in ('success', 'retry', 'dead')}
+CALLBACK_QUEUE = prometheus.CallbackGauge('callback_queue_depth',
+                                          "Callbacks en file ou en attente de reprise",
+                                          registry=REGISTRY)
+DEAD_LETTERS = prometheus.CallbackGauge('callback_dead_letters',
+                                        "Callbacks abandonnés (lettres mortes)", registry=REGISTRY)
+BATCH_ITEMS = Histogram('soap_batch_items', "Éléments par appel groupé", ['operation'],
+                        buckets=(1, 10, 50, 100, 500, 1000, 5000, 10000), registry=REGISTRY)
+STORE_SIZE = prometheus.CallbackGauge('cheque_requests', "Demandes de chèque conservées",
+                                       registry=REGISTRY)
+STORE_SIZE.set_function(lambda: len(_STORE))
+if isinstance(_STORE, cheque_store.ChequeStore) and _STORE.path:
+    STORE_LOG = prometheus.CallbackGauge('cheque_store_log_bytes', "Taille du journal des demandes",
+                                         registry=REGISTRY)
+    STORE_LOG.set_function(_STORE.log_bytes)
+    atexit.register(_STORE.close)
+
+# --- traces : span par opération, callback rattaché au dépôt d'origine ---
+tracer = tracing.tracer_from_env('ms_banque')
+
+# --- callbacks : pool borné de workers, file bornée, session par hôte,
+#     reprises avec backoff et lettres mortes (cf. common/callbacks.py) ---
+def _callback_attempt(outcome, duration):
+    CALLBACK_LATENCY.observe(duration)
+    CALLBACK_ATTEMPTS[outcome].inc()
+
+callbacks = CallbackDispatcher(
+    workers=int(os.getenv('CALLBACK_WORKERS', '8')),
+    queue_size=int(os.getenv('CALLBACK_QUEUE_SIZE', '10000')),
+    max_attempts=int(os.getenv('CALLBACK_MAX_ATTEMPTS', '6')),
+    backoff_base=float(os.getenv('CALLBACK_BACKOFF_BASE', '0.5')),
+    backoff_max=float(os.getenv('CALLBACK_BACKOFF_MAX', '30')),
+    timeout=float(os.getenv('CALLBACK_TIMEOUT', '5')),
+    enqueue_timeout=float(os.getenv('CALLBACK_ENQUEUE_TIMEOUT', '5')),
+    dead_letter_max=int(os.getenv('CALLBACK_DEAD_LETTERS', '1000')),
+    tracer=tracer, on_attempt=_callback_attempt, on_delivered=CALLBACK_DELIVERY.observe)
+atexit.register(callbacks.stop)
+DEAD_LETTERS.set_function(lambda: len(callbacks.dead))
+
+def _callback_envelope(reply_to, verdicts):
+    # verdicts : (request_id, relates_to, verdict, traceparent)
+    if len(verdicts) == 1:
+        # enveloppe simple, construite à chaque tentative pour porter le contexte
+        # du span d'envoi (paramètre de référence WS-Addressing)
+        request_id, relates_to, verdict, _ = verdicts[0]
+        return lambda context: soap.cheque_status_response(request_id, reply_to, relates_to,
+                                                           verdict, traceparent=context)
+    return soap.cheque_status_batch(reply_to, verdicts)
+
+# regroupement des verdicts par ReplyTo : une enveloppe pour au plus
+# CALLBACK_BATCH_MAX verdicts reçus dans une fenêtre de CALLBACK_BATCH_WINDOW s
+batcher = CallbackBatcher(
+    callbacks, _callback_envelope,
+    window=float(os.getenv('CALLBACK_BATCH_WINDOW', '0.02')),
+    max_batch=int(os.getenv('CALLBACK_BATCH_MAX', '100')),
+    headers={'Content-Type': 'application/soap+xml; charset=utf-8'},
+    on_flush=CALLBACK_BATCH.observe)
+atexit.register(batcher.stop)      # exécuté avant callbacks.stop (ordre inverse)
+CALLBACK_QUEUE.set_function(lambda: callbacks.pending() + batcher.pending())
 
 class ChequeStatus(ComplexModel):
     status  = Unicode
     verdict = Unicode
 
-def send_callback(request_id, reply_to, relates_to, verdict):
-    NS_WSA = 'http://www.w3.org/2005/08/addressing'
-    root = etree.Element(
-        "{http://schemas.xmlsoap.org/soap/envelope/}Envelope",
-        nsmap={None:"http://schemas.xmlsoap.org/soap/envelope/", 'wsa':NS_WSA}
-    )
-    hdr = etree.SubElement(root, "{http://schemas.xmlsoap.org/soap/envelope/}Header")
-    etree.SubElement(hdr, f"{{{NS_WSA}}}MessageID").text   = str(uuid.uuid4())
-    etree.SubElement(hdr, f"{{{NS_WSA}}}RelatesTo").text   = relates_to
-    etree.SubElement(hdr, f"{{{NS_WSA}}}To").text         = reply_to
-
-    body = etree.SubElement(root, "{http://schemas.xmlsoap.org/soap/envelope/}Body")
-    resp = etree.SubElement(body, "ChequeStatusResponse")
-    etree.SubElement(resp, "request_id").text = request_id
-    etree.SubElement(resp, "status").text     = "done"
-    etree.SubElement(resp, "verdict").text    = verdict
-
-    xml = etree.tostring(root, xml_declaration=True, encoding='utf-8')
+class ChequeUpload(ComplexModel):
+    __namespace__ = 'ms.banque.async'
+    request_id = Unicode
+    cheque     = Unicode
+
+class ChequeResult(ComplexModel):
+    # status : done, unknown, pending, ou busy (verdict enregistré, callback
+    # non mis en file : file saturée, dépôt à renvoyer plus tard)
+    __namespace__ = 'ms.banque.async'
+    request_id = Unicode
+    status     = Unicode
+    verdict    = Unicode
+
+def send_callback(request_id, reply_to, relates_to, verdict, traceparent=None):
+    """Met le verdict en file (QueueFull si la file reste saturée) ; envoi groupé par les workers."""
+    batcher.add(reply_to, (request_id, relates_to, verdict, traceparent), traceparent)
+
+def _addressing(ctx):
+    # (ReplyTo, MessageID) par XPath compilé (cf. common/soap.py)
+    return soap.addressing(ctx.in_document)
+
+def _verdict(cheque):
+    return "Chèque validé" if cheque == 'valid' else "Chèque invalide"
+
+def _batch(operation, items):
+    items = items or []
+    if len(items) > MAX_ITEMS:
+        raise Fault('Client.TooLarge', f"{len(items)} éléments (max {MAX_ITEMS})")
+    BATCH_ITEMS.labels(operation).observe(len(items))
+    return items
+
+def _upload(request_id, cheque):
+    data = _STORE.get(request_id)
+    if not data:
+        return
+    verdict = _verdict(cheque)
+    data['status']  = 'done'
+    data['verdict'] = verdict
+    _STORE[request_id] = data
+    # callback envoyé en arrière-plan ; file saturée : le verdict est
+    # conservé, le client peut renvoyer le chèque plus tard
     try:
-        requests.post(
-            reply_to,
-            data=xml,
-            headers={'Content-Type':'application/soap+xml; charset=utf-8'},
-            timeout=5
-        )
-    except:
-        pass
+        send_callback(request_id, data['reply_to'], data['relates_to'], verdict,
+                      data.get('traceparent'))
+    except QueueFull as exc:
+        raise Fault('Server.Busy', f"Callbacks saturés, réessayez plus tard ({exc})")
+
+def _new_request(reply_to, relates_to):
+    req_id  = str(uuid.uuid4())
+    context = tracing.current()
+    _STORE[req_id] = {
+        'status':     'pending',
+        'verdict':    '',
+        'reply_to':   reply_to,
+        'relates_to': relates_to,
+        'traceparent': context.traceparent() if context else None
+    }
+    return req_id
 
 class BanqueAsync(ServiceBase):
     __namespace__ = 'ms.banque.async'
 
     @rpc(_returns=Unicode)
     def SubmitChequeRequest(ctx):
-        tree       = ctx.in_document
-        ns_wsa     = {'wsa':'http://www.w3.org/2005/08/addressing'}
-        reply_to   = tree.findtext('.//wsa:ReplyTo/wsa:Address', namespaces=ns_wsa) or ''
-        relates_to = tree.findtext('.//wsa:MessageID',      namespaces=ns_wsa) or ''
-
-        req_id = str(uuid.uuid4())
-        _STORE[req_id] = {
-            'status':     'pending',
-            'verdict':    '',
-            'reply_to':   reply_to,
-            'relates_to': relates_to
-        }
-        return req_id
+        reply_to, relates_to = _addressing(ctx)
+        return _new_request(reply_to, relates_to)
+
+    @rpc(Integer, _returns=Array(Unicode))
+    def SubmitChequeRequests(ctx, count):
+        # enregistrement groupé : `count` demandes pour un seul aller-retour SOAP
+        count = max(0, count or 0)
+        if count > MAX_BATCH:
+            # refus explicite : un lot tronqué renverrait moins d'identifiants que demandé
+            raise Fault('Client.TooLarge', f"{count} demandes (max {MAX_BATCH})")
+        reply_to, relates_to = _addressing(ctx)
+        return [_new_request(reply_to, relates_to) for _ in range(count)]
 
     @rpc(Unicode, Unicode, _returns=None)
     def UploadCheque(ctx, request_id, cheque):
-        data = _STORE.get(request_id)
-        if not data:
-            return None
-        verdict = "Chèque validé" if cheque == 'valid' else "Chèque invalide"
-        data['status']  = 'done'
-        data['verdict'] = verdict
-        # lancer le callback en arrière-plan
-        threading.Thread(
-            target=send_callback,
-            args=(request_id, data['reply_to'], data['relates_to'], verdict),
-            daemon=True
-        ).start()
-        return None
+        _upload(request_id, cheque)
 
     @rpc(Unicode, _returns=ChequeStatus)
     def GetChequeStatus(ctx, request_id):
@@ -81,6 +195,54 @@ class BanqueAsync(ServiceBase):
             return ChequeStatus(status='unknown', verdict='')
         return ChequeStatus(status=data['status'], verdict=data['verdict'])
 
+    @rpc(Array(ChequeUpload), _returns=Array(ChequeResult))
+    def UploadCheques(ctx, uploads):
+        # dépôt groupé : une lecture et une écriture du store pour tout le lot,
+        # puis un callback par verdict (regroupés par ReplyTo, cf. CallbackBatcher)
+        uploads = _batch('UploadCheques', uploads)
+        stored  = _STORE.get_many({u.request_id for u in uploads})
+        results, updated = [], {}
+        for upload in uploads:
+            data = stored.get(upload.request_id)
+            if not data:
+                results.append(ChequeResult(request_id=upload.request_id, status='unknown',
+                                            verdict=''))
+                continue
+            data = dict(data, status='done', verdict=_verdict(upload.cheque))
+            updated[upload.request_id] = data
+            results.append(ChequeResult(request_id=upload.request_id, status='done',
+                                        verdict=data['verdict']))
+        _STORE.update(updated)
+        busy = False
+        for result, upload in zip(results, uploads):
+            if result.status != 'done':
+                continue
+            if not busy:
+                data = stored[upload.request_id]
+                try:
+                    send_callback(upload.request_id, data['reply_to'], data['relates_to'],
+                                  result.verdict, data.get('traceparent'))
+                    continue
+                except QueueFull:
+                    # file saturée : inutile d'attendre à nouveau pour le reste du lot
+                    busy = True
+            result.status = 'busy'
+        return results
+
+    @rpc(Array(Unicode), _returns=Array(ChequeResult))
+    def GetChequeStatuses(ctx, request_ids):
+        request_ids = _batch('GetChequeStatuses', request_ids)
+        stored = _STORE.get_many(set(request_ids))
+        results = []
+        for request_id in request_ids:
+            data = stored.get(request_id)
+            if data:
+                results.append(ChequeResult(request_id=request_id, status=data['status'],
+                                            verdict=data['verdict']))
+            else:
+                results.append(ChequeResult(request_id=request_id, status='unknown', verdict=''))
+        return results
+
 application = Application(
     [BanqueAsync],
     tns='ms.banque.async',
@@ -88,7 +250,158 @@ application = Application(
     out_protocol=Soap11()
 )
 
+# instrumentation via les événements Spyne, autour de l'appel de chaque méthode
+def _trace_parent(environ, document):
+    # traceparent HTTP, sinon en-tête SOAP (paramètre de référence WS-Addressing)
+    parent = tracing.parse_traceparent((environ or {}).get('HTTP_TRACEPARENT'))
+    if parent is None and document is not None:
+        parent = tracing.parse_traceparent(soap.traceparent(document))
+    return parent
+
+def _on_call(ctx):
+    IN_FLIGHT.inc()
+    parent = _trace_parent(getattr(ctx.transport, 'req_env', None), ctx.in_document)
+    span = tracer.span(ctx.descriptor.name, parent=parent, kind='server')
+    ctx.udc = (time.perf_counter(), span.__enter__())
+
+def _on_return(ctx, exc=None):
+    IN_FLIGHT.dec()
+    start, span = ctx.udc
+    LATENCY.labels(ctx.descriptor.name).observe(time.perf_counter() - start)
+    span.__exit__(type(exc) if exc else None, exc, None)
+
+def _on_exception(ctx):
+    name = ctx.descriptor.name if ctx.descriptor else 'unknown'
+    # requête rejetée avant l'appel (validation du schéma) : pas de span ouvert
+    if ctx.udc is not None:
+        _on_return(ctx, ctx.out_error)
+    ERRORS.labels(name, type(ctx.out_error).__name__).inc()
+
+application.event_manager.add_listener('method_call', _on_call)
+application.event_manager.add_listener('method_return_object', _on_return)
+application.event_manager.add_listener('method_exception_object', _on_exception)
+
+# --- chemin rapide : SubmitChequeRequest et UploadCheque sans Spyne ---
+# BANQUE_FAST_PATH=1 : la requête est analysée par le parser durci de
+# common/soap.py et validée par le schéma que Spyne a compilé au démarrage
+# (celui du WSDL) ; réponses et fautes identiques à celles de Spyne. Toute
+# autre requête, ou une requête invalide, passe par Spyne (même faute qu'avant).
+FAST_PATH = os.getenv('BANQUE_FAST_PATH', '1') == '1'
+
+# un XMLSchema lxml ne se partage pas entre threads : chaque thread compile le
+# sien depuis les documents XSD de Spyne, sérialisés une fois au démarrage
+# (imports résolus en mémoire, comme les parsers de common/soap.py)
+_XSD = {f'{prefix}.xsd': etree.tostring(node)
+        for prefix, node in application.interface.docs.xml_schema.schema_dict.items()}
+_XSD_MAIN = f'{application.interface.get_namespace_prefix(application.interface.tns)}.xsd'
+_schemas = threading.local()
+
+class _XsdResolver(etree.Resolver):
+    def resolve(self, url, pubid, context):
+        data = _XSD.get(url.rsplit('/', 1)[-1])
+        if data is not None:
+            return self.resolve_string(data, context, base_url=url)
+
+def _schema():
+    schema = getattr(_schemas, 'schema', None)
+    if schema is None:
+        parser = etree.XMLParser(resolve_entities=False, no_network=True)
+        parser.resolvers.add(_XsdResolver())
+        schema = _schemas.schema = etree.XMLSchema(
+            etree.fromstring(_XSD[_XSD_MAIN], parser, base_url=_XSD_MAIN))
+    return schema
+
+def _valid(payload):
+    return _schema().validate(payload)
+
+def _fast_submit(root, payload):
+    reply_to, relates_to = soap.addressing(root)
+    return soap.submit_response(_new_request(reply_to, relates_to))
+
+def _fast_upload(root, payload):
+    _upload(*soap.upload_fields(payload))
+    return soap.UPLOAD_RESPONSE
+
+_FAST_OPERATIONS = {
+    f'{{{soap.NS_BANQUE}}}SubmitChequeRequest': ('SubmitChequeRequest', _fast_submit),
+    f'{{{soap.NS_BANQUE}}}UploadCheque':        ('UploadCheque', _fast_upload),
+}
+
+def _fast_call(name, handler, environ, root, payload, start_response):
+    # mêmes métriques et span que les événements Spyne ci-dessus
+    IN_FLIGHT.inc()
+    start  = time.perf_counter()
+    status = '200 OK'
+    try:
+        with tracer.span(name, parent=_trace_parent(environ, root), kind='server'):
+            body = handler(root, payload)
+    except Fault as exc:
+        ERRORS.labels(name, type(exc).__name__).inc()
+        status, body = '500 Internal Server Error', soap.fault(exc.faultcode, exc.faultstring)
+    except Exception as exc:
+        # comme Spyne : erreur journalisée, faute Server générique sans détail interne
+        logger.exception("%s : erreur inattendue", name)
+        ERRORS.labels(name, type(exc).__name__).inc()
+        status, body = '500 Internal Server Error', soap.fault('Server', 'Internal Error')
+    finally:
+        IN_FLIGHT.dec()
+        LATENCY.labels(name).observe(time.perf_counter() - start)
+    start_response(status, [('Content-Type', 'text/xml; charset=utf-8'),
+                            ('Content-Length', str(len(body)))])
+    return [body]
+
+def _fast_path(environ, start_response, soap_app):
+    length = environ.get('CONTENT_LENGTH')
+    if not length:
+        return soap_app(environ, start_response)
+    data = environ['wsgi.input'].read(int(length))
+    operation = None
+    try:
+        root = soap.parse(data)
+        payload = soap.payload(root)
+        operation = _FAST_OPERATIONS.get(payload.tag) if payload is not None else None
+    except soap.SoapError:
+        pass
+    if operation is None or not _valid(payload):
+        environ['wsgi.input'] = io.BytesIO(data)
+        return soap_app(environ, start_response)
+    return _fast_call(*operation, environ, root, payload, start_response)
+
+def _admin_callbacks(environ, start_response):
+    """GET : état de la file et lettres mortes ; POST : renvoi des lettres mortes."""
+    if environ.get('REQUEST_METHOD') == 'POST':
+        body = {"redelivered": callbacks.redeliver()}
+    else:
+        body = dict(callbacks.stats(), batching=batcher.pending(),
+                    dead_letters=callbacks.dead_letters())
+    data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+    start_response('200 OK', [('Content-Type', 'application/json'),
+                              ('Content-Length', str(len(data)))])
+    return [data]
+
+def wsgi_app(soap_app=None):
+    """Application WSGI : /metrics pour Prometheus, /admin/callbacks, tout le reste vers Spyne."""
+    soap_app    = soap_app or WsgiApplication(application)
+    metrics_app = prometheus.wsgi_app(REGISTRY)
+    def dispatch(environ, start_response):
+        path = environ.get('PATH_INFO')
+        if path == '/metrics':
+            return metrics_app(environ, start_response)
+        if path == '/admin/callbacks':
+            return _admin_callbacks(environ, start_response)
+        if FAST_PATH and environ.get('REQUEST_METHOD') == 'POST' and not environ.get('QUERY_STRING'):
+            return _fast_path(environ, start_response, soap_app)
+        return soap_app(environ, start_response)
+    return dispatch
+
 if __name__ == '__main__':
-    from wsgiref.simple_server import make_server
-    srv = make_server('0.0.0.0', 5002, WsgiApplication(application))
+    # serveur de développement, un thread par requête ; en production :
+    # python -m common.serving 'server:wsgi_app()' --port 5002 (cf. Dockerfile)
+    from socketserver import ThreadingMixIn
+    from wsgiref.simple_server import make_server, WSGIServer
+
+    class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+        daemon_threads = True
+
+    srv = make_server('0.0.0.0', 5002, wsgi_app(), server_class=ThreadingWSGIServer)
     srv.serve_forever()
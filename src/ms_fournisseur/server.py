@@ -1,11 +1,68 @@
-from flask import Flask, request, jsonify
+import time
+from flask import Flask, Response, g, request, jsonify
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+from common import tracing, serving, shared_store
+from common.metrics import exposition
 
 app = Flask(__name__)
 app.config['JSON_AS_ASCII'] = False
 
+# Métriques Prometheus exposées sur /metrics, mesurées autour de chaque requête
+REGISTRY  = CollectorRegistry()
+LATENCY   = Histogram('http_request_duration_seconds', "Durée des requêtes par endpoint",
+                      ['endpoint'],
+                      buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1),
+                      registry=REGISTRY)
+IN_FLIGHT = Gauge('http_requests_in_flight', "Requêtes en cours",
+                  multiprocess_mode='livesum', registry=REGISTRY)
+ERRORS    = Counter('http_request_errors', "Réponses en erreur par endpoint et code",
+                    ['endpoint', 'status'], registry=REGISTRY)
+
+# Traces : un span serveur par requête, rattaché au traceparent de l'appelant
+tracer = tracing.tracer_from_env('ms_fournisseur')
+
+@app.before_request
+def _start_timer():
+    g.start = time.perf_counter()
+    IN_FLIGHT.inc()
+    if request.endpoint not in ('health', 'metrics'):
+        g.span = tracer.span(request.endpoint or 'unknown',
+                             parent=tracing.extract(request.headers), kind='server').__enter__()
+
+@app.after_request
+def _record_metrics(response):
+    if request.endpoint != 'metrics':
+        endpoint = request.endpoint or 'unknown'
+        LATENCY.labels(endpoint).observe(time.perf_counter() - g.start)
+        if response.status_code >= 400:
+            ERRORS.labels(endpoint, str(response.status_code)).inc()
+    return response
+
+@app.teardown_request
+def _end_request(exc):
+    IN_FLIGHT.dec()
+    if exc is not None:
+        ERRORS.labels(request.endpoint or 'unknown', '500').inc()
+    span = g.pop('span', None)
+    if span is not None:
+        span.__exit__(type(exc) if exc else None, exc, None)
+
+# Transferts déjà effectués par Idempotency-Key (les plus récents) : un envoi
+# répété par l'orchestrateur après une interruption rejoue la réponse initiale ;
+# IDEMPOTENCY_PATH : fichier SQLite commun aux workers (cf. common/shared_store.py)
+IDEMPOTENCY_MAX = 10000
+_transfers = shared_store.from_env('IDEMPOTENCY_PATH', table='transfers', maxsize=IDEMPOTENCY_MAX)
+serving.require_shared('IDEMPOTENCY_PATH', shared_store.is_shared(_transfers),
+                       "définir IDEMPOTENCY_PATH")
+
 # Endpoint pour créer un transfert de fonds (ressource : fundTransfers)
 @app.route('/fundTransfers', methods=['POST'])
 def create_fund_transfer():
+    key = request.headers.get('Idempotency-Key')
+    if key is not None:
+        previous = _transfers.get(key)
+        if previous is not None:
+            return jsonify(previous), 200
     data = request.json
     loan_amount = data.get("loan_amount")
     client_id = data.get("client_id")
@@ -19,6 +76,9 @@ def create_fund_transfer():
             "status": f"/fundTransfers/{transfer_id}/status"
         }
     }
+    if key is not None and _transfers.setdefault(key, response) != response:
+        # même clé traitée entre-temps par une requête concurrente
+        return jsonify(_transfers[key]), 200
     return jsonify(response), 201
 
 # Endpoint pour consulter l'état d'un transfert (simulation)
@@ -30,6 +90,12 @@ def get_fund_transfer_status(transfer_id):
         "status": "completed"
     }), 200
 
+# Exposition Prometheus
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    body, content_type = exposition(REGISTRY)
+    return Response(body, content_type=content_type)
+
 # Endpoint dédié au healthcheck
 @app.route('/health', methods=['GET'])
 def health():
@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x10montantmax.proto\x12\rms_montantmax\"\"\n\x0bLoanRequest\x12\x13\n\x0bloan_amount\x18\x01 \x01(\x02\"0\n\x0cLoanResponse\x12\x0f\n\x07\x61llowed\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t2Y\n\x11MontantMaxService\x12\x44\n\tCheckLoan\x12\x1a.ms_montantmax.LoanRequest\x1a\x1b.ms_montantmax.LoanResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x10montantmax.proto\x12\rms_montantmax\"\"\n\x0bLoanRequest\x12\x13\n\x0bloan_amount\x18\x01 \x01(\x02\"0\n\x0cLoanResponse\x12\x0f\n\x07\x61llowed\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"=\n\x10LoanBatchRequest\x12)\n\x05loans\x18\x01 \x03(\x0b\x32\x1a.ms_montantmax.LoanRequest\"A\n\x11LoanBatchResponse\x12,\n\x07results\x18\x01 \x03(\x0b\x32\x1b.ms_montantmax.LoanResponse\"%\n\x0cRulesRequest\x12\x15\n\rknown_version\x18\x01 \x01(\x03\"G\n\x04Rule\x12\n\n\x02op\x18\x01 \x01(\t\x12\x11\n\tthreshold\x18\x02 \x01(\x01\x12\x0f\n\x07\x61llowed\x18\x03 \x01(\x08\x12\x0f\n\x07message\x18\x04 \x01(\t\"U\n\tRuleTable\x12\x0f\n\x07version\x18\x01 \x01(\x03\x12\x13\n\x0b\x65xpressible\x18\x02 \x01(\x08\x12\"\n\x05rules\x18\x03 \x03(\x0b\x32\x13.ms_montantmax.Rule2\xed\x01\n\x11MontantMaxService\x12\x44\n\tCheckLoan\x12\x1a.ms_montantmax.LoanRequest\x1a\x1b.ms_montantmax.LoanResponse\x12O\n\nCheckLoans\x12\x1f.ms_montantmax.LoanBatchRequest\x1a .ms_montantmax.LoanBatchResponse\x12\x41\n\x08GetRules\x12\x1b.ms_montantmax.RulesRequest\x1a\x18.ms_montantmax.RuleTableb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -35,6 +35,16 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_LOANREQUEST']._serialized_end=69
   _globals['_LOANRESPONSE']._serialized_start=71
   _globals['_LOANRESPONSE']._serialized_end=119
-  _globals['_MONTANTMAXSERVICE']._serialized_start=121
-  _globals['_MONTANTMAXSERVICE']._serialized_end=210
+  _globals['_LOANBATCHREQUEST']._serialized_start=121
+  _globals['_LOANBATCHREQUEST']._serialized_end=182
+  _globals['_LOANBATCHRESPONSE']._serialized_start=184
+  _globals['_LOANBATCHRESPONSE']._serialized_end=249
+  _globals['_RULESREQUEST']._serialized_start=251
+  _globals['_RULESREQUEST']._serialized_end=288
+  _globals['_RULE']._serialized_start=290
+  _globals['_RULE']._serialized_end=361
+  _globals['_RULETABLE']._serialized_start=363
+  _globals['_RULETABLE']._serialized_end=448
+  _globals['_MONTANTMAXSERVICE']._serialized_start=451
+  _globals['_MONTANTMAXSERVICE']._serialized_end=688
 # @@protoc_insertion_point(module_scope)
@@ -40,6 +40,16 @@ class MontantMaxServiceStub(object):
                 request_serializer=montantmax__pb2.LoanRequest.SerializeToString,
                 response_deserializer=montantmax__pb2.LoanResponse.FromString,
                 _registered_method=True)
+        self.CheckLoans = channel.unary_unary(
+                '/ms_montantmax.MontantMaxService/CheckLoans',
+                request_serializer=montantmax__pb2.LoanBatchRequest.SerializeToString,
+                response_deserializer=montantmax__pb2.LoanBatchResponse.FromString,
+                _registered_method=True)
+        self.GetRules = channel.unary_unary(
+                '/ms_montantmax.MontantMaxService/GetRules',
+                request_serializer=montantmax__pb2.RulesRequest.SerializeToString,
+                response_deserializer=montantmax__pb2.RuleTable.FromString,
+                _registered_method=True)
 
 
 class MontantMaxServiceServicer(object):
@@ -53,6 +63,20 @@ class MontantMaxServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def CheckLoans(self, request, context):
+        """Vérification groupée : une réponse par montant, dans le même ordre
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetRules(self, request, context):
+        """Publication des règles de décision sous forme de table versionnée
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_MontantMaxServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -61,6 +85,16 @@ def add_MontantMaxServiceServicer_to_server(servicer, server):
                     request_deserializer=montantmax__pb2.LoanRequest.FromString,
                     response_serializer=montantmax__pb2.LoanResponse.SerializeToString,
             ),
+            'CheckLoans': grpc.unary_unary_rpc_method_handler(
+                    servicer.CheckLoans,
+                    request_deserializer=montantmax__pb2.LoanBatchRequest.FromString,
+                    response_serializer=montantmax__pb2.LoanBatchResponse.SerializeToString,
+            ),
+            'GetRules': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetRules,
+                    request_deserializer=montantmax__pb2.RulesRequest.FromString,
+                    response_serializer=montantmax__pb2.RuleTable.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'ms_montantmax.MontantMaxService', rpc_method_handlers)
@@ -99,3 +133,57 @@ class MontantMaxService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def CheckLoans(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/ms_montantmax.MontantMaxService/CheckLoans',
+            montantmax__pb2.LoanBatchRequest.SerializeToString,
+            montantmax__pb2.LoanBatchResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetRules(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/ms_montantmax.MontantMaxService/GetRules',
+            montantmax__pb2.RulesRequest.SerializeToString,
+            montantmax__pb2.RuleTable.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -1,24 +1,89 @@
 # src/ms_montantmax/server.py
 from concurrent import futures
+import functools
+import operator
+import os
+import zlib
 import grpc
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, start_http_server
+from common import tracing
 from ms_montantmax import montantmax_pb2
 from ms_montantmax import montantmax_pb2_grpc
 
+# Métriques Prometheus, servies en HTTP sur METRICS_PORT (à côté du port gRPC)
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9101'))
+REGISTRY  = CollectorRegistry()
+LATENCY   = Histogram('rpc_duration_seconds', "Durée des RPC MontantMax", ['method'],
+                      buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1),
+                      registry=REGISTRY)
+IN_FLIGHT = Gauge('rpc_in_flight', "RPC en cours", registry=REGISTRY)
+ERRORS    = Counter('rpc_errors', "RPC en erreur par méthode et type d'exception",
+                    ['method', 'reason'], registry=REGISTRY)
+
+# Span serveur par RPC, rattaché au traceparent reçu dans les métadonnées gRPC
+tracer = tracing.tracer_from_env('ms_montantmax')
+
+def _instrumented(method):
+    # séries résolues une seule fois, hors du chemin critique
+    latency = LATENCY.labels(method)
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, request, context):
+            with tracer.span(method, parent=tracing.extract_grpc(context), kind='server'), \
+                    IN_FLIGHT.track_inprogress(), latency.time():
+                try:
+                    return fn(self, request, context)
+                except Exception as exc:
+                    ERRORS.labels(method, type(exc).__name__).inc()
+                    raise
+        return wrapper
+    return decorator
+
 # Définir la classe de service en étendant la classe générée par gRPC
 class MontantMaxService(montantmax_pb2_grpc.MontantMaxServiceServicer):
+    @_instrumented('CheckLoan')
     def CheckLoan(self, request, context):
-        # Par exemple, définissons un plafond autorisé
-        plafond = 50000
-        if request.loan_amount <= plafond:
-            return montantmax_pb2.LoanResponse(
-                allowed=True,
-                message="Demande acceptée"
-            )
-        else:
-            return montantmax_pb2.LoanResponse(
-                allowed=False,
-                message="Montant trop élevé"
-            )
+        return _check(request.loan_amount)
+
+    @_instrumented('CheckLoans')
+    def CheckLoans(self, request, context):
+        # Un seul aller-retour pour tout un lot de montants
+        return montantmax_pb2.LoanBatchResponse(
+            results=[_check(loan.loan_amount) for loan in request.loans]
+        )
+
+    @_instrumented('GetRules')
+    def GetRules(self, request, context):
+        # Table inchangée : on renvoie seulement la version, sans les règles
+        if request.known_version == RULES_VERSION:
+            return montantmax_pb2.RuleTable(version=RULES_VERSION, expressible=True)
+        return montantmax_pb2.RuleTable(
+            version=RULES_VERSION,
+            expressible=True,
+            rules=[montantmax_pb2.Rule(op=op, threshold=threshold, allowed=allowed, message=message)
+                   for op, threshold, allowed, message in RULES]
+        )
+
+# Par exemple, définissons un plafond autorisé
+PLAFOND = 50000
+
+# Table de règles (op, seuil, autorisé, message), évaluée dans l'ordre ; "*" s'applique
+# toujours. C'est la source unique de la décision : CheckLoan l'évalue et GetRules la
+# publie, la version changeant avec son contenu.
+RULES = [
+    ("<=", PLAFOND, True,  "Demande acceptée"),
+    ("*",  0,       False, "Montant trop élevé"),
+]
+RULES_VERSION = zlib.crc32(repr(RULES).encode('utf-8'))
+
+_OPS = {"<=": operator.le, "<": operator.lt, ">=": operator.ge, ">": operator.gt,
+        "*": lambda amount, threshold: True}
+
+def _check(loan_amount):
+    for op, threshold, allowed, message in RULES:
+        if _OPS[op](loan_amount, threshold):
+            return montantmax_pb2.LoanResponse(allowed=allowed, message=message)
+    return montantmax_pb2.LoanResponse(allowed=False, message="Aucune règle applicable")
 
 def serve():
     # Créer un serveur gRPC avec un pool de threads
@@ -28,7 +93,9 @@ def serve():
     # Écouter sur le port 5001
     server.add_insecure_port('[::]:50051')
     server.start()
+    start_http_server(METRICS_PORT, registry=REGISTRY)
     print("MS MontantMax gRPC server is running on port 50051")
+    print(f"Métriques Prometheus sur le port {METRICS_PORT} (/metrics)")
     server.wait_for_termination()
 
 if __name__ == '__main__':
@@ -1,27 +1,102 @@
 # src/ms_profilrisque/app.py
-from flask import Flask, request, jsonify
-from graphene import ObjectType, String, Schema, Float
+from flask import Flask, Response, request, jsonify
+import operator
+import zlib
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+from common import tracing
+from common.metrics import exposition
+from graphene import (ObjectType, InputObjectType, String, Schema, Float, List, NonNull,
+                      Int, Boolean, Field)
+
+class RiskInput(InputObjectType):
+    loanAmount = Float(required=True)
+    clientInfo = String(required=True)
+
+class RiskRule(ObjectType):
+    op        = String()
+    threshold = Float()
+    profile   = String()
+
+class RiskRuleTable(ObjectType):
+    version     = Int()
+    expressible = Boolean()
+    rules       = List(RiskRule)
 
 class Query(ObjectType):
     riskProfile = String(loanAmount=Float(required=True), clientInfo=String(required=True))
+    # Évaluation groupée : un profil par entrée, dans le même ordre
+    riskProfiles = List(String, items=List(NonNull(RiskInput), required=True))
+    # Règles de décision publiées sous forme de table versionnée
+    riskRules = Field(RiskRuleTable)
 
     def resolve_riskProfile(root, info, loanAmount, clientInfo):
-        # Implémentez ici la logique d'analyse du risque.
-        # Par exemple, si le montant est élevé, on renvoie "elevé"
-        if loanAmount >= 20000:
-            return "elevé"
-        else:
-            return "acceptable"
+        return evaluate_risk(loanAmount, clientInfo)
+
+    def resolve_riskProfiles(root, info, items):
+        return [evaluate_risk(item.loanAmount, item.clientInfo) for item in items]
+
+    def resolve_riskRules(root, info):
+        return RiskRuleTable(
+            version=RULES_VERSION,
+            expressible=True,
+            rules=[RiskRule(op=op, threshold=threshold, profile=profile)
+                   for op, threshold, profile in RULES]
+        )
+
+# Implémentez ici la logique d'analyse du risque.
+# Par exemple, si le montant est élevé, on renvoie "elevé".
+# Table (op, seuil, profil) évaluée dans l'ordre sur le montant, "*" s'applique toujours ;
+# evaluate_risk l'évalue et riskRules la publie. Si le profil venait à dépendre de
+# clientInfo, riskRules devrait renvoyer expressible=false.
+RULES = [
+    (">=", 20000, "elevé"),
+    ("*",  0,     "acceptable"),
+]
+RULES_VERSION = zlib.crc32(repr(RULES).encode('utf-8')) & 0x7fffffff  # Int GraphQL sur 32 bits
+
+_OPS = {"<=": operator.le, "<": operator.lt, ">=": operator.ge, ">": operator.gt,
+        "*": lambda amount, threshold: True}
+
+def evaluate_risk(loanAmount, clientInfo):
+    for op, threshold, profile in RULES:
+        if _OPS[op](loanAmount, threshold):
+            return profile
+    return "acceptable"
 
 schema = Schema(query=Query)
 
+# Métriques Prometheus exposées sur /metrics
+REGISTRY  = CollectorRegistry()
+LATENCY   = Histogram('graphql_duration_seconds', "Durée d'exécution des requêtes GraphQL",
+                      buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1),
+                      registry=REGISTRY)
+IN_FLIGHT = Gauge('graphql_in_flight', "Requêtes GraphQL en cours",
+                  multiprocess_mode='livesum', registry=REGISTRY)
+ERRORS    = Counter('graphql_errors', "Requêtes GraphQL en erreur par motif", ['reason'],
+                    registry=REGISTRY)
+
+# Traces : span serveur rattaché au traceparent de l'appelant
+tracer = tracing.tracer_from_env('ms_profilrisque')
+
 app = Flask(__name__)
 
 @app.route("/graphql", methods=["POST"])
 def graphql_server():
-    data = request.get_json()
-    result = schema.execute(data.get("query"), variables=data.get("variables"))
-    return jsonify(result.data)
+    with tracer.span('graphql', parent=tracing.extract(request.headers), kind='server'), \
+            IN_FLIGHT.track_inprogress(), LATENCY.time():
+        data = request.get_json(silent=True)
+        if not data:
+            ERRORS.labels('bad_request').inc()
+            return jsonify({"errors": [{"message": "Corps JSON manquant"}]}), 400
+        result = schema.execute(data.get("query"), variables=data.get("variables"))
+        if result.errors:
+            ERRORS.labels('execution').inc()
+        return jsonify(result.data)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    body, content_type = exposition(REGISTRY)
+    return Response(body, content_type=content_type)
 
 @app.route('/health', methods=['GET'])
 def health():
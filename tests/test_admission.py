@@ -0,0 +1,62 @@
+import pytest
+
+from app.admission import AdmissionController, AdmissionRejected
+
+
+def test_concurrency_limit_reserves_priority_slots():
+    admission = AdmissionController(max_concurrent=3, reserved=1, client_rate=0)
+    admission.acquire()
+    admission.acquire()
+    with pytest.raises(AdmissionRejected) as exc:
+        admission.acquire()               # dernière place réservée
+    assert exc.value.reason == 'overload'
+    admission.acquire(priority=True)
+    with pytest.raises(AdmissionRejected):
+        admission.acquire(priority=True)
+    admission.release()
+    with admission.admit(priority=True):
+        assert admission.in_flight() == 3
+    assert admission.stats()['in_flight'] == 2
+
+
+def test_token_bucket_per_client():
+    admission = AdmissionController(max_concurrent=0, client_rate=10, client_burst=2)
+    for _ in range(2):
+        with admission.admit('c1'):
+            pass
+    with pytest.raises(AdmissionRejected) as exc:
+        admission.acquire('c1')
+    assert exc.value.reason == 'rate_limit'
+    assert 0 < exc.value.retry_after <= 0.1
+    with admission.admit('c2'):          # seau distinct
+        pass
+    with admission.admit('c1', priority=True):   # trafic prioritaire non limité
+        pass
+
+
+def test_configure_at_runtime():
+    admission = AdmissionController(max_concurrent=1, reserved=0, client_rate=0)
+    admission.acquire()
+    with pytest.raises(AdmissionRejected):
+        admission.acquire()
+    admission.configure(max_concurrent=0)    # 0 : sans limite
+    admission.acquire()
+    assert admission.limits()['max_concurrent'] == 0
+    with pytest.raises(ValueError):
+        admission.configure(max_concurrent=-1)
+    with pytest.raises(ValueError):
+        admission.configure(inconnue=1)
+
+
+def test_overload_does_not_consume_client_tokens():
+    admission = AdmissionController(max_concurrent=1, reserved=0, client_rate=0.001, client_burst=1)
+    admission.acquire('autre')
+    with pytest.raises(AdmissionRejected) as exc:
+        admission.acquire('c1')          # saturé : le jeton de c1 reste disponible
+    assert exc.value.reason == 'overload'
+    admission.release()
+    with admission.admit('c1'):
+        pass
+    with pytest.raises(AdmissionRejected) as exc:
+        admission.charge('c1')           # prêt d'un lot : jeton du seau, sans place
+    assert exc.value.reason == 'rate_limit' and admission.in_flight() == 0
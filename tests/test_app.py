@@ -1,11 +1,19 @@
+import threading
+import time
 import pytest
 import grpc
+import requests
 from flask import json
 from xml.etree import ElementTree as ET
 
-from app.app import app as flask_app, MS_BANQUE_URL, MS_PROFILRISQUE_URL, MS_FOURNISSEUR_URL
+from app.app import app as flask_app, montantmax_pool, risk_cache, decisions, breakers, transfers, transfer_queue, admission, metrics, MS_BANQUE_URL, MS_PROFILRISQUE_URL, MS_FOURNISSEUR_URL
 from ms_montantmax import montantmax_pb2_grpc
 
+# Canal gRPC factice
+class FakeChannel:
+    def close(self):
+        pass
+
 # Stub pour gRPC MontantMax
 class DummyLoanResponse:
     def __init__(self, allowed, message):
@@ -16,11 +24,31 @@ class FakeMontantStub:
     def __init__(self, _):
         pass
 
-    def CheckLoan(self, request):
+    def CheckLoan(self, request, timeout=None, metadata=None):
         if request.loan_amount <= 50000:
             return DummyLoanResponse(True, "Demande acceptée")
         return DummyLoanResponse(False, "Montant trop élevé")
 
+    def CheckLoans(self, request, timeout=None, metadata=None):
+        CALLS.append('CheckLoans')
+        return DummyBatchResponse([self.CheckLoan(loan) for loan in request.loans])
+
+    def GetRules(self, request, timeout=None):
+        from ms_montantmax import montantmax_pb2
+        return montantmax_pb2.RuleTable(version=7, expressible=True, rules=[
+            montantmax_pb2.Rule(op="<=", threshold=50000, allowed=True, message="Demande acceptée"),
+            montantmax_pb2.Rule(op="*", allowed=False, message="Montant trop élevé"),
+        ])
+
+
+class DummyBatchResponse:
+    def __init__(self, results):
+        self.results = results
+
+
+# appels aval groupés observés par les tests de /loan/batch
+CALLS = []
+
 
 # DummyResponse pour simuler requests.post
 class DummyResponse:
@@ -41,17 +69,52 @@ class DummyResponse:
 @pytest.fixture(autouse=True)
 def mock_services(monkeypatch):
     # gRPC stub
-    monkeypatch.setattr(grpc, 'insecure_channel', lambda addr: None)
+    monkeypatch.setattr(grpc, 'insecure_channel', lambda addr, options=None: FakeChannel())
     monkeypatch.setattr(montantmax_pb2_grpc, 'MontantMaxServiceStub', FakeMontantStub)
+    montantmax_pool.reset()
+    risk_cache.reset()
+    for downstream in breakers.values():
+        downstream.reset()
+    transfer_queue.clear()
+    admission.reset()
+    CALLS.clear()
 
     # requests.post fake
     def fake_post(url, data=None, json=None, headers=None, timeout=None):
+        if isinstance(data, bytes):   # enveloppes SOAP pré-assemblées en octets
+            data = data.decode('utf-8')
+        # GraphQL table de règles
+        if url == MS_PROFILRISQUE_URL and 'riskRules' in json['query']:
+            return DummyResponse(json_data={'riskRules': {
+                'version': 3, 'expressible': True,
+                'rules': [{'op': '>=', 'threshold': 20000, 'profile': 'elevé'},
+                          {'op': '*', 'threshold': 0, 'profile': 'acceptable'}]}})
+
+        # GraphQL risk (groupé)
+        if url == MS_PROFILRISQUE_URL and 'items' in json['variables']:
+            CALLS.append('riskProfiles')
+            risks = ['acceptable' if it['loanAmount'] < 20000 else 'elevé'
+                     for it in json['variables']['items']]
+            return DummyResponse(json_data={'riskProfiles': risks})
+
         # GraphQL risk
         if url == MS_PROFILRISQUE_URL:
+            CALLS.append('riskProfile')
             amt = json['variables']['loanAmount']
             risk = 'acceptable' if amt < 20000 else 'elevé'
             return DummyResponse(json_data={'riskProfile': risk})
 
+        # SubmitChequeRequests SOAP (groupé)
+        if url == MS_BANQUE_URL and 'SubmitChequeRequests' in data:
+            CALLS.append('SubmitChequeRequests')
+            count = int(data.split('<count>')[1].split('</count>')[0])
+            ids = ''.join(f'<tns:string>batch-{n}</tns:string>' for n in range(count))
+            xml = f"""<soap11env:Envelope xmlns:soap11env="http://schemas.xmlsoap.org/soap/envelope/"
+                   xmlns:tns="ms.banque.async"><soap11env:Body><tns:SubmitChequeRequestsResponse>
+<tns:SubmitChequeRequestsResult>{ids}</tns:SubmitChequeRequestsResult>
+</tns:SubmitChequeRequestsResponse></soap11env:Body></soap11env:Envelope>""".encode()
+            return DummyResponse(content=xml, text=xml.decode())
+
         # SubmitChequeRequest SOAP
         if url == MS_BANQUE_URL:
             # renvoyer un XML avec un request_id fixe
@@ -73,6 +136,13 @@ def mock_services(monkeypatch):
         return DummyResponse(status_code=404)
 
     monkeypatch.setattr("requests.post", fake_post)
+    # les clients poolés passent par requests.Session
+    monkeypatch.setattr(requests.Session, 'post', lambda self, url, **kw: fake_post(url, **kw))
+    yield
+    transfers.join(timeout=5)
+    montantmax_pool.reset()
+    for downstream in breakers.values():
+        downstream.reset()
 
 
 @pytest.fixture
@@ -133,12 +203,14 @@ def test_flow_async_success(client):
     rv3 = client.post('/loan/callback', data=soap, content_type='text/xml')
     assert rv3.status_code == 200
 
-    # 4) après callback, status approved
+    # 4) après callback, status approved, fonds transférés en arrière-plan
+    assert transfers.join(timeout=5)
     rv4 = client.get(f'/loan/status/{req_id}')
     assert rv4.status_code == 200
     out = rv4.get_json()
     assert out['status'] == 'approved'
     assert 'fonds' in out['message']
+    assert out['transfer'] == 'done'
 
 
 def test_flow_async_invalid(client):
@@ -163,3 +235,448 @@ def test_flow_async_invalid(client):
     rv2 = client.get(f'/loan/status/{req_id}')
     assert rv2.status_code == 400
     assert rv2.get_json()['status'] == 'refused'
+
+
+def test_grpc_channels_reused(client):
+    for _ in range(3):
+        client.post('/loan', json={'id':'1','personal_info':'x','loan_amount':10000})
+    stats = client.get('/admin/pools').get_json()['ms_montantmax']
+    assert stats['calls'] == 3
+    assert stats['channels_created'] <= stats['size']
+    assert stats['reused_calls'] == 3 - stats['channels_created']
+
+
+def test_loan_batch(client):
+    loans = [
+        {'id':'1','personal_info':'x','loan_amount':10000},
+        {'id':'2','personal_info':'y','loan_amount':60000},
+        {'id':'3','personal_info':'z','loan_amount':25000},
+        {'id':'4','personal_info':'w','loan_amount':'abc'},
+        {'id':'5','personal_info':'v','loan_amount':500},
+    ]
+    rv = client.post('/loan/batch', json={'loans': loans})
+    assert rv.status_code == 200
+    results = rv.get_json()['results']
+    assert [r['status'] for r in results] == ['pending', 'refused', 'refused', 'error', 'pending']
+    assert results[2]['reason'] == 'Risque trop élevé'
+    assert results[3]['reason'].startswith("Le montant doit être un nombre")
+    # un seul appel par micro-service pour tout le lot
+    assert CALLS == ['CheckLoans', 'riskProfiles', 'SubmitChequeRequests']
+
+    rv2 = client.get(f"/loan/status/{results[0]['request_id']}")
+    assert rv2.get_json()['status'] == 'pending'
+
+
+def test_loan_batch_empty(client):
+    rv = client.post('/loan/batch', json={'loans': []})
+    assert rv.status_code == 400
+
+
+def test_history_pagination_and_gzip(client):
+    import gzip, json as _json
+    rv = client.post('/loan', json={'id':'1','personal_info':'x','loan_amount':10000})
+    req_id = rv.get_json()['request_id']
+
+    full = client.get(f'/loan/history/{req_id}').get_json()
+    services = [s['service'] for s in full['history']]
+    assert services[0] == 'client'
+    assert full['next'] is None
+
+    page1 = client.get(f'/loan/history/{req_id}?limit=2').get_json()
+    assert [s['service'] for s in page1['history']] == services[:2]
+    page2 = client.get(f"/loan/history/{req_id}?after={page1['next']}&limit=2").get_json()
+    assert [s['service'] for s in page2['history']] == services[2:4]
+
+    rv = client.get(f'/loan/history/{req_id}', headers={'Accept-Encoding': 'gzip'})
+    assert rv.headers['Content-Encoding'] == 'gzip'
+    assert _json.loads(gzip.decompress(rv.data)) == full
+
+    assert client.get(f'/loan/history/{req_id}?limit=0').status_code == 400
+    assert client.get('/loan/history/unknown').status_code == 404
+
+
+def test_risk_profile_cache(client):
+    payload = {'id':'1','personal_info':'M.  Dupont','loan_amount':10000}
+    client.post('/loan', json=payload)
+    rv = client.post('/loan', json=dict(payload, personal_info='M. Dupont'))
+    assert rv.status_code == 200
+    assert CALLS.count('riskProfile') == 1
+    stats = client.get('/admin/cache/risk').get_json()
+    assert stats['hits'] == 1 and stats['misses'] == 1
+
+    history = client.get(f"/loan/history/{rv.get_json()['request_id']}").get_json()['history']
+    assert history[2]['response']['cached'] is True
+
+    rv = client.delete('/admin/cache/risk?client_info=M. Dupont')
+    assert rv.get_json()['invalidated'] == 1
+    client.post('/loan', json=payload)
+    assert CALLS.count('riskProfile') == 2
+
+
+def test_local_rule_decisions(client, monkeypatch):
+    monkeypatch.setattr(decisions, 'mode', 'local')
+    stats = client.post('/admin/rules/sync').get_json()
+    assert stats['services']['ms_montantmax']['version'] == 7
+    assert stats['services']['ms_profilrisque']['version'] == 3
+
+    rv = client.post('/loan', json={'id':'1','personal_info':'x','loan_amount':25000})
+    assert rv.get_json()['reason'] == 'Risque trop élevé'
+    rv = client.post('/loan', json={'id':'1','personal_info':'x','loan_amount':60000})
+    assert rv.get_json()['reason'] == 'Montant trop élevé'
+    assert 'riskProfile' not in CALLS
+    history = client.get(f"/loan/history/{rv.get_json()['request_id']}").get_json()['history']
+    assert history[1]['response']['local'] is True
+
+
+def test_breaker_fast_fail(client, monkeypatch):
+    def unavailable(self, url, **kw):
+        CALLS.append(url)
+        return DummyResponse(status_code=503)
+    monkeypatch.setattr(requests.Session, 'post', unavailable)
+    payload = {'id': '1', 'personal_info': 'x', 'loan_amount': 1000}
+
+    threshold = breakers['ms_profilrisque'].breaker.failure_threshold
+    for _ in range(threshold):
+        assert client.post('/loan', json=payload).status_code == 500
+    assert len(CALLS) == threshold
+
+    rv = client.post('/loan', json=payload)
+    assert rv.status_code == 503 and 'Retry-After' in rv.headers
+    assert len(CALLS) == threshold   # aucun appel aval tant que le disjoncteur est ouvert
+
+    stats = client.get('/admin/breakers').get_json()
+    assert stats['ms_profilrisque']['state'] == 'open'
+    assert stats['ms_profilrisque']['rejected'] == 1
+    assert stats['ms_montantmax']['state'] == 'closed'
+
+
+def test_metrics_endpoint(client):
+    client.post('/loan', json={'id': '1', 'personal_info': 'x', 'loan_amount': 1000})
+    client.post('/loan', json={'id': '1', 'personal_info': 'x', 'loan_amount': 60000})
+    rv = client.get('/metrics')
+    assert rv.status_code == 200 and rv.content_type.startswith('text/plain')
+    text = rv.get_data(as_text=True)
+    for stage in ('loan', 'montantmax', 'risk', 'submit'):
+        assert f'loan_stage_duration_seconds_count{{stage="{stage}"}}' in text
+    assert 'loan_requests_in_flight{endpoint="loan"} 0.0' in text
+    assert 'loan_outcomes_total{status="refused"}' in text
+    assert 'loan_store_entries ' in text
+
+
+def test_trace_propagation(client, monkeypatch):
+    sent = {}
+    post = requests.Session.post
+    def recording_post(self, url, **kw):
+        sent[url] = kw
+        return post(self, url, **kw)
+    monkeypatch.setattr(requests.Session, 'post', recording_post)
+
+    parent = '00-' + 'a' * 32 + '-' + 'b' * 16 + '-01'
+    rv = client.post('/loan', json={'id': '1', 'personal_info': 'x', 'loan_amount': 1000},
+                     headers={'traceparent': parent})
+    req_id = rv.get_json()['request_id']
+    trace = client.get(f'/debug/trace/{req_id}').get_json()
+    assert trace['trace_id'] == 'a' * 32
+    names = [(span['depth'], span['name']) for span in trace['spans']]
+    assert names[:4] == [(0, 'loan'), (1, 'montantmax'), (1, 'risk'), (1, 'submit')]
+
+    # traceparent transmis en HTTP et dans les ReferenceParameters WS-Addressing
+    submit = sent[MS_BANQUE_URL]
+    assert submit['headers']['traceparent'].startswith('00-' + 'a' * 32)
+    envelope = submit['data'].decode('utf-8')
+    assert submit['headers']['traceparent'] in envelope
+    assert '<wsa:ReplyTo>' in envelope
+
+    # le callback de la banque renvoie le contexte dans l'en-tête SOAP
+    soap = f"""<?xml version="1.0"?>
+<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">
+  <soapenv:Header><tr:traceparent xmlns:tr="urn:webservice:trace">{submit['headers']['traceparent']}</tr:traceparent></soapenv:Header>
+  <soapenv:Body><ChequeStatusResponse><request_id>{req_id}</request_id>
+  <verdict>Chèque validé</verdict></ChequeStatusResponse></soapenv:Body>
+</soapenv:Envelope>"""
+    client.post('/loan/callback', data=soap, content_type='text/xml')
+    assert transfers.join(timeout=5)
+    assert sent[MS_FOURNISSEUR_URL]['headers']['traceparent'].startswith('00-' + 'a' * 32)
+    text = client.get(f'/debug/trace/{req_id}?format=text').get_data(as_text=True)
+    assert '      app fund_transfer' in text   # submit > callback > fund_transfer
+
+    assert client.get('/debug/trace/inconnu').status_code == 404
+
+
+def test_transfer_queued_retried_once(client, monkeypatch):
+    monkeypatch.setattr(transfers, 'backoff_base', 0.01)
+    sent = []
+    post = requests.Session.post
+    def flaky_post(self, url, **kw):
+        if url == MS_FOURNISSEUR_URL:
+            sent.append(kw['headers']['Idempotency-Key'])
+            if len(sent) == 1:
+                return DummyResponse(status_code=503)
+        return post(self, url, **kw)
+    monkeypatch.setattr(requests.Session, 'post', flaky_post)
+
+    req_id = client.post('/loan', json={'id': '1', 'personal_info': 'x',
+                                        'loan_amount': 1000}).get_json()['request_id']
+    soap = f"""<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">
+  <soapenv:Body><ChequeStatusResponse><request_id>{req_id}</request_id>
+  <verdict>Chèque validé</verdict></ChequeStatusResponse></soapenv:Body></soapenv:Envelope>"""
+    assert client.post('/loan/callback', data=soap, content_type='text/xml').status_code == 200
+    # callback rejoué : acquitté sans second transfert
+    assert client.post('/loan/callback', data=soap, content_type='text/xml').status_code == 200
+    assert transfers.join(timeout=5)
+
+    assert sent == [req_id, req_id]   # un échec, une reprise, même clé d'idempotence
+    assert client.get(f'/loan/status/{req_id}').get_json()['transfer'] == 'done'
+    services = [s['service'] for s in client.get(f'/loan/history/{req_id}').get_json()['history']]
+    assert services.count('ms_banque callback') == 1 and services.count('ms_fournisseur') == 1
+    stats = client.get('/admin/transfers').get_json()
+    assert stats['done'] == 1 and stats['depth'] == 0
+
+
+def test_transfer_rejected_is_not_retried(client, monkeypatch):
+    sent = []
+    post = requests.Session.post
+    def rejecting_post(self, url, **kw):
+        if url == MS_FOURNISSEUR_URL:
+            sent.append(kw['json'])
+            return DummyResponse(status_code=422, json_data={'error': 'compte clos'})
+        return post(self, url, **kw)
+    monkeypatch.setattr(requests.Session, 'post', rejecting_post)
+
+    req_id = client.post('/loan', json={'id': '1', 'personal_info': 'x',
+                                        'loan_amount': 1000}).get_json()['request_id']
+    assert client.post('/loan/callback', data=_callback(req_id, 'Chèque validé'),
+                       content_type='text/xml').status_code == 200
+    assert transfers.join(timeout=5)
+
+    assert len(sent) == 1                    # 4xx : aucune reprise
+    assert client.get(f'/loan/status/{req_id}').get_json()['transfer'] == 'failed'
+    history = client.get(f'/loan/history/{req_id}').get_json()['history']
+    assert history[-1] == {'timestamp': history[-1]['timestamp'], 'service': 'ms_fournisseur',
+                           'error': 'Transfert refusé (HTTP 422)'}
+    assert client.get('/admin/transfers').get_json()['failed'] == 1
+    assert client.get('/admin/breakers').get_json()['ms_fournisseur']['consecutive_failures'] == 0
+
+
+def _callback(req_id, verdict):
+    return f"""<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">
+  <soapenv:Body><ChequeStatusResponse><request_id>{req_id}</request_id>
+  <verdict>{verdict}</verdict></ChequeStatusResponse></soapenv:Body></soapenv:Envelope>"""
+
+
+def test_callback_rejects_invalid_envelope(client):
+    dtd = ('<?xml version="1.0"?><!DOCTYPE x [<!ENTITY e SYSTEM "file:///etc/passwd">]>'
+           '<x>&e;</x>')
+    for body in (dtd, '<soapenv:Envelope', ''):
+        rv = client.post('/loan/callback', data=body, content_type='text/xml')
+        assert rv.status_code == 400 and rv.get_json()['status'] == 'error'
+    assert client.post('/loan/callback', data=_callback('inconnu', 'Chèque validé'),
+                       content_type='text/xml').status_code == 404
+
+
+def test_callback_applies_coalesced_verdicts(client):
+    from common import soap as codec
+    req_id = client.post('/loan', json={'id': '1', 'personal_info': 'x',
+                                        'loan_amount': 1000}).get_json()['request_id']
+    parent = '00-' + 'c' * 32 + '-' + 'd' * 16 + '-01'
+    body = codec.cheque_status_batch('http://app/loan/callback', [
+        (req_id, 'urn:uuid:1', 'Chèque validé', parent),
+        ('inconnu', 'urn:uuid:2', 'Chèque invalide', None),
+        (req_id, 'urn:uuid:1', 'Chèque validé', parent)])      # verdict rejoué dans le lot
+    rv = client.post('/loan/callback', data=body, content_type='text/xml')
+    assert rv.status_code == 200
+    assert [r['status'] for r in rv.get_json()['results']] == [200, 404, 200]
+    assert transfers.join(timeout=5)
+    assert client.get(f'/loan/status/{req_id}').get_json()['status'] == 'approved'
+    services = [s['service'] for s in client.get(f'/loan/history/{req_id}').get_json()['history']]
+    assert services.count('ms_banque callback') == 1 and services.count('ms_fournisseur') == 1
+
+
+def test_status_long_poll(client):
+    from app.app import waiters
+    req_id = client.post('/loan', json={'id': '1', 'personal_info': 'x',
+                                        'loan_amount': 1000}).get_json()['request_id']
+    assert client.get(f'/loan/status/{req_id}?wait=0.01').get_json() == {'status': 'pending'}
+    assert client.get(f'/loan/status/{req_id}?wait=abc').status_code == 400
+
+    def bank():
+        while not waiters.waiting():
+            pass
+        with flask_app.test_client() as c:
+            c.post('/loan/callback', data=_callback(req_id, 'Chèque invalide'), content_type='text/xml')
+
+    thread = threading.Thread(target=bank)
+    thread.start()
+    rv = client.get(f'/loan/status/{req_id}?wait=5')
+    thread.join()
+    assert rv.status_code == 400 and rv.get_json()['status'] == 'refused'
+    assert waiters.stats()['waiting'] == 0
+
+
+def test_status_long_poll_rechecks_without_notification(client, monkeypatch):
+    # multi-workers : le callback peut être traité par un autre processus, sans notification
+    import app.app as app_module
+    monkeypatch.setattr(app_module, 'STATUS_RECHECK', 0.05)
+    req_id = client.post('/loan', json={'id': '1', 'personal_info': 'x',
+                                        'loan_amount': 1000}).get_json()['request_id']
+    timer = threading.Timer(0.1, app_module._loans.update, args=(req_id,),
+                            kwargs={'status': 'refused', 'verdict': 'Chèque invalide'})
+    timer.start()
+    start = time.monotonic()
+    rv = client.get(f'/loan/status/{req_id}?wait=5')
+    timer.join()
+    assert rv.get_json()['status'] == 'refused' and time.monotonic() - start < 2
+
+
+def test_status_events(client):
+    req_id = client.post('/loan', json={'id': '1', 'personal_info': 'x',
+                                        'loan_amount': 1000}).get_json()['request_id']
+    rv = client.get(f'/loan/status/{req_id}/events', buffered=False)
+    assert rv.mimetype == 'text/event-stream'
+    stream = rv.response
+    assert next(stream).decode().startswith('event: status\ndata: {"status": "pending"}')
+
+    client.post('/loan/callback', data=_callback(req_id, 'Chèque validé'), content_type='text/xml')
+    rest = b''.join(stream).decode()   # approuvé (transfert en cours) puis fonds transférés
+    assert rest.count('event: status') in (1, 2)
+    assert rest.rstrip().endswith('"transfer": "done"}')
+    assert client.get('/loan/status/inconnu/events').status_code == 404
+
+
+def test_list_loans(client):
+    from app.app import _loans
+    _loans.clear()
+    # refus (identifiants uuid4) puis une demande en attente
+    for amount in (60000, 25000, 70000):
+        client.post('/loan', json={'id': 'client-q', 'personal_info': 'x', 'loan_amount': amount})
+    client.post('/loan', json={'id': 'autre', 'personal_info': 'x', 'loan_amount': 1000})
+
+    page = client.get('/loans?client_id=client-q&limit=2').get_json()
+    assert [l['loan_amount'] for l in page['loans']] == [70000, 25000]
+    assert 'history' not in page['loans'][0]
+    page = client.get(f"/loans?client_id=client-q&limit=2&cursor={page['next']}").get_json()
+    assert [l['loan_amount'] for l in page['loans']] == [60000] and page['next'] is None
+
+    pending = client.get('/loans?status=pending&since=2000-01-01T00:00:00').get_json()['loans']
+    assert [l['client_id'] for l in pending] == ['autre']
+    assert client.get('/loans?until=0').get_json()['loans'] == []
+    assert client.get('/loans/counts').get_json() == {"counts": {"pending": 1, "refused": 3}, "total": 4}
+
+    assert client.get('/loans?limit=0').status_code == 400
+    assert client.get('/loans?cursor=abc').status_code == 400
+    assert client.get('/loans?since=hier').status_code == 400
+
+
+def test_idempotency_key(client):
+    from app.app import idempotency_cache
+    idempotency_cache.reset()
+    payload = {'id': '1', 'personal_info': 'x', 'loan_amount': 1000}
+    headers = {'Idempotency-Key': 'cle-1'}
+
+    first = client.post('/loan', json=payload, headers=headers)
+    calls = len(CALLS)
+    again = client.post('/loan', json=payload, headers=headers)
+    assert again.status_code == first.status_code == 200
+    assert again.get_json() == first.get_json()
+    assert again.headers['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in first.headers
+    assert len(CALLS) == calls          # aucun nouvel appel aval
+
+    conflict = client.post('/loan', json=dict(payload, loan_amount=2000), headers=headers)
+    assert conflict.status_code == 422
+    assert client.post('/loan', json=payload, headers={'Idempotency-Key': 'x' * 256}).status_code == 400
+
+
+def test_idempotency_key_coalesces_concurrent_retries(client, monkeypatch):
+    from app.app import idempotency_cache, idempotency_flight
+    import app.app as app_module
+    idempotency_cache.reset()
+    coalesced = idempotency_flight.coalesced
+    started, release, runs = threading.Event(), threading.Event(), []
+    process = app_module._process_loan
+    def slow_process(data):
+        runs.append(data)
+        started.set()
+        release.wait(5)
+        return process(data)
+    monkeypatch.setattr(app_module, '_process_loan', slow_process)
+
+    payload = {'id': '1', 'personal_info': 'x', 'loan_amount': 1000}
+    results = []
+    def retry():
+        with flask_app.test_client() as c:
+            results.append(c.post('/loan', json=payload, headers={'Idempotency-Key': 'cle-2'}))
+
+    threads = [threading.Thread(target=retry) for _ in range(3)]
+    threads[0].start()
+    started.wait(5)
+    for t in threads[1:]:
+        t.start()
+    while idempotency_flight.coalesced < coalesced + 2:
+        pass
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(runs) == 1
+    assert sorted(r.headers.get('Idempotent-Replayed', 'false') for r in results) == ['false', 'true', 'true']
+    assert len({r.get_json()['request_id'] for r in results}) == 1
+
+
+def test_admission_control(client):
+    shed = lambda reason: metrics.REGISTRY.get_sample_value(
+        'loan_shed_total', {'reason': reason, 'traffic': 'submit'}) or 0
+    overload, rate_limit = shed('overload'), shed('rate_limit')
+    limits = admission.limits()
+    try:
+        rv = client.put('/admin/admission', json={'max_concurrent': 1, 'reserved': 1})
+        assert rv.status_code == 200 and rv.get_json()['max_concurrent'] == 1
+        # toutes les places sont réservées : les soumissions sont délestées, pas le statut
+        rv = client.post('/loan', json={'id': '1', 'personal_info': 'x', 'loan_amount': 1000})
+        assert rv.status_code == 503 and rv.headers['Retry-After'] == '1'
+        assert client.get('/loan/status/inconnu').status_code == 404
+
+        client.put('/admin/admission', json={'max_concurrent': 0, 'client_rate': 1, 'client_burst': 1})
+        payload = {'id': 'rafale', 'personal_info': 'x', 'loan_amount': 1000}
+        assert client.post('/loan', json=payload).status_code == 200
+        rv = client.post('/loan', json=payload)
+        assert rv.status_code == 429 and int(rv.headers['Retry-After']) >= 1
+        assert client.post('/loan', json=dict(payload, id='autre')).status_code == 200
+
+        text = client.get('/metrics').get_data(as_text=True)
+        assert 'loan_shed_total{reason="overload",traffic="submit"}' in text
+        assert shed('overload') == overload + 1 and shed('rate_limit') == rate_limit + 1
+        assert client.put('/admin/admission', json={'max_concurrent': -1}).status_code == 400
+    finally:
+        admission.configure(**limits)
+
+
+def test_admission_rejects_more_reserved_than_concurrent(client):
+    limits = admission.limits()
+    try:
+        client.put('/admin/admission', json={'max_concurrent': 4, 'reserved': 2})
+        rv = client.put('/admin/admission', json={'reserved': 5})
+        assert rv.status_code == 400 and 'reserved' in rv.get_json()['reason']
+        rv = client.put('/admin/admission', json={'max_concurrent': 1})
+        assert rv.status_code == 400
+        stats = client.get('/admin/admission').get_json()
+        assert (stats['max_concurrent'], stats['reserved']) == (4, 2)   # rien n'est appliqué
+        # 0 : concurrence illimitée, les places réservées sont sans effet
+        assert client.put('/admin/admission', json={'max_concurrent': 0, 'reserved': 5}).status_code == 200
+    finally:
+        admission.configure(**limits)
+
+
+def test_loan_batch_charges_client_per_loan(client):
+    limits = admission.limits()
+    try:
+        admission.configure(max_concurrent=0, client_rate=0.001, client_burst=2)
+        loans = [{'id': 'lot', 'personal_info': 'x', 'loan_amount': 1000} for _ in range(3)]
+        loans.append({'id': 'autre', 'personal_info': 'x', 'loan_amount': 1000})
+        results = client.post('/loan/batch', json={'loans': loans}).get_json()['results']
+        assert [r['status'] for r in results] == ['pending', 'pending', 'error', 'pending']
+        assert results[2]['reason'] == 'Trop de demandes pour ce client' and results[2]['retry_after'] > 0
+        # seau du client épuisé par le lot : POST /loan limité à son tour
+        rv = client.post('/loan', json={'id': 'lot', 'personal_info': 'x', 'loan_amount': 1000})
+        assert rv.status_code == 429
+    finally:
+        admission.configure(**limits)
@@ -0,0 +1,291 @@
+import time
+import asyncio
+
+import httpx
+import pytest
+
+from app.app import (_process_loan_async, _loans, create_asgi_app, app as flask_app,
+                     decisions, risk_cache, risk_aflight, LocalLoanResponse)
+from asgi import LoanAsgiApp
+from rules import RuleTable
+
+
+class DummyLoanResponse:
+    def __init__(self, allowed, message):
+        self.allowed = allowed
+        self.message = message
+
+
+SUBMIT_RESPONSE = b"""<?xml version='1.0' encoding='UTF-8'?>
+<soap11env:Envelope xmlns:soap11env="http://schemas.xmlsoap.org/soap/envelope/"
+                   xmlns:tns="ms.banque.async">
+  <soap11env:Body>
+    <tns:SubmitChequeRequestResponse>
+      <tns:SubmitChequeRequestResult>async-uuid-1234</tns:SubmitChequeRequestResult>
+    </tns:SubmitChequeRequestResponse>
+  </soap11env:Body>
+</soap11env:Envelope>"""
+
+
+class FakeDownstreams:
+    """Downstreams asynchrones simulés, avec latences réglables."""
+
+    def __init__(self, montant_delay=0.0, risk_delay=0.0):
+        self.montant_delay = montant_delay
+        self.risk_delay    = risk_delay
+        self.cancelled     = []
+
+    async def _sleep(self, name, delay):
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(name)
+            raise
+
+    async def check_loan(self, loan_amount):
+        await self._sleep('montantmax', self.montant_delay)
+        if loan_amount <= 50000:
+            return DummyLoanResponse(True, "Demande acceptée")
+        return DummyLoanResponse(False, "Montant trop élevé")
+
+    async def risk_profile(self, payload):
+        await self._sleep('risk', self.risk_delay)
+        amt = payload['variables']['loanAmount']
+        return 'acceptable' if amt < 20000 else 'elevé'
+
+    async def submit_cheque(self, soap, headers):
+        return SUBMIT_RESPONSE
+
+
+class AsgiDownstreams(FakeDownstreams):
+    """FakeDownstreams installés par create_asgi_app()."""
+
+    async def aclose(self):
+        pass
+
+
+def _run(data, downstreams):
+    return asyncio.run(_process_loan_async(data, downstreams))
+
+
+@pytest.fixture(autouse=True)
+def fresh_risk_cache():
+    risk_cache.reset()
+
+
+@pytest.fixture
+def rules(monkeypatch):
+    """Installe des tables de règles et un RULES_MODE, sans synchronisation distante."""
+    def install(mode, montantmax, risk):
+        monkeypatch.setattr(decisions, 'mode', mode)
+        monkeypatch.setattr(decisions, '_tables', {
+            'ms_montantmax':   RuleTable(1, [(op, t, LocalLoanResponse(*o)) for op, t, o in montantmax]),
+            'ms_profilrisque': RuleTable(1, risk)})
+        monkeypatch.setattr(decisions, '_last_sync', time.monotonic())
+        monkeypatch.setattr(decisions, '_counters', {
+            name: dict.fromkeys(counters, 0) for name, counters in decisions._counters.items()})
+    return install
+
+
+def _responses(body):
+    return {step.service: step.response for step in _loans.get(body['request_id'])['history']}
+
+
+class RemoteForbidden(FakeDownstreams):
+    """Échoue si MontantMax ou le profil de risque est appelé."""
+
+    async def check_loan(self, loan_amount):
+        raise AssertionError("appel MontantMax inattendu")
+
+    async def risk_profile(self, payload):
+        raise AssertionError("appel profil de risque inattendu")
+
+
+def test_async_pending():
+    body, code = _run({'id': '1', 'personal_info': 'x', 'loan_amount': 10000}, FakeDownstreams())
+    assert code == 200
+    assert body['status'] == 'pending'
+    assert _loans.get(body['request_id'])['status'] == 'pending'
+
+
+def test_async_validation_error():
+    body, code = _run({'id': '1'}, FakeDownstreams())
+    assert code == 400
+    assert body['reason'] == 'Paramètres requis manquants'
+
+
+def test_montantmax_refusal_cancels_risk_call():
+    fake = FakeDownstreams(montant_delay=0.0, risk_delay=5.0)
+    body, code = _run({'id': '1', 'personal_info': 'x', 'loan_amount': 60000}, fake)
+    assert code == 400
+    assert body['reason'] == 'Montant trop élevé'
+    assert fake.cancelled == ['risk']
+
+
+def test_risk_refusal_cancels_montantmax_call():
+    fake = FakeDownstreams(montant_delay=5.0, risk_delay=0.0)
+    body, code = _run({'id': '1', 'personal_info': 'x', 'loan_amount': 25000}, fake)
+    assert code == 400
+    assert body['reason'] == 'Risque trop élevé'
+    assert fake.cancelled == ['montantmax']
+
+
+def test_async_local_rule_decisions(rules):
+    rules('local', [('>', 50000, (False, "Montant trop élevé")), ('*', 0, (True, "Demande acceptée"))],
+          [('>=', 20000, 'elevé'), ('*', 0, 'acceptable')])
+    body, code = _run({'id': '1', 'personal_info': 'x', 'loan_amount': 25000}, RemoteForbidden())
+    assert code == 400 and body['reason'] == 'Risque trop élevé'
+    body, code = _run({'id': '1', 'personal_info': 'x', 'loan_amount': 60000}, RemoteForbidden())
+    assert code == 400 and body['reason'] == 'Montant trop élevé'
+    body, code = _run({'id': '1', 'personal_info': 'x', 'loan_amount': 10000}, RemoteForbidden())
+    assert code == 200
+    responses = _responses(body)
+    assert responses['ms_montantmax']['local'] is True and responses['ms_profilrisque']['local'] is True
+    assert decisions.stats()['services']['ms_profilrisque']['local'] == 3
+
+
+def test_async_shadow_rules_compare_remote_decisions(rules):
+    # table locale divergente : la décision distante s'applique, l'écart est compté
+    rules('shadow', [('*', 0, (True, "Demande acceptée"))], [('*', 0, 'acceptable')])
+    body, code = _run({'id': '1', 'personal_info': 'x', 'loan_amount': 25000}, FakeDownstreams())
+    assert code == 400 and body['reason'] == 'Risque trop élevé'
+    body, code = _run({'id': '1', 'personal_info': 'y', 'loan_amount': 10000}, FakeDownstreams())
+    assert code == 200
+    services = decisions.stats()['services']
+    assert services['ms_profilrisque']['shadow_checks'] == 2
+    assert services['ms_profilrisque']['shadow_mismatches'] == 1
+    assert services['ms_montantmax']['shadow_checks'] >= 1
+    assert services['ms_montantmax']['shadow_mismatches'] == 0
+
+
+def test_async_risk_cache_and_single_flight():
+    calls = []
+
+    class Counting(FakeDownstreams):
+        async def risk_profile(self, payload):
+            calls.append(payload['variables'])
+            return await super().risk_profile(payload)
+
+    data = {'id': '1', 'personal_info': 'M.  Dupont', 'loan_amount': 10000}
+    coalesced = risk_aflight.coalesced
+
+    async def concurrent():
+        fake = Counting(risk_delay=0.05)
+        return await asyncio.gather(*(_process_loan_async(data, fake) for _ in range(3)))
+
+    results = asyncio.run(concurrent())
+    assert [code for _, code in results] == [200, 200, 200]
+    assert len(calls) == 1 and risk_aflight.coalesced == coalesced + 2
+
+    body, code = _run(dict(data, personal_info='M. Dupont'), Counting())
+    assert code == 200 and len(calls) == 1
+    assert _responses(body)['ms_profilrisque']['cached'] is True
+
+
+def test_asgi_routes():
+    async def loan_handler(scope, data):
+        return await _process_loan_async(data, FakeDownstreams())
+
+    asgi_app = LoanAsgiApp(flask_app, {('POST', '/loan'): loan_handler})
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=asgi_app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as c:
+            loan   = await c.post('/loan', json={'id': '1', 'personal_info': 'x', 'loan_amount': 10000})
+            health = await c.get('/health')
+            return loan, health
+
+    loan, health = asyncio.run(scenario())
+    assert loan.status_code == 200
+    assert loan.json()['status'] == 'pending'
+    assert health.json() == {'status': 'ok'}
+
+
+def test_asgi_loan_honours_idempotency_key(monkeypatch):
+    import app.app as orchestrator
+    submits = []
+
+    class CountingDownstreams(AsgiDownstreams):
+        async def submit_cheque(self, soap, headers):
+            submits.append(soap)
+            await asyncio.sleep(0.01)
+            return SUBMIT_RESPONSE
+
+    monkeypatch.setattr('async_downstreams.AsyncDownstreams', lambda *a, **kw: CountingDownstreams())
+    orchestrator.idempotency_cache.reset()
+    asgi_app = create_asgi_app()
+    payload = {'id': '1', 'personal_info': 'x', 'loan_amount': 10000}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=asgi_app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as c:
+            post = lambda body, key: c.post('/loan', json=body, headers={'Idempotency-Key': key})
+            concurrent = await asyncio.gather(*(post(payload, 'asgi-key') for _ in range(3)))
+            retried  = await post(payload, 'asgi-key')
+            conflict = await post(dict(payload, loan_amount=500), 'asgi-key')
+            invalid  = await post(payload, 'k' * 300)
+            return concurrent, retried, conflict, invalid
+
+    concurrent, retried, conflict, invalid = asyncio.run(scenario())
+    assert len(submits) == 1                    # un seul workflow pour la clé
+    assert len({r.json()['request_id'] for r in concurrent + [retried]}) == 1
+    assert sorted(r.headers.get('idempotent-replayed', 'false') for r in concurrent) == ['false', 'true', 'true']
+    assert retried.headers['idempotent-replayed'] == 'true'
+    assert conflict.status_code == 422 and invalid.status_code == 400
+
+
+def test_asgi_loan_applies_admission(monkeypatch):
+    from app.app import admission
+    monkeypatch.setattr('async_downstreams.AsyncDownstreams', lambda *a, **kw: AsgiDownstreams())
+    asgi_app = create_asgi_app()
+    limits = admission.limits()
+    payload = {'id': 'asgi-rafale', 'personal_info': 'x', 'loan_amount': 10000}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=asgi_app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as c:
+            admission.configure(max_concurrent=1, reserved=1)
+            saturated = await c.post('/loan', json=payload)
+            admission.configure(max_concurrent=0, client_rate=0.001, client_burst=1)
+            first   = await c.post('/loan', json=payload)
+            limited = await c.post('/loan', json=payload)
+            return saturated, first, limited
+
+    try:
+        admission.reset()
+        saturated, first, limited = asyncio.run(scenario())
+    finally:
+        admission.configure(**limits)
+        admission.reset()
+    assert saturated.status_code == 503 and saturated.headers['retry-after'] == '1'
+    assert first.status_code == 200          # la requête délestée n'a pas consommé le jeton
+    assert limited.status_code == 429 and int(limited.headers['retry-after']) >= 1
+    assert admission.in_flight() == 0
+
+
+def test_create_asgi_app():
+    assert isinstance(create_asgi_app(), LoanAsgiApp)
+
+
+def test_asgi_status_long_poll_and_events():
+    from app.app import waiters
+    _loans.put('asgi-wait', {'client_id': '1', 'loan_amount': 10, 'status': 'pending', 'history': []})
+    asgi_app = create_asgi_app()
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=asgi_app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as c:
+            timed_out = await c.get('/loan/status/asgi-wait?wait=0.01')
+            poll = asyncio.ensure_future(c.get('/loan/status/asgi-wait?wait=5'))
+            while not waiters.waiting():
+                await asyncio.sleep(0.001)
+            _loans.update('asgi-wait', status='done', verdict='Chèque invalide')
+            waiters.notify('asgi-wait')
+            events = await c.get('/loan/status/asgi-wait/events')
+            return timed_out, await poll, events
+
+    timed_out, poll, events = asyncio.run(scenario())
+    assert timed_out.json() == {'status': 'pending'}
+    assert poll.status_code == 400 and poll.json()['status'] == 'refused'
+    assert events.headers['content-type'].startswith('text/event-stream')
+    assert events.text.startswith('event: status\ndata: {"status": "refused"')
@@ -0,0 +1,248 @@
+# tests/test_banque_service.py
+"""
+Opérations de ms_banque ajoutées au service (lots, callbacks, store, chemin
+rapide) : exécutées quelle que soit la version de Python, contrairement à
+test_ms_banque.py.
+"""
+import pytest
+from spyne.server.wsgi import WsgiApplication
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+from lxml import etree
+
+from ms_banque.server import application, _STORE
+
+
+@pytest.fixture(autouse=True)
+def flush_store():
+    _STORE.clear()
+    yield
+    _STORE.clear()
+
+@pytest.fixture
+def client():
+    wsgi_app = WsgiApplication(application)
+    return Client(wsgi_app, Response)
+
+def _parse_response(resp):
+    return etree.fromstring(resp.data)
+
+
+def test_submit_cheque_requests_batch(client):
+    soap = b'''<?xml version="1.0"?>\
+<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">\
+<soapenv:Body><SubmitChequeRequests xmlns="ms.banque.async"><count>3</count>\
+</SubmitChequeRequests></soapenv:Body></soapenv:Envelope>'''
+    resp = client.post('/', data=soap, headers={'Content-Type':'text/xml'})
+    assert resp.status_code == 200
+    tree = _parse_response(resp)
+    ns = {'tns':'ms.banque.async'}
+    ids = [e.text for e in tree.iterfind('.//tns:SubmitChequeRequestsResult/tns:string', namespaces=ns)]
+    assert len(ids) == 3
+    assert all(i in _STORE for i in ids)
+
+
+def test_submit_cheque_requests_rejects_oversized_batch(client):
+    from ms_banque.server import MAX_BATCH
+    soap = _envelope(f'<SubmitChequeRequests xmlns="ms.banque.async"><count>{MAX_BATCH + 1}</count>'
+                     f'</SubmitChequeRequests>')
+    resp = client.post('/', data=soap, headers={'Content-Type':'text/xml'})
+    assert resp.status_code == 500
+    assert _parse_response(resp).findtext('.//faultcode') == 'soap11env:Client.TooLarge'
+    assert len(_STORE) == 0
+
+
+def test_metrics_endpoint():
+    from ms_banque.server import wsgi_app
+    client = Client(wsgi_app(), Response)
+    soap = b'''<?xml version="1.0"?>\
+<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">\
+<soapenv:Body><SubmitChequeRequest xmlns="ms.banque.async"/></soapenv:Body></soapenv:Envelope>'''
+    client.post('/', data=soap, headers={'Content-Type':'text/xml'})
+    text = client.get('/metrics').data.decode()
+    assert 'soap_operation_duration_seconds_count{operation="SubmitChequeRequest"}' in text
+    assert 'cheque_requests 1.0' in text
+
+
+def test_callback_carries_trace_context(monkeypatch):
+    from ms_banque import server
+    sent = {}
+    class Ok:
+        status_code = 200
+        headers     = {}
+    def post(self, url, data=None, headers=None, timeout=None):
+        sent.update(data=data, headers=headers)
+        return Ok()
+    monkeypatch.setattr('requests.Session.post', post)
+    parent = '00-' + 'e' * 32 + '-' + 'f' * 16 + '-01'
+    server.send_callback('req-1', 'http://app/loan/callback', 'urn:uuid:1', 'Chèque validé', parent)
+    server.batcher.flush()
+    assert server.callbacks.join(timeout=5)
+    tree = etree.fromstring(sent['data'])
+    traceparent = tree.findtext('.//{urn:webservice:trace}traceparent')
+    assert traceparent.startswith('00-' + 'e' * 32) and traceparent == sent['headers']['traceparent']
+    assert [s['parent_id'] for s in server.tracer.exporter.find('e' * 32)] == ['f' * 16]
+
+
+def test_admin_callbacks_lists_dead_letters(monkeypatch):
+    from ms_banque import server
+    class Refused:
+        status_code = 404
+        headers     = {}
+    monkeypatch.setattr('requests.Session.post', lambda self, *a, **kw: Refused())
+    server.callbacks.dead.clear()
+    server.send_callback('req-2', 'http://app/loan/callback', 'urn:uuid:2', 'Chèque invalide')
+    server.batcher.flush()
+    assert server.callbacks.join(timeout=5)
+    admin = Client(server.wsgi_app(), Response)
+    body = admin.get('/admin/callbacks').get_json()
+    assert body['dead'] == 1 and body['dead_letters'][0]['error'] == 'HTTP 404'
+    assert 'callback_dead_letters 1.0' in admin.get('/metrics').data.decode()
+    monkeypatch.setattr('requests.Session.post', lambda self, *a, **kw: type('Ok', (), {'status_code': 200, 'headers': {}})())
+    assert admin.post('/admin/callbacks').get_json() == {'redelivered': 1}
+    assert server.callbacks.join(timeout=5) and not server.callbacks.dead
+
+
+def test_callbacks_are_coalesced_per_reply_to(monkeypatch):
+    from ms_banque import server
+    from common import soap as codec
+    sent = []
+    class Ok:
+        status_code = 200
+        headers     = {}
+    def post(self, url, data=None, headers=None, timeout=None):
+        sent.append((url, data))
+        return Ok()
+    monkeypatch.setattr('requests.Session.post', post)
+    for n in range(3):
+        server.send_callback(f'b-{n}', 'http://app/loan/callback', f'urn:uuid:{n}', 'Chèque validé')
+    server.send_callback('c-0', 'http://other/loan/callback', 'urn:uuid:9', 'Chèque invalide')
+    server.batcher.flush()
+    assert server.callbacks.join(timeout=5)
+    envelopes = {url: codec.cheque_statuses(codec.parse(data)) for url, data in sent}
+    assert [v['request_id'] for v in envelopes['http://app/loan/callback']] == ['b-0', 'b-1', 'b-2']
+    assert envelopes['http://app/loan/callback'][1]['relates_to'] == 'urn:uuid:1'
+    # verdict seul : enveloppe simple, inchangée
+    single = codec.parse(dict(sent)['http://other/loan/callback'])
+    assert envelopes['http://other/loan/callback'] == []
+    assert codec.cheque_status(single)['verdict'] == 'Chèque invalide'
+
+
+def _envelope(body):
+    return (f'<?xml version="1.0"?><soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">'
+            f'<soapenv:Body>{body}</soapenv:Body></soapenv:Envelope>').encode()
+
+
+def test_upload_cheques_and_statuses_batch(client, monkeypatch):
+    from ms_banque import server
+    queued = []
+    monkeypatch.setattr(server.batcher, 'add', lambda url, item, traceparent=None: queued.append(item))
+    ids = [server._new_request('http://app/loan/callback', f'urn:uuid:{n}') for n in range(3)]
+    uploads = ''.join(f'<ChequeUpload><request_id>{i}</request_id><cheque>{c}</cheque></ChequeUpload>'
+                      for i, c in [(ids[0], 'valid'), (ids[1], 'invalid'), ('inconnu', 'valid')])
+    resp = client.post('/', data=_envelope(f'<UploadCheques xmlns="ms.banque.async"><uploads>{uploads}'
+                                           f'</uploads></UploadCheques>'),
+                       headers={'Content-Type': 'text/xml'})
+    assert resp.status_code == 200
+    ns = {'tns': 'ms.banque.async'}
+    results = [(r.findtext('tns:request_id', namespaces=ns), r.findtext('tns:status', namespaces=ns))
+               for r in _parse_response(resp).iterfind('.//tns:ChequeResult', namespaces=ns)]
+    assert results == [(ids[0], 'done'), (ids[1], 'done'), ('inconnu', 'unknown')]
+    assert [item[0] for item in queued] == ids[:2]
+
+    ids_xml = ''.join(f'<string>{i}</string>' for i in ids)
+    resp = client.post('/', data=_envelope(f'<GetChequeStatuses xmlns="ms.banque.async"><request_ids>'
+                                           f'{ids_xml}</request_ids></GetChequeStatuses>'),
+                       headers={'Content-Type': 'text/xml'})
+    statuses = [(r.findtext('tns:status', namespaces=ns), r.findtext('tns:verdict', namespaces=ns))
+                for r in _parse_response(resp).iterfind('.//tns:ChequeResult', namespaces=ns)]
+    assert statuses == [('done', 'Chèque validé'), ('done', 'Chèque invalide'), ('pending', '')]
+
+
+def test_upload_cheques_reports_busy_when_callbacks_saturated(client, monkeypatch):
+    from ms_banque import server
+    calls = []
+    def saturated(url, item, traceparent=None):
+        calls.append(item)
+        raise server.QueueFull('saturée')
+    monkeypatch.setattr(server.batcher, 'add', saturated)
+    ids = [server._new_request('http://app/loan/callback', 'urn:uuid:1') for _ in range(2)]
+    uploads = ''.join(f'<ChequeUpload><request_id>{i}</request_id><cheque>valid</cheque></ChequeUpload>'
+                      for i in ids)
+    resp = client.post('/', data=_envelope(f'<UploadCheques xmlns="ms.banque.async"><uploads>{uploads}'
+                                           f'</uploads></UploadCheques>'),
+                       headers={'Content-Type': 'text/xml'})
+    ns = {'tns': 'ms.banque.async'}
+    assert [r.text for r in _parse_response(resp).iterfind('.//tns:status', namespaces=ns)] == ['busy', 'busy']
+    assert len(calls) == 1                      # pas de nouvelle attente pour le reste du lot
+    assert all(_STORE[i]['status'] == 'done' for i in ids)
+
+
+def test_fast_path_matches_spyne(monkeypatch):
+    from ms_banque import server
+    monkeypatch.setattr(server.batcher, 'add', lambda url, item, traceparent=None: None)
+    fast, spyne = Client(server.wsgi_app(), Response), Client(WsgiApplication(application), Response)
+    submit = _envelope('<SubmitChequeRequest xmlns="ms.banque.async"/>')
+    answers = [c.post('/', data=submit, headers={'Content-Type': 'text/xml'}) for c in (fast, spyne)]
+    ids = [r.data.split(b'Result>')[1].split(b'<')[0].decode() for r in answers]
+    assert answers[0].data.replace(ids[0].encode(), ids[1].encode()) == answers[1].data
+    assert answers[0].headers['Content-Type'] == answers[1].headers['Content-Type']
+    assert _STORE[ids[0]]['status'] == 'pending'
+
+    upload = _envelope(f'<UploadCheque xmlns="ms.banque.async"><request_id>{ids[0]}</request_id>'
+                       f'<cheque>valid</cheque></UploadCheque>')
+    answers = [c.post('/', data=upload, headers={'Content-Type': 'text/xml'}) for c in (fast, spyne)]
+    assert answers[0].status_code == 200 and answers[0].data == answers[1].data
+    assert _STORE[ids[0]]['verdict'] == 'Chèque validé'
+
+    # file des callbacks saturée : même faute SOAP
+    def saturated(url, item, traceparent=None):
+        raise server.QueueFull('saturée')
+    monkeypatch.setattr(server.batcher, 'add', saturated)
+    answers = [c.post('/', data=upload, headers={'Content-Type': 'text/xml'}) for c in (fast, spyne)]
+    assert answers[0].status_code == answers[1].status_code == 500
+    assert answers[0].data == answers[1].data and b'Server.Busy' in answers[0].data
+
+    text = fast.get('/metrics').data.decode()
+    assert 'soap_operation_duration_seconds_count{operation="UploadCheque"}' in text
+
+
+def test_fast_path_falls_back_to_spyne_on_invalid_request():
+    from ms_banque import server
+    fast = Client(server.wsgi_app(), Response)
+    invalid = _envelope('<UploadCheque xmlns="ms.banque.async"><bad/></UploadCheque>')
+    resp = fast.post('/', data=invalid, headers={'Content-Type': 'text/xml'})
+    assert resp.status_code == 500 and b'SchemaValidationError' in resp.data
+    assert b'definitions' in fast.get('/?wsdl').data
+
+
+def test_fast_path_unexpected_error_is_a_soap_fault(monkeypatch):
+    from ms_banque import server
+    def broken(request_id, cheque):
+        raise RuntimeError('store indisponible')
+    monkeypatch.setattr(server, '_upload', broken)
+    fast, spyne = Client(server.wsgi_app(), Response), Client(WsgiApplication(application), Response)
+    upload = _envelope('<UploadCheque xmlns="ms.banque.async"><request_id>r</request_id>'
+                       '<cheque>valid</cheque></UploadCheque>')
+    answers = [c.post('/', data=upload, headers={'Content-Type': 'text/xml'}) for c in (fast, spyne)]
+    assert answers[0].status_code == answers[1].status_code == 500
+    assert answers[0].data == answers[1].data and b'store indisponible' not in answers[0].data
+
+
+def test_fast_path_validates_concurrently():
+    import threading
+    from ms_banque import server
+    envelope = _envelope('<UploadCheque xmlns="ms.banque.async"><request_id>r</request_id>'
+                         '<cheque>valid</cheque></UploadCheque>')
+    schemas, results = [], []
+    def validate():
+        # un document par requête, comme dans _fast_path
+        payload = server.soap.payload(server.soap.parse(envelope))
+        schemas.append(server._schema())
+        results.extend(server._valid(payload) for _ in range(200))
+    threads = [threading.Thread(target=validate) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(map(id, schemas))) == 4 and len(results) == 800 and all(results)
@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from cache import TTLCache, SharedTTLCache, SingleFlight
+from common.shared_store import SharedDict
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = TTLCache(maxsize=10, ttl=5)
+    cache.set('k', 'v')
+    assert cache.get('k') == (True, 'v')
+    now[0] += 6
+    assert cache.get('k') == (False, None)
+    assert cache.stats()['expired'] == 1
+
+
+def test_lru_eviction():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')          # 'b' devient le moins récemment utilisé
+    cache.set('c', 3)
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, 1)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_invalidate_predicate():
+    cache = TTLCache()
+    cache.set((1, 'x'), 'a')
+    cache.set((2, 'x'), 'b')
+    cache.set((1, 'y'), 'c')
+    assert cache.invalidate(predicate=lambda k: k[1] == 'x') == 2
+    assert cache.stats()['size'] == 1
+
+
+def test_shared_ttl_cache_across_processes(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    first  = SharedTTLCache(SharedDict(path, table='idempotency', maxsize=10, ttl=60))
+    second = SharedTTLCache(SharedDict(path, table='idempotency', maxsize=10, ttl=60))
+    assert first.get('k') == (False, None)
+    first.set('k', ('fp', {'status': 'pending'}, 202))
+    assert second.get('k') == (True, ['fp', {'status': 'pending'}, 202])
+    assert second.stats()['hits'] == 1 and first.stats()['misses'] == 1
+    assert second.invalidate('k') == 1 and first.get('k') == (False, None)
+    first.set('k', 1)
+    first.reset()
+    assert second.stats()['size'] == 0 and first.stats()['misses'] == 0
+
+
+def test_single_flight_coalesces():
+    flight  = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls   = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(2)
+        return 'risk'
+
+    results = []
+    leader  = threading.Thread(target=lambda: results.append(flight.do('k', slow)))
+    leader.start()
+    started.wait(2)
+    follower = threading.Thread(target=lambda: results.append(flight.do('k', slow)))
+    follower.start()
+    while flight.coalesced == 0:
+        time.sleep(0.001)
+    release.set()
+    leader.join()
+    follower.join()
+    assert len(calls) == 1
+    assert sorted(results) == [('risk', False), ('risk', True)]
+
+
+def test_single_flight_propagates_errors():
+    flight = SingleFlight()
+    with pytest.raises(ValueError):
+        flight.do('k', lambda: (_ for _ in ()).throw(ValueError()))
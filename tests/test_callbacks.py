@@ -0,0 +1,171 @@
+import time
+import threading
+
+import pytest
+
+from common.callbacks import CallbackDispatcher, CallbackBatcher, QueueFull
+
+
+class Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers     = headers or {}
+
+
+class FakeSession:
+    """Réponses scriptées par URL (la dernière est répétée)."""
+
+    def __init__(self, script, gate=None):
+        self.script = script
+        self.gate   = gate
+        self.calls  = []
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.calls.append((url, data, headers))
+        statuses = self.script.get(url, [200])
+        status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+        if isinstance(status, Exception):
+            raise status
+        return Response(status)
+
+
+@pytest.fixture
+def dispatcher(monkeypatch):
+    made = []
+    def factory(script=None, gate=None, **kw):
+        kw.setdefault('backoff_base', 0.005)
+        kw.setdefault('backoff_max', 0.01)
+        d = CallbackDispatcher(**kw)
+        d.fake = FakeSession(script or {}, gate)
+        monkeypatch.setattr(d, 'session', lambda url: d.fake)
+        made.append(d)
+        return d
+    yield factory
+    for d in made:
+        d.stop()
+
+
+def test_delivers_with_body_built_per_attempt(dispatcher):
+    outcomes, latencies = [], []
+    d = dispatcher(on_attempt=lambda outcome, duration: outcomes.append(outcome),
+                   on_delivered=latencies.append)
+    d.submit('http://app/cb', lambda tp: b'<verdict/>', headers={'Content-Type': 'text/xml'})
+    d.submit('http://app/cb', b'<raw/>')
+    assert d.join(timeout=5)
+    assert sorted(call[1] for call in d.fake.calls) == [b'<raw/>', b'<verdict/>']
+    assert outcomes == ['success', 'success'] and len(latencies) == 2
+    assert d.stats()['delivered'] == 2 and d.pending() == 0
+
+
+def test_retries_transient_errors_then_succeeds(dispatcher):
+    outcomes = []
+    d = dispatcher({'http://app/cb': [503, ConnectionError('reset'), 429, 200]},
+                   on_attempt=lambda outcome, duration: outcomes.append(outcome))
+    d.submit('http://app/cb', b'x')
+    assert d.join(timeout=5)
+    assert outcomes == ['retry', 'retry', 'retry', 'success']
+    assert d.stats()['retried'] == 3 and not d.dead
+
+
+def test_dead_letters_after_rejection_or_exhaustion(dispatcher):
+    d = dispatcher({'http://app/refuse': [400], 'http://app/down': [500]}, max_attempts=3)
+    d.submit('http://app/refuse', b'x')
+    d.submit('http://app/down', b'x')
+    assert d.join(timeout=5)
+    letters = {letter['url']: letter for letter in d.dead_letters()}
+    assert letters['http://app/refuse']['attempts'] == 1
+    assert letters['http://app/down']['attempts'] == 3
+    assert letters['http://app/down']['error'] == 'HTTP 500'
+
+    # renvoi après rétablissement du destinataire
+    d.fake.script.clear()
+    assert d.redeliver() == 2
+    assert d.join(timeout=5) and not d.dead and d.stats()['delivered'] == 2
+
+
+def test_bounded_queue_applies_backpressure(dispatcher):
+    gate = threading.Event()
+    d = dispatcher(gate=gate, workers=1, queue_size=2, enqueue_timeout=0.05)
+    d.submit('http://app/cb', b'1')
+    d.submit('http://app/cb', b'2')
+    with pytest.raises(QueueFull):
+        d.submit('http://app/cb', b'3')
+    assert d.stats()['rejected'] == 1
+    gate.set()
+    assert d.join(timeout=5) and d.stats()['delivered'] == 2
+
+
+def test_session_is_shared_per_host():
+    d = CallbackDispatcher(workers=4)
+    try:
+        first = d.session('http://app:5000/loan/callback')
+        assert d.session('http://app:5000/other') is first
+        assert d.session('http://other:5000/loan/callback') is not first
+        assert d.stats()['hosts'] == 2
+    finally:
+        d.stop()
+
+
+def test_backoff_is_bounded():
+    d = CallbackDispatcher(backoff_base=1, backoff_max=8)
+    assert 0.5 <= d.backoff(1) <= 1
+    assert 4 <= d.backoff(4) <= 8
+    assert d.backoff(20) <= 8
+
+
+def test_batcher_coalesces_per_url_within_window(dispatcher):
+    d = dispatcher()
+    sizes = []
+    batcher = CallbackBatcher(d, lambda url, items: ','.join(items).encode(), window=0.05,
+                              max_batch=3, on_flush=sizes.append)
+    for n in range(4):
+        batcher.add('http://app/cb', f'a{n}')          # lot plein envoyé aussitôt
+    batcher.add('http://other/cb', 'b0', traceparent='00-' + 'e' * 32 + '-' + 'f' * 16 + '-01')
+    assert batcher.pending() == 2
+    deadline = time.monotonic() + 5
+    while batcher.pending() and time.monotonic() < deadline:
+        time.sleep(0.01)                                # fenêtre expirée
+    batcher.stop()                                      # lot en cours d'envoi terminé
+    assert d.join(timeout=5)
+    assert sorted(call[1] for call in d.fake.calls) == [b'a0,a1,a2', b'a3', b'b0']
+    assert sorted(sizes) == [1, 1, 3]
+
+
+def test_batcher_disabled_sends_immediately(dispatcher):
+    d = dispatcher()
+    batcher = CallbackBatcher(d, lambda url, items: items[0], window=0)
+    batcher.add('http://app/cb', b'x')
+    assert batcher.pending() == 0 and d.join(timeout=5)
+    assert [call[1] for call in d.fake.calls] == [b'x']
+
+
+def test_batcher_buffered_items_count_against_queue(dispatcher):
+    d = dispatcher(queue_size=3, enqueue_timeout=0.05)
+    batcher = CallbackBatcher(d, lambda url, items: ','.join(items).encode(), window=60,
+                              max_batch=10)
+    for n in range(3):
+        batcher.add('http://app/cb', f'a{n}')           # une place réservée par élément
+    assert d.stats()['reserved'] == 3
+    with pytest.raises(QueueFull):
+        batcher.add('http://app/cb', 'a3')
+    with pytest.raises(QueueFull):
+        d.submit('http://other/cb', b'x')
+    batcher.flush()                                     # un envoi pour le lot : deux places rendues
+    assert d.stats()['reserved'] == 0
+    assert d.join(timeout=5) and [call[1] for call in d.fake.calls] == [b'a0,a1,a2']
+    batcher.add('http://app/cb', 'a4')
+    batcher.stop()
+    assert d.join(timeout=5) and d.stats()['reserved'] == 0
+
+
+def test_batcher_releases_reservations_when_build_fails(dispatcher):
+    d = dispatcher(queue_size=2)
+    def build(url, items):
+        raise ValueError("corps invalide")
+    batcher = CallbackBatcher(d, build, window=60, max_batch=2)
+    batcher.add('http://app/cb', 'a0')
+    with pytest.raises(ValueError):
+        batcher.add('http://app/cb', 'a1')              # lot plein : construction en échec
+    assert d.stats()['reserved'] == 0 and batcher.pending() == 0
@@ -0,0 +1,130 @@
+import time
+import threading
+
+from cheque_store import ChequeStore, from_env
+from common.shared_store import SharedDict
+
+
+def test_concurrent_writers_on_striped_store():
+    store = ChequeStore(stripes=4)
+    def writer(n):
+        for i in range(500):
+            store[f'{n}-{i}'] = {'status': 'pending', 'n': i}
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(store) == 4000 and store['7-499'] == {'status': 'pending', 'n': 499}
+    assert store.get_many(['0-0', 'absent']) == {'0-0': {'status': 'pending', 'n': 0}}
+
+
+def test_done_entries_expire_pending_entries_stay():
+    store = ChequeStore(done_ttl=0.05, pending_ttl=0)
+    store.update({'a': {'status': 'pending'}, 'b': {'status': 'done'}})
+    value = store['a']
+    value['status'] = 'done'              # une copie : rien n'est écrit
+    assert store['a']['status'] == 'pending' and 'b' in store
+    time.sleep(0.06)
+    assert 'b' not in store and store.get('b') is None and len(store) == 1
+    assert store['a'] == {'status': 'pending'}
+
+
+def test_log_replayed_after_restart(tmp_path):
+    path = str(tmp_path / 'cheques.log')
+    store = ChequeStore(path, done_ttl=0.05)
+    store['pending'] = {'status': 'pending', 'reply_to': 'http://app/cb'}
+    store['done']    = {'status': 'done', 'verdict': 'Chèque validé'}
+    store['gone']    = {'status': 'pending'}
+    assert store.pop('gone') == {'status': 'pending'}
+    store.close()
+    with open(path, 'a') as fh:
+        fh.write('["tronq')                  # arrêt pendant une écriture
+
+    time.sleep(0.06)
+    store = ChequeStore(path, done_ttl=0.05)
+    assert store['pending']['reply_to'] == 'http://app/cb'
+    assert 'done' not in store and 'gone' not in store and len(store) == 1
+    store.close()
+
+
+def test_writes_after_torn_line_survive_restarts(tmp_path):
+    path = str(tmp_path / 'cheques.log')
+    store = ChequeStore(path)
+    store['a'] = {'status': 'pending'}
+    store['b'] = {'status': 'pending'}
+    store.close()
+    with open(path, 'a') as fh:
+        fh.write('["tronq')                  # arrêt pendant une écriture
+
+    store = ChequeStore(path)
+    store['c'] = {'status': 'pending'}
+    store.close()
+    store = ChequeStore(path)
+    store['d'] = {'status': 'pending'}
+    store.close()
+    store = ChequeStore(path)
+    assert sorted(store.get_many(['a', 'b', 'c', 'd'])) == ['a', 'b', 'c', 'd']
+    store.close()
+    with open(path) as fh:
+        assert 'tronq' not in fh.read()
+
+
+def test_corrupt_json_line_handled_like_torn_line(tmp_path):
+    path = str(tmp_path / 'cheques.log')
+    for corrupt in ('{}', '1', '["a"', '["a", 1, 2, 3]', '[1]', '["a", {}, null]'):
+        store = ChequeStore(path)
+        store['a'] = {'status': 'pending'}
+        store.close()
+        with open(path, 'a') as fh:
+            fh.write(corrupt + '\n')         # JSON valide mais pas un enregistrement
+        store = ChequeStore(path)
+        assert store['a'] == {'status': 'pending'} and len(store) == 1
+        store['b'] = {'status': 'pending'}
+        store.close()
+        with open(path) as fh:
+            assert corrupt not in fh.read().splitlines()
+        store = ChequeStore(path)
+        assert sorted(store.get_many(['a', 'b'])) == ['a', 'b']
+        store.pop('b')
+        store.close()
+
+
+def test_log_compaction(tmp_path):
+    path = str(tmp_path / 'cheques.log')
+    store = ChequeStore(path, compact_ratio=2, compact_min=100)
+    for i in range(1000):
+        store[f'k{i % 10}'] = {'status': 'pending', 'i': i}
+    assert store.compactions > 0 and store.log_bytes() < 50 * 1024
+    store.close()
+    with open(path) as fh:
+        assert sum(1 for _ in fh) < 200
+    store = ChequeStore(path)
+    assert len(store) == 10 and store['k9'] == {'status': 'pending', 'i': 999}
+    store.close()
+
+
+def test_from_env_selects_backend(tmp_path, monkeypatch):
+    monkeypatch.setenv('BANQUE_STORE_PATH', str(tmp_path / 'cheques.db'))
+    monkeypatch.setenv('BANQUE_DONE_TTL', '0.05')
+    monkeypatch.setenv('BANQUE_PENDING_TTL', '0')
+    shared = from_env()
+    assert isinstance(shared, SharedDict)
+    shared.update({'a': {'status': 'pending'}, 'b': {'status': 'done'}})
+    time.sleep(0.06)
+    assert shared.get_many(['a', 'b']) == {'a': {'status': 'pending'}}
+    monkeypatch.delenv('BANQUE_STORE_PATH')
+    monkeypatch.setenv('BANQUE_STORE_LOG', str(tmp_path / 'cheques.log'))
+    store = from_env()
+    assert isinstance(store, ChequeStore) and store.path.endswith('cheques.log')
+    store.close()
+
+
+def test_memory_stays_flat_under_churn():
+    store = ChequeStore(stripes=1, done_ttl=0, pending_ttl=3600)
+    for i in range(5000):
+        store[f'c{i}'] = {'status': 'pending'}
+        store[f'c{i}'] = {'status': 'done'}         # sans expiration : sort du tas
+        store.pop(f'c{i}')
+    stripe = store._stripes[0]
+    assert len(store) == 0 and len(stripe.deadlines) <= 64
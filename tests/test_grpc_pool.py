@@ -0,0 +1,82 @@
+import grpc
+import pytest
+
+from grpc_pool import GrpcChannelPool
+
+
+class FakeChannel:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class Unavailable(grpc.RpcError):
+    def code(self):
+        return grpc.StatusCode.UNAVAILABLE
+
+
+class FakeStub:
+    def __init__(self, channel):
+        self.channel = channel
+
+    def Echo(self, request):
+        if request == 'down':
+            raise Unavailable()
+        return self.channel
+
+
+@pytest.fixture
+def channels(monkeypatch):
+    created = []
+
+    def fake_channel(addr, options=None):
+        created.append(FakeChannel())
+        return created[-1]
+
+    monkeypatch.setattr(grpc, 'insecure_channel', fake_channel)
+    return created
+
+
+def test_round_robin_and_reuse(channels):
+    pool = GrpcChannelPool('x:1', size=2)
+    used = [pool.call(FakeStub, 'Echo', 'ok') for _ in range(4)]
+    assert used == [channels[0], channels[1], channels[0], channels[1]]
+    stats = pool.stats()
+    assert stats['channels_created'] == 2
+    assert stats['reused_calls'] == 2
+
+
+def test_reconnect_on_unavailable(channels):
+    pool = GrpcChannelPool('x:1', size=1)
+    with pytest.raises(Unavailable):
+        pool.call(FakeStub, 'Echo', 'down')
+    assert channels[0].closed
+    assert pool.call(FakeStub, 'Echo', 'ok') is channels[1]
+    assert pool.stats()['reconnects'] == 1
+
+
+def test_reconnect_after_acquire_does_not_cache_stale_stub(channels):
+    pool = GrpcChannelPool('x:1', size=1)
+    acquire = pool._acquire
+
+    def racing_acquire():
+        acquired = acquire()
+        if len(channels) == 1:
+            pool._reconnect(0, channels[0])   # autre thread : canal écarté juste après la prise
+        return acquired
+
+    pool._acquire = racing_acquire
+    assert pool.call(FakeStub, 'Echo', 'ok') is channels[0]
+    assert channels[0].closed
+    assert pool.call(FakeStub, 'Echo', 'ok') is channels[1]   # stub du nouveau canal
+
+
+def test_close(channels):
+    pool = GrpcChannelPool('x:1', size=2)
+    pool.call(FakeStub, 'Echo', 'ok')
+    pool.close()
+    assert channels[0].closed
+    with pytest.raises(RuntimeError):
+        pool.call(FakeStub, 'Echo', 'ok')
@@ -0,0 +1,19 @@
+from history import HistoryStep
+
+
+def test_step_is_compact():
+    step = HistoryStep("ms_montantmax", request={"loan_amount": 1.0})
+    assert not hasattr(step, '__dict__')
+    assert isinstance(step.ts_ns, int)
+    assert step.service is HistoryStep("ms_montantmax").service  # nom interné
+
+
+def test_timestamp_formatted_on_serialization():
+    step = HistoryStep("client", ts_ns=1_700_000_000_123_456_789)
+    assert step.to_dict() == {"timestamp": "2023-11-14T22:13:20.123456", "service": "client"}
+
+
+def test_record_round_trip():
+    step = HistoryStep("ms_banque", response={"request_id": "x"}, error="oops")
+    back = HistoryStep.from_record(step.to_record())
+    assert back.to_dict() == step.to_dict()
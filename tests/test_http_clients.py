@@ -0,0 +1,50 @@
+import http.server
+import threading
+
+import pytest
+
+from http_clients import ServiceClient
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    srv = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{srv.server_port}/'
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_connections_are_reused(server):
+    client = ServiceClient(server, pool_size=2)
+    for _ in range(5):
+        assert client.post(json={'x': 1}).json() == {'ok': True}
+    stats = client.stats()
+    assert stats['requests'] == 5
+    assert stats['connections_opened'] == 1
+    assert stats['connections_reused'] == 4
+    client.close()
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv('MS_TEST_POOL_SIZE', '3')
+    monkeypatch.setenv('MS_TEST_TIMEOUT', '1.5')
+    client = ServiceClient.from_env('MS_TEST', 'http://x/')
+    assert client.pool_size == 3
+    assert client.timeout == 1.5
@@ -0,0 +1,242 @@
+import os
+
+import pytest
+
+from history import HistoryStep
+from loan_store import MemoryLoanStore, SqliteLoanStore
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        s = MemoryLoanStore()
+    else:
+        s = SqliteLoanStore(str(tmp_path / 'loans.db'))
+    yield s
+    s.close()
+
+
+def _entry(status='pending'):
+    return {"client_id": "c1", "loan_amount": 1000.0, "status": status,
+            "history": [HistoryStep("client", request={"id": "c1"})]}
+
+
+def test_put_get_update_append(store):
+    store.put('r1', _entry())
+    assert store.get('r1')['status'] == 'pending'
+    assert store.update('r1', status='done', verdict='Chèque validé')
+    assert store.append_history('r1', HistoryStep("ms_banque callback"))
+    entry = store.get('r1')
+    assert entry['status'] == 'done'
+    assert entry['verdict'] == 'Chèque validé'
+    assert [s.service for s in entry['history']] == ['client', 'ms_banque callback']
+    assert entry['history'][0].request == {"id": "c1"}
+
+
+def test_unknown_id(store):
+    assert store.get('nope') is None
+    assert not store.update('nope', status='done')
+    assert not store.append_history('nope', HistoryStep("x"))
+    assert store.history('nope') is None
+
+
+def test_batch_writes(store):
+    with store.batch():
+        store.put('a', _entry())
+        store.put('b', _entry('refused'))
+        assert store.get('a') is None  # écrit à la sortie du bloc
+    assert store.count() == 2
+    assert store.get('b')['status'] == 'refused'
+
+
+def test_history_pages(store):
+    store.put('r1', _entry())
+    store.append_history('r1', HistoryStep("a"), HistoryStep("b"), HistoryStep("c"))
+    assert [s.service for s in store.history('r1', after=1, limit=2)] == ['a', 'b']
+    assert [s.service for s in store.history('r1', after=3)] == ['c']
+
+
+def test_sqlite_survives_restart(tmp_path):
+    path = str(tmp_path / 'loans.db')
+    s = SqliteLoanStore(path)
+    s.put('r1', _entry())
+    s.close()
+    s = SqliteLoanStore(path)
+    assert s.get('r1')['status'] == 'pending'
+    s.close()
+
+
+def test_sqlite_indexes(tmp_path):
+    s = SqliteLoanStore(str(tmp_path / 'loans.db'))
+    plan = s._conn().execute(
+        "EXPLAIN QUERY PLAN SELECT request_id FROM loans WHERE client_id = ? "
+        "ORDER BY created_at", ('c1',)).fetchall()
+    assert 'loans_client_idx' in str(plan)
+    s.close()
+
+
+def test_tiered_evicts_finished_to_cold(tmp_path):
+    from loan_store import TieredLoanStore
+    s = TieredLoanStore(str(tmp_path / 'loans.cold'), max_hot=2, ttl=3600)
+    s.put('p1', _entry('pending'))
+    s.put('r1', _entry('refused'))
+    s.put('r2', _entry('refused'))   # dépasse max_hot : r1 (LRU) part à froid
+    stats = s.stats()
+    assert stats['hot_entries'] == 2
+    assert stats['cold_entries'] == 1
+    assert stats['evictions_lru'] == 1
+    # lecture transparente depuis le segment froid
+    assert s.get('r1')['status'] == 'refused'
+    assert s.stats()['cold_reads'] == 1
+    # les prêts en cours ne sont jamais évincés
+    s.put('r3', _entry('refused'))
+    assert s.get('p1')['status'] == 'pending'
+    s.close()
+
+
+def test_tiered_ttl_and_promotion(tmp_path):
+    from loan_store import TieredLoanStore
+    path = str(tmp_path / 'loans.cold')
+    s = TieredLoanStore(path, ttl=0, sweep_interval=0)
+    s.put('p1', _entry('pending'))
+    s.update('p1', status='done', verdict='Chèque validé')
+    s.put('x', _entry('pending'))     # déclenche le balayage TTL
+    assert s.stats()['evictions_ttl'] == 1
+    assert s.append_history('p1', HistoryStep("ms_fournisseur"))
+    assert s.stats()['promotions'] == 1
+    assert len(s.get('p1')['history']) == 2
+    s.close()
+    # l'index du segment froid est relu au redémarrage
+    s = TieredLoanStore(path, ttl=0, sweep_interval=0)
+    assert len(s.get('p1')['history']) == 2
+    s.close()
+
+
+def test_tiered_cold_segment_compaction(tmp_path):
+    from loan_store import TieredLoanStore
+    path = str(tmp_path / 'loans.cold')
+    s = TieredLoanStore(path, ttl=0, sweep_interval=0, compact_min=4096)
+    history = [HistoryStep(f"étape {i}") for i in range(20)]
+    for i in range(200):
+        # même clé réécrite : chaque éviction remplace l'enregistrement froid
+        s.put('r1', dict(_entry('pending'), history=history, n=i))
+        s.update('r1', status='done')
+        s.put('x', _entry('pending'))      # balayage TTL : r1 part à froid
+    stats = s.stats()
+    assert stats['cold_entries'] == 1 and stats['compactions'] > 0
+    assert stats['cold_bytes'] < 4096
+    assert s.get('r1')['n'] == 199 and len(s.get('r1')['history']) == 20
+    s.close()
+    s = TieredLoanStore(path, ttl=0, sweep_interval=0, compact_min=4096)
+    assert s.get('r1')['n'] == 199 and s.status_counts() == {'done': 1}
+    assert [l['request_id'] for l in s.query(status='done')[0]] == ['r1']
+    s.close()
+    # le fichier de la génération précédente est supprimé
+    assert [n for n in os.listdir(tmp_path) if '.idx' not in n] == [f'loans.cold.{s._cold._generation}']
+
+
+def test_tiered_keeps_only_hot_entries_in_memory_index(tmp_path):
+    from loan_store import TieredLoanStore
+    s = TieredLoanStore(str(tmp_path / 'loans.cold'), max_hot=2, ttl=3600)
+    _seed(s)
+    assert len(s._index._meta) == 5          # prêts en cours seulement : les terminés sont à froid
+    assert s.status_counts() == {'pending': 5, 'refused': 5}
+    s.close()
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'tiered'])
+def any_store(request, tmp_path):
+    from loan_store import TieredLoanStore
+    if request.param == 'memory':
+        s = MemoryLoanStore()
+    elif request.param == 'sqlite':
+        s = SqliteLoanStore(str(tmp_path / 'loans.db'))
+    else:
+        s = TieredLoanStore(str(tmp_path / 'loans.cold'), max_hot=2, ttl=3600)
+    yield s
+    s.close()
+
+
+def _seed(store):
+    for n in range(10):
+        store.put(f'r{n}', dict(_entry('pending' if n % 2 else 'refused'),
+                                client_id=f'c{n % 3}', created_at=1000.0 + n))
+
+
+def test_query_filters_and_pages(any_store):
+    _seed(any_store)
+    loans, cursor = any_store.query(limit=4)
+    assert [l['request_id'] for l in loans] == ['r9', 'r8', 'r7', 'r6']
+    assert 'history' not in loans[0]
+    loans, cursor = any_store.query(limit=4, cursor=cursor)
+    assert [l['request_id'] for l in loans] == ['r5', 'r4', 'r3', 'r2']
+    loans, cursor = any_store.query(limit=4, cursor=cursor)
+    assert [l['request_id'] for l in loans] == ['r1', 'r0'] and cursor is None
+
+    ids = lambda **kw: [l['request_id'] for l in any_store.query(**kw)[0]]
+    assert ids(client_id='c0') == ['r9', 'r6', 'r3', 'r0']
+    assert ids(client_id='c0', status='pending') == ['r9', 'r3']
+    assert ids(status='refused', since=1002, until=1008) == ['r6', 'r4', 'r2']
+    assert ids(client_id='inconnu') == []
+
+
+def test_query_integer_client_id_matches_text_filter(any_store):
+    any_store.put('n1', dict(_entry('pending'), client_id=42, created_at=1000.0))
+    any_store.put('n2', dict(_entry('pending'), client_id='42', created_at=1001.0))
+    ids = lambda **kw: [l['request_id'] for l in any_store.query(**kw)[0]]
+    assert ids(client_id='42') == ['n2', 'n1']
+    assert ids(client_id=42, status='pending') == ['n2', 'n1']
+    assert any_store.get('n1')['client_id'] == 42       # valeur stockée inchangée
+
+
+def test_query_index_follows_updates(any_store):
+    _seed(any_store)
+    assert any_store.status_counts() == {'pending': 5, 'refused': 5}
+    any_store.update('r1', status='done', verdict='Chèque validé')
+    any_store.put('r9', dict(_entry('done'), client_id='c0', created_at=1009.0))
+    assert any_store.status_counts() == {'pending': 3, 'refused': 5, 'done': 2}
+    assert [l['request_id'] for l in any_store.query(status='done')[0]] == ['r9', 'r1']
+    assert [l['request_id'] for l in any_store.query(status='pending', client_id='c1')[0]] == ['r7']
+
+
+def test_query_index_survives_restart(tmp_path):
+    from loan_store import TieredLoanStore
+    path = str(tmp_path / 'loans.cold')
+    s = TieredLoanStore(path, max_hot=1, ttl=3600)
+    _seed(s)
+    s.close()
+    s = TieredLoanStore(path, max_hot=1, ttl=3600)
+    assert s.status_counts() == {'refused': 5}   # les prêts en attente n'étaient qu'en mémoire
+    assert [l['request_id'] for l in s.query(client_id='c2')[0]] == ['r8', 'r2']
+    s.close()
+
+
+def test_sqlite_query_uses_indexes(tmp_path):
+    s = SqliteLoanStore(str(tmp_path / 'loans.db'))
+    plan = s._conn().execute(
+        "EXPLAIN QUERY PLAN SELECT request_id FROM loans WHERE client_id = ? AND status = ? "
+        "ORDER BY created_at DESC, request_id DESC", ('c1', 'pending')).fetchall()
+    assert 'loans_client_status_idx' in str(plan)
+    s.close()
+
+
+def test_cursor_round_trip():
+    from loan_store import encode_cursor, decode_cursor
+    assert decode_cursor(encode_cursor((1000.5, 'r1'))) == (1000.5, 'r1')
+    with pytest.raises(ValueError):
+        decode_cursor('pas-un-curseur')
+
+
+def test_sqlite_counts_initialised_on_existing_base(tmp_path):
+    import sqlite3
+    path = str(tmp_path / 'loans.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE loans (request_id TEXT PRIMARY KEY, client_id TEXT, '
+                 'status TEXT NOT NULL, created_at REAL NOT NULL, data TEXT NOT NULL)')
+    conn.executemany('INSERT INTO loans VALUES (?, ?, ?, ?, ?)',
+                     [('a', 'c', 'pending', 1.0, '{}'), ('b', 'c', 'done', 2.0, '{}')])
+    conn.commit()
+    conn.close()
+    s = SqliteLoanStore(path)
+    assert s.status_counts() == {'pending': 1, 'done': 1} and s.count() == 2
+    s.close()
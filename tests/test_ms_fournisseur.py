@@ -20,7 +20,19 @@ def test_create_fund_transfer(client):
     assert "Fonds de 12345" in j["message"]
     assert "self" in j["links"] and "status" in j["links"]
 
+def test_create_fund_transfer_idempotent(client):
+    headers = {'Idempotency-Key': 'req-42'}
+    first = client.post('/fundTransfers', json={"loan_amount": 10, "client_id": "c"}, headers=headers)
+    again = client.post('/fundTransfers', json={"loan_amount": 10, "client_id": "c"}, headers=headers)
+    assert first.status_code == 201 and again.status_code == 200
+    assert again.get_json() == first.get_json()
+
 def test_get_fund_transfer_status(client):
     rv = client.get('/fundTransfers/1234/status')
     assert rv.status_code == 200
     assert rv.get_json()["status"] == "completed"
+
+def test_metrics(client):
+    client.get('/fundTransfers/1234/status')
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{endpoint="get_fund_transfer_status"}' in text
@@ -17,3 +17,37 @@ def test_checkloan_above_limit(service):
     resp = service.CheckLoan(req, None)
     assert resp.allowed is False
     assert "Montant trop élevé" in resp.message
+
+def test_checkloans_batch(service):
+    req = montantmax_pb2.LoanBatchRequest(loans=[
+        montantmax_pb2.LoanRequest(loan_amount=1000),
+        montantmax_pb2.LoanRequest(loan_amount=60000),
+    ])
+    resp = service.CheckLoans(req, None)
+    assert [r.allowed for r in resp.results] == [True, False]
+
+def test_get_rules(service):
+    table = service.GetRules(montantmax_pb2.RulesRequest(), None)
+    assert table.expressible
+    assert [(r.op, r.threshold, r.allowed) for r in table.rules] == [("<=", 50000, True), ("*", 0, False)]
+    # version déjà connue : pas de règles renvoyées
+    same = service.GetRules(montantmax_pb2.RulesRequest(known_version=table.version), None)
+    assert same.version == table.version and not same.rules
+
+def test_rpc_metrics(service):
+    from ms_montantmax.server import REGISTRY
+    before = REGISTRY.get_sample_value('rpc_duration_seconds_count', {'method': 'CheckLoan'}) or 0
+    service.CheckLoan(montantmax_pb2.LoanRequest(loan_amount=1000), None)
+    assert REGISTRY.get_sample_value('rpc_duration_seconds_count', {'method': 'CheckLoan'}) == before + 1
+    assert REGISTRY.get_sample_value('rpc_in_flight') == 0
+
+def test_rpc_span_joins_caller_trace(service):
+    from ms_montantmax.server import tracer
+
+    class Context:
+        def invocation_metadata(self):
+            return (('traceparent', '00-' + 'c' * 32 + '-' + 'd' * 16 + '-01'),)
+
+    service.CheckLoan(montantmax_pb2.LoanRequest(loan_amount=1000), Context())
+    spans = tracer.exporter.find('c' * 32)
+    assert [(s['name'], s['parent_id']) for s in spans] == [('CheckLoan', 'd' * 16)]
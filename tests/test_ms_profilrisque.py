@@ -29,3 +29,31 @@ def test_risk_profile_eleve(client):
     rv = client.post('/graphql', json=payload)
     assert rv.status_code == 200
     assert rv.get_json()['riskProfile'] == 'elevé'
+
+def test_risk_profiles_batch(client):
+    payload = {
+        "query": """
+          query($items: [RiskInput!]!) { riskProfiles(items: $items) }
+        """,
+        "variables": {"items": [
+            {"loanAmount": 1000, "clientInfo": "A"},
+            {"loanAmount": 25000, "clientInfo": "B"},
+        ]}
+    }
+    rv = client.post('/graphql', json=payload)
+    assert rv.status_code == 200
+    assert rv.get_json()['riskProfiles'] == ['acceptable', 'elevé']
+
+def test_risk_rules(client):
+    rv = client.post('/graphql', json={
+        "query": "{ riskRules { version expressible rules { op threshold profile } } }"
+    })
+    table = rv.get_json()['riskRules']
+    assert table['expressible'] is True
+    assert table['rules'][0] == {"op": ">=", "threshold": 20000, "profile": "elevé"}
+
+def test_metrics(client):
+    client.post('/graphql', json={"query": "{ riskRules { version } }"})
+    rv = client.get('/metrics')
+    assert rv.status_code == 200
+    assert 'graphql_duration_seconds_count' in rv.get_data(as_text=True)
@@ -0,0 +1,162 @@
+import time
+import threading
+
+import pytest
+
+from app.resilience import CircuitBreaker, CircuitOpenError, Downstream, LatencyTracker
+
+
+def test_breaker_opens_and_half_opens():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == 'half_open'
+    assert breaker.allow()        # un seul appel d'essai
+    assert not breaker.allow()
+    breaker.record_failure()      # l'essai échoue : réouverture
+    assert breaker.state == 'open'
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+
+
+def test_downstream_fast_fail():
+    downstream = Downstream('svc', CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    calls = []
+
+    def failing(timeout):
+        calls.append(timeout)
+        raise IOError('down')
+
+    with pytest.raises(IOError):
+        downstream.call(failing)
+    with pytest.raises(CircuitOpenError) as info:
+        downstream.call(failing)
+    assert len(calls) == 1 and info.value.retry_after > 0
+
+
+def test_adaptive_timeout():
+    downstream = Downstream('svc', default_timeout=5, min_timeout=0.2,
+                            max_timeout=5, min_samples=10)
+    assert downstream.timeout() == 5
+    for _ in range(10):
+        downstream.latency.record(0.3)
+    assert downstream.timeout() == pytest.approx(0.6)
+    for _ in range(10):
+        downstream.latency.record(0.01)
+    assert downstream.timeout() == pytest.approx(0.6)   # p99 toujours 0.3
+    assert downstream.call(lambda timeout: timeout) == pytest.approx(0.6)
+
+
+def test_breaker_recovers_when_latency_exceeds_learned_timeout():
+    downstream = Downstream('svc', CircuitBreaker(failure_threshold=3, reset_timeout=0.05),
+                            default_timeout=1.0, min_timeout=0.02, max_timeout=1.0, min_samples=5)
+    for _ in range(20):
+        downstream.latency.record(0.001)        # timeout appris : 0.02 s
+    assert downstream.timeout() == 0.02
+
+    def slower(timeout):                        # le service répond désormais en 0.05 s
+        if timeout < 0.05:
+            time.sleep(timeout)
+            raise TimeoutError('délai dépassé')
+        time.sleep(0.05)
+        return 'ok'
+
+    results = []
+    for _ in range(40):
+        try:
+            results.append(downstream.call(slower))
+        except CircuitOpenError as exc:
+            time.sleep(exc.retry_after + 0.001)
+        except TimeoutError:
+            pass
+        if len(results) >= 3:
+            break
+    assert results == ['ok'] * 3 and downstream.breaker.state == 'closed'
+
+
+def test_latency_quantiles_window():
+    tracker = LatencyTracker(window=4)
+    assert tracker.quantile(0.99) is None
+    for value in (9, 9, 1, 2, 3, 4):
+        tracker.record(value)
+    assert tracker.samples == 4
+    assert tracker.quantile(0.99) == 4 and tracker.quantile(0.0) == 1
+
+
+def test_hedged_request_wins():
+    downstream = Downstream('svc', min_samples=5, hedge=True)
+    for _ in range(5):
+        downstream.latency.record(0.01)
+    release = threading.Event()
+    attempts = []
+
+    def read(timeout):
+        attempts.append(timeout)
+        if len(attempts) == 1:
+            release.wait(1)       # première requête bloquée
+            return 'slow'
+        return 'fast'
+
+    assert downstream.call(read) == 'fast'
+    release.set()
+    assert downstream.hedges == 1 and downstream.hedge_wins == 1
+
+
+def test_cancelled_trial_releases_half_open_breaker():
+    import asyncio
+    downstream = Downstream('svc', CircuitBreaker(failure_threshold=1, reset_timeout=0.05))
+    downstream.breaker.record_failure()
+    time.sleep(0.06)
+
+    async def cancelled_trial():
+        task = asyncio.ensure_future(downstream.acall(lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        task.cancel()                 # vérification perdante annulée
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancelled_trial())
+    assert downstream.breaker.state == 'half_open'
+    assert downstream.breaker.allow()    # un nouvel essai peut partir
+
+
+def test_hedged_call_stays_within_timeout():
+    downstream = Downstream('svc', min_samples=5, hedge=True)
+    for _ in range(5):
+        downstream.latency.record(0.05)       # p95 : 0.05 s
+    timeouts = []
+
+    def hanging(timeout):
+        timeouts.append(timeout)
+        time.sleep(1)
+
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        downstream._hedged(hanging, 0.2)
+    assert time.monotonic() - start < 0.3 and timeouts[1] <= 0.15
+
+
+def test_async_5xx_counts_as_failure():
+    import asyncio
+    import httpx
+    from async_downstreams import AsyncDownstreams
+    downstreams = AsyncDownstreams('localhost:0', 'http://risk/graphql', 'http://banque/')
+    downstreams._http = httpx.AsyncClient(transport=httpx.MockTransport(lambda req: httpx.Response(503)))
+    downstream = Downstream('svc', CircuitBreaker(failure_threshold=1, reset_timeout=60))
+
+    async def scenario():
+        try:
+            await downstream.acall(lambda: downstreams.submit_cheque(b'<x/>', {}))
+        finally:
+            await downstreams.aclose()
+
+    with pytest.raises(IOError):
+        asyncio.run(scenario())
+    assert downstream.breaker.state == 'open'
@@ -0,0 +1,67 @@
+import pytest
+
+from rules import LocalDecisions, RuleTable
+
+
+def _risk_table(version=1, expressible=True):
+    return RuleTable(version, [(">=", 20000, "elevé"), ("*", 0, "acceptable")], expressible)
+
+
+def test_rule_table_evaluate():
+    table = _risk_table()
+    assert table.evaluate(25000) == "elevé"
+    assert table.evaluate(100) == "acceptable"
+    assert not RuleTable(1, [("~", 0, "x")]).expressible
+
+
+def test_local_mode_and_resync():
+    tables = [_risk_table(1)]
+    seen = []
+
+    def fetch(version):
+        seen.append(version)
+        return tables[-1] if tables[-1].version != version else None
+
+    d = LocalDecisions({'risk': fetch}, mode='local', sync_interval=3600)
+    d.sync()
+    assert d.decide('risk', 25000) == "elevé"
+    d.sync()                                       # version inchangée : table conservée
+    tables.append(RuleTable(2, [("*", 0, "acceptable")]))
+    d.sync()
+    assert d.decide('risk', 25000) == "acceptable"
+    assert seen == [None, 1, 1]
+    stats = d.stats()['services']['risk']
+    assert stats['version'] == 2 and stats['local'] == 2
+
+
+def test_missing_table_falls_back():
+    def down(version):
+        raise ConnectionError()
+
+    d = LocalDecisions({'risk': down}, mode='local')
+    d.sync()
+    assert d.decide('risk', 100) is None
+    stats = d.stats()['services']['risk']
+    assert stats['fallback'] == 1 and stats['sync_errors'] >= 1
+
+
+def test_not_expressible_falls_back():
+    d = LocalDecisions({'risk': lambda v: _risk_table(expressible=False)}, mode='local')
+    d.sync()
+    assert d.decide('risk', 25000) is None
+
+
+def test_shadow_counts_mismatches():
+    d = LocalDecisions({'risk': lambda v: _risk_table()}, mode='shadow', sync_interval=3600)
+    d.sync()
+    assert d.decide('risk', 25000) is None         # en shadow, le distant fait foi
+    d.shadow('risk', 25000, "elevé")
+    d.shadow('risk', 25000, "acceptable")
+    stats = d.stats()['services']['risk']
+    assert stats['shadow_checks'] == 2
+    assert stats['shadow_mismatches'] == 1
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        LocalDecisions({}, mode='bogus')
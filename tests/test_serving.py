@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import time
+import socket
+import subprocess
+import urllib.request
+
+import pytest
+
+from common import serving
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC  = os.path.join(ROOT, 'src')
+
+
+def test_options_scale_with_cores(monkeypatch):
+    monkeypatch.setattr(serving, 'available_cores', lambda: 4)
+    threaded = serving.options('0.0.0.0:5000', env={})
+    assert threaded['worker_class'] == 'gthread' and threaded['workers'] == 4
+    assert threaded['threads'] == 8 and threaded['keepalive'] == 5 and not threaded['preload_app']
+    prefork = serving.options('0.0.0.0:5000', env={'SERVE_MODE': 'prefork', 'SERVE_MAX_REQUESTS': '1000'})
+    assert prefork['worker_class'] == 'sync' and prefork['workers'] == 9 and prefork['threads'] == 1
+    assert prefork['max_requests_jitter'] == 100
+    assert serving.options('x', env={'SERVE_WORKERS': '2'})['workers'] == 2
+    with pytest.raises(ValueError):
+        serving.options('x', env={'SERVE_MODE': 'eventlet'})
+
+
+def test_available_cores():
+    assert 1 <= serving.available_cores() <= (os.cpu_count() or 1)
+
+
+def test_require_shared(monkeypatch):
+    serving.require_shared('STORE', False, "n/a")   # un seul processus
+    monkeypatch.setenv('SERVE_PROCESSES', '4')
+    serving.require_shared('STORE', True, "n/a")
+    with pytest.raises(RuntimeError, match='STORE'):
+        serving.require_shared('STORE', False, "définir STORE_PATH")
+
+
+def test_app_refuses_process_local_store(tmp_path):
+    env = dict(os.environ, SERVE_PROCESSES='2', LOAN_STORE='memory',
+               IDEMPOTENCY_PATH=str(tmp_path / 'idempotency.db'),
+               PYTHONPATH=os.pathsep.join([SRC, os.path.join(SRC, 'ms_montantmax')]))
+    proc = subprocess.run([sys.executable, '-c', 'import app'], cwd=os.path.join(SRC, 'app'),
+                          env=env, capture_output=True, text=True)
+    assert proc.returncode != 0 and 'LOAN_STORE' in proc.stderr
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _post(url, headers):
+    req = urllib.request.Request(url, data=json.dumps({"loan_amount": 10, "client_id": "c"}).encode(),
+                                 headers=dict(headers, **{'Content-Type': 'application/json'}))
+    with urllib.request.urlopen(req, timeout=5) as resp:
+        return resp.status, json.loads(resp.read())
+
+
+def test_multi_worker_server_shares_state_and_metrics(tmp_path):
+    port = _free_port()
+    prometheus_dir = tmp_path / 'prometheus'   # ne contient que les fichiers de métriques
+    prometheus_dir.mkdir()
+    env = dict(os.environ, SERVE_WORKERS='2', SERVE_THREADS='2', PYTHONPATH=SRC,
+               IDEMPOTENCY_PATH=str(tmp_path / 'transfers.db'),
+               PROMETHEUS_MULTIPROC_DIR=str(prometheus_dir))
+    proc = subprocess.Popen([sys.executable, '-m', 'common.serving', 'server:app', '--port', str(port),
+                             '--host', '127.0.0.1'], cwd=os.path.join(SRC, 'ms_fournisseur'), env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    base = f'http://127.0.0.1:{port}'
+    try:
+        deadline = time.monotonic() + 20
+        while True:
+            try:
+                urllib.request.urlopen(base + '/health', timeout=1).close()
+                break
+            except OSError:
+                assert proc.poll() is None and time.monotonic() < deadline, proc.stderr.read()
+                time.sleep(0.05)
+        # chaque requête sur une nouvelle connexion : réparties entre les deux workers
+        codes = [_post(base + '/fundTransfers', {'Idempotency-Key': 'k-1'})[0] for _ in range(6)]
+        assert codes[0] == 201 and set(codes[1:]) == {200}
+        with urllib.request.urlopen(base + '/metrics', timeout=5) as resp:
+            body = resp.read().decode()
+        latency = [line for line in body.splitlines()
+                   if line.startswith('http_request_duration_seconds_count{endpoint="create_fund_transfer"}')]
+        assert latency and float(latency[0].split()[-1]) == 6.0
+    finally:
+        proc.terminate()
+        proc.wait(10)
+    assert proc.returncode == 0
@@ -0,0 +1,83 @@
+import time
+import sqlite3
+
+import pytest
+
+from common import shared_store
+from common.shared_store import SharedDict, BoundedDict
+
+
+def test_shared_dict_visible_across_connections(tmp_path):
+    path = str(tmp_path / 'shared.db')
+    first, second = SharedDict(path), SharedDict(path)
+    first['a'] = {'status': 'pending'}
+    assert second['a'] == {'status': 'pending'} and 'a' in second and len(second) == 1
+    value = second['a']
+    value['status'] = 'done'           # une copie : rien n'est écrit...
+    assert first['a']['status'] == 'pending'
+    second['a'] = value                # ...tant qu'elle n'est pas réécrite
+    assert first['a']['status'] == 'done'
+    assert first.pop('a') == {'status': 'done'} and first.get('a') is None
+    try:
+        del second['a']
+        assert False, "KeyError attendue"
+    except KeyError:
+        pass
+
+
+def test_shared_dict_setdefault_keeps_first_writer(tmp_path):
+    path = str(tmp_path / 'shared.db')
+    first, second = SharedDict(path), SharedDict(path)
+    assert first.setdefault('k', [1]) == [1]
+    assert second.setdefault('k', [2]) == [1]
+
+
+def test_shared_dict_maxsize_and_ttl(tmp_path):
+    store = SharedDict(str(tmp_path / 'bounded.db'), maxsize=3)
+    for n in range(5):
+        store[f'k{n}'] = n
+    assert len(store) == 3 and 'k1' not in store and store['k4'] == 4
+
+    expiring = SharedDict(str(tmp_path / 'ttl.db'), ttl=0.05)
+    expiring['k'] = 1
+    assert expiring['k'] == 1
+    time.sleep(0.08)
+    assert 'k' not in expiring and len(expiring) == 0
+    assert expiring.setdefault('k', 2) == 2
+    time.sleep(0.08)
+    assert expiring.purge() == 1
+
+
+def test_from_env(monkeypatch, tmp_path):
+    monkeypatch.delenv('STORE_PATH', raising=False)
+    assert shared_store.from_env('STORE_PATH') == {}
+    bounded = shared_store.from_env('STORE_PATH', maxsize=2)
+    assert isinstance(bounded, BoundedDict)
+    for n in range(3):
+        bounded.setdefault(n, n)
+    assert list(bounded) == [1, 2]
+    monkeypatch.setenv('STORE_PATH', str(tmp_path / 'env.db'))
+    assert shared_store.is_shared(shared_store.from_env('STORE_PATH'))
+
+
+def test_batch_read_and_write(tmp_path):
+    shared = SharedDict(str(tmp_path / 'shared.db'), maxsize=1500)
+    shared.update({f'k{n}': {'n': n} for n in range(1200)})
+    found = shared.get_many(['k0', 'absent', 'k1199'] + [f'k{n}' for n in range(600, 1100)])
+    assert len(found) == 502 and found['k1199'] == {'n': 1199} and 'absent' not in found
+    assert len(shared) == 1200
+
+
+def test_failed_batch_write_is_rolled_back(tmp_path, monkeypatch):
+    shared = SharedDict(str(tmp_path / 'shared.db'), maxsize=10)
+    def locked():
+        raise sqlite3.OperationalError('database is locked')
+    monkeypatch.setattr(shared, '_evict', locked)
+    with pytest.raises(sqlite3.OperationalError):
+        shared.update({'a': 1, 'b': 2})
+    with pytest.raises(sqlite3.OperationalError):
+        shared.setdefault('c', 3)
+    monkeypatch.undo()
+    assert len(shared) == 0                   # rien d'appliqué à moitié
+    shared.update({'d': 4})                   # aucune transaction laissée ouverte
+    assert shared.get_many(['a', 'c', 'd']) == {'d': 4}
@@ -0,0 +1,92 @@
+import pytest
+
+from common import soap
+
+TRACEPARENT = '00-' + 'a' * 32 + '-' + 'b' * 16 + '-01'
+
+
+def test_submit_template_roundtrip():
+    template = soap.SubmitTemplate('http://app:5000/loan/callback?a=1&b=2')
+    first, second = template.render(TRACEPARENT), template.render()
+    root = soap.parse(first)
+    reply_to, message_id = soap.addressing(root)
+    assert reply_to == 'http://app:5000/loan/callback?a=1&b=2'
+    assert message_id.startswith('urn:uuid:') and message_id not in second.decode()
+    assert soap.traceparent(root) == TRACEPARENT and soap.traceparent(soap.parse(second)) is None
+    body = root.find(f'{{{soap.NS_SOAP}}}Body')[0]
+    assert body.tag == f'{{{soap.NS_BANQUE}}}SubmitChequeRequest'
+
+    batch = soap.parse(soap.SubmitTemplate('x', batch=True).render(count=3))
+    assert batch.findtext(f'.//{{{soap.NS_BANQUE}}}count') == '3'
+
+
+def test_parse_spyne_responses():
+    single = b'''<?xml version='1.0' encoding='UTF-8'?>
+<soap11env:Envelope xmlns:soap11env="http://schemas.xmlsoap.org/soap/envelope/" xmlns:tns="ms.banque.async">
+  <soap11env:Body><tns:SubmitChequeRequestResponse>
+    <tns:SubmitChequeRequestResult>id-1</tns:SubmitChequeRequestResult>
+  </tns:SubmitChequeRequestResponse></soap11env:Body></soap11env:Envelope>'''
+    assert soap.submit_result(soap.parse(single)) == 'id-1'
+    batch = ('<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" xmlns:tns="ms.banque.async">'
+             '<s:Body><tns:SubmitChequeRequestsResponse><tns:SubmitChequeRequestsResult>'
+             '<tns:string>a</tns:string><tns:string>b</tns:string>'
+             '</tns:SubmitChequeRequestsResult></tns:SubmitChequeRequestsResponse></s:Body></s:Envelope>')
+    assert soap.submit_results(soap.parse(batch)) == ['a', 'b']
+    assert soap.submit_result(soap.parse(batch)) is None
+
+
+def test_cheque_status_response_roundtrip():
+    xml = soap.cheque_status_response('id<1>', 'http://app/cb?a&b', 'urn:uuid:9', 'Chèque validé',
+                                      traceparent=TRACEPARENT)
+    root = soap.parse(xml)
+    assert soap.cheque_status(root) == {'request_id': 'id<1>', 'status': 'done',
+                                        'verdict': 'Chèque validé'}
+    assert soap.traceparent(root) == TRACEPARENT
+    # corps qualifié par l'espace de noms SOAP (enveloppe construite avec un espace par défaut)
+    legacy = (b'<Envelope xmlns="http://schemas.xmlsoap.org/soap/envelope/"><Body><ChequeStatusResponse>'
+              b'<request_id>z</request_id><verdict>v</verdict></ChequeStatusResponse></Body></Envelope>')
+    assert soap.cheque_status(soap.parse(legacy)) == {'request_id': 'z', 'verdict': 'v'}
+    assert soap.cheque_status(soap.parse(b'<s:Envelope xmlns:s="%s"/>' % soap.NS_SOAP.encode())) == {}
+
+
+def test_cheque_status_batch_roundtrip():
+    xml = soap.cheque_status_batch('http://app/cb?a&b', [
+        ('id-1', 'urn:uuid:1', 'Chèque validé', TRACEPARENT),
+        ('id<2>', None, 'Chèque invalide', None)])
+    root = soap.parse(xml)
+    assert soap.cheque_statuses(root) == [
+        {'request_id': 'id-1', 'status': 'done', 'verdict': 'Chèque validé',
+         'relates_to': 'urn:uuid:1', 'traceparent': TRACEPARENT},
+        {'request_id': 'id<2>', 'status': 'done', 'verdict': 'Chèque invalide', 'relates_to': ''}]
+    assert soap.cheque_status(root) == {}
+    single = soap.parse(soap.cheque_status_response('x', 'http://app/cb', 'urn:uuid:9', 'v'))
+    assert soap.cheque_statuses(single) == []
+
+
+def test_banque_fast_path_helpers():
+    upload = soap.parse(b'<s:Envelope xmlns:s="%s"><s:Body><UploadCheque xmlns="ms.banque.async">'
+                        b'<request_id>id-1</request_id><cheque>valid</cheque></UploadCheque>'
+                        b'</s:Body></s:Envelope>' % soap.NS_SOAP.encode())
+    assert soap.payload(upload).tag == '{ms.banque.async}UploadCheque'
+    assert soap.upload_fields(soap.payload(upload)) == ('id-1', 'valid')
+    assert soap.submit_result(soap.parse(soap.submit_response('id<2>'))) == 'id<2>'
+    fault = soap.parse(soap.fault('Server.Busy', 'saturée & pleine'))
+    assert fault.findtext('.//faultcode') == 'soap11env:Server.Busy'
+    assert fault.findtext('.//faultstring') == 'saturée & pleine'
+
+
+@pytest.mark.parametrize('payload', [
+    b'<?xml version="1.0"?><!DOCTYPE x [<!ENTITY a "aaaa">]><x>&a;</x>',
+    b'<?xml version="1.0"?><!DOCTYPE x [<!ENTITY e SYSTEM "file:///etc/passwd">]><x>&e;</x>',
+    b'<x><unclosed></x>',
+    b'',
+])
+def test_parser_rejects_dtd_and_malformed(payload):
+    with pytest.raises(soap.SoapError):
+        soap.parse(payload)
+
+
+def test_parser_rejects_oversized(monkeypatch):
+    monkeypatch.setattr(soap, 'MAX_SIZE', 10)
+    with pytest.raises(soap.SoapError):
+        soap.parse(b'<x>' + b'a' * 20 + b'</x>')
@@ -0,0 +1,47 @@
+import os
+import sys
+import json
+import subprocess
+
+from flask import Flask
+
+import openapi
+from app.app import swagger, swagger_template
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_is_lazy():
+    # un processus neuf : les clients lourds ne sont chargés qu'au premier appel
+    env = dict(os.environ, SWAGGER_MODE='off',
+               PYTHONPATH=os.pathsep.join([os.path.join(ROOT, 'src'),
+                                           os.path.join(ROOT, 'src', 'ms_montantmax')]))
+    probe = ("import sys, json, app; print(json.dumps([m for m in "
+             "('grpc', 'google.protobuf', 'requests', 'asyncio', 'flasgger') if m in sys.modules]))")
+    out = subprocess.run([sys.executable, '-c', probe], cwd=os.path.join(ROOT, 'src', 'app'),
+                         env=env, check=True, capture_output=True, text=True).stdout
+    assert json.loads(out.strip().splitlines()[-1]) == []
+
+
+def test_static_spec(tmp_path):
+    spec = openapi.build_spec(swagger)
+    assert '/loan' in spec['paths']
+    path = tmp_path / 'openapi.json'
+    path.write_text(json.dumps(spec))
+
+    static = Flask('static')
+    assert openapi.init_app(static, swagger_template, mode='static', spec_path=str(path)) is None
+    client = static.test_client()
+
+    resp = client.get(openapi.SPEC_ROUTE)
+    assert resp.status_code == 200
+    assert resp.get_json() == spec
+    etag = resp.headers['ETag']
+    assert 'max-age' in resp.headers['Cache-Control']
+
+    resp = client.get(openapi.SPEC_ROUTE, headers={'If-None-Match': etag})
+    assert resp.status_code == 304
+
+    resp = client.get(openapi.UI_ROUTE)
+    assert resp.status_code == 200
+    assert openapi.SPEC_ROUTE in resp.get_data(as_text=True)
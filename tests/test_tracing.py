@@ -0,0 +1,56 @@
+from common import tracing
+
+
+def test_traceparent_roundtrip():
+    context = tracing.SpanContext('a' * 32, 'b' * 16, True)
+    assert tracing.parse_traceparent(context.traceparent()) == context
+    assert tracing.parse_traceparent('00-' + '0' * 32 + '-' + 'b' * 16 + '-01') is None
+    assert tracing.parse_traceparent('garbage') is None
+    assert tracing.parse_traceparent(None) is None
+
+
+def test_spans_nest_and_propagate():
+    tracer = tracing.Tracer('svc')
+    assert tracing.inject() == {} and tracing.grpc_metadata() is None
+    with tracer.span('parent') as parent:
+        headers = tracing.inject({'Content-Type': 'text/xml'})
+        with tracer.span('child') as child:
+            assert tracing.current() == child.context
+    assert tracing.current() is None
+    assert tracing.extract(headers) == parent.context
+    assert child.parent_id == parent.context.span_id
+    assert child.trace_id == parent.trace_id
+
+    # côté service appelé : span serveur rattaché au contexte reçu
+    remote = tracing.Tracer('remote', tracer.exporter)
+    with remote.span('handler', parent=tracing.extract(headers), kind='server'):
+        pass
+    rows = tracing.waterfall(tracer.exporter.find(parent.trace_id))
+    assert [(r['depth'], r['service'], r['name']) for r in rows] == [
+        (0, 'svc', 'parent'), (1, 'svc', 'child'), (1, 'remote', 'handler')]
+
+
+def test_error_and_sampling():
+    tracer = tracing.Tracer('svc', sample_rate=0)
+    try:
+        with tracer.span('boom') as span:
+            raise ValueError('x')
+    except ValueError:
+        pass
+    assert span.status == 'error'
+    assert tracer.exporter.find(span.trace_id) == []   # trace non échantillonnée
+
+
+def test_file_exporter(tmp_path):
+    path = str(tmp_path / 'spans.jsonl')
+    first, second = tracing.FileExporter(path), tracing.FileExporter(path)
+    with tracing.Tracer('a', first).span('root') as root:
+        with tracing.Tracer('b', second).span('leaf'):
+            pass
+    with tracing.Tracer('a', first).span('other'):
+        pass
+    spans = first.find(root.trace_id)
+    assert sorted(s['service'] for s in spans) == ['a', 'b']
+    assert 'root' in tracing.render_waterfall(tracing.waterfall(spans))
+    first.close()
+    second.close()
@@ -0,0 +1,88 @@
+import time
+import threading
+
+from app.transfers import TransferQueue, TransferWorkers
+
+
+def test_enqueue_is_idempotent_and_persistent(tmp_path):
+    path = str(tmp_path / 'transfers.db')
+    queue = TransferQueue(path, lease=0.05)
+    assert queue.enqueue('r1', {'loan_amount': 10})
+    assert not queue.enqueue('r1', {'loan_amount': 99})
+    job = queue.claim()
+    assert job['request_id'] == 'r1' and job['payload'] == {'loan_amount': 10}
+    assert job['attempt'] == 1
+    assert queue.claim() is None        # loué
+    queue.close()
+
+    # redémarrage pendant l'envoi : le bail expire, le transfert est repris
+    time.sleep(0.06)
+    queue = TransferQueue(path, lease=0.05)
+    job = queue.claim()
+    assert job['request_id'] == 'r1' and job['attempt'] == 2
+    queue.complete('r1', {'status': 'success'})
+    assert queue.claim() is None
+    assert queue.depth() == 0 and queue.oldest_age() == 0.0
+    assert not queue.enqueue('r1', {})  # jamais renvoyé une fois terminé
+    queue.close()
+
+
+def test_in_memory_queue_warns_it_is_volatile(tmp_path, caplog):
+    TransferQueue().warn_if_volatile()
+    assert 'perdus au redémarrage' in caplog.text
+    caplog.clear()
+    queue = TransferQueue(str(tmp_path / 'transfers.db'))
+    queue.warn_if_volatile()
+    assert caplog.text == ''
+    queue.close()
+
+
+def test_workers_retry_with_backoff_then_fail():
+    attempts, failed = [], []
+    def handler(job):
+        attempts.append(job['attempt'])
+        if job['request_id'] == 'ko' or job['attempt'] < 3:
+            raise IOError('indisponible')
+        return {'ok': True}
+
+    outcomes = []
+    workers = TransferWorkers(TransferQueue(), handler, workers=2, max_attempts=3,
+                              on_failed=lambda job, exc: failed.append(job['request_id']),
+                              on_attempt=outcomes.append, backoff_base=0.005)
+    assert workers.submit('ok', {})
+    assert workers.submit('ko', {})
+    assert not workers.submit('ok', {})
+    assert workers.join(timeout=5)
+    workers.stop()
+
+    assert failed == ['ko']
+    assert sorted(attempts) == [1, 1, 2, 2, 3, 3]
+    assert sorted(outcomes) == ['failed', 'retry', 'retry', 'retry', 'retry', 'success']
+    stats = workers.queue.stats()
+    assert stats['done'] == 1 and stats['failed'] == 1
+
+
+def test_backoff_is_bounded():
+    workers = TransferWorkers(TransferQueue(), lambda job: None, backoff_base=1, backoff_max=8)
+    assert 0.5 <= workers.backoff(1) <= 1
+    assert 4 <= workers.backoff(4) <= 8
+    assert workers.backoff(20) <= 8
+
+
+def test_pool_is_bounded():
+    running, peak, lock = [0], [0], threading.Lock()
+    def handler(job):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+
+    workers = TransferWorkers(TransferQueue(), handler, workers=3)
+    for n in range(20):
+        workers.submit(f'r{n}', {})
+    assert workers.join(timeout=5)
+    workers.stop()
+    assert peak[0] <= 3
+    assert workers.queue.stats()['done'] == 20
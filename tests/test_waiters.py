@@ -0,0 +1,53 @@
+import asyncio
+import threading
+
+from app.waiters import WaiterRegistry
+
+
+def test_notify_wakes_threads():
+    registry = WaiterRegistry()
+    woken = []
+
+    def wait():
+        with registry.watch('r1') as event:
+            woken.append(event.wait(5))
+
+    threads = [threading.Thread(target=wait) for _ in range(3)]
+    for t in threads:
+        t.start()
+    while registry.waiting() < 3:
+        pass
+    assert registry.stats()['keys'] == 1   # un seul emplacement par demande
+    assert registry.notify('r1') == 3
+    for t in threads:
+        t.join()
+    assert woken == [True, True, True]
+    assert registry.stats() == {"waiting": 0, "keys": 0, "notified": 3}
+
+
+def test_timeout_releases_slot():
+    registry = WaiterRegistry()
+    with registry.watch('r1') as event:
+        assert not event.wait(0.01)
+    assert registry.notify('r1') == 0
+    assert registry.stats()['keys'] == 0
+
+
+def test_notify_wakes_coroutines_from_thread():
+    registry = WaiterRegistry()
+
+    async def scenario():
+        async def wait(timeout):
+            with registry.watch_async('r1') as waiter:
+                return await waiter.wait(timeout)
+
+        tasks = [asyncio.ensure_future(wait(5)) for _ in range(1000)]
+        await asyncio.sleep(0)
+        assert registry.waiting() == 1000
+        threading.Thread(target=registry.notify, args=('r1',)).start()
+        woken = await asyncio.gather(*tasks)
+        assert not await wait(0.01)
+        return woken
+
+    assert all(asyncio.run(scenario()))
+    assert registry.stats() == {"waiting": 0, "keys": 0, "notified": 1000}